@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Codec Benchmark
+
+Compara el camino stdlib (json.dumps/json.loads + gzip) contra la capa
+de codecs compartida en payloads representativos del scraper.
+
+Uso:
+    python -m benchmarks.codec_benchmark [--iterations 20000]
+"""
+
+import argparse
+import gzip
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+# Agregar raíz del proyecto al path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils import codec
+
+
+def sample_payloads() -> Dict[str, Any]:
+    """Payloads con la forma de los datos reales"""
+    scraped = {
+        'url': 'https://empresa-marketing.pe/blog/necesito-agencia',
+        'title': 'Necesito una agencia de marketing digital en Lima urgente',
+        'content': 'Busco proveedor de marketing digital para mi pyme. ' * 40,
+        'metadata': {'status_code': 200, 'content_type': 'text/html', 'content_length': 2080, 'word_count': 320},
+        'scraped_at': datetime.now().isoformat(),
+        'content_hash': 'd41d8cd98f00b204e9800998ecf8427e',
+    }
+    competitor = {
+        'name': 'Piscinas Lima SAC',
+        'website': 'https://piscinaslima.com.pe',
+        'services': ['limpieza de piscinas', 'mantenimiento', 'cloración', 'reparación de bombas'],
+        'social_media': ['https://facebook.com/piscinaslima', 'https://instagram.com/piscinaslima'],
+    }
+    analysis = {
+        'service_categories': {'Limpieza/Mantenimiento': 12, 'Reparaciones': 4, 'Otros Servicios': 7},
+        'common_services': ['limpieza', 'mantenimiento', 'cloración'] * 3,
+        'opportunities': ['Ofrecer paquetes de servicios integrales'] * 3,
+    }
+    return {'scraped_content': scraped, 'competitor': competitor, 'analysis': analysis, 'intent_tag': 'dolor'}
+
+
+def _stdlib_roundtrip(value: Any) -> Any:
+    """Camino anterior: JSON texto, gzip si > 1KB"""
+    text = json.dumps(value, ensure_ascii=False)
+    data: Any = text
+    if len(text.encode('utf-8')) > 1024:
+        data = gzip.compress(text.encode('utf-8'))
+        text = gzip.decompress(data).decode('utf-8')
+    return json.loads(text), len(data if isinstance(data, bytes) else data.encode('utf-8'))
+
+
+def _codec_roundtrip(selected: codec.Codec) -> Callable[[Any], Tuple[Any, int]]:
+    def run(value: Any) -> Tuple[Any, int]:
+        blob = codec.encode(value, selected, compress_threshold=1024)
+        return codec.decode(blob), len(blob)
+    return run
+
+
+def _time_it(func: Callable[[Any], Tuple[Any, int]], value: Any, iterations: int) -> Tuple[float, int]:
+    size = func(value)[1]
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(value)
+    elapsed = time.perf_counter() - start
+    return elapsed / iterations * 1_000_000, size
+
+
+def run_benchmark(iterations: int) -> List[Dict[str, Any]]:
+    """Ejecutar benchmark y devolver filas de resultados"""
+    candidates: Dict[str, Callable[[Any], Tuple[Any, int]]] = {'stdlib json+gzip': _stdlib_roundtrip}
+    for name in ('json', 'orjson', 'msgpack'):
+        try:
+            candidates[f"codec:{name}"] = _codec_roundtrip(codec.get_codec(name))
+        except codec.CodecError:
+            continue
+
+    results = []
+    for payload_name, value in sample_payloads().items():
+        baseline_us = None
+        for candidate_name, func in candidates.items():
+            us, size = _time_it(func, value, iterations)
+            if baseline_us is None:
+                baseline_us = us
+            results.append({
+                'payload': payload_name,
+                'codec': candidate_name,
+                'us_per_roundtrip': round(us, 2),
+                'bytes': size,
+                'speedup': round(baseline_us / us, 2) if us else 0.0,
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de codecs vs stdlib json")
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"{'payload':<16} {'codec':<18} {'µs/roundtrip':>13} {'bytes':>8} {'speedup':>8}")
+    print("-" * 67)
+    for row in run_benchmark(args.iterations):
+        print(f"{row['payload']:<16} {row['codec']:<18} {row['us_per_roundtrip']:>13} {row['bytes']:>8} {row['speedup']:>7}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Compression Benchmark
+
+Mide los bytes ahorrados al guardar posts.body comprimido con zstd
+(diccionarios por dominio) y el costo en latencia de lectura. Genera los
+mismos posts sintéticos (con texto repetido por sitio, como el de los foros
+reales) en dos bases: una sin compresión y otra comprimida con
+diccionarios entrenados. Cada variante corre en su propio proceso porque
+la configuración (DB_PATH, DB_COMPRESS_TEXT) se lee al importar.
+
+Uso:
+    python -m benchmarks.compression_benchmark [--rows 50000] [--reads 5000] [--dir /tmp/zbench]
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Agregar raíz del proyecto al path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+DOMAINS = 12
+WORDS = ('necesito', 'proveedor', 'precio', 'cotización', 'envío', 'Lima', 'clientes', 'ventas',
+         'marketing', 'tienda', 'urgente', 'recomienden', 'agencia', 'web', 'factura', 'pago')
+
+
+def _body(rng: random.Random, domain: int, i: int) -> str:
+    """Cuerpo con plantilla del sitio (cabecera, reglas, firma) y texto propio del post"""
+    header = (f"Foro de emprendedores peruanos foro{domain}.pe — Inicio › Comunidad › Negocios. "
+              f"Recuerda leer las normas de la comunidad antes de publicar. ")
+    footer = (f" — Publicado en foro{domain}.pe. Responder · Citar · Reportar. "
+              f"© foro{domain}.pe Todos los derechos reservados.")
+    text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 160)))
+    return f"{header}Post {i}: {text}{footer}"
+
+
+def populate(rows: int, compressed: bool) -> None:
+    from database.db import get_conn, init_db, upsert_posts
+    from database.compression import recompress, train_dictionaries
+
+    init_db()
+    rng = random.Random(42)
+    batch = []
+    for i in range(rows):
+        domain = i % DOMAINS
+        batch.append({
+            'id': f'p{i}', 'source': f'foro{domain}.pe', 'url': f'https://foro{domain}.pe/t/{i}',
+            'title': f'Consulta {i}', 'body': _body(rng, domain, i), 'lang': 'es',
+            'created_at': f'2026-10-{1 + i % 28:02d}T10:00:00', 'keyword': 'marketing',
+            'tag': 'dolor', 'relevance_score': i % 10,
+        })
+        if len(batch) == 5000:
+            upsert_posts(batch)
+            batch = []
+    if batch:
+        upsert_posts(batch)
+
+    if compressed:
+        train_dictionaries('posts.body')
+        recompress('posts.body')
+
+    with get_conn() as c:
+        c.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        c.execute("VACUUM")
+
+
+def measure(rows: int, reads: int, compressed: bool) -> dict:
+    from config.config_v2 import get_db_path
+    from database.compression import decompress_value
+    from database.db import get_read_conn
+
+    populate(rows, compressed)
+    rng = random.Random(7)
+    ids = [f'p{rng.randrange(rows)}' for _ in range(reads)]
+
+    with get_read_conn() as c:
+        stored = c.execute("SELECT COALESCE(SUM(LENGTH(CAST(body AS BLOB))), 0) FROM posts").fetchone()[0]
+
+        start = time.perf_counter()
+        chars = 0
+        for post_id in ids:
+            body = decompress_value(c.execute("SELECT body FROM posts WHERE id = ?", (post_id,)).fetchone()[0])
+            chars += len(body)
+        point = (time.perf_counter() - start) / reads * 1e6
+
+        start = time.perf_counter()
+        for (body,) in c.execute("SELECT body FROM posts"):
+            decompress_value(body)
+        scan = time.perf_counter() - start
+
+    return {'file_bytes': os.path.getsize(get_db_path()), 'body_bytes': stored,
+            'point_read_us': point, 'full_scan_s': scan}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de compresión de posts.body')
+    parser.add_argument('--rows', type=int, default=50_000)
+    parser.add_argument('--reads', type=int, default=5_000, help='Lecturas puntuales por id')
+    parser.add_argument('--dir', help='Directorio de las bases (por defecto temporal)')
+    parser.add_argument('--variant', choices=['plain', 'zstd'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        print(json.dumps(measure(args.rows, args.reads, args.variant == 'zstd')))
+        return
+
+    from database.compression import ZSTD_AVAILABLE
+    if not ZSTD_AVAILABLE:
+        sys.exit("El benchmark requiere el paquete zstandard")
+
+    root = Path(args.dir or tempfile.mkdtemp())
+    root.mkdir(parents=True, exist_ok=True)
+    print(f"Generando {args.rows} posts de {DOMAINS} dominios en {root}...")
+
+    results = {}
+    for variant in ('plain', 'zstd'):
+        env = dict(os.environ, DB_PATH=str(root / f'{variant}.db'), DB_MMAP_SIZE='0',
+                   DB_COMPRESS_TEXT='true' if variant == 'zstd' else 'false')
+        out = subprocess.run([sys.executable, '-m', 'benchmarks.compression_benchmark',
+                              '--variant', variant, '--rows', str(args.rows), '--reads', str(args.reads)],
+                             cwd=project_root, env=env, check=True, capture_output=True, text=True)
+        results[variant] = json.loads(out.stdout.strip().splitlines()[-1])
+
+    print(f"{'variante':<8} {'archivo MB':>11} {'body MB':>9} {'lectura µs':>11} {'scan s':>8}")
+    for variant, r in results.items():
+        print(f"{variant:<8} {r['file_bytes'] / 1e6:>11.1f} {r['body_bytes'] / 1e6:>9.1f} "
+              f"{r['point_read_us']:>11.1f} {r['full_scan_s']:>8.2f}")
+
+    plain, zstd = results['plain'], results['zstd']
+    print(f"\nBytes ahorrados: {(plain['file_bytes'] - zstd['file_bytes']) / 1e6:.1f} MB en el archivo "
+          f"({1 - zstd['file_bytes'] / plain['file_bytes']:.0%}), "
+          f"body {plain['body_bytes'] / max(zstd['body_bytes'], 1):.1f}x más pequeño")
+    print(f"Costo de lectura: +{zstd['point_read_us'] - plain['point_read_us']:.1f} µs por post, "
+          f"scan completo {zstd['full_scan_s'] / max(plain['full_scan_s'], 1e-9):.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Streaming Benchmark
+
+Compara el pico de memoria (RSS máximo) de recorrer todos los competidores
+de una keyword con fetchall() + decodificación JSON inmediata (camino
+anterior de load_competitors) contra iter_competitors (keyset + LazyRow).
+Cada paso (incluida la generación de datos) corre en su propio proceso
+para que el RSS máximo de uno no se herede en el siguiente, y
+con mmap_size=0: las páginas mapeadas del archivo cuentan en el RSS de
+ambos modos y taparían la diferencia de memoria del proceso.
+
+Uso:
+    python -m benchmarks.streaming_benchmark [--rows 1000000] [--db /tmp/stream.db]
+"""
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Agregar raíz del proyecto al path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+KEYWORD = 'marketing digital'
+
+
+def populate(rows: int) -> None:
+    """Competidores sintéticos generados dentro de SQLite (rápido, sin pasar por Python)"""
+    from database.db import get_conn, init_competition_tables
+
+    init_competition_tables()
+    with get_conn() as c:
+        if c.execute("SELECT COUNT(*) FROM competitors WHERE keyword = ?", (KEYWORD,)).fetchone()[0] >= rows:
+            return
+        c.execute("DELETE FROM competitors")
+        c.execute("""
+            WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < ?)
+            INSERT INTO competitors (id, name, website, services, social_media, description,
+                                     location, pricing_info, scraped_at, keyword, domain)
+            SELECT ? || ':agencia' || n || '.pe', 'Agencia ' || n, 'https://agencia' || n || '.pe',
+                   '["SEO","SEM","Redes sociales","Diseño web","Email marketing"]',
+                   '["https://facebook.com/agencia' || n || '","https://instagram.com/agencia' || n || '"]',
+                   'Agencia de marketing digital en Lima especializada en pymes ' || n,
+                   'Lima, Perú', 'Desde S/ 1500 al mes',
+                   printf('2025-%02d-%02dT%02d:00:00', 1 + n % 12, 1 + n % 28, n % 24), ?, 'agencia' || n || '.pe'
+            FROM seq
+        """, (rows, KEYWORD, KEYWORD))
+        c.commit()
+
+
+def run_mode(mode: str) -> None:
+    """Recorre todos los competidores y reporta filas, tiempo y RSS máximo"""
+    from database.db import COMPETITOR_COLUMNS, get_read_conn, iter_competitors
+    from utils.codec import from_json
+
+    start = time.perf_counter()
+    count = 0
+    services = 0
+    if mode == 'fetchall':
+        with get_read_conn() as c:
+            rows = c.execute(f"""
+                SELECT {', '.join(COMPETITOR_COLUMNS)} FROM competitors
+                WHERE keyword = ? ORDER BY scraped_at DESC
+            """, (KEYWORD,)).fetchall()
+        competitors = []
+        for row in rows:
+            competitor = dict(zip(COMPETITOR_COLUMNS, row))
+            competitor['services'] = from_json(competitor['services'], [])
+            competitor['social_media'] = from_json(competitor['social_media'], [])
+            competitors.append(competitor)
+        for competitor in competitors:
+            count += 1
+            services += len(competitor['services'])
+    else:
+        for competitor in iter_competitors(KEYWORD):
+            count += 1
+            services += len(competitor['services'])
+
+    elapsed = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB en Linux
+    print(f"{mode:<12} {count:>9} filas {elapsed:>8.2f}s  RSS máx {peak_mb:>8.1f} MB  ({services} servicios)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de lectura en streaming')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--db', help='Ruta de la base de datos (por defecto temporal)')
+    parser.add_argument('--mode', choices=['populate', 'fetchall', 'stream'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode == 'populate':
+        populate(args.rows)
+        return
+    if args.mode:
+        run_mode(args.mode)
+        return
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), 'stream_bench.db')
+    os.environ['DB_PATH'] = db_path  # antes de importar config
+    os.environ['DB_MMAP_SIZE'] = '0'
+    print(f"Generando {args.rows} competidores en {db_path}...")
+
+    for mode in ('populate', 'fetchall', 'stream'):
+        subprocess.run([sys.executable, '-m', 'benchmarks.streaming_benchmark',
+                        '--mode', mode, '--rows', str(args.rows)],
+                       cwd=project_root, env=os.environ, check=True)
+
+
+if __name__ == '__main__':
+    main()
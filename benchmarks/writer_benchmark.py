@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Writer Benchmark
+
+Compara upsert_post fila por fila (conexión + commit por post, bloqueando el
+event loop) contra el AsyncBatchWriter, midiendo posts/s y el lag máximo del
+event loop mientras se escribe.
+
+Uso:
+    python -m benchmarks.writer_benchmark [--posts 2000] [--db /tmp/bench.db]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List
+
+# Agregar raíz del proyecto al path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+
+def sample_posts(count: int, prefix: str) -> List[Dict[str, Any]]:
+    now = datetime.utcnow().isoformat()
+    return [{
+        'id': f'{prefix}{i:08d}',
+        'source': 'empresa-marketing.pe',
+        'url': f'https://empresa-marketing.pe/blog/{prefix}{i}',
+        'title': f'Necesito una agencia de marketing digital en Lima {i}',
+        'body': 'Busco proveedor de marketing digital para mi pyme. ' * 10,
+        'lang': 'es',
+        'created_at': now,
+        'keyword': 'marketing digital',
+        'tag': 'busqueda',
+        'published_at': None,
+        'relevance_score': 85,
+    } for i in range(count)]
+
+
+async def _measure_lag(stop: asyncio.Event, interval: float = 0.005) -> float:
+    """Máximo retraso observado entre ticks del event loop"""
+    loop = asyncio.get_running_loop()
+    worst = 0.0
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        worst = max(worst, loop.time() - expected)
+    return worst
+
+
+async def _run(label: str, write) -> None:
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(_measure_lag(stop))
+    await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    count = await write()
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    worst_lag = await lag_task
+    print(f"{label:<22} {count:>7} posts {elapsed:>8.3f}s {count / elapsed:>10.0f} posts/s "
+          f"  max loop lag {worst_lag * 1000:>8.1f} ms")
+
+
+async def main_async(posts: int) -> None:
+    from database.db import init_db, upsert_post
+    from database.writer import AsyncBatchWriter
+
+    init_db()
+
+    async def per_row() -> int:
+        rows = sample_posts(posts, 'row')
+        for row in rows:
+            upsert_post(row)  # camino anterior, síncrono dentro de la corrutina
+        return len(rows)
+
+    writer = AsyncBatchWriter()
+
+    async def batched() -> int:
+        rows = sample_posts(posts, 'bat')
+        results = await writer.write_many(rows)
+        await writer.stop()
+        return sum(1 for r in results if r is True)
+
+    print(f"{'Modo':<22} {'Filas':>13} {'Tiempo':>9} {'Throughput':>18}")
+    await _run("upsert_post por fila", per_row)
+    await _run("AsyncBatchWriter", batched)
+    print(f"Writer: {writer.get_stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del writer por lotes')
+    parser.add_argument('--posts', type=int, default=2000)
+    parser.add_argument('--db', help='Ruta de la base de datos (por defecto temporal)')
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), 'writer_bench.db')
+    os.environ['DB_PATH'] = db_path  # antes de importar config
+    asyncio.run(main_async(args.posts))
+
+
+if __name__ == '__main__':
+    main()
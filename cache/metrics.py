@@ -0,0 +1,281 @@
+"""
+Cache Metrics for Aqxion Scraper
+Per-namespace and per-tier counters, byte sizes and latency histograms
+"""
+
+import math
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+
+try:
+    from prometheus_client import start_http_server
+    from prometheus_client.core import (
+        REGISTRY, CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily
+    )
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+log = logging.getLogger("cache_metrics")
+
+TIER_LOCAL = "local"
+TIER_REDIS = "redis"
+DEFAULT_NAMESPACE = "default"
+
+
+class LatencyHistogram:
+    """Log2-bucketed latency histogram: bucket i counts samples <= 2**i microseconds"""
+
+    NUM_BUCKETS = 25  # 1µs .. ~16.8s, anything slower lands in the overflow bucket
+
+    def __init__(self):
+        self.counts = [0] * (self.NUM_BUCKETS + 1)
+        self.count = 0
+        self.total_seconds = 0.0
+
+    @classmethod
+    def bucket_bounds(cls) -> List[float]:
+        """Upper bounds in seconds (excluding +Inf)"""
+        return [(2 ** i) / 1_000_000 for i in range(cls.NUM_BUCKETS)]
+
+    def observe(self, seconds: float) -> None:
+        micros = seconds * 1_000_000
+        index = 0 if micros <= 1 else math.ceil(math.log2(micros))
+        self.counts[min(index, self.NUM_BUCKETS)] += 1
+        self.count += 1
+        self.total_seconds += seconds
+
+    def percentile(self, q: float) -> float:
+        """Approximate percentile (bucket upper bound), in seconds"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        bounds = self.bucket_bounds()
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return bounds[index] if index < len(bounds) else math.inf
+        return math.inf
+
+    def cumulative_buckets(self) -> List[Tuple[str, int]]:
+        """Prometheus-style (le, cumulative count) pairs"""
+        buckets = []
+        running = 0
+        for bound, bucket_count in zip(self.bucket_bounds(), self.counts):
+            running += bucket_count
+            buckets.append((repr(bound), running))
+        buckets.append(("+Inf", self.count))
+        return buckets
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_seconds / self.count * 1000, 3) if self.count else 0.0,
+            "p50_ms": round(self.percentile(0.50) * 1000, 3),
+            "p95_ms": round(self.percentile(0.95) * 1000, 3),
+            "p99_ms": round(self.percentile(0.99) * 1000, 3),
+            "buckets_us": {f"le_{2 ** i}": c for i, c in enumerate(self.counts[:-1]) if c},
+            "overflow": self.counts[-1],
+        }
+
+
+@dataclass
+class NamespaceStats:
+    """Counters for one (tier, namespace) pair"""
+    hits: int = 0
+    misses: int = 0
+    sets: int = 0
+    deletes: int = 0
+    bytes_read: int = 0
+    bytes_written: int = 0
+    get_latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+    set_latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate * 100, 2),
+            "sets": self.sets,
+            "deletes": self.deletes,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "get_latency": self.get_latency.to_dict(),
+            "set_latency": self.set_latency.to_dict(),
+        }
+
+
+class CacheMetricsRegistry:
+    """Process-wide cache metrics, keyed by tier and namespace"""
+
+    def __init__(self):
+        self._stats: Dict[Tuple[str, str], NamespaceStats] = {}
+        self._lock = threading.Lock()
+        # Callables returning {region: {"entries", "bytes", "evictions", "expirations"}}
+        self._region_sources: Dict[str, Callable[[], Dict[str, Dict[str, int]]]] = {}
+
+    def _get(self, tier: str, namespace: str) -> NamespaceStats:
+        key = (tier, namespace or DEFAULT_NAMESPACE)
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = NamespaceStats()
+        return stats
+
+    def record_get(self, tier: str, namespace: str, hit: bool, seconds: float, nbytes: int = 0) -> None:
+        with self._lock:
+            stats = self._get(tier, namespace)
+            if hit:
+                stats.hits += 1
+                stats.bytes_read += nbytes
+            else:
+                stats.misses += 1
+            stats.get_latency.observe(seconds)
+
+    def record_set(self, tier: str, namespace: str, seconds: float, nbytes: int = 0) -> None:
+        with self._lock:
+            stats = self._get(tier, namespace)
+            stats.sets += 1
+            stats.bytes_written += nbytes
+            stats.set_latency.observe(seconds)
+
+    def record_delete(self, tier: str, namespace: str) -> None:
+        with self._lock:
+            self._get(tier, namespace).deletes += 1
+
+    def register_regions(self, tier: str, source: Callable[[], Dict[str, Dict[str, int]]]) -> None:
+        """Register a callable that reports per-region sizes and evictions for a tier"""
+        self._region_sources[tier] = source
+
+    def namespaces(self, tier: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """Per-namespace stats, optionally filtered to one tier"""
+        with self._lock:
+            items = sorted(self._stats.items())
+            result: Dict[str, Dict[str, Any]] = {}
+            for (stat_tier, namespace), stats in items:
+                if tier is None:
+                    result.setdefault(stat_tier, {})[namespace] = stats.to_dict()
+                elif stat_tier == tier:
+                    result[namespace] = stats.to_dict()
+            return result
+
+    def regions(self) -> Dict[str, Dict[str, Dict[str, int]]]:
+        result = {}
+        for tier, source in self._region_sources.items():
+            try:
+                result[tier] = source()
+            except Exception as e:
+                log.debug(f"Region metrics for {tier} failed: {e}")
+        return result
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {"namespaces": self.namespaces(), "regions": self.regions()}
+
+    def summary_lines(self) -> List[str]:
+        """Compact human-readable lines for end-of-cycle logs"""
+        lines = []
+        with self._lock:
+            items = sorted(self._stats.items())
+            for (tier, namespace), stats in items:
+                lines.append(
+                    f"{tier}/{namespace}: {stats.hits}/{stats.hits + stats.misses} hits "
+                    f"({stats.hit_rate * 100:.1f}%), {stats.sets} sets, "
+                    f"get p50={stats.get_latency.percentile(0.5) * 1000:.3f}ms "
+                    f"p99={stats.get_latency.percentile(0.99) * 1000:.3f}ms, "
+                    f"read={stats.bytes_read}B written={stats.bytes_written}B"
+                )
+        for tier, regions in self.regions().items():
+            for region, info in regions.items():
+                lines.append(
+                    f"{tier}[{region}]: {info['entries']} entries, {info['bytes']}B, "
+                    f"{info['evictions']} evictions, {info['expirations']} expirations"
+                )
+        return lines
+
+    def log_summary(self, logger: Optional[logging.Logger] = None) -> None:
+        logger = logger or log
+        for line in self.summary_lines():
+            logger.info(f"📊 Cache {line}")
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+class _PrometheusCollector:
+    """Exports the registry on each scrape (no duplicated bookkeeping)"""
+
+    def __init__(self, registry: CacheMetricsRegistry):
+        self.registry = registry
+
+    def collect(self):
+        labels = ["tier", "namespace"]
+        counters = {
+            name: CounterMetricFamily(f"aqxion_cache_{name}", f"Cache {name.replace('_', ' ')}", labels=labels)
+            for name in ("hits", "misses", "sets", "deletes", "bytes_read", "bytes_written")
+        }
+        get_hist = HistogramMetricFamily("aqxion_cache_get_latency_seconds", "Cache get latency", labels=labels)
+        set_hist = HistogramMetricFamily("aqxion_cache_set_latency_seconds", "Cache set latency", labels=labels)
+
+        with self.registry._lock:
+            items = sorted(self.registry._stats.items())
+            for (tier, namespace), stats in items:
+                label_values = [tier, namespace]
+                for name, family in counters.items():
+                    family.add_metric(label_values, getattr(stats, name))
+                get_hist.add_metric(label_values, stats.get_latency.cumulative_buckets(),
+                                    stats.get_latency.total_seconds)
+                set_hist.add_metric(label_values, stats.set_latency.cumulative_buckets(),
+                                    stats.set_latency.total_seconds)
+
+        yield from counters.values()
+        yield get_hist
+        yield set_hist
+
+        region_labels = ["tier", "region"]
+        entries = GaugeMetricFamily("aqxion_cache_entries", "Entries per cache region", labels=region_labels)
+        size = GaugeMetricFamily("aqxion_cache_bytes", "Stored bytes per cache region", labels=region_labels)
+        evictions = CounterMetricFamily("aqxion_cache_evictions", "Capacity evictions per cache region", labels=region_labels)
+        expirations = CounterMetricFamily("aqxion_cache_expirations", "Expired entries per cache region", labels=region_labels)
+        for tier, regions in self.registry.regions().items():
+            for region, info in regions.items():
+                entries.add_metric([tier, region], info["entries"])
+                size.add_metric([tier, region], info["bytes"])
+                evictions.add_metric([tier, region], info["evictions"])
+                expirations.add_metric([tier, region], info["expirations"])
+        yield from (entries, size, evictions, expirations)
+
+
+_prometheus_started = False
+
+
+def start_prometheus_exporter(port: int, registry: Optional[CacheMetricsRegistry] = None) -> bool:
+    """Serve cache metrics on /metrics (idempotent)"""
+    global _prometheus_started
+    if _prometheus_started:
+        return True
+    if not PROMETHEUS_AVAILABLE:
+        log.warning("⚠️ prometheus-client not installed, cache metrics endpoint disabled")
+        return False
+
+    try:
+        start_http_server(port)
+        REGISTRY.register(_PrometheusCollector(registry or cache_metrics))
+    except Exception as e:
+        log.warning(f"⚠️ Could not start Prometheus exporter on port {port}: {e}")
+        return False
+
+    _prometheus_started = True
+    log.info(f"📈 Prometheus cache metrics on :{port}/metrics")
+    return True
+
+
+# Global instance
+cache_metrics = CacheMetricsRegistry()
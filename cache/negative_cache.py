@@ -0,0 +1,160 @@
+"""
+Negative Cache for Aqxion Scraper
+Remembers URLs that failed or were rejected so later cycles skip them
+"""
+
+import hashlib
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Dict, Optional
+from urllib.parse import urldefrag
+import logging
+
+from cache.simple_cache import SmartCacheManager, cache_manager
+from config.config_v2 import get_settings
+
+log = logging.getLogger("negative_cache")
+
+
+class NegativeReason(str, Enum):
+    """Why a URL was not turned into a post"""
+    NOT_FOUND = "not_found"                  # HTTP 404 / 410
+    HTTP_ERROR = "http_error"                # other 4xx / 5xx
+    TIMEOUT = "timeout"                      # network timeout / connection error
+    NON_HTML = "non_html"                    # PDF, images, feeds...
+    NO_TITLE = "no_title"                    # page without <title>
+    SHORT_TITLE = "short_title"              # should_scrape_detail: title too short
+    IRRELEVANT_URL = "irrelevant_url"        # should_scrape_detail: tag/login/feed... pattern
+    UNRELATED_KEYWORD = "unrelated_keyword"  # should_scrape_detail: title unrelated to keyword
+    LOW_QUALITY = "low_quality"              # validate_content_quality failed
+
+
+# Default TTLs (seconds): transient failures are retried soon, permanent ones rarely
+DEFAULT_NEGATIVE_TTLS: Dict[NegativeReason, int] = {
+    NegativeReason.TIMEOUT: 30 * 60,
+    NegativeReason.HTTP_ERROR: 6 * 3600,
+    NegativeReason.NO_TITLE: 24 * 3600,
+    NegativeReason.SHORT_TITLE: 3 * 86400,
+    NegativeReason.UNRELATED_KEYWORD: 3 * 86400,
+    NegativeReason.LOW_QUALITY: 3 * 86400,
+    NegativeReason.NOT_FOUND: 7 * 86400,
+    NegativeReason.NON_HTML: 7 * 86400,
+    NegativeReason.IRRELEVANT_URL: 30 * 86400,
+}
+
+# Reasons that depend on the keyword being scraped, not only on the URL
+KEYWORD_SCOPED_REASONS = {NegativeReason.UNRELATED_KEYWORD}
+
+
+def reason_for_status(status: int) -> NegativeReason:
+    """Map an HTTP status to a negative reason"""
+    return NegativeReason.NOT_FOUND if status in (404, 410) else NegativeReason.HTTP_ERROR
+
+
+@dataclass
+class NegativeCacheStats:
+    """Lookup/hit counters for reporting"""
+    lookups: int = 0
+    hits: int = 0
+    hits_by_reason: Dict[str, int] = field(default_factory=dict)
+    recorded_by_reason: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.lookups if self.lookups > 0 else 0.0
+
+
+class NegativeCache:
+    """Negative-result cache with reason codes and per-reason TTLs"""
+
+    NAMESPACE = "negative"
+
+    def __init__(self, manager: SmartCacheManager, ttls: Optional[Dict[str, int]] = None,
+                 enabled: bool = True):
+        self.manager = manager
+        self.enabled = enabled
+        self.ttls: Dict[NegativeReason, int] = dict(DEFAULT_NEGATIVE_TTLS)
+        for reason, ttl in (ttls or {}).items():
+            try:
+                self.ttls[NegativeReason(reason)] = int(ttl)
+            except ValueError:
+                log.warning(f"⚠️ Unknown negative cache reason in settings: {reason}")
+        self.stats = NegativeCacheStats()
+
+    def _url_key(self, url: str) -> str:
+        return hashlib.md5(urldefrag(url)[0].encode()).hexdigest()
+
+    def _keyword_key(self, url: str, keyword: str) -> str:
+        return hashlib.md5(f"{keyword.lower()}|{urldefrag(url)[0]}".encode()).hexdigest()
+
+    async def check(self, url: str, keyword: Optional[str] = None) -> Optional[NegativeReason]:
+        """Return the recorded reason if the URL should be skipped"""
+        if not self.enabled:
+            return None
+
+        self.stats.lookups += 1
+        entry = await self.manager.get(self._url_key(url), namespace=self.NAMESPACE, strategy='negative')
+        if entry is None and keyword:
+            entry = await self.manager.get(self._keyword_key(url, keyword),
+                                           namespace=self.NAMESPACE, strategy='negative')
+        if entry is None:
+            return None
+
+        try:
+            reason = NegativeReason(entry["reason"])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+        self.stats.hits += 1
+        self.stats.hits_by_reason[reason.value] = self.stats.hits_by_reason.get(reason.value, 0) + 1
+        return reason
+
+    async def record(self, url: str, reason: NegativeReason, keyword: Optional[str] = None,
+                     detail: str = "") -> bool:
+        """Remember a failed/rejected URL for the reason's TTL"""
+        if not self.enabled:
+            return False
+
+        if reason in KEYWORD_SCOPED_REASONS and keyword:
+            key = self._keyword_key(url, keyword)
+        else:
+            key = self._url_key(url)
+
+        entry = {"reason": reason.value, "detail": detail[:200], "recorded_at": time.time()}
+        stored = await self.manager.set(key, entry, ttl=self.ttls[reason],
+                                        namespace=self.NAMESPACE, strategy='negative')
+        if stored:
+            self.stats.recorded_by_reason[reason.value] = self.stats.recorded_by_reason.get(reason.value, 0) + 1
+        return stored
+
+    async def forget(self, url: str, keyword: Optional[str] = None) -> None:
+        """Drop negative entries for a URL (e.g. after a manual retry succeeded)"""
+        await self.manager.delete(self._url_key(url), namespace=self.NAMESPACE, strategy='negative')
+        if keyword:
+            await self.manager.delete(self._keyword_key(url, keyword),
+                                      namespace=self.NAMESPACE, strategy='negative')
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit rates for reporting"""
+        return {
+            "enabled": self.enabled,
+            "lookups": self.stats.lookups,
+            "hits": self.stats.hits,
+            "hit_rate": round(self.stats.hit_rate * 100, 2),
+            "hits_by_reason": dict(self.stats.hits_by_reason),
+            "recorded_by_reason": dict(self.stats.recorded_by_reason),
+            "entries": len(self.manager.negative_cache),
+        }
+
+    def reset_stats(self) -> None:
+        self.stats = NegativeCacheStats()
+
+
+def _build_default_negative_cache() -> NegativeCache:
+    cache_settings = get_settings().cache
+    return NegativeCache(cache_manager, ttls=cache_settings.negative_ttls,
+                         enabled=cache_settings.enable_negative_cache)
+
+# Global instance
+negative_cache = _build_default_negative_cache()
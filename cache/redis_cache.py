@@ -4,219 +4,348 @@ Distributed caching with fallback to local cache
 """
 
 import asyncio
-import json
-from typing import Optional, Dict, Any, Union
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional, Dict, Any, Tuple
 import redis.asyncio as redis
-from redis.exceptions import ConnectionError, TimeoutError
+from redis.exceptions import ConnectionError, TimeoutError, RedisError
 import logging
 
+from cache.metrics import cache_metrics, TIER_REDIS
 from cache.simple_cache import SmartCacheManager
+from config.config_v2 import get_settings
+from utils import codec
 
 log = logging.getLogger("redis_cache")
 
+
+@dataclass
+class RedisHealthMetrics:
+    """Health and degraded-mode metrics for the Redis tier"""
+    health_checks: int = 0
+    failed_checks: int = 0
+    outages: int = 0
+    total_degraded_seconds: float = 0.0
+    degraded_since: Optional[float] = None  # time.monotonic() when the outage began
+    last_outage_at: Optional[datetime] = None
+    last_recovery_at: Optional[datetime] = None
+    local_only_operations: int = 0
+    resynced_keys: int = 0
+    dropped_resync_keys: int = 0
+
+    @property
+    def current_degraded_seconds(self) -> float:
+        if self.degraded_since is None:
+            return 0.0
+        return time.monotonic() - self.degraded_since
+
+
 class RedisCacheManager:
-    """Redis-based distributed cache with local fallback"""
+    """Redis-based distributed cache with local fallback
+
+    A background health monitor owns (re)connection. While Redis is unhealthy
+    every operation is served by the local tier without touching the network;
+    writes made in that window are replayed to Redis once it recovers.
+    """
 
     def __init__(self, redis_url: str = "redis://localhost:6379", local_fallback: bool = True):
+        cache_settings = get_settings().cache
+
         self.redis_url = redis_url
         self.redis_client = None
         self.local_fallback = local_fallback
         self.local_cache = SmartCacheManager() if local_fallback else None
         self.connected = False
 
-        # Redis connection settings
-        self.max_retries = 3
-        self.retry_delay = 1.0
-        self.socket_timeout = 5.0
-        self.socket_connect_timeout = 5.0
+        # Values are stored as codec envelopes (binary)
+        self.codec = codec.get_codec()
+        self.compression_threshold = 1024
+
+        # Redis connection settings (short timeouts: failures flip us to local mode)
+        self.socket_timeout = 1.0
+        self.socket_connect_timeout = 2.0
+        self.health_check_interval = cache_settings.redis_health_check_interval
+
+        # Health monitor and degraded-mode state
+        self.health = RedisHealthMetrics()
+        self._monitor_task: Optional[asyncio.Task] = None
+        self._pending_resync: "OrderedDict[Tuple[str, str], Tuple[str, Optional[int]]]" = OrderedDict()
+        self._max_pending_resync = cache_settings.redis_resync_max_keys
 
         log.info(f"🔴 Redis Cache Manager initialized - URL: {redis_url}")
 
-    async def connect(self) -> bool:
-        """Establish Redis connection"""
+    async def connect(self, quiet: bool = False) -> bool:
+        """Establish Redis connection (single attempt, no backoff)"""
         try:
-            self.redis_client = redis.Redis.from_url(
-                self.redis_url,
-                socket_timeout=self.socket_timeout,
-                socket_connect_timeout=self.socket_connect_timeout,
-                retry_on_timeout=True,
-                max_connections=20,
-                decode_responses=True
-            )
+            if self.redis_client is None:
+                self.redis_client = redis.Redis.from_url(
+                    self.redis_url,
+                    socket_timeout=self.socket_timeout,
+                    socket_connect_timeout=self.socket_connect_timeout,
+                    retry_on_timeout=False,
+                    max_connections=20,
+                    decode_responses=False
+                )
 
             # Test connection
             await self.redis_client.ping()
-            self.connected = True
+            self._mark_healthy()
             log.info("✅ Redis connection established successfully")
             return True
 
         except Exception as e:
-            log.warning(f"❌ Redis connection failed: {e}")
-            if self.local_fallback:
-                log.info("🔄 Falling back to local cache")
-            self.connected = False
+            if quiet:
+                log.debug(f"Redis reconnect attempt failed: {e}")
+            else:
+                log.warning(f"❌ Redis connection failed: {e}")
+                if self.local_fallback:
+                    log.info("🔄 Falling back to local cache")
+            self._mark_unhealthy()
             return False
 
     async def disconnect(self):
-        """Close Redis connection"""
+        """Stop the health monitor and close Redis connection"""
+        await self.stop_health_monitor()
         if self.redis_client:
             await self.redis_client.close()
+            self.redis_client = None
             self.connected = False
             log.info("🔌 Redis connection closed")
 
+    # ===== HEALTH MONITOR =====
+
+    def start_health_monitor(self) -> None:
+        """Start the background health monitor (idempotent)"""
+        if self._monitor_task is not None and not self._monitor_task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._monitor_task = loop.create_task(self._health_monitor_loop())
+
+    async def stop_health_monitor(self) -> None:
+        """Stop the background health monitor"""
+        if self._monitor_task is None:
+            return
+        self._monitor_task.cancel()
+        try:
+            await self._monitor_task
+        except asyncio.CancelledError:
+            pass
+        self._monitor_task = None
+
+    async def _health_monitor_loop(self) -> None:
+        """Ping Redis periodically; reconnect and resync when it comes back"""
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            self.health.health_checks += 1
+
+            if self.connected:
+                try:
+                    await asyncio.wait_for(self.redis_client.ping(), timeout=self.socket_timeout)
+                except Exception as e:
+                    self.health.failed_checks += 1
+                    log.warning(f"⚠️ Redis health check failed: {e}")
+                    self._mark_unhealthy()
+                continue
+
+            if await self.connect(quiet=True):
+                await self._resync_pending()
+            else:
+                self.health.failed_checks += 1
+
+    def _mark_healthy(self) -> None:
+        if self.health.degraded_since is not None:
+            self.health.total_degraded_seconds += self.health.current_degraded_seconds
+            self.health.degraded_since = None
+            self.health.last_recovery_at = datetime.now()
+            log.info(f"✅ Redis recovered after {self.health.last_recovery_at - self.health.last_outage_at}")
+        self.connected = True
+
+    def _mark_unhealthy(self) -> None:
+        if self.connected or self.health.degraded_since is None:
+            self.health.outages += 1
+            self.health.degraded_since = time.monotonic()
+            self.health.last_outage_at = datetime.now()
+        self.connected = False
+        # Make sure somebody is working on getting Redis back
+        self.start_health_monitor()
+
+    def _use_redis(self) -> bool:
+        """True when operations may touch Redis; never blocks"""
+        if self.connected:
+            return True
+        self.health.local_only_operations += 1
+        self.start_health_monitor()
+        return False
+
+    def _track_pending(self, key: str, namespace: str, op: str, ttl: Optional[int] = None) -> None:
+        """Remember a write made while degraded so it can be replayed"""
+        entry = (key, namespace)
+        self._pending_resync.pop(entry, None)
+        self._pending_resync[entry] = (op, ttl)
+        while len(self._pending_resync) > self._max_pending_resync:
+            self._pending_resync.popitem(last=False)
+            self.health.dropped_resync_keys += 1
+
+    async def _resync_pending(self) -> None:
+        """Replay writes made while Redis was unavailable"""
+        if not self._pending_resync or not self.local_fallback:
+            self._pending_resync.clear()
+            return
+
+        pending = list(self._pending_resync.items())
+        self._pending_resync.clear()
+
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for (key, namespace), (op, ttl) in pending:
+                redis_key = self._make_key(key, namespace)
+                if op == "delete":
+                    pipe.delete(redis_key)
+                    continue
+                value = await self.local_cache.get(key, namespace)
+                if value is not None:
+                    pipe.set(redis_key, self._serialize_value(value), ex=ttl or 3600)
+            await pipe.execute()
+            self.health.resynced_keys += len(pending)
+            log.info(f"🔄 Resynced {len(pending)} keys to Redis")
+        except (ConnectionError, TimeoutError, RedisError) as e:
+            log.warning(f"⚠️ Redis resync failed: {e}")
+            for entry, item in pending:
+                self._pending_resync.setdefault(entry, item)
+            self._mark_unhealthy()
+
+    # ===== KEY/VALUE HELPERS =====
+
     def _make_key(self, key: str, namespace: str = "") -> str:
         """Create Redis key with namespace"""
         if namespace:
             return f"aqxion:{namespace}:{key}"
         return f"aqxion:{key}"
 
-    def _serialize_value(self, value: Any) -> str:
+    def _serialize_value(self, value: Any) -> bytes:
         """Serialize value for Redis storage"""
-        if isinstance(value, (dict, list)):
-            return json.dumps(value, ensure_ascii=False)
-        return str(value)
-
-    def _deserialize_value(self, value: str) -> Any:
-        """Deserialize value from Redis storage"""
-        try:
-            return json.loads(value)
-        except (json.JSONDecodeError, TypeError):
-            return value
-
-    async def _execute_with_retry(self, operation, *args, **kwargs):
-        """Execute Redis operation with retry logic"""
-        for attempt in range(self.max_retries):
-            try:
-                if not self.connected:
-                    await self.connect()
+        return codec.encode(value, self.codec, compress_threshold=self.compression_threshold)
 
-                if self.connected:
-                    return await operation(*args, **kwargs)
-                else:
-                    raise ConnectionError("Redis not connected")
+    def _deserialize_value(self, value: bytes) -> Any:
+        """Deserialize value from Redis storage (legacy JSON strings included)"""
+        return codec.decode(value)
 
-            except (ConnectionError, TimeoutError) as e:
-                if attempt == self.max_retries - 1:
-                    log.warning(f"❌ Redis operation failed after {self.max_retries} attempts: {e}")
-                    raise e
+    async def _execute(self, operation, *args, **kwargs):
+        """Execute a Redis operation once; a failure flips the manager to local mode"""
+        if not self.connected:
+            raise ConnectionError("Redis not connected")
+        try:
+            return await operation(*args, **kwargs)
+        except (ConnectionError, TimeoutError) as e:
+            log.warning(f"❌ Redis operation failed, switching to local cache: {e}")
+            self._mark_unhealthy()
+            raise
 
-                log.warning(f"⚠️ Redis operation failed (attempt {attempt + 1}/{self.max_retries}): {e}")
-                await asyncio.sleep(self.retry_delay * (2 ** attempt))  # Exponential backoff
+    # ===== CACHE API =====
 
     async def get(self, key: str, namespace: str = "") -> Optional[Any]:
         """Get value from Redis with local fallback"""
         redis_key = self._make_key(key, namespace)
 
-        try:
-            # Try Redis first
-            if self.connected or await self.connect():
-                value = await self._execute_with_retry(self.redis_client.get, redis_key)
+        if self._use_redis():
+            start_time = time.perf_counter()
+            try:
+                value = await self._execute(self.redis_client.get, redis_key)
+                cache_metrics.record_get(TIER_REDIS, namespace, value is not None,
+                                         time.perf_counter() - start_time, len(value or b""))
                 if value is not None:
                     log.debug(f"✅ Redis hit: {redis_key}")
                     return self._deserialize_value(value)
+            except Exception as e:
+                log.debug(f"Redis get failed for {key}: {e}")
 
-            # Fallback to local cache
-            if self.local_fallback:
-                local_value = await self.local_cache.get(key, namespace)
-                if local_value is not None:
-                    log.debug(f"🔄 Local cache hit: {key}")
-                    # Also store in Redis for future requests
-                    if self.connected:
-                        try:
-                            await self._execute_with_retry(
-                                self.redis_client.set,
-                                redis_key,
-                                self._serialize_value(local_value),
-                                ex=3600  # 1 hour TTL
-                            )
-                        except Exception:
-                            pass  # Don't fail if Redis write fails
-                    return local_value
-
-        except Exception as e:
-            log.warning(f"❌ Cache get error for key {key}: {e}")
-            # Try local fallback if Redis fails
-            if self.local_fallback:
-                return await self.local_cache.get(key, namespace)
+        if not self.local_fallback:
+            return None
 
-        return None
+        local_value = await self.local_cache.get(key, namespace)
+        if local_value is not None:
+            log.debug(f"🔄 Local cache hit: {key}")
+            # Also store in Redis for future requests
+            if self.connected:
+                try:
+                    await self._execute(
+                        self.redis_client.set,
+                        redis_key,
+                        self._serialize_value(local_value),
+                        ex=3600  # 1 hour TTL
+                    )
+                except Exception:
+                    pass  # Don't fail if Redis write fails
+        return local_value
 
     async def set(self, key: str, value: Any, ttl: Optional[int] = None,
                   namespace: str = "") -> bool:
         """Set value in Redis with local fallback"""
         redis_key = self._make_key(key, namespace)
-        serialized_value = self._serialize_value(value)
+        stored = False
 
-        try:
-            # Try Redis first
-            if self.connected or await self.connect():
-                await self._execute_with_retry(
+        # Always store in local cache as backup
+        if self.local_fallback:
+            stored = await self.local_cache.set(key, value, ttl, namespace)
+
+        if self._use_redis():
+            start_time = time.perf_counter()
+            try:
+                blob = self._serialize_value(value)
+                await self._execute(
                     self.redis_client.set,
                     redis_key,
-                    serialized_value,
+                    blob,
                     ex=ttl or 3600
                 )
+                cache_metrics.record_set(TIER_REDIS, namespace, time.perf_counter() - start_time, len(blob))
                 log.debug(f"✅ Redis set: {redis_key}")
+                return True
+            except Exception as e:
+                log.debug(f"Redis set failed for {key}: {e}")
 
-            # Always store in local cache as backup
-            if self.local_fallback:
-                await self.local_cache.set(key, value, ttl, namespace)
-
-            return True
-
-        except Exception as e:
-            log.warning(f"❌ Cache set error for key {key}: {e}")
-            # Fallback to local cache only
-            if self.local_fallback:
-                return await self.local_cache.set(key, value, ttl, namespace)
-
-        return False
+        if self.local_fallback:
+            self._track_pending(key, namespace, "set", ttl)
+        return stored
 
     async def delete(self, key: str, namespace: str = "") -> bool:
         """Delete value from Redis and local cache"""
         redis_key = self._make_key(key, namespace)
+        deleted = False
 
-        try:
-            # Try Redis first
-            if self.connected or await self.connect():
-                await self._execute_with_retry(self.redis_client.delete, redis_key)
-                log.debug(f"✅ Redis delete: {redis_key}")
-
-            # Also delete from local cache
-            if self.local_fallback:
-                await self.local_cache.delete(key, namespace)
-
-            return True
+        if self.local_fallback:
+            deleted = await self.local_cache.delete(key, namespace)
 
-        except Exception as e:
-            log.warning(f"❌ Cache delete error for key {key}: {e}")
-            # Try local cache
-            if self.local_fallback:
-                return await self.local_cache.delete(key, namespace)
+        if self._use_redis():
+            try:
+                await self._execute(self.redis_client.delete, redis_key)
+                cache_metrics.record_delete(TIER_REDIS, namespace)
+                log.debug(f"✅ Redis delete: {redis_key}")
+                return True
+            except Exception as e:
+                log.debug(f"Redis delete failed for {key}: {e}")
 
-        return False
+        self._track_pending(key, namespace, "delete")
+        return deleted
 
     async def exists(self, key: str, namespace: str = "") -> bool:
         """Check if key exists in Redis or local cache"""
         redis_key = self._make_key(key, namespace)
 
-        try:
-            # Try Redis first
-            if self.connected or await self.connect():
-                exists = await self._execute_with_retry(self.redis_client.exists, redis_key)
-                if exists:
+        if self._use_redis():
+            try:
+                if await self._execute(self.redis_client.exists, redis_key):
                     return True
+            except Exception as e:
+                log.debug(f"Redis exists failed for {key}: {e}")
 
-            # Check local cache
-            if self.local_fallback:
-                return await self.local_cache.exists(key, namespace)
-
-        except Exception as e:
-            log.warning(f"❌ Cache exists error for key {key}: {e}")
-            # Try local cache
-            if self.local_fallback:
-                return await self.local_cache.exists(key, namespace)
-
+        if self.local_fallback:
+            return await self.local_cache.exists(key, namespace)
         return False
 
     async def get_stats(self) -> Dict[str, Any]:
@@ -224,12 +353,29 @@ class RedisCacheManager:
         stats = {
             "redis_connected": self.connected,
             "redis_url": self.redis_url,
-            "local_fallback_enabled": self.local_fallback
+            "local_fallback_enabled": self.local_fallback,
+            "health": {
+                "degraded": not self.connected,
+                "outages": self.health.outages,
+                "current_degraded_seconds": round(self.health.current_degraded_seconds, 2),
+                "total_degraded_seconds": round(
+                    self.health.total_degraded_seconds + self.health.current_degraded_seconds, 2
+                ),
+                "last_outage_at": self.health.last_outage_at.isoformat() if self.health.last_outage_at else None,
+                "last_recovery_at": self.health.last_recovery_at.isoformat() if self.health.last_recovery_at else None,
+                "health_checks": self.health.health_checks,
+                "failed_checks": self.health.failed_checks,
+                "local_only_operations": self.health.local_only_operations,
+                "pending_resync_keys": len(self._pending_resync),
+                "resynced_keys": self.health.resynced_keys,
+                "dropped_resync_keys": self.health.dropped_resync_keys,
+            },
+            "namespaces": cache_metrics.namespaces(TIER_REDIS),
         }
 
         try:
             if self.connected:
-                info = await self._execute_with_retry(self.redis_client.info)
+                info = await self._execute(self.redis_client.info)
                 stats.update({
                     "redis_memory_used": info.get("used_memory_human", "unknown"),
                     "redis_connected_clients": info.get("connected_clients", 0),
@@ -247,13 +393,13 @@ class RedisCacheManager:
     async def clear_namespace(self, namespace: str) -> bool:
         """Clear all keys in a namespace"""
         try:
-            if self.connected or await self.connect():
+            if self._use_redis():
                 # Get all keys in namespace
                 pattern = f"aqxion:{namespace}:*"
-                keys = await self._execute_with_retry(self.redis_client.keys, pattern)
+                keys = await self._execute(self.redis_client.keys, pattern)
 
                 if keys:
-                    await self._execute_with_retry(self.redis_client.delete, *keys)
+                    await self._execute(self.redis_client.delete, *keys)
                     log.info(f"✅ Cleared {len(keys)} keys in namespace: {namespace}")
 
             # Clear local cache namespace (if implemented)
@@ -270,9 +416,10 @@ class RedisCacheManager:
 redis_cache = RedisCacheManager(redis_url="redis://localhost:6380")
 
 async def init_redis_cache():
-    """Initialize Redis cache connection"""
+    """Initialize Redis cache connection and its health monitor"""
     await redis_cache.connect()
+    redis_cache.start_health_monitor()
 
 async def close_redis_cache():
     """Close Redis cache connection"""
-    await redis_cache.disconnect()
\ No newline at end of file
+    await redis_cache.disconnect()
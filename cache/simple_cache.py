@@ -4,16 +4,23 @@ Redis-compatible interface with intelligent caching strategies
 """
 
 import asyncio
-import gzip
 import hashlib
-import json
 import time
-from typing import Optional, Dict, Any, Union, List
+from pathlib import Path
+from typing import Optional, Dict, Any, Union, List, Tuple
 from cachetools import TTLCache, LRUCache, LFUCache
 import threading
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 
+from cache.metrics import cache_metrics, TIER_LOCAL
+from cache.snapshot import SnapshotReader, write_snapshot
+from config.config_v2 import get_settings
+from utils import codec
+
+# Stored entries are (expires_at or None, codec blob)
+CacheEntry = Tuple[Optional[float], bytes]
+
 @dataclass
 class CacheMetrics:
     """Cache performance metrics"""
@@ -24,6 +31,9 @@ class CacheMetrics:
     compression_savings: int = 0
     avg_response_time: float = 0.0
     last_cleanup: datetime = field(default_factory=datetime.now)
+    snapshot_restores: int = 0
+    snapshots_written: int = 0
+    last_snapshot: Optional[datetime] = None
 
     @property
     def hit_rate(self) -> float:
@@ -34,21 +44,56 @@ class CacheMetrics:
     def total_operations(self) -> int:
         return self.hits + self.misses + self.sets + self.deletes
 
+class _CountingCache:
+    """Mixin counting capacity evictions and expirations on a cachetools cache"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.evictions = 0
+        self.expirations = 0
+
+    def popitem(self):
+        item = super().popitem()
+        self.evictions += 1
+        return item
+
+
+class CountingLRUCache(_CountingCache, LRUCache):
+    pass
+
+
+class CountingLFUCache(_CountingCache, LFUCache):
+    pass
+
+
+class CountingTTLCache(_CountingCache, TTLCache):
+    def expire(self, time=None):
+        expired = super().expire(time)
+        self.expirations += len(expired)
+        return expired
+
+
 class SmartCacheManager:
     """Intelligent cache manager with Redis-compatible interface"""
 
-    def __init__(self, max_memory_mb: int = 100):
+    # Stable region ids used in snapshot files
+    REGIONS = ('lru', 'lfu', 'ttl', 'url', 'content', 'intent', 'negative')
+
+    def __init__(self, max_memory_mb: int = 100, snapshot_path: Optional[Path] = None,
+                 snapshot_max_entries: int = 20000, negative_cache_size: int = 20000):
         # Multiple cache strategies
-        self.lru_cache = LRUCache(maxsize=1000)
-        self.lfu_cache = LFUCache(maxsize=1000)
-        self.ttl_cache = TTLCache(maxsize=2000, ttl=3600)
+        self.lru_cache = CountingLRUCache(maxsize=1000)
+        self.lfu_cache = CountingLFUCache(maxsize=1000)
+        self.ttl_cache = CountingTTLCache(maxsize=2000, ttl=3600)
 
         # Specialized caches for different data types
-        self.url_cache = TTLCache(maxsize=500, ttl=1800)  # 30 min for URLs
-        self.content_cache = TTLCache(maxsize=300, ttl=3600)  # 1 hour for content
-        self.intent_cache = TTLCache(maxsize=1000, ttl=7200)  # 2 hours for AI analysis
+        self.url_cache = CountingTTLCache(maxsize=500, ttl=1800)  # 30 min for URLs
+        self.content_cache = CountingTTLCache(maxsize=300, ttl=3600)  # 1 hour for content
+        self.intent_cache = CountingTTLCache(maxsize=1000, ttl=7200)  # 2 hours for AI analysis
+        self.negative_cache = CountingLRUCache(maxsize=negative_cache_size)  # failed/rejected URLs, per-entry TTL
 
-        # Compression settings
+        # Serialization and compression settings
+        self.codec = codec.get_codec()
         self.compression_threshold = 1024  # Compress content > 1KB
         self.max_memory_mb = max_memory_mb
 
@@ -59,32 +104,38 @@ class SmartCacheManager:
         # Thread safety
         self._lock = threading.Lock()
 
-        print(f"🧠 Smart Cache initialized with {max_memory_mb}MB memory limit")
-
-    def _should_compress(self, data: str) -> bool:
+        # Warm start: entries from the last snapshot are restored lazily on miss
+        self.snapshot_path = Path(snapshot_path) if snapshot_path else None
+        self.snapshot_max_entries = snapshot_max_entries
+        self._snapshot: Optional[SnapshotReader] = SnapshotReader.open(self.snapshot_path)
+        self._snapshot_shadowed: set = set()  # keys set/deleted since the snapshot was opened
+        self._snapshot_task: Optional[asyncio.Task] = None
+
+        restored = f", {len(self._snapshot)} entries available from snapshot" if self._snapshot else ""
+        print(f"🧠 Smart Cache initialized with {max_memory_mb}MB memory limit{restored}")
+
+    def _regions(self) -> Dict[str, Any]:
+        return {
+            'lru': self.lru_cache,
+            'lfu': self.lfu_cache,
+            'ttl': self.ttl_cache,
+            'url': self.url_cache,
+            'content': self.content_cache,
+            'intent': self.intent_cache,
+            'negative': self.negative_cache,
+        }
+
+    def _should_compress(self, payload: bytes) -> bool:
         """Determine if data should be compressed"""
-        return len(data.encode('utf-8')) > self.compression_threshold
-
-    def _compress_data(self, data: str) -> bytes:
-        """Compress data using gzip"""
-        return gzip.compress(data.encode('utf-8'))
+        return len(payload) > self.compression_threshold
 
-    def _decompress_data(self, compressed_data: bytes) -> str:
-        """Decompress gzip data"""
-        return gzip.decompress(compressed_data).decode('utf-8')
+    def _serialize_value(self, value: Any) -> bytes:
+        """Serialize value with the shared codec (dataclasses/datetimes included)"""
+        return self.codec.dumps(value)
 
-    def _serialize_value(self, value: Any) -> str:
-        """Serialize value to JSON string"""
-        if isinstance(value, (dict, list)):
-            return json.dumps(value, ensure_ascii=False)
-        return str(value)
-
-    def _deserialize_value(self, value: str) -> Any:
-        """Deserialize value from JSON string"""
-        try:
-            return json.loads(value)
-        except (json.JSONDecodeError, TypeError):
-            return value
+    def _deserialize_value(self, blob: bytes) -> Any:
+        """Deserialize an enveloped blob (compression is flagged in the envelope)"""
+        return codec.decode(blob)
 
     def _get_cache_key(self, key: str, namespace: str = "") -> str:
         """Generate consistent cache key"""
@@ -92,66 +143,101 @@ class SmartCacheManager:
             key = f"{namespace}:{key}"
         return hashlib.md5(key.encode()).hexdigest()
 
+    def _select_region(self, key: str, strategy: str = 'auto') -> str:
+        """Select appropriate cache region name"""
+        if strategy in ('lru', 'lfu', 'ttl', 'negative'):
+            return strategy
+
+        # Auto-select based on key pattern
+        if 'url' in key.lower():
+            return 'url'
+        elif 'intent' in key.lower() or 'analysis' in key.lower():
+            return 'intent'
+        elif 'content' in key.lower():
+            return 'content'
+        return 'ttl'
+
     def _select_cache_strategy(self, key: str, strategy: str = 'auto') -> Any:
         """Select appropriate cache strategy"""
-        if strategy == 'lru':
-            return self.lru_cache
-        elif strategy == 'lfu':
-            return self.lfu_cache
-        elif strategy == 'ttl':
-            return self.ttl_cache
-        else:
-            # Auto-select based on key pattern
-            if 'url' in key.lower():
-                return self.url_cache
-            elif 'intent' in key.lower() or 'analysis' in key.lower():
-                return self.intent_cache
-            elif 'content' in key.lower():
-                return self.content_cache
-            else:
-                return self.ttl_cache
+        return self._regions()[self._select_region(key, strategy)]
+
+    def _expires_at(self, cache: Any, ttl: Optional[int]) -> Optional[float]:
+        """Absolute expiry for a new entry (per-entry ttl, else the region's ttl)"""
+        effective_ttl = ttl or getattr(cache, 'ttl', None)
+        return time.time() + effective_ttl if effective_ttl else None
+
+    def _load_entry(self, cache: Any, cache_key: str) -> Optional[CacheEntry]:
+        """Fetch a live entry, falling back to the snapshot (lazy warm start)"""
+        entry = cache.get(cache_key)
+        if entry is None:
+            entry = self._restore_from_snapshot(cache, cache_key)
+            if entry is None:
+                return None
+
+        expires_at = entry[0]
+        if expires_at is not None and expires_at <= time.time():
+            cache.pop(cache_key, None)
+            cache.expirations += 1
+            return None
+        return entry
+
+    def _restore_from_snapshot(self, cache: Any, cache_key: str) -> Optional[CacheEntry]:
+        if self._snapshot is None or cache_key in self._snapshot_shadowed:
+            return None
+
+        found = self._snapshot.lookup(cache_key)
+        # Restore at most once; later misses must not resurrect evicted entries
+        self._snapshot_shadowed.add(cache_key)
+        if found is None:
+            return None
+
+        _, expires_at, blob = found
+        if expires_at is not None and expires_at <= time.time():
+            return None
+
+        entry = (expires_at, bytes(blob))
+        cache[cache_key] = entry
+        self.metrics.snapshot_restores += 1
+        return entry
 
     async def get(self, key: str, namespace: str = "", strategy: str = 'auto') -> Optional[Any]:
         """Get value from cache with Redis-compatible interface"""
-        start_time = time.time()
+        start_time = time.perf_counter()
 
         with self._lock:
             cache_key = self._get_cache_key(key, namespace)
             cache = self._select_cache_strategy(key, strategy)
 
             try:
-                compressed_data = cache.get(cache_key)
-                if compressed_data is None:
+                entry = self._load_entry(cache, cache_key)
+                if entry is None:
                     self.metrics.misses += 1
+                    cache_metrics.record_get(TIER_LOCAL, namespace, False, time.perf_counter() - start_time)
                     return None
 
-                # Decompress if needed
-                if isinstance(compressed_data, bytes):
-                    data = self._decompress_data(compressed_data)
-                else:
-                    data = compressed_data
-
-                # Deserialize
-                value = self._deserialize_value(data)
+                # Decode (decompresses transparently)
+                value = self._deserialize_value(entry[1])
                 self.metrics.hits += 1
 
                 # Track response time
-                response_time = time.time() - start_time
+                response_time = time.perf_counter() - start_time
                 self.response_times.append(response_time)
                 if len(self.response_times) > 100:
                     self.response_times.pop(0)
+                cache_metrics.record_get(TIER_LOCAL, namespace, True, response_time, len(entry[1]))
 
                 return value
 
             except Exception as e:
                 print(f"⚠️  Cache get error for key {key}: {e}")
                 self.metrics.misses += 1
+                cache_metrics.record_get(TIER_LOCAL, namespace, False, time.perf_counter() - start_time)
                 return None
 
     async def set(self, key: str, value: Any, ttl: Optional[int] = None,
                   namespace: str = "", strategy: str = 'auto', compress: bool = True) -> bool:
         """Set value in cache with Redis-compatible interface"""
-        start_time = time.time()
+        start_time = time.perf_counter()
 
         with self._lock:
             try:
@@ -159,26 +245,26 @@ class SmartCacheManager:
                 cache = self._select_cache_strategy(key, strategy)
 
                 # Serialize value
-                serialized_value = self._serialize_value(value)
+                payload = self._serialize_value(value)
 
                 # Compress if beneficial
-                if compress and self._should_compress(serialized_value):
-                    final_value = self._compress_data(serialized_value)
-                    original_size = len(serialized_value.encode('utf-8'))
-                    compressed_size = len(final_value)
-                    self.metrics.compression_savings += (original_size - compressed_size)
-                else:
-                    final_value = serialized_value
+                should_compress = compress and self._should_compress(payload)
+                final_value = codec.seal(payload, self.codec, compress=should_compress)
+                if should_compress:
+                    overhead = codec.ENVELOPE_HEADER_SIZE
+                    self.metrics.compression_savings += max(len(payload) + overhead - len(final_value), 0)
 
                 # Store in cache
-                cache[cache_key] = final_value
+                cache[cache_key] = (self._expires_at(cache, ttl), final_value)
+                self._snapshot_shadowed.add(cache_key)
                 self.metrics.sets += 1
 
                 # Track response time
-                response_time = time.time() - start_time
+                response_time = time.perf_counter() - start_time
                 self.response_times.append(response_time)
                 if len(self.response_times) > 100:
                     self.response_times.pop(0)
+                cache_metrics.record_set(TIER_LOCAL, namespace, response_time, len(final_value))
 
                 return True
 
@@ -193,11 +279,13 @@ class SmartCacheManager:
                 cache_key = self._get_cache_key(key, namespace)
                 cache = self._select_cache_strategy(key, strategy)
 
-                if cache_key in cache:
-                    del cache[cache_key]
+                existed = self._load_entry(cache, cache_key) is not None
+                cache.pop(cache_key, None)
+                self._snapshot_shadowed.add(cache_key)
+                if existed:
                     self.metrics.deletes += 1
-                    return True
-                return False
+                    cache_metrics.record_delete(TIER_LOCAL, namespace)
+                return existed
 
             except Exception as e:
                 print(f"⚠️  Cache delete error for key {key}: {e}")
@@ -208,7 +296,7 @@ class SmartCacheManager:
         with self._lock:
             cache_key = self._get_cache_key(key, namespace)
             cache = self._select_cache_strategy(key, strategy)
-            return cache_key in cache
+            return self._load_entry(cache, cache_key) is not None
 
     async def expire(self, key: str, ttl: int, namespace: str = "", strategy: str = 'auto') -> bool:
         """Set expiration time for key (Redis-compatible)"""
@@ -221,9 +309,15 @@ class SmartCacheManager:
 
     async def ttl(self, key: str, namespace: str = "", strategy: str = 'auto') -> int:
         """Get TTL for key (Redis-compatible)"""
-        # Simplified TTL check - in a real Redis implementation this would be more accurate
-        exists = await self.exists(key, namespace, strategy)
-        return -1 if exists else -2  # -1 = exists, -2 = doesn't exist
+        with self._lock:
+            cache_key = self._get_cache_key(key, namespace)
+            cache = self._select_cache_strategy(key, strategy)
+            entry = self._load_entry(cache, cache_key)
+            if entry is None:
+                return -2  # doesn't exist
+            if entry[0] is None:
+                return -1  # exists without expiry
+            return max(int(entry[0] - time.time()), 0)
 
     def get_metrics(self) -> Dict[str, Any]:
         """Get comprehensive cache metrics"""
@@ -240,22 +334,56 @@ class SmartCacheManager:
                 "deletes": self.metrics.deletes,
                 "compression_savings_mb": round(self.metrics.compression_savings / (1024 * 1024), 2),
                 "avg_response_time_ms": round(self.metrics.avg_response_time * 1000, 2),
+                "codec": self.codec.name,
                 "cache_sizes": {
                     "lru": len(self.lru_cache),
                     "lfu": len(self.lfu_cache),
                     "ttl": len(self.ttl_cache),
                     "url": len(self.url_cache),
                     "content": len(self.content_cache),
-                    "intent": len(self.intent_cache)
+                    "intent": len(self.intent_cache),
+                    "negative": len(self.negative_cache)
                 },
-                "last_cleanup": self.metrics.last_cleanup.isoformat()
+                "last_cleanup": self.metrics.last_cleanup.isoformat(),
+                "regions": self._region_metrics_locked(),
+                "namespaces": cache_metrics.namespaces(TIER_LOCAL),
+                "snapshot": {
+                    "path": str(self.snapshot_path) if self.snapshot_path else None,
+                    "lazy_entries_available": len(self._snapshot) if self._snapshot else 0,
+                    "restored": self.metrics.snapshot_restores,
+                    "written": self.metrics.snapshots_written,
+                    "last_snapshot": self.metrics.last_snapshot.isoformat() if self.metrics.last_snapshot else None
+                }
             }
 
+    def _region_metrics_locked(self) -> Dict[str, Dict[str, int]]:
+        return {
+            name: {
+                "entries": len(region),
+                "maxsize": int(region.maxsize),
+                "bytes": sum(len(blob) for _, blob in list(region.values())),
+                "evictions": region.evictions,
+                "expirations": region.expirations,
+            }
+            for name, region in self._regions().items()
+        }
+
+    def region_metrics(self) -> Dict[str, Dict[str, int]]:
+        """Entries, stored bytes, evictions and expirations per region"""
+        with self._lock:
+            return self._region_metrics_locked()
+
     async def cleanup(self) -> Dict[str, int]:
         """Perform cache cleanup and maintenance"""
         with self._lock:
-            # Clear expired entries (TTL caches handle this automatically)
-            # Additional cleanup logic can be added here
+            # Drop entries whose per-entry TTL has passed (TTLCache only knows its global ttl)
+            now = time.time()
+            for cache in self._regions().values():
+                expired = [k for k, (expires_at, _) in list(cache.items())
+                           if expires_at is not None and expires_at <= now]
+                for cache_key in expired:
+                    cache.pop(cache_key, None)
+                cache.expirations += len(expired)
             self.metrics.last_cleanup = datetime.now()
 
             return {
@@ -277,9 +405,130 @@ class SmartCacheManager:
         content_hash = hashlib.md5(content.encode()).hexdigest()
         return await self.set(content_hash, post_id, namespace="content")
 
+    async def get_cached_intent_analysis(self, text: str) -> Optional[str]:
+        """Get cached intent tag for a text"""
+        text_hash = hashlib.md5(text.encode()).hexdigest()
+        return await self.get(f"intent:{text_hash}", namespace="intent")
+
+    async def set_cached_intent_analysis(self, text: str, tag: str, ttl: Optional[int] = None) -> bool:
+        """Cache intent tag for a text"""
+        text_hash = hashlib.md5(text.encode()).hexdigest()
+        return await self.set(f"intent:{text_hash}", tag, ttl, namespace="intent")
+
+    async def get_cached_url_content(self, url: str) -> Optional[str]:
+        """Get cached raw content for a URL"""
+        url_hash = hashlib.md5(url.encode()).hexdigest()
+        return await self.get(f"url_content:{url_hash}", namespace="url")
+
+    async def set_cached_url_content(self, url: str, content: str, ttl: Optional[int] = None) -> bool:
+        """Cache raw content for a URL"""
+        url_hash = hashlib.md5(url.encode()).hexdigest()
+        return await self.set(f"url_content:{url_hash}", content, ttl, namespace="url")
+
     def get_stats(self) -> Dict[str, Any]:
         """Legacy method for getting cache statistics"""
         return self.get_metrics()
 
+    # ===== SNAPSHOTS (warm start across restarts) =====
+
+    def _collect_snapshot_entries(self) -> List[Tuple[str, int, Optional[float], bytes]]:
+        """Collect live entries, plus not-yet-restored ones from the previous snapshot"""
+        now = time.time()
+        entries: Dict[str, Tuple[str, int, Optional[float], bytes]] = {}
+
+        with self._lock:
+            for region_id, region in enumerate(self.REGIONS):
+                for cache_key, (expires_at, blob) in list(self._regions()[region].items()):
+                    if expires_at is not None and expires_at <= now:
+                        continue
+                    entries[cache_key] = (cache_key, region_id, expires_at, blob)
+                    if len(entries) >= self.snapshot_max_entries:
+                        return list(entries.values())
+
+            if self._snapshot is not None:
+                for cache_key, region_id, expires_at, blob in self._snapshot.iter_entries():
+                    if len(entries) >= self.snapshot_max_entries:
+                        break
+                    if cache_key in entries or cache_key in self._snapshot_shadowed:
+                        continue
+                    if expires_at is not None and expires_at <= now:
+                        continue
+                    entries[cache_key] = (cache_key, region_id, expires_at, bytes(blob))
+
+        return list(entries.values())
+
+    def save_snapshot(self, path: Optional[Path] = None) -> int:
+        """Write live entries to disk; returns the number of entries saved"""
+        path = Path(path) if path else self.snapshot_path
+        if path is None:
+            return 0
+
+        entries = self._collect_snapshot_entries()
+
+        with self._lock:
+            # Release the old mapping before replacing the file (required on Windows)
+            if self._snapshot is not None and self._snapshot.path == path:
+                self._snapshot.close()
+                self._snapshot = None
+                self._snapshot_shadowed.clear()
+
+        count = write_snapshot(path, entries)
+        self.metrics.snapshots_written += 1
+        self.metrics.last_snapshot = datetime.now()
+        return count
+
+    def discard_snapshot(self) -> None:
+        """Forget the loaded snapshot so cleared entries are not restored"""
+        with self._lock:
+            if self._snapshot is not None:
+                self._snapshot.close()
+                self._snapshot = None
+            self._snapshot_shadowed.clear()
+
+    def start_snapshot_task(self, interval: int) -> None:
+        """Snapshot periodically in the background (idempotent)"""
+        if self.snapshot_path is None:
+            return
+        if self._snapshot_task is not None and not self._snapshot_task.done():
+            return
+        self._snapshot_task = asyncio.get_running_loop().create_task(self._snapshot_loop(interval))
+
+    async def _snapshot_loop(self, interval: int) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                count = await asyncio.to_thread(self.save_snapshot)
+                print(f"💾 Cache snapshot saved ({count} entries)")
+            except Exception as e:
+                print(f"⚠️  Cache snapshot failed: {e}")
+
+    async def shutdown(self) -> None:
+        """Stop periodic snapshots and write a final one (graceful shutdown)"""
+        if self._snapshot_task is not None:
+            self._snapshot_task.cancel()
+            try:
+                await self._snapshot_task
+            except asyncio.CancelledError:
+                pass
+            self._snapshot_task = None
+
+        if self.snapshot_path is not None:
+            try:
+                count = await asyncio.to_thread(self.save_snapshot)
+                print(f"💾 Cache snapshot saved on shutdown ({count} entries)")
+            except Exception as e:
+                print(f"⚠️  Cache snapshot failed on shutdown: {e}")
+
+def _build_default_cache_manager() -> SmartCacheManager:
+    cache_settings = get_settings().cache
+    snapshot_path = cache_settings.snapshot_path if cache_settings.enable_snapshot else None
+    manager = SmartCacheManager(
+        snapshot_path=snapshot_path,
+        snapshot_max_entries=cache_settings.snapshot_max_entries,
+        negative_cache_size=cache_settings.negative_cache_size
+    )
+    cache_metrics.register_regions(TIER_LOCAL, manager.region_metrics)
+    return manager
+
 # Global instance
-cache_manager = SmartCacheManager()
\ No newline at end of file
+cache_manager = _build_default_cache_manager()
\ No newline at end of file
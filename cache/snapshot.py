@@ -0,0 +1,128 @@
+"""
+Cache Snapshot Files for Aqxion Scraper
+Compact, memory-mappable on-disk snapshots of the local cache
+
+Layout (little endian):
+    header : magic(8s) | entry_count(I) | created_at(d)
+    index  : entry_count fixed-size records sorted by key
+             key(32s, md5 hex) | region(B) | expires_at(d, 0 = never) | offset(Q) | length(I)
+    data   : concatenated codec blobs
+
+The index is sorted and fixed-width, so a reader can binary-search the
+mmap directly: opening a snapshot costs one header read regardless of size.
+"""
+
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Tuple
+import logging
+
+log = logging.getLogger("cache_snapshot")
+
+SNAPSHOT_MAGIC = b"AQXSNAP1"
+_HEADER = struct.Struct("<8sId")
+_RECORD = struct.Struct("<32sBdQI")
+
+# (cache_key, region_id, expires_at or None, blob)
+SnapshotEntry = Tuple[str, int, Optional[float], bytes]
+
+
+def write_snapshot(path: Path, entries: Iterable[SnapshotEntry]) -> int:
+    """Write entries atomically (tmp file + fsync + rename). Returns entry count"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    unique = {}
+    for cache_key, region_id, expires_at, blob in entries:
+        unique[cache_key] = (region_id, expires_at, blob)
+    ordered = sorted(unique.items())
+
+    data_offset = _HEADER.size + _RECORD.size * len(ordered)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(SNAPSHOT_MAGIC, len(ordered), time.time()))
+
+        offset = data_offset
+        for cache_key, (region_id, expires_at, blob) in ordered:
+            f.write(_RECORD.pack(cache_key.encode("ascii"), region_id, expires_at or 0.0, offset, len(blob)))
+            offset += len(blob)
+
+        for _, (_, _, blob) in ordered:
+            f.write(blob)
+
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_path, path)
+    return len(ordered)
+
+
+class SnapshotReader:
+    """Lazy, mmap-backed view over a snapshot file"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+
+        magic, self.count, self.created_at = _HEADER.unpack_from(self._mm, 0)
+        if magic != SNAPSHOT_MAGIC:
+            self.close()
+            raise ValueError(f"Not a cache snapshot: {self.path}")
+
+        if len(self._mm) < _HEADER.size + _RECORD.size * self.count:
+            self.close()
+            raise ValueError(f"Truncated cache snapshot: {self.path}")
+
+    @classmethod
+    def open(cls, path: Optional[Path]) -> Optional["SnapshotReader"]:
+        """Open a snapshot if present and valid; never raises"""
+        if path is None or not Path(path).exists():
+            return None
+        try:
+            return cls(path)
+        except Exception as e:
+            log.warning(f"⚠️ Ignoring unreadable cache snapshot {path}: {e}")
+            return None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _record(self, index: int) -> Tuple[bytes, int, float, int, int]:
+        return _RECORD.unpack_from(self._mm, _HEADER.size + index * _RECORD.size)
+
+    def lookup(self, cache_key: str) -> Optional[Tuple[int, Optional[float], bytes]]:
+        """Binary-search a key; returns (region_id, expires_at, blob)"""
+        target = cache_key.encode("ascii")
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            key = self._record(mid)[0]
+            if key < target:
+                lo = mid + 1
+            elif key > target:
+                hi = mid
+            else:
+                _, region_id, expires_at, offset, length = self._record(mid)
+                return region_id, expires_at or None, self._mm[offset:offset + length]
+        return None
+
+    def iter_entries(self) -> Iterator[SnapshotEntry]:
+        """Iterate every entry in key order"""
+        for index in range(self.count):
+            key, region_id, expires_at, offset, length = self._record(index)
+            yield key.decode("ascii"), region_id, expires_at or None, self._mm[offset:offset + length]
+
+    def close(self) -> None:
+        try:
+            self._mm.close()
+        finally:
+            self._file.close()
@@ -75,7 +75,7 @@ async def run_analyze_mode(args):
     print("🔬 Iniciando análisis de datos existentes...")
 
     # Cargar datos
-    competitors = competition_watcher.load_competitor_data(args.load_limit)
+    competitors = await competition_watcher.load_competitor_data_async(args.load_limit)
 
     if not competitors:
         print("❌ No se encontraron datos de competidores para analizar")
@@ -90,12 +90,12 @@ async def run_analyze_mode(args):
     print("\n✅ Análisis completado!")
     show_analysis_summary(analysis, args.output)
 
-def run_history_mode(args):
+async def run_history_mode(args):
     """Modo historial"""
     print("📚 Consultando historial...")
 
     # Historial de análisis
-    analyses = competition_watcher.get_analysis_history(args.history_limit)
+    analyses = await competition_watcher.get_analysis_history_async(args.history_limit)
 
     if analyses:
         print(f"\n📊 ÚLTIMOS {len(analyses)} ANÁLISIS:")
@@ -110,7 +110,7 @@ def run_history_mode(args):
         print("❌ No se encontraron análisis previos")
 
     # Historial de ejecuciones
-    runs = competition_watcher.get_run_history(args.history_limit)
+    runs = await competition_watcher.get_run_history_async(args.history_limit)
 
     if runs:
         print(f"\n⚙️ ÚLTIMAS {len(runs)} EJECUCIONES:")
@@ -173,7 +173,7 @@ async def main():
         elif args.mode == 'analyze':
             await run_analyze_mode(args)
         elif args.mode == 'history':
-            run_history_mode(args)
+            await run_history_mode(args)
 
     except KeyboardInterrupt:
         print("\n⏹️  Operación interrumpida por el usuario")
@@ -10,7 +10,8 @@ import logging
 import io
 from datetime import datetime, timezone, timedelta
 from typing import Dict, Any, List
-import json
+
+from utils.codec import to_json
 
 logger = logging.getLogger(__name__)
 
@@ -104,7 +105,7 @@ class CSVOutputGenerator:
         evidence_str = ";".join(evidence_urls)
 
         # Convertir métricas a JSON string
-        metrics_json = json.dumps(signal.data) if hasattr(signal, 'data') and signal.data else "{}"
+        metrics_json = to_json(signal.data) if hasattr(signal, 'data') and signal.data else "{}"
 
         # Generar acción
         action = self._generate_action(signal)
@@ -5,12 +5,13 @@ Genera output JSON machine-readable con evidencia completa
 para integración con sistemas automatizados.
 """
 
-import json
 import logging
 from datetime import datetime, timezone, timedelta
 from typing import Dict, Any, List
 from dataclasses import dataclass, asdict
 
+from utils.codec import to_json
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -90,7 +91,7 @@ class JSONOutputGenerator:
         }
 
         # Convertir a JSON con formato legible
-        json_output = json.dumps(output_data, indent=2, ensure_ascii=False)
+        json_output = to_json(output_data, indent=True)
 
         logger.info(f"✅ Output JSON generado: {len(signals)} señales, {len(json_output)} caracteres")
         return json_output
@@ -7,15 +7,23 @@ reutilizando la infraestructura de base de datos existente.
 
 import asyncio
 import logging
-import json
-from typing import Dict, Any, List, Optional
+from itertools import islice
+from typing import Dict, Any, Iterator, List, Optional
 from datetime import datetime
 from dataclasses import dataclass
 
-from database.db import get_conn
+from database.compression import compress_value, decompress_value
+from database.db import get_conn, get_read_conn, iter_keyset, json_dict_decoder, keyset_page
+from database.async_db import run_db
+from database.retention import RetentionEngine, market_scans_policy
+from competitive_radar.config import STORAGE_CONFIG
+from utils.codec import to_json, from_json
 
 logger = logging.getLogger(__name__)
 
+SIGNAL_COLUMNS = ('id', 'scan_id', 'signal_type', 'title', 'description', 'priority',
+                  'confidence', 'signal_data', 'created_at')
+
 @dataclass
 class MarketScan:
     """Registro de un escaneo de mercado"""
@@ -76,6 +84,11 @@ class MarketDataStorage:
                 ON market_scans(scan_timestamp)
             """)
 
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_market_scans_keyword_timestamp
+                ON market_scans(keyword, scan_timestamp)
+            """)
+
             conn.execute("""
                 CREATE INDEX IF NOT EXISTS idx_market_signals_type
                 ON market_signals(signal_type)
@@ -112,7 +125,7 @@ class MarketDataStorage:
             raw_data=scan_data
         )
 
-        scan_id = self._save_scan_record(scan)
+        scan_id = await run_db(self._save_scan_record, scan)
 
         # Guardar señales asociadas
         signals = scan_data.get("signals", [])
@@ -136,7 +149,7 @@ class MarketDataStorage:
                 scan.processed_results,
                 scan.signals_generated,
                 scan.scan_timestamp.isoformat(),
-                json.dumps(scan.raw_data)
+                compress_value('market_scans.raw_data', scan.sensor_type, to_json(scan.raw_data))
             ))
 
             scan_id = cursor.lastrowid
@@ -151,6 +164,12 @@ class MarketDataStorage:
         if not signals:
             return
 
+        await run_db(self._insert_signals, scan_id, signals)
+
+        logger.info(f"💾 Guardadas {len(signals)} señales para escaneo {scan_id}")
+
+    def _insert_signals(self, scan_id: int, signals: List[Any]) -> None:
+        """Insertar señales en una sola transacción"""
         with get_conn() as conn:
             for signal in signals:
                 conn.execute("""
@@ -165,52 +184,43 @@ class MarketDataStorage:
                     signal.description,
                     signal.priority,
                     signal.confidence,
-                    json.dumps(signal.data) if signal.data else None
+                    to_json(signal.data) if signal.data else None
                 ))
 
             conn.commit()
 
-        logger.info(f"💾 Guardadas {len(signals)} señales para escaneo {scan_id}")
-
     async def get_recent_scans(self, limit: int = 10) -> List[MarketScan]:
         """Obtener escaneos recientes"""
-        with get_conn() as conn:
-            cursor = conn.execute("""
-                SELECT id, keyword, sensor_type, total_results, processed_results,
-                       signals_generated, scan_timestamp, raw_data
-                FROM market_scans
-                ORDER BY scan_timestamp DESC
-                LIMIT ?
-            """, (limit,))
+        return await run_db(lambda: list(islice(self.iter_scans(page_size=limit), limit)))
 
-            rows = cursor.fetchall()
+    def iter_scans(self, keyword: Optional[str] = None,
+                   page_size: Optional[int] = None) -> Iterator[MarketScan]:
+        """Recorrer escaneos del más reciente al más antiguo en memoria constante
 
-        scans = []
-        for row in rows:
-            scans.append(MarketScan(
-                id=row[0],
-                keyword=row[1],
-                sensor_type=row[2],
-                total_results=row[3],
-                processed_results=row[4],
-                signals_generated=row[5],
-                scan_timestamp=datetime.fromisoformat(row[6]),
-                raw_data=json.loads(row[7]) if row[7] else {}
-            ))
+        Pagina por (scan_timestamp, id); raw_data se decodifica fila a fila.
+        """
+        where, params = ("keyword = ?", (keyword,)) if keyword is not None else ("", ())
+        rows = iter_keyset(
+            'market_scans',
+            ('id', 'keyword', 'sensor_type', 'total_results', 'processed_results',
+             'signals_generated', 'scan_timestamp', 'raw_data'),
+            ('scan_timestamp', 'id'), where=where, params=params, page_size=page_size)
 
-        return scans
+        for row in rows:
+            yield MarketScan(
+                id=row['id'],
+                keyword=row['keyword'],
+                sensor_type=row['sensor_type'],
+                total_results=row['total_results'],
+                processed_results=row['processed_results'],
+                signals_generated=row['signals_generated'],
+                scan_timestamp=datetime.fromisoformat(row['scan_timestamp']),
+                raw_data=from_json(decompress_value(row['raw_data']), {})
+            )
 
     async def get_scan_signals(self, scan_id: int) -> List[Dict[str, Any]]:
         """Obtener señales de un escaneo específico"""
-        with get_conn() as conn:
-            cursor = conn.execute("""
-                SELECT signal_type, title, description, priority, confidence, signal_data
-                FROM market_signals
-                WHERE scan_id = ?
-                ORDER BY confidence DESC
-            """, (scan_id,))
-
-            rows = cursor.fetchall()
+        rows = await run_db(self._fetch_scan_signals, scan_id)
 
         signals = []
         for row in rows:
@@ -220,17 +230,54 @@ class MarketDataStorage:
                 "description": row[2],
                 "priority": row[3],
                 "confidence": row[4],
-                "data": json.loads(row[5]) if row[5] else {}
+                "data": from_json(row[5], {})
             })
 
         return signals
 
+    def _fetch_scan_signals(self, scan_id: int) -> List[tuple]:
+        with get_read_conn() as conn:
+            cursor = conn.execute("""
+                SELECT signal_type, title, description, priority, confidence, signal_data
+                FROM market_signals
+                WHERE scan_id = ?
+                ORDER BY confidence DESC
+            """, (scan_id,))
+
+            return cursor.fetchall()
+
     async def get_market_trends(self, days: int = 30) -> Dict[str, Any]:
         """Obtener tendencias del mercado en los últimos días"""
         # TODO: Implementar análisis de tendencias
         return {"message": "Análisis de tendencias próximamente"}
 
-    def cleanup_old_data(self, days_to_keep: int = 90) -> int:
-        """Limpiar datos antiguos"""
-        # TODO: Implementar limpieza de datos antiguos
-        return 0
+    def cleanup_old_data(self, days_to_keep: int = STORAGE_CONFIG["retention_days"]) -> int:
+        """Archivar y eliminar escaneos (y sus señales) más antiguos que days_to_keep
+
+        Returns:
+            Número de escaneos eliminados
+        """
+        report = RetentionEngine([market_scans_policy(days_to_keep)]).run()
+        result = report.policies[0]
+        logger.info(f"🧹 {result.rows_deleted} escaneos y {result.child_rows_deleted} señales archivados "
+                    f"y eliminados; {report.bytes_reclaimed / 1024:.0f} KB recuperados")
+        return result.rows_deleted
+
+
+def page_signals(signal_type: Optional[str] = None, priority: Optional[str] = None,
+                 scan_id: Optional[int] = None, after: Optional[List[Any]] = None,
+                 limit: int = 50) -> Dict[str, Any]:
+    """Página de señales de la más reciente a la más antigua (keyset por id)
+
+    Solo lectura, para consumidores externos (API REST); ``after`` es el
+    cursor 'next' de la página anterior.
+    """
+    filters, params = [], []
+    for column, value in (('signal_type', signal_type), ('priority', priority), ('scan_id', scan_id)):
+        if value is not None:
+            filters.append(f"{column} = ?")
+            params.append(value)
+    page = keyset_page('market_signals', SIGNAL_COLUMNS, ('id',), where=" AND ".join(filters),
+                       params=params, after=after, limit=limit,
+                       decoders={'signal_data': json_dict_decoder})
+    return {'signals': page['rows'], 'next': page['next']}
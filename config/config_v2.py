@@ -4,7 +4,7 @@ Replaces the old environment variable approach with a robust configuration syste
 """
 
 from pathlib import Path
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Union
 from pydantic import BaseModel, Field, field_validator
 from pydantic_settings import BaseSettings
 from pydantic.types import SecretStr
@@ -128,11 +128,63 @@ class DatabaseSettings(BaseSettings):
     synchronous_mode: str = Field(default="NORMAL", pattern=r"^(FULL|NORMAL|OFF)$", description="SQLite synchronous mode")
     cache_size: int = Field(default=-64000, description="SQLite cache size in KB (negative for KB)")
     journal_mode: str = Field(default="WAL", pattern=r"^(DELETE|TRUNCATE|PERSIST|MEMORY|WAL|OFF)$", description="SQLite journal mode")
+    mmap_size: int = Field(default=268435456, ge=0, description="Bytes of the database file to memory-map (0 disables)")
+    temp_store: str = Field(default="MEMORY", pattern=r"^(DEFAULT|FILE|MEMORY)$", description="Where SQLite keeps temp tables and indices")
+    busy_timeout_ms: int = Field(default=5000, ge=0, le=300000, description="Milliseconds to wait on a locked database")
+    wal_autocheckpoint: int = Field(default=1000, ge=0, description="WAL pages before an automatic checkpoint (0 disables)")
+    auto_vacuum: str = Field(default="INCREMENTAL", pattern=r"^(NONE|FULL|INCREMENTAL)$", description="auto_vacuum mode for new databases (INCREMENTAL lets retention reclaim space)")
+
+    # Background WAL checkpointer
+    checkpoint_interval: float = Field(default=30.0, ge=0.0, le=3600.0, description="Seconds between background WAL checkpoints (0 disables)")
+    wal_truncate_above_mb: int = Field(default=64, ge=1, description="Truncate the WAL file once it grows past this size")
 
     # Connection pool settings
     max_connections: int = Field(default=10, ge=1, le=100, description="Maximum database connections")
     connection_timeout: float = Field(default=30.0, ge=1.0, le=300.0, description="Connection timeout in seconds")
 
+    # Async access (dedicated DB threads)
+    async_workers: int = Field(default=4, ge=1, le=32, description="Threads running database calls for async code")
+
+    # Streaming readers (keyset pagination)
+    stream_page_size: int = Field(default=1000, ge=1, le=100000, description="Rows fetched per page by the iter_* readers")
+
+    # Batched writer settings
+    writer_batch_size: int = Field(default=500, ge=1, le=50000, description="Maximum rows per write transaction")
+    writer_max_delay_ms: int = Field(default=50, ge=1, le=10000, description="Maximum time a row waits for its batch to fill")
+    writer_queue_size: int = Field(default=10000, ge=100, le=1000000, description="Pending rows before producers are backpressured")
+
+    # Ingestion path: "direct" writes through the batch writer, "log" appends to
+    # local segments that a single loader process bulk-ingests
+    ingest_mode: str = Field(default="direct", pattern=r"^(direct|log)$", description="How crawlers persist posts")
+    ingest_dir: Path = Field(default=Path("ingest"), description="Directory holding ingestion log segments")
+    ingest_segment_max_mb: int = Field(default=16, ge=1, le=1024, description="Segment size that triggers rotation")
+    ingest_segment_max_age_s: float = Field(default=5.0, ge=0.1, le=3600.0, description="Segment age that triggers rotation")
+    ingest_loader_batch_rows: int = Field(default=5000, ge=1, le=500000, description="Rows per loader transaction")
+    ingest_loader_poll_s: float = Field(default=1.0, ge=0.05, le=60.0, description="Loader sleep when no new records are found")
+    ingest_stale_segment_s: float = Field(default=300.0, ge=1.0, le=86400.0, description="Age after which an unsealed segment is treated as abandoned")
+
+    # Monthly posts shards (opt-in)
+    shard_posts: bool = Field(default=False, description="Write posts to monthly shard databases instead of the main file")
+    shard_dir: Path = Field(default=Path("shards"), description="Directory holding posts_YYYYMM.db shards")
+    shard_writable_months: int = Field(default=2, ge=2, le=24, description="Most recent shards kept writable; older ones may be sealed read-only")
+
+    # zstd compression of large text columns (needs the zstandard package)
+    compress_text: bool = Field(default=True, description="Store posts.body, competitors.description and market_scans.raw_data zstd-compressed")
+    compress_level: int = Field(default=3, ge=1, le=22, description="zstd compression level")
+    compress_min_bytes: int = Field(default=256, ge=0, le=1048576, description="Values shorter than this stay uncompressed")
+    compress_dict_size: int = Field(default=65536, ge=1024, le=1048576, description="Size of each trained dictionary in bytes")
+    compress_dict_min_samples: int = Field(default=50, ge=5, le=100000, description="Rows a group needs before it gets its own dictionary")
+    compress_dict_max_samples: int = Field(default=5000, ge=10, le=1000000, description="Most recent rows used to train a dictionary")
+
+    # Retention (archive + delete of expired rows)
+    retention_archive_dir: Path = Field(default=Path(".archive"), description="Directory for compressed, date-partitioned archives")
+    retention_batch_size: int = Field(default=500, ge=1, le=50000, description="Rows archived and deleted per transaction")
+    retention_noise_posts_days: int = Field(default=30, ge=1, description="Days to keep posts tagged 'ruido'")
+    retention_competition_runs_days: int = Field(default=180, ge=1, description="Days to keep finished competition runs")
+    retention_market_scans_days: int = Field(default=90, ge=1, description="Days to keep market scans and their signals")
+    retention_scan_raw_data_days: int = Field(default=14, ge=1, description="Days to keep market_scans.raw_data before archiving it")
+    retention_vacuum_pages: int = Field(default=0, ge=0, description="Pages freed per incremental_vacuum run (0 = all free pages)")
+
     class Config:
         env_prefix = "DB_"
         case_sensitive = False
@@ -164,16 +216,32 @@ class CacheSettings(BaseSettings):
     # Redis settings
     redis_url: Optional[str] = Field(default=None, description="Redis URL for distributed caching")
     redis_ttl: int = Field(default=3600, ge=300, le=86400, description="Default TTL for cached items")
+    redis_health_check_interval: float = Field(default=2.0, ge=0.1, le=60.0, description="Seconds between Redis health checks")
+    redis_resync_max_keys: int = Field(default=10000, ge=0, le=1000000, description="Max keys written while Redis is down to replay on recovery")
 
     # Local cache settings
     local_cache_size: int = Field(default=10000, ge=1000, le=100000, description="Local cache maximum size")
     local_cache_ttl: int = Field(default=3600, ge=300, le=86400, description="Local cache TTL")
 
+    # Snapshot / warm start of the local cache
+    enable_snapshot: bool = Field(default=True, description="Persist local cache entries across restarts")
+    snapshot_path: Path = Field(default=Path(".cache/local_cache.snap"), description="Local cache snapshot file")
+    snapshot_interval: int = Field(default=300, ge=10, le=86400, description="Seconds between periodic cache snapshots")
+    snapshot_max_entries: int = Field(default=20000, ge=100, le=1000000, description="Maximum entries written per snapshot")
+
+    # Serialization
+    codec: str = Field(default="auto", pattern=r"^(auto|msgpack|orjson|json)$", description="Codec for cached values (auto picks the fastest installed)")
+
     # Cache keys
     enable_url_cache: bool = Field(default=True, description="Cache scraped URLs")
     enable_content_cache: bool = Field(default=True, description="Cache processed content")
     enable_intent_cache: bool = Field(default=True, description="Cache intent analysis results")
 
+    # Negative cache (URLs that failed or were rejected)
+    enable_negative_cache: bool = Field(default=True, description="Remember failed/rejected URLs across cycles")
+    negative_ttls: Dict[str, int] = Field(default_factory=dict, description="Per-reason TTL overrides in seconds, e.g. {\"timeout\": 600}")
+    negative_cache_size: int = Field(default=20000, ge=1000, le=1000000, description="Maximum negative entries kept locally")
+
     class Config:
         env_prefix = "CACHE_"
         case_sensitive = False
@@ -187,6 +255,11 @@ class ExportSettings(BaseSettings):
     enable_csv_export: bool = Field(default=True, description="Enable CSV export")
     enable_json_export: bool = Field(default=True, description="Enable JSON export")
 
+    # Incremental columnar export (python -m database.export)
+    columnar_format: str = Field(default="parquet", pattern=r"^(parquet|arrow)$", description="File format of incremental exports")
+    compression: str = Field(default="zstd", pattern=r"^(zstd|lz4|snappy|gzip|none)$", description="Compression codec for exported files")
+    chunk_rows: int = Field(default=50000, ge=100, le=1000000, description="Rows read per page and buffered before writing")
+
     # Google Sheets integration
     google_sheets_url: Optional[str] = Field(default=None, description="Google Sheets URL for export")
     google_credentials_path: Optional[Path] = Field(default=None, description="Path to Google credentials")
@@ -214,6 +287,7 @@ class MonitoringSettings(BaseSettings):
     # Metrics
     enable_prometheus: bool = Field(default=False, description="Enable Prometheus metrics")
     prometheus_port: int = Field(default=8000, ge=1024, le=65535, description="Prometheus metrics port")
+    loop_lag_warn_ms: int = Field(default=100, ge=1, le=60000, description="Warn when the event loop is blocked longer than this")
 
     # Health checks
     enable_health_checks: bool = Field(default=True, description="Enable health check endpoints")
@@ -224,6 +298,55 @@ class MonitoringSettings(BaseSettings):
         case_sensitive = False
 
 
+class WebSettings(BaseSettings):
+    """HTTP services (live feed, REST API) settings"""
+
+    # Live dashboard feed (python -m web.live_feed)
+    live_host: str = Field(default="0.0.0.0", description="Interface the live feed binds to")
+    live_port: int = Field(default=8765, ge=1024, le=65535, description="Live feed port (SSE, websocket and HTML page)")
+    live_poll_ms: int = Field(default=500, ge=50, le=10000, description="How often the tailer checks for new posts")
+    live_batch_rows: int = Field(default=1000, ge=10, le=100000, description="New posts read per tail query")
+    live_recent_leads: int = Field(default=50, ge=1, le=1000, description="High-value leads kept in memory and sent on connect")
+    live_queue_size: int = Field(default=256, ge=8, le=100000, description="Pending events per subscriber before it is disconnected")
+    live_heartbeat_s: float = Field(default=15.0, ge=1.0, le=300.0, description="Keep-alive interval for idle subscribers")
+
+    # Read-only REST API (python -m web.api); shares 8000 with MONITORING_PROMETHEUS_PORT,
+    # so run them in separate processes/containers or move one of them
+    api_host: str = Field(default="0.0.0.0", description="Interface the REST API binds to")
+    api_port: int = Field(default=8000, ge=1024, le=65535, description="REST API port")
+    api_page_size: int = Field(default=50, ge=1, le=1000, description="Default rows per page")
+    api_max_page_size: int = Field(default=500, ge=1, le=10000, description="Largest page a client may request")
+    api_cache_entries: int = Field(default=512, ge=0, le=100000, description="Encoded responses kept per data version (0 disables)")
+    api_gzip_min_bytes: int = Field(default=1024, ge=0, le=1048576, description="Smallest body sent gzip-compressed")
+    api_kpi_days_max: int = Field(default=90, ge=1, le=3650, description="Longest KPI series a client may request")
+
+    class Config:
+        env_prefix = "WEB_"
+        case_sensitive = False
+
+
+class StreamSettings(BaseSettings):
+    """Lead stream (Redis Streams) settings"""
+
+    enabled: bool = Field(default=False, description="Publish saved posts to a Redis Stream")
+    redis_url: Optional[str] = Field(default=None, description="Redis URL for the stream (defaults to CACHE_REDIS_URL)")
+    key: str = Field(default="aqxion:leads", description="Stream key")
+    maxlen: int = Field(default=100000, ge=100, le=100000000, description="Approximate number of entries kept in the stream")
+    publish_all: bool = Field(default=False, description="Publish every saved post, not only high-value leads")
+    body_chars: int = Field(default=2000, ge=0, le=100000, description="Characters of the post body included in each entry")
+    compress_min_bytes: int = Field(default=1024, ge=0, le=1048576, description="Payloads larger than this are zlib-compressed")
+
+    # Reference consumer (python -m utils.lead_stream consume)
+    group: str = Field(default="crm", description="Default consumer group")
+    batch_size: int = Field(default=100, ge=1, le=10000, description="Entries read per XREADGROUP")
+    block_ms: int = Field(default=5000, ge=0, le=600000, description="How long XREADGROUP waits for new entries")
+    claim_idle_ms: int = Field(default=60000, ge=1000, le=86400000, description="Pending entries idle this long are reclaimed from dead consumers")
+
+    class Config:
+        env_prefix = "STREAM_"
+        case_sensitive = False
+
+
 class MLSettings(BaseSettings):
     """Machine Learning settings for intent analysis"""
 
@@ -260,6 +383,8 @@ class Settings(BaseSettings):
     cache: CacheSettings = CacheSettings()
     export: ExportSettings = ExportSettings()
     monitoring: MonitoringSettings = MonitoringSettings()
+    web: WebSettings = WebSettings()
+    stream: StreamSettings = StreamSettings()
     ml: MLSettings = MLSettings()
 
     class Config:
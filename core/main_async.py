@@ -10,6 +10,7 @@ import re
 import logging
 import os
 import random
+import signal
 import time
 from pathlib import Path
 from typing import List, Dict, Optional, Tuple, Set, Any
@@ -27,11 +28,17 @@ from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_excep
 
 # Configuración moderna
 from config.config_v2 import get_settings, ScrapingSettings, DatabaseSettings, MIN_TITLE_LENGTH, MIN_BODY_LENGTH
-from database.db import init_db, upsert_post
+from database import async_db
+from database.writer import post_writer
+from database.ingest_log import get_ingest_log
 from config.sources import search_urls_for
 from config.rules import tag_item
 from utils.simple_alerts import alert_lead, AlertSystem, auto_configure_alerts, alert_system_status
+from utils.lead_stream import lead_stream
+from utils.loop_monitor import LoopLagMonitor
 from cache.simple_cache import cache_manager
+from cache.negative_cache import negative_cache, NegativeReason, reason_for_status
+from cache.metrics import cache_metrics, start_prometheus_exporter
 from scraping.simple_scrapling import scrapling_scraper
 from ai.ai_service import ai_service
 
@@ -263,6 +270,8 @@ class AsyncScraper:
         self.rate_limiter = AsyncRateLimiter()
         self.session: Optional[ClientSession] = None
         self.cache_manager = cache_manager
+        self.negative_cache = negative_cache
+        self.loop_monitor = LoopLagMonitor(warn_threshold=settings.monitoring.loop_lag_warn_ms / 1000)
 
     async def __aenter__(self):
         """Inicializar recursos asÃ­ncronos"""
@@ -289,6 +298,20 @@ class AsyncScraper:
             }
         )
 
+        # Detectar llamadas bloqueantes dentro de corrutinas
+        self.loop_monitor.start()
+
+        # Snapshots periódicos de la caché local (warm start en el próximo arranque)
+        if settings.cache.enable_snapshot:
+            self.cache_manager.start_snapshot_task(settings.cache.snapshot_interval)
+
+        # Stream de leads (si está activado); sin Redis solo se registra un aviso
+        await lead_stream.connect()
+
+        # Métricas de caché para Prometheus (/metrics)
+        if settings.monitoring.enable_prometheus:
+            start_prometheus_exporter(settings.monitoring.prometheus_port)
+
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
@@ -296,13 +319,39 @@ class AsyncScraper:
         if self.session:
             await self.session.close()
 
+        # Vaciar la cola del writer antes de salir
+        await post_writer.stop()
+        if db_config.ingest_mode == "log":
+            get_ingest_log().close()
+        await self.loop_monitor.stop()
+        await lead_stream.close()
+
+        # Snapshot final de la caché (también en cancelación/SIGTERM)
+        await self.cache_manager.shutdown()
+
+    async def fetch_url(self, url: str) -> Optional[str]:
+        """Obtener contenido de URL con retry automático y caché inteligente
+
+        Los errores de red/HTTP van a la caché negativa solo cuando se agotan
+        los reintentos; un intento que funciona no deja entrada.
+        """
+        try:
+            return await self._fetch_url_with_retry(url)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if isinstance(e, aiohttp.ClientResponseError):
+                reason = reason_for_status(e.status)
+            else:
+                reason = NegativeReason.TIMEOUT
+            await self.negative_cache.record(url, reason, detail=str(e))
+            raise
+
     @retry(
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=4, max=10),
-        retry=retry_if_exception_type((aiohttp.ClientError, asyncio.TimeoutError))
+        retry=retry_if_exception_type((aiohttp.ClientError, asyncio.TimeoutError)),
+        reraise=True
     )
-    async def fetch_url(self, url: str) -> Optional[str]:
-        """Obtener contenido de URL con retry automático y caché inteligente"""
+    async def _fetch_url_with_retry(self, url: str) -> Optional[str]:
         domain = urlparse(url).netloc
 
         # 1. Verificar caché antes de hacer petición
@@ -322,11 +371,23 @@ class AsyncScraper:
                 raise RuntimeError("HTTP session not initialized")
 
             async with self.session.get(url) as response:
+                # Páginas muertas: no reintentar, recordar en caché negativa
+                if response.status in (404, 410):
+                    await self.negative_cache.record(url, NegativeReason.NOT_FOUND, detail=f"HTTP {response.status}")
+                    return None
+
                 response.raise_for_status()
+
+                content_type = response.headers.get('Content-Type', '')
+                if content_type and 'html' not in content_type.lower():
+                    await self.negative_cache.record(url, NegativeReason.NON_HTML, detail=content_type)
+                    return None
+
                 content = await response.text()
 
                 # Resetear errores en caso de éxito
                 self.rate_limiter.reset_error_count(domain)
+                await self.negative_cache.forget(url)
 
                 # 3. Cachear el contenido obtenido
                 try:
@@ -344,9 +405,14 @@ class AsyncScraper:
 
     def should_scrape_detail(self, url: str, title: str, keyword: str) -> Tuple[bool, str]:
         """Filtrado avanzado antes de hacer request detallada"""
+        rejection, reason = self.classify_detail(url, title, keyword)
+        return rejection is None, reason
+
+    def classify_detail(self, url: str, title: str, keyword: str) -> Tuple[Optional[NegativeReason], str]:
+        """Igual que should_scrape_detail, pero con el código de rechazo para la caché negativa"""
         # Filtros de tÃ­tulo
         if len(title.strip()) < scraping_config.min_title_length:
-            return False, "tÃ­tulo demasiado corto"
+            return NegativeReason.SHORT_TITLE, "tÃ­tulo demasiado corto"
 
         # Filtros de URL
         url_lower = url.lower()
@@ -358,7 +424,7 @@ class AsyncScraper:
         ]
 
         if any(pattern in url_lower for pattern in irrelevant_patterns):
-            return False, "patrÃ³n URL irrelevante"
+            return NegativeReason.IRRELEVANT_URL, "patrÃ³n URL irrelevante"
 
         # Verificar relaciÃ³n con keyword
         keyword_lower = keyword.lower()
@@ -366,9 +432,9 @@ class AsyncScraper:
         keyword_words = set(keyword_lower.split())
 
         if not keyword_words.intersection(title_words) and keyword_lower not in title.lower():
-            return False, "tÃ­tulo no relacionado con keyword"
+            return NegativeReason.UNRELATED_KEYWORD, "tÃ­tulo no relacionado con keyword"
 
-        return True, "vÃ¡lido para scraping"
+        return None, "vÃ¡lido para scraping"
 
     def validate_content_quality(self, title: str, body: Optional[str]) -> Tuple[bool, str]:
         """Validar calidad del contenido"""
@@ -516,7 +582,9 @@ class AsyncScraper:
     async def get_cache_stats(self) -> Dict[str, Any]:
         """Obtener estadísticas del sistema de caché"""
         try:
-            return self.cache_manager.get_stats()
+            stats = self.cache_manager.get_stats()
+            stats["negative_cache"] = self.negative_cache.get_stats()
+            return stats
         except Exception as e:
             log.warning(f"Error getting cache stats: {e}")
             return {}
@@ -532,6 +600,8 @@ class AsyncScraper:
                 self.cache_manager.url_cache.clear()
                 self.cache_manager.content_cache.clear()
                 self.cache_manager.intent_cache.clear()
+                self.cache_manager.negative_cache.clear()
+                self.cache_manager.discard_snapshot()
                 return True
             elif cache_type == 'url':
                 self.cache_manager.url_cache.clear()
@@ -542,6 +612,9 @@ class AsyncScraper:
             elif cache_type == 'intent':
                 self.cache_manager.intent_cache.clear()
                 return True
+            elif cache_type == 'negative':
+                self.cache_manager.negative_cache.clear()
+                return True
             else:
                 return False
         except Exception as e:
@@ -559,6 +632,9 @@ class AsyncScraper:
 
             if result and result.get('status') != 200:
                 log.warning(f"Scrapling scrape failed for {url}: {result.get('error', 'Unknown error')}")
+                status = result.get('status')
+                if isinstance(status, int) and status >= 400:
+                    await self.negative_cache.record(url, reason_for_status(status), detail=f"HTTP {status}")
                 return None
 
             # Extraer información del resultado de Scrapling
@@ -568,6 +644,7 @@ class AsyncScraper:
             title = result.get('title', '')
             if not title:
                 log.debug(f"No title found for {url}")
+                await self.negative_cache.record(url, NegativeReason.NO_TITLE)
                 return None
 
             # Usar el contenido como body
@@ -612,6 +689,7 @@ class AsyncScraper:
             is_valid, reason = self.validate_content_quality(title, body)
             if not is_valid:
                 log.debug(f"Contenido rechazado: {reason}")
+                await self.negative_cache.record(url, NegativeReason.LOW_QUALITY, detail=reason)
                 return None
 
             # Verificar duplicados
@@ -665,6 +743,12 @@ class AsyncScraper:
         # Procesar URLs concurrentemente
         tasks = []
         for url in urls[:scraping_config.max_per_keyword]:
+            # URLs fallidas o rechazadas en ciclos anteriores
+            skip_reason = await self.negative_cache.check(url, keyword)
+            if skip_reason:
+                log.debug(f"Saltando {url}: caché negativa ({skip_reason.value})")
+                continue
+
             # Filtrado bÃ¡sico antes de scraping
             try:
                 content = await self.fetch_url(url)
@@ -675,13 +759,15 @@ class AsyncScraper:
                     if title_elem:
                         title = title_elem.text().strip()
                         log.debug(f"Título encontrado: {title}")
-                        should_scrape, reason = self.should_scrape_detail(url, title, keyword)
-                        if should_scrape:
+                        rejection, reason = self.classify_detail(url, title, keyword)
+                        if rejection is None:
                             tasks.append(self.scrape_single_url(url, keyword))
                         else:
                             log.debug(f"Saltando {url}: {reason}")
+                            await self.negative_cache.record(url, rejection, keyword, detail=reason)
                     else:
                         log.debug(f"No se encontró título en {url}")
+                        await self.negative_cache.record(url, NegativeReason.NO_TITLE)
                 else:
                     log.debug(f"No se pudo obtener contenido de {url}")
             except Exception as e:
@@ -696,42 +782,63 @@ class AsyncScraper:
 
         return []
 
+    async def _append_to_ingest_log(self, posts: List[ScrapedPost]) -> List[Any]:
+        """Un registro por lote; si el lote no valida se reintenta post por post"""
+        try:
+            await get_ingest_log().append_async([post.to_dict() for post in posts])
+            return [True] * len(posts)
+        except ValueError:
+            results = []
+            for post in posts:
+                try:
+                    results.append(bool(await get_ingest_log().append_async([post.to_dict()])))
+                except ValueError as e:
+                    results.append(e)
+            return results
+
     async def save_posts(self, posts: List[ScrapedPost]) -> None:
         """Guardar posts en base de datos"""
         if not posts:
             return
 
-        # Guardar en lotes para mejor rendimiento
-        batch_size = MIN_BODY_LENGTH
-        for i in range(0, len(posts), batch_size):
-            batch = posts[i:i + batch_size]
-            for post in batch:
-                try:
-                    upsert_post(post.to_dict())
-
-                    # Alertas para leads de alto valor
-                    if (post.tag in ['dolor', 'busqueda'] and
-                        post.relevance_score >= scraping_config.high_value_threshold):
-                        alert_lead({
-                            "title": post.title or "",
-                            "body": post.body or "",
-                            "url": post.url,
-                            "keyword": post.keyword,
-                            "tag": post.tag,
-                            "score": post.relevance_score
-                        })
-
-                except Exception as e:
-                    log.error(f"Error guardando post {post.id}: {e}")
-
-        log.info(f"ðŸ’¾ Guardados {len(posts)} posts en base de datos")
+        if db_config.ingest_mode == "log":
+            # El loader de ingesta los pasa a SQLite; aquí solo se anexan al log local
+            results = await self._append_to_ingest_log(posts)
+        else:
+            # El writer agrupa las filas en transacciones y confirma tras el commit
+            results = await post_writer.write_many([post.to_dict() for post in posts])
+
+        saved = []
+        for post, result in zip(posts, results):
+            if isinstance(result, BaseException):
+                log.error(f"Error guardando post {post.id}: {result}")
+                continue
+            saved.append(post)
+
+            # Alertas para leads de alto valor
+            if (post.tag in ['dolor', 'busqueda'] and
+                post.relevance_score >= scraping_config.high_value_threshold):
+                alert_lead({
+                    "title": post.title or "",
+                    "body": post.body or "",
+                    "url": post.url,
+                    "keyword": post.keyword,
+                    "tag": post.tag,
+                    "score": post.relevance_score
+                })
+
+        # Leads a consumidores externos (Redis Stream), tras confirmar la escritura
+        if saved and lead_stream.enabled:
+            await lead_stream.publish(post.to_dict() for post in saved)
+
+        log.info(f"ðŸ’¾ Guardados {len(saved)}/{len(posts)} posts en base de datos")
 
     async def run_scraping_cycle(self) -> None:
         """Ejecutar un ciclo completo de scraping"""
         log.info("ðŸš€ Iniciando ciclo de scraping asÃ­ncrono")
 
-        # Inicializar base de datos
-        init_db()
+        # Inicializar base de datos (en los hilos de BD, sin bloquear el loop)
+        await async_db.init_db()
 
         # Configurar alertas
         auto_configure_alerts()
@@ -754,6 +861,18 @@ class AsyncScraper:
                 log.error(f"Error procesando keyword {keyword}: {e}")
 
         log.info(f"âœ… Ciclo de scraping completado. Total posts: {total_posts}")
+
+        neg = self.negative_cache.get_stats()
+        log.info(f"🚫 Caché negativa: {neg['hits']}/{neg['lookups']} URLs saltadas "
+                 f"({neg['hit_rate']}%), por motivo: {neg['hits_by_reason']}, "
+                 f"nuevas: {neg['recorded_by_reason']}")
+
+        # Desglose de caché por namespace/tier para dimensionar regiones
+        cache_metrics.log_summary(log)
+
+        lag = self.loop_monitor.get_stats()
+        log.info(f"⏱️ Event loop: lag medio {lag['avg_lag_ms']} ms, máximo {lag['max_lag_ms']} ms, "
+                 f"{lag['stalls']} bloqueos > {lag['warn_threshold_ms']} ms")
         alert_system_status("completed", f"Ciclo completado: {total_posts} posts procesados")
 
 
@@ -769,6 +888,14 @@ async def main():
 
     args = parser.parse_args()
 
+    # SIGTERM (docker stop) cancela la tarea principal para cerrar limpiamente
+    # y guardar el snapshot de la caché
+    try:
+        main_task = asyncio.current_task()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, main_task.cancel)
+    except (NotImplementedError, RuntimeError):
+        pass  # Windows: no hay add_signal_handler
+
     async with AsyncScraper() as scraper:
         if args.single_url:
             # Modo single URL
@@ -847,4 +974,7 @@ async def main():
 
 if (__name__ == '__main__'):
     # Ejecutar scraper asíncrono
-    asyncio.run(main())
\ No newline at end of file
+    try:
+        asyncio.run(main())
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        log.info("🛑 Scraper detenido")
\ No newline at end of file
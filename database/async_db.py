@@ -0,0 +1,95 @@
+"""
+Async Database Access for Aqxion Scraper
+Awaitable versions of database.db, run on dedicated DB threads
+
+SQLite calls are blocking; running them inside a coroutine freezes every
+in-flight fetch. Each function here submits the synchronous implementation
+to a small thread pool reserved for the database (its work queue is the
+request queue), so the event loop only awaits a future.
+
+Every database.db function that touches a database file has a wrapper,
+except:
+
+- context managers and generators (get_conn, get_read_conn,
+  get_day_read_conns, sharded_posts, iter_sharded_posts, iter_keyset,
+  iter_competitors, iter_competition_runs, iter_competition_analyses):
+  consume them inside one call, e.g. ``run_db(lambda: list(islice(...)))``;
+- pure helpers that never open a database (normalize_post, to_epoch, lima_*,
+  day_bucket_for, fts_query, categorize_service, normalize_domain, shard_path,
+  existing_shard_months, is_sealed_shard, posts_db_path, ...);
+- shard routing (route_posts, ensure_shard, shard_target), which only runs
+  on the writer thread (database.writer).
+"""
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from config.config_v2 import get_settings
+from database import db
+
+T = TypeVar("T")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Thread pool dedicated to database work (created on first use)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=get_settings().database.async_workers,
+                thread_name_prefix="db-async"
+            )
+        return _executor
+
+
+async def run_db(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking DB callable on the DB threads and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+
+
+def shutdown(wait: bool = True) -> None:
+    """Stop the DB threads (pending calls finish first when ``wait``)"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait)
+            _executor = None
+
+
+def _awaitable(func: Callable[..., T]) -> Callable[..., "asyncio.Future[T]"]:
+    @functools.wraps(func)
+    async def wrapper(*args: Any, **kwargs: Any) -> T:
+        return await run_db(func, *args, **kwargs)
+    return wrapper
+
+
+# ===== AWAITABLE database.db API =====
+
+init_db = _awaitable(db.init_db)
+migrate_db = _awaitable(db.migrate_db)
+upsert_post = _awaitable(db.upsert_post)
+upsert_posts = _awaitable(db.upsert_posts)
+search_posts = _awaitable(db.search_posts)
+search_competitors = _awaitable(db.search_competitors)
+browse_leads = _awaitable(db.browse_leads)
+rebuild_search_index = _awaitable(db.rebuild_search_index)
+keyset_page = _awaitable(db.keyset_page)
+
+init_competition_tables = _awaitable(db.init_competition_tables)
+save_competitor = _awaitable(db.save_competitor)
+load_competitors = _awaitable(db.load_competitors)
+page_competitors = _awaitable(db.page_competitors)
+get_competitor_history = _awaitable(db.get_competitor_history)
+save_competition_analysis = _awaitable(db.save_competition_analysis)
+load_competition_analysis = _awaitable(db.load_competition_analysis)
+get_competitor_market_stats = _awaitable(db.get_competitor_market_stats)
+start_competition_run = _awaitable(db.start_competition_run)
+update_competition_run = _awaitable(db.update_competition_run)
+get_competition_runs = _awaitable(db.get_competition_runs)
@@ -0,0 +1,450 @@
+"""
+Column Compression for Aqxion Scraper
+zstd compression of large text columns with dictionaries trained per source
+
+posts.body, competitors.description and market_scans.raw_data repeat a lot
+of per-site boilerplate. Values above ``compress_min_bytes`` are stored as a
+BLOB::
+
+    MAGIC (0xC7) | dictionary id (u32 BE, 0 = no dictionary) | zstd frame
+
+Short values stay plain TEXT, and so do the hot filter/index columns (id,
+tag, keyword, day_bucket, ...). Dictionaries are trained per group (the
+post's source domain, the competitor's domain, the scan's sensor type), kept
+in ``compression_dicts`` of the main database and never deleted, so every
+stored value can still be decoded after a retrain. Training samples and
+recompression cover posts in the main database and in every writable shard;
+sealed shards are read-only and keep the encoding they were sealed with.
+
+Reads decompress only on access: Python readers call decompress_value(),
+SQL uses ``zdecompress(col)``, which register_sql_functions() adds to every
+connection opened through connect() or the pools (the FTS indexes read
+through it as well). A bare sqlite3.connect() can read plain columns, but
+any write to posts or competitors fails with "no such function:
+zdecompress" because the FTS triggers call it.
+
+zstandard is optional; without it (or with DB_COMPRESS_TEXT=false) values
+are written uncompressed, and reading a compressed value raises
+CompressionError.
+
+Usage:
+    python -m database.compression train [--column posts.body] [--retrain]
+    python -m database.compression stats
+"""
+
+import argparse
+import sqlite3
+import struct
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+try:
+    import zstandard as zstd
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+from config.config_v2 import get_db_path, get_settings
+
+log = logging.getLogger("db_compression")
+
+COMPRESSED_MAGIC = 0xC7
+HEADER = struct.Struct(">BI")  # magic, dictionary id
+NO_DICTIONARY = 0
+
+DICTS_DDL = """
+CREATE TABLE IF NOT EXISTS compression_dicts(
+  id INTEGER PRIMARY KEY,
+  column_key TEXT NOT NULL,    -- 'posts.body'
+  group_key TEXT NOT NULL,     -- dominio / sensor
+  dict_data BLOB NOT NULL,
+  samples INTEGER NOT NULL,
+  active INTEGER NOT NULL DEFAULT 1,
+  trained_at TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_compression_dicts_active
+  ON compression_dicts(column_key, group_key) WHERE active = 1;
+"""
+
+
+class CompressionError(ValueError):
+    """Raised when a stored value cannot be decompressed"""
+    pass
+
+
+@dataclass(frozen=True)
+class CompressedColumn:
+    """A column stored compressed, with the column that picks its dictionary"""
+    table: str
+    column: str
+    group_column: str
+
+    @property
+    def key(self) -> str:
+        return f"{self.table}.{self.column}"
+
+
+COMPRESSED_COLUMNS: Dict[str, CompressedColumn] = {
+    c.key: c for c in (
+        CompressedColumn("posts", "body", "source"),
+        CompressedColumn("competitors", "description", "domain"),
+        CompressedColumn("market_scans", "raw_data", "sensor_type"),
+    )
+}
+
+
+def compression_enabled() -> bool:
+    return ZSTD_AVAILABLE and get_settings().database.compress_text
+
+
+def is_compressed(value: Any) -> bool:
+    return isinstance(value, (bytes, bytearray, memoryview)) and len(value) > HEADER.size \
+        and value[0] == COMPRESSED_MAGIC
+
+
+# ===== DICTIONARIES =====
+
+class _DictionaryRegistry:
+    """Dictionaries of the main database, cached per process.
+
+    zstd (de)compressor objects are not thread-safe, so each thread keeps
+    its own per dictionary id.
+    """
+
+    def __init__(self, refresh_interval: float = 300.0):
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._active: Dict[Tuple[str, str], int] = {}
+        self._dicts: Dict[int, Any] = {}
+        self._loaded_at = 0.0
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        return connect(get_db_path(), read_only=True)
+
+    def _refresh(self) -> None:
+        try:
+            conn = self._connect()
+        except sqlite3.Error:
+            return
+        try:
+            active = {(column_key, group_key): dict_id for dict_id, column_key, group_key in conn.execute(
+                "SELECT id, column_key, group_key FROM compression_dicts WHERE active = 1")}
+        except sqlite3.Error:
+            active = {}  # tabla aún no creada
+        finally:
+            conn.close()
+        with self._lock:
+            self._active = active
+            self._loaded_at = time.monotonic()
+
+    def active_id(self, column_key: str, group: Optional[str]) -> int:
+        if time.monotonic() - self._loaded_at > self.refresh_interval:
+            self._refresh()
+        return self._active.get((column_key, group or ""), NO_DICTIONARY)
+
+    def dictionary(self, dict_id: int) -> Any:
+        data = self._dicts.get(dict_id)
+        if data is None:
+            conn = self._connect()
+            try:
+                row = conn.execute("SELECT dict_data FROM compression_dicts WHERE id = ?",
+                                   (dict_id,)).fetchone()
+            finally:
+                conn.close()
+            if row is None:
+                raise CompressionError(f"Diccionario zstd {dict_id} no encontrado")
+            data = zstd.ZstdCompressionDict(row[0])
+            with self._lock:
+                self._dicts[dict_id] = data
+        return data
+
+    def compressor(self, dict_id: int) -> Any:
+        cache = self._local.__dict__.setdefault("compressors", {})
+        compressor = cache.get(dict_id)
+        if compressor is None:
+            level = get_settings().database.compress_level
+            if dict_id == NO_DICTIONARY:
+                compressor = zstd.ZstdCompressor(level=level)
+            else:
+                compressor = zstd.ZstdCompressor(level=level, dict_data=self.dictionary(dict_id))
+            cache[dict_id] = compressor
+        return compressor
+
+    def decompressor(self, dict_id: int) -> Any:
+        cache = self._local.__dict__.setdefault("decompressors", {})
+        decompressor = cache.get(dict_id)
+        if decompressor is None:
+            if dict_id == NO_DICTIONARY:
+                decompressor = zstd.ZstdDecompressor()
+            else:
+                decompressor = zstd.ZstdDecompressor(dict_data=self.dictionary(dict_id))
+            cache[dict_id] = decompressor
+        return decompressor
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded_at = 0.0
+        self._local = threading.local()
+
+
+_registry = _DictionaryRegistry()
+
+
+# ===== VALUES =====
+
+def compress_value(column_key: str, group: Optional[str], value: Any) -> Any:
+    """Stored form of ``value``: a compressed BLOB, or the value itself when
+    it is short, not text, or compression is off/not worth it"""
+    if not isinstance(value, str) or not compression_enabled():
+        return value
+    raw = value.encode("utf-8")
+    if len(raw) < get_settings().database.compress_min_bytes:
+        return value
+
+    dict_id = _registry.active_id(column_key, group)
+    blob = HEADER.pack(COMPRESSED_MAGIC, dict_id) + _registry.compressor(dict_id).compress(raw)
+    return blob if len(blob) < len(raw) else value
+
+
+def decompress_value(value: Any) -> Any:
+    """Original text of a stored value (plain values are returned unchanged)"""
+    if not is_compressed(value):
+        return value
+    if not ZSTD_AVAILABLE:
+        raise CompressionError("Valor comprimido con zstd y el paquete zstandard no está instalado")
+    _, dict_id = HEADER.unpack_from(value)
+    try:
+        return _registry.decompressor(dict_id).decompress(bytes(value[HEADER.size:])).decode("utf-8")
+    except zstd.ZstdError as e:
+        raise CompressionError(f"No se pudo descomprimir (diccionario {dict_id}): {e}")
+
+
+def compress_row(row: Dict[str, Any], column_key: str) -> Dict[str, Any]:
+    """Copy of ``row`` with the compressed column encoded for storage"""
+    spec = COMPRESSED_COLUMNS[column_key]
+    value = row.get(spec.column)
+    stored = compress_value(column_key, row.get(spec.group_column), value)
+    if stored is value:
+        return row
+    return {**row, spec.column: stored}
+
+
+def register_sql_functions(conn: sqlite3.Connection) -> None:
+    """zdecompress(col) for SQL readers, FTS triggers and content views"""
+    conn.create_function("zdecompress", 1, decompress_value, deterministic=True)
+
+
+def connect(path: Path, read_only: bool = False, **kwargs: Any) -> sqlite3.Connection:
+    """sqlite3.connect() with the SQL functions the schema needs (zdecompress)"""
+    if read_only:
+        conn = sqlite3.connect(f"{Path(path).resolve().as_uri()}?mode=ro", uri=True, **kwargs)
+    else:
+        conn = sqlite3.connect(str(path), **kwargs)
+    register_sql_functions(conn)
+    return conn
+
+
+# ===== TRAINING =====
+
+def ensure_dictionary_table(conn: sqlite3.Connection) -> None:
+    for statement in DICTS_DDL.strip().split(";"):
+        if statement.strip():
+            conn.execute(statement)
+
+
+def _source_paths(spec: CompressedColumn, include_sealed: bool = False) -> List[Path]:
+    """Files holding ``spec.table``: posts live in the main database and each
+    shard. Sealed shards are read-only and keep their encoding, so they are
+    left out unless ``include_sealed``."""
+    from database.db import is_sealed_shard, posts_db_paths
+
+    if spec.table != "posts":
+        return [Path(get_db_path())]
+    return [path for path in posts_db_paths() if include_sealed or not is_sealed_shard(path)]
+
+
+def _has_table(conn: sqlite3.Connection, table: str) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                        (table,)).fetchone() is not None
+
+
+def train_dictionaries(column_key: str, retrain: bool = False,
+                       min_samples: Optional[int] = None) -> Dict[str, int]:
+    """Train a dictionary per group with enough rows; returns {group: dictionary id}
+
+    Samples come from every file holding the table, newest shard first; the
+    dictionaries are stored in the main database.
+    """
+    if not ZSTD_AVAILABLE:
+        raise CompressionError("Entrenar diccionarios requiere el paquete zstandard")
+    from contextlib import ExitStack
+    from database.db import get_conn
+    from database.pool import get_pool
+
+    spec = COMPRESSED_COLUMNS[column_key]
+    db_settings = get_settings().database
+    min_samples = min_samples or db_settings.compress_dict_min_samples
+    trained = {}
+
+    with get_conn() as c, ExitStack() as stack:
+        ensure_dictionary_table(c)
+        c.commit()
+        sources = [stack.enter_context(get_pool(path, read_only=True).connection())
+                   for path in reversed(_source_paths(spec))]
+        sources = [source for source in sources if _has_table(source, spec.table)]
+        if not sources:
+            return trained
+
+        existing = {group for (group,) in c.execute(
+            "SELECT group_key FROM compression_dicts WHERE column_key = ? AND active = 1", (column_key,))}
+        counts: Dict[str, int] = {}
+        for source in sources:
+            for group, count in source.execute(f"""
+                SELECT {spec.group_column}, COUNT(*) FROM {spec.table}
+                WHERE {spec.column} IS NOT NULL AND {spec.group_column} IS NOT NULL
+                GROUP BY {spec.group_column}
+            """):
+                counts[group] = counts.get(group, 0) + count
+        groups = [group for group, count in counts.items() if count >= min_samples]
+
+        for group in groups:
+            if group in existing and not retrain:
+                continue
+            samples = []
+            for source in sources:
+                remaining = db_settings.compress_dict_max_samples - len(samples)
+                if remaining <= 0:
+                    break
+                samples += [decompress_value(value) for (value,) in source.execute(f"""
+                    SELECT {spec.column} FROM {spec.table}
+                    WHERE {spec.group_column} = ? AND {spec.column} IS NOT NULL
+                    ORDER BY rowid DESC LIMIT ?
+                """, (group, remaining))]
+            samples = [s.encode("utf-8") for s in samples if isinstance(s, str) and s]
+            try:
+                dictionary = zstd.train_dictionary(db_settings.compress_dict_size, samples)
+            except zstd.ZstdError as e:
+                log.warning(f"⚠️ No se pudo entrenar el diccionario de {column_key}/{group}: {e}")
+                continue
+
+            c.execute("BEGIN IMMEDIATE")
+            c.execute("UPDATE compression_dicts SET active = 0 WHERE column_key = ? AND group_key = ?",
+                      (column_key, group))
+            cursor = c.execute("""
+                INSERT INTO compression_dicts (column_key, group_key, dict_data, samples, trained_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, (column_key, group, dictionary.as_bytes(), len(samples), datetime.now().isoformat()))
+            c.commit()
+            trained[group] = cursor.lastrowid
+
+    _registry.invalidate()
+    return trained
+
+
+def recompress(column_key: str, batch_size: int = 500) -> Dict[str, int]:
+    """Re-encode stored values with the current settings and active dictionaries,
+    in the main database and every writable posts shard"""
+    from database.pool import get_pool
+
+    spec = COMPRESSED_COLUMNS[column_key]
+    _registry.invalidate()
+    stats = {"rows": 0, "bytes_before": 0, "bytes_after": 0}
+
+    for path in _source_paths(spec):
+        with get_pool(path).connection() as c:
+            if _has_table(c, spec.table):
+                _recompress_table(c, spec, batch_size, stats)
+    return stats
+
+
+def _recompress_table(c: sqlite3.Connection, spec: CompressedColumn, batch_size: int,
+                      stats: Dict[str, int]) -> None:
+    last_rowid = 0
+    while True:
+        rows = c.execute(f"""
+            SELECT rowid, {spec.column}, {spec.group_column} FROM {spec.table}
+            WHERE rowid > ? AND {spec.column} IS NOT NULL ORDER BY rowid LIMIT ?
+        """, (last_rowid, batch_size)).fetchall()
+        if not rows:
+            break
+        updates = []
+        for rowid, stored, group in rows:
+            value = compress_value(spec.key, group, decompress_value(stored))
+            stats["bytes_before"] += len(stored) if stored is not None else 0
+            stats["bytes_after"] += len(value.encode("utf-8") if isinstance(value, str) else value)
+            if value != stored:
+                updates.append((value, rowid))
+        c.execute("BEGIN IMMEDIATE")
+        c.executemany(f"UPDATE {spec.table} SET {spec.column} = ? WHERE rowid = ?", updates)
+        c.commit()
+        stats["rows"] += len(updates)
+        last_rowid = rows[-1][0]
+
+
+def column_stats(conn: sqlite3.Connection, column_key: str) -> Dict[str, Any]:
+    spec = COMPRESSED_COLUMNS[column_key]
+    if not _has_table(conn, spec.table):
+        return {"column": column_key, "missing": True}
+    total, compressed, stored_bytes = conn.execute(f"""
+        SELECT COUNT({spec.column}),
+               SUM(typeof({spec.column}) = 'blob'),
+               COALESCE(SUM(LENGTH(CAST({spec.column} AS BLOB))), 0)
+        FROM {spec.table}
+    """).fetchone()
+    return {"column": column_key, "values": total, "compressed": compressed or 0,
+            "stored_bytes": stored_bytes}
+
+
+def total_column_stats(column_key: str) -> Dict[str, Any]:
+    """column_stats() summed over every file holding the column (sealed shards included)"""
+    from database.pool import get_pool
+
+    totals: Dict[str, Any] = {"column": column_key, "missing": True}
+    for path in _source_paths(COMPRESSED_COLUMNS[column_key], include_sealed=True):
+        with get_pool(path, read_only=True).connection() as c:
+            stats = column_stats(c, column_key)
+        if stats.get("missing"):
+            continue
+        if totals.pop("missing", False):
+            totals.update(values=0, compressed=0, stored_bytes=0)
+        for key in ("values", "compressed", "stored_bytes"):
+            totals[key] += stats[key]
+    return totals
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compresión zstd de columnas de texto")
+    parser.add_argument("command", choices=["train", "stats"])
+    parser.add_argument("--column", choices=sorted(COMPRESSED_COLUMNS), action="append",
+                        help="Columna (repetible; por defecto todas)")
+    parser.add_argument("--retrain", action="store_true", help="Reentrenar grupos que ya tienen diccionario")
+    args = parser.parse_args(argv)
+    columns = args.column or list(COMPRESSED_COLUMNS)
+
+    if args.command == "train":
+        for column_key in columns:
+            trained = train_dictionaries(column_key, retrain=args.retrain)
+            result = recompress(column_key)
+            saved = result["bytes_before"] - result["bytes_after"]
+            print(f"🗜️  {column_key}: {len(trained)} diccionarios, {result['rows']} filas recomprimidas, "
+                  f"{saved / 1024:.0f} KB ahorrados")
+        return 0
+
+    for column_key in columns:
+        stats = total_column_stats(column_key)
+        if stats.get("missing"):
+            continue
+        print(f"{column_key}: {stats['values']} valores, {stats['compressed']} comprimidos, "
+              f"{stats['stored_bytes'] / 1024 / 1024:.1f} MB almacenados")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
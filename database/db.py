@@ -1,8 +1,15 @@
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple, Callable, Iterator, Sequence
+import heapq
 import sqlite3
-from contextlib import contextmanager
+from collections.abc import Mapping
+from contextlib import ExitStack, contextmanager
+from itertools import islice
+from datetime import date, datetime, timedelta, timezone
 from pathlib import Path
-from config.config_v2 import get_db_path
+from config.config_v2 import get_db_path, get_settings
+from database.compression import compress_row, decompress_value
+from database.pool import get_pool
+from utils.codec import to_json, from_json
 
 DDL = """
 CREATE TABLE IF NOT EXISTS posts (
@@ -16,32 +23,337 @@ CREATE TABLE IF NOT EXISTS posts (
     keyword TEXT,
     tag TEXT,
     published_at TEXT,
-    relevance_score INTEGER DEFAULT 0
+    relevance_score INTEGER DEFAULT 0,
+    created_epoch INTEGER,  -- created_at en segundos UTC
+    day_bucket INTEGER      -- día local de Lima como YYYYMMDD
 );
 CREATE INDEX IF NOT EXISTS idx_posts_created_at ON posts(created_at);
-CREATE INDEX IF NOT EXISTS idx_posts_tag ON posts(tag);
-CREATE INDEX IF NOT EXISTS idx_posts_keyword ON posts(keyword);
 CREATE INDEX IF NOT EXISTS idx_posts_published ON posts(published_at);
-CREATE INDEX IF NOT EXISTS idx_posts_score ON posts(relevance_score);
 CREATE INDEX IF NOT EXISTS idx_posts_tag_created_at ON posts(tag, created_at);
 CREATE INDEX IF NOT EXISTS idx_posts_url ON posts(url);
 CREATE INDEX IF NOT EXISTS idx_posts_keyword_created_at ON posts(keyword, created_at);
-CREATE INDEX IF NOT EXISTS idx_posts_relevance_score ON posts(relevance_score DESC);
 """
 
+# Índices cubrientes del explorador de leads: orden (relevance_score,
+# created_at, id) con y sin filtro de igualdad; incluyen las demás columnas
+# filtrables para resolver la página sin leer la tabla. Reemplazan a los
+# índices simples por tag, keyword y score, que son prefijos suyos.
+LEAD_INDEX_DDL = """
+CREATE INDEX IF NOT EXISTS idx_posts_lead_score ON posts(relevance_score, created_at, id, tag, keyword, source);
+CREATE INDEX IF NOT EXISTS idx_posts_lead_tag ON posts(tag, relevance_score, created_at, id, keyword, source);
+CREATE INDEX IF NOT EXISTS idx_posts_lead_keyword ON posts(keyword, relevance_score, created_at, id, tag, source);
+CREATE INDEX IF NOT EXISTS idx_posts_lead_source ON posts(source, relevance_score, created_at, id, tag, keyword);
+DROP INDEX IF EXISTS idx_posts_tag;
+DROP INDEX IF EXISTS idx_posts_keyword;
+DROP INDEX IF EXISTS idx_posts_score;
+DROP INDEX IF EXISTS idx_posts_relevance_score;
+"""
+
+# Índices sobre las columnas de tiempo; se crean después de migrar tablas antiguas
+TIME_INDEX_DDL = """
+CREATE INDEX IF NOT EXISTS idx_posts_day_tag_keyword_score ON posts(day_bucket, tag, keyword, relevance_score);
+CREATE INDEX IF NOT EXISTS idx_posts_day_epoch ON posts(day_bucket, created_epoch);
+CREATE INDEX IF NOT EXISTS idx_posts_created_epoch ON posts(created_epoch);
+"""
+
+# ===== COLUMNAS DE TIEMPO (epoch UTC + día local de Lima) =====
+
+# Lima no tiene horario de verano: UTC-5 todo el año
+LIMA_UTC_OFFSET = timedelta(hours=-5)
+LIMA_TZ = timezone(LIMA_UTC_OFFSET, "America/Lima")
+
+# Backfill en SQL: strftime interpreta created_at sin zona como UTC
+_BACKFILL_TIME_COLUMNS_SQL = """
+UPDATE posts
+SET created_epoch = CAST(strftime('%s', created_at) AS INTEGER),
+    day_bucket = CAST(strftime('%Y%m%d', created_at, '-5 hours') AS INTEGER)
+WHERE created_epoch IS NULL OR day_bucket IS NULL
+"""
+
+def to_epoch(timestamp: Optional[str]) -> Optional[int]:
+    """ISO 8601 (sin zona = UTC) a segundos epoch"""
+    if not timestamp:
+        return None
+    try:
+        parsed = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+def lima_day_bucket(epoch: Optional[int] = None) -> int:
+    """Día local de Lima (YYYYMMDD) de un epoch; por defecto, hoy"""
+    moment = datetime.now(LIMA_TZ) if epoch is None else datetime.fromtimestamp(epoch, LIMA_TZ)
+    return moment.year * 10000 + moment.month * 100 + moment.day
+
+def day_bucket_for(day: date) -> int:
+    """date -> YYYYMMDD"""
+    return day.year * 10000 + day.month * 100 + day.day
+
+def lima_today() -> date:
+    return datetime.now(LIMA_TZ).date()
+
+def lima_day_range(day: date) -> Tuple[int, int]:
+    """[inicio, fin) en epoch UTC de un día local de Lima"""
+    start = datetime(day.year, day.month, day.day, tzinfo=LIMA_TZ)
+    return int(start.timestamp()), int((start + timedelta(days=1)).timestamp())
+
+def _ensure_time_columns(c: sqlite3.Connection) -> int:
+    """Agrega created_epoch/day_bucket a tablas antiguas, rellena filas y crea índices"""
+    columns = {row[1] for row in c.execute("PRAGMA table_info(posts)")}
+    if 'created_epoch' not in columns:
+        c.execute("ALTER TABLE posts ADD COLUMN created_epoch INTEGER")
+    if 'day_bucket' not in columns:
+        c.execute("ALTER TABLE posts ADD COLUMN day_bucket INTEGER")
+
+    backfilled = c.execute(_BACKFILL_TIME_COLUMNS_SQL).rowcount
+    c.executescript(TIME_INDEX_DDL)
+    c.commit()
+    return backfilled
+
 @contextmanager
 def get_conn():
-    conn = sqlite3.connect(str(get_db_path()))
-    conn.execute("PRAGMA journal_mode=WAL;")
-    conn.execute("PRAGMA synchronous=NORMAL;")
-    yield conn
-    conn.close()
+    """Conexión del pool (PRAGMAs según DatabaseSettings); se devuelve al salir"""
+    with get_pool().connection() as conn:
+        yield conn
+
+@contextmanager
+def get_read_conn():
+    """Conexión de solo lectura para dashboards y analítica"""
+    with get_pool(read_only=True).connection() as conn:
+        yield conn
+
+POST_COLUMNS = ('id', 'source', 'url', 'title', 'body', 'lang', 'created_at',
+                'keyword', 'tag', 'published_at', 'relevance_score',
+                'created_epoch', 'day_bucket')
+
+def _init_posts_schema(c: sqlite3.Connection) -> None:
+    """Tabla posts con columnas de tiempo, rollups e índice full-text.
+
+    Los triggers FTS usan zdecompress(): ``c`` debe venir de
+    database.compression.connect() o de un pool (ver _search_index_ddl).
+    """
+    # Import diferido: database.rollups depende de este módulo
+    from database.rollups import ensure_rollups
+
+    c.executescript(DDL)
+    _ensure_time_columns(c)
+    c.executescript(LEAD_INDEX_DDL)
+    ensure_rollups(c)
+    _ensure_search_index(c, 'posts_fts')
 
 def init_db():
     with get_conn() as c:
-        c.executescript(DDL)
+        _init_posts_schema(c)
+    if sharding_enabled():
+        ensure_shard(current_shard_month())
 
-def upsert_post(p):
+# ===== SHARDS MENSUALES DE POSTS =====
+
+# Con DatabaseSettings.shard_posts los posts nuevos van a una base por mes
+# (shard_dir/posts_YYYYMM.db, mes local de Lima). La base principal conserva
+# el resto de tablas y los posts anteriores a activar el sharding; las
+# lecturas por rango unen main.posts con los shards del rango vía ATTACH.
+
+_initialized_shards: set = set()
+
+def sharding_enabled() -> bool:
+    return get_settings().database.shard_posts
+
+def shard_month(day_bucket: int) -> int:
+    """YYYYMMDD -> YYYYMM"""
+    return day_bucket // 100
+
+def current_shard_month() -> int:
+    return shard_month(lima_day_bucket())
+
+def add_months(month: int, delta: int) -> int:
+    year, index = divmod(month // 100 * 12 + month % 100 - 1 + delta, 12)
+    return year * 100 + index + 1
+
+def shard_path(month: int) -> Path:
+    return Path(get_settings().database.shard_dir) / f"posts_{month}.db"
+
+def existing_shard_months() -> List[int]:
+    shard_dir = Path(get_settings().database.shard_dir)
+    months = []
+    for path in shard_dir.glob("posts_*.db"):
+        suffix = path.stem.split('_', 1)[1]
+        if suffix.isdigit() and len(suffix) == 6:
+            months.append(int(suffix))
+    return sorted(months)
+
+def is_sealed_shard(path: Path) -> bool:
+    """Los shards sellados (database.shards seal) no tienen bits de escritura.
+
+    Se miran los bits y no os.access() porque en el contenedor corremos como root.
+    """
+    return path.exists() and not path.stat().st_mode & 0o222
+
+def ensure_shard(month: int) -> Path:
+    """Crea (una vez por proceso) el esquema de posts en el shard del mes"""
+    path = shard_path(month)
+    if month not in _initialized_shards:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with get_pool(path).connection() as c:
+            _init_posts_schema(c)
+        _initialized_shards.add(month)
+    return path
+
+# Mes de ruta para posts que van a la base principal
+MAIN_SHARD = 0
+
+def shard_target(month: int) -> Path:
+    """Base donde escribir los posts de un mes de route_posts()"""
+    return Path(get_db_path()) if month == MAIN_SHARD else ensure_shard(month)
+
+def route_posts(rows: List[Dict[str, Any]]) -> Dict[int, List[Dict[str, Any]]]:
+    """Agrupa filas normalizadas por mes de shard.
+
+    Un post que ya existe en el shard del mes anterior se sigue actualizando
+    ahí (created_at se conserva), así un re-scrapeo a inicio de mes no lo duplica.
+    Los posts de meses ya sellados van a la base principal (MAIN_SHARD), que
+    siempre participa en las lecturas por rango.
+    """
+    current = current_shard_month()
+    previous = add_months(current, -1)
+    routes: Dict[int, List[Dict[str, Any]]] = {}
+    for row in rows:
+        month = shard_month(row['day_bucket']) if row['day_bucket'] else current
+        if month != current and is_sealed_shard(shard_path(month)):
+            month = MAIN_SHARD
+        routes.setdefault(month, []).append(row)
+
+    previous_path = shard_path(previous)
+    if routes.get(current) and previous_path.exists() and not is_sealed_shard(previous_path):
+        ids = [row['id'] for row in routes[current]]
+        with get_pool(previous_path).connection() as c:
+            found = set()
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                found.update(r[0] for r in c.execute(
+                    f"SELECT id FROM posts WHERE id IN ({', '.join('?' for _ in chunk)})", chunk))
+        if found:
+            routes.setdefault(previous, []).extend(r for r in routes[current] if r['id'] in found)
+            routes[current] = [r for r in routes[current] if r['id'] not in found]
+    return {month: group for month, group in routes.items() if group}
+
+def _shard_uri(path: Path) -> str:
+    uri = f"{path.resolve().as_uri()}?mode=ro"
+    # Sellado = inmutable: sin locks ni -wal/-shm
+    return uri + "&immutable=1" if is_sealed_shard(path) else uri
+
+def _shard_months(since: Optional[date], until: Optional[date]) -> List[int]:
+    """Meses con shard existente dentro de [since, until]"""
+    if not sharding_enabled():
+        return []
+    first = shard_month(day_bucket_for(since)) if since else 0
+    last = shard_month(day_bucket_for(until)) if until else 999999
+    return [m for m in existing_shard_months() if first <= m <= last]
+
+@contextmanager
+def _attached_shards(c: sqlite3.Connection, months: List[int]):
+    """Adjunta (solo lectura) los shards de ``months`` y devuelve sus alias"""
+    attached = []
+    try:
+        for month in months:
+            alias = f"shard_{month}"
+            c.execute(f"ATTACH DATABASE ? AS {alias}", (_shard_uri(shard_path(month)),))
+            attached.append(alias)
+        yield attached
+    finally:
+        for alias in attached:
+            c.execute(f"DETACH DATABASE {alias}")
+
+@contextmanager
+def sharded_posts(since: Optional[date] = None, until: Optional[date] = None):
+    """Conexión de lectura con los shards del rango adjuntos (ATTACH, solo lectura).
+
+    Devuelve (conexión, esquemas): 'main' más un alias por shard cuyo mes cae
+    en [since, until]. Usar posts_union_sql() para consultar todos a la vez.
+    Si el rango tiene más shards que SQLITE_LIMIT_ATTACHED lanza ValueError;
+    para rangos abiertos usar iter_sharded_posts().
+    """
+    with get_read_conn() as c:
+        months = _shard_months(since, until)
+        limit = c.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+        if len(months) > limit:
+            raise ValueError(f"El rango abarca {len(months)} shards; SQLite permite adjuntar {limit}")
+        with _attached_shards(c, months) as aliases:
+            yield c, ['main'] + aliases
+
+def iter_sharded_posts(since: Optional[date] = None, until: Optional[date] = None):
+    """Como sharded_posts() pero sin tope de shards: los del rango se adjuntan
+    en tandas que caben en SQLITE_LIMIT_ATTACHED, del más reciente al más antiguo.
+
+    Genera (conexión, esquemas) por tanda ('main' va en la primera); quien
+    llama ejecuta la consulta en cada tanda y combina los resultados.
+    """
+    with get_read_conn() as c:
+        months = _shard_months(since, until)[::-1]
+        size = c.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+        batches = [months[start:start + size] for start in range(0, len(months), size)] or [[]]
+        for index, batch in enumerate(batches):
+            with _attached_shards(c, batch) as aliases:
+                yield c, (['main'] if index == 0 else []) + aliases
+
+def posts_union_sql(schemas: List[str], columns: Tuple[str, ...] = POST_COLUMNS,
+                    where: str = "") -> str:
+    """Subconsulta UNION ALL de posts sobre varios esquemas; ``where`` se aplica en cada rama"""
+    cols = ', '.join(columns)
+    clause = f" WHERE {where}" if where else ""
+    return " UNION ALL ".join(f"SELECT {cols} FROM {schema}.posts{clause}" for schema in schemas)
+
+def posts_db_path(day_bucket: Optional[int] = None) -> Path:
+    """Archivo que contiene los posts de un día (hoy por defecto): su shard o la base principal"""
+    if sharding_enabled():
+        path = shard_path(shard_month(day_bucket or lima_day_bucket()))
+        if path.exists():
+            return path
+    return Path(get_db_path())
+
+def day_posts_db_paths(day_bucket: Optional[int] = None) -> List[Path]:
+    """Archivos que pueden tener posts de un día: posts_db_path() y, si es otro, la base principal.
+
+    La principal conserva los posts anteriores al sharding y recibe los de
+    meses sellados (route_posts), así que las lecturas de un día la suman.
+    """
+    path = posts_db_path(day_bucket)
+    main = Path(get_db_path())
+    return [path] if path == main else [path, main]
+
+def posts_db_paths() -> List[Path]:
+    """Todos los archivos con posts: la base principal y cada shard existente"""
+    paths = [Path(get_db_path())]
+    if sharding_enabled():
+        paths += [shard_path(month) for month in existing_shard_months()]
+    return paths
+
+@contextmanager
+def get_day_read_conns(day_bucket: Optional[int] = None):
+    """Conexiones de solo lectura a cada archivo con posts de un día (hoy por defecto)"""
+    with ExitStack() as stack:
+        yield [stack.enter_context(get_pool(path, read_only=True).connection())
+               for path in day_posts_db_paths(day_bucket)]
+
+
+# Columnas que se actualizan cuando el post ya existe. created_at conserva la
+# primera vez que se vio el post; la cláusula WHERE evita reescribir filas
+# (y sus índices) cuando nada cambió.
+_UPDATABLE_POST_COLUMNS = ('source', 'url', 'title', 'body', 'lang', 'keyword',
+                           'tag', 'published_at', 'relevance_score')
+
+UPSERT_POST_SQL = f"""
+INSERT INTO posts({', '.join(POST_COLUMNS)})
+VALUES({', '.join(':' + col for col in POST_COLUMNS)})
+ON CONFLICT(id) DO UPDATE SET
+    {', '.join(f'{col} = excluded.{col}' for col in _UPDATABLE_POST_COLUMNS)}
+WHERE {' OR '.join(f'posts.{col} IS NOT excluded.{col}' for col in _UPDATABLE_POST_COLUMNS)}
+"""
+
+def normalize_post(p):
+    """Valida un post y devuelve un dict con todas las columnas de posts"""
     # Validación de tipos y valores requeridos
     if not isinstance(p, dict):
         raise ValueError("El parámetro 'p' debe ser un diccionario")
@@ -64,27 +376,51 @@ def upsert_post(p):
     if not isinstance(p['created_at'], str) or not p['created_at'].strip():
         raise ValueError("El campo 'created_at' debe ser una cadena no vacía")
     
+    row = {col: p.get(col) for col in POST_COLUMNS}
+
     # Campos opcionales - asegurar que sean strings o None
     optional_fields = ['title', 'body', 'lang', 'keyword', 'tag', 'published_at']
     for field in optional_fields:
-        if field in p and p[field] is not None and not isinstance(p[field], str):
-            p[field] = str(p[field])
+        if row[field] is not None and not isinstance(row[field], str):
+            row[field] = str(row[field])
     
     # Asegurar que relevance_score sea un entero
-    if 'relevance_score' in p:
-        p['relevance_score'] = int(p.get('relevance_score', 0))
-    else:
-        p['relevance_score'] = 0
-    
+    row['relevance_score'] = int(row['relevance_score'] or 0)
+
+    # Columnas de tiempo indexables (derivadas de created_at)
+    row['created_epoch'] = to_epoch(row['created_at'])
+    row['day_bucket'] = lima_day_bucket(row['created_epoch']) if row['created_epoch'] is not None else None
+    return row
+
+def post_storage_rows(rows: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Posts normalizados con body comprimido para escribirlos en la tabla"""
+    return [compress_row(row, 'posts.body') for row in rows]
+
+def upsert_posts(posts, conn: Optional[sqlite3.Connection] = None) -> int:
+    """Inserta/actualiza varios posts en una sola transacción (executemany)"""
+    rows = post_storage_rows([normalize_post(p) for p in posts])
+    if not rows:
+        return 0
+
     try:
-        with get_conn() as c:
-            c.execute("""
-            INSERT OR REPLACE INTO posts(id, source, url, title, body, lang, created_at, keyword, tag, published_at, relevance_score)
-            VALUES(:id, :source, :url, :title, :body, :lang, :created_at, :keyword, :tag, :published_at, :relevance_score)
-            """, p)
-            c.commit()
+        if conn is not None:
+            with conn:
+                conn.executemany(UPSERT_POST_SQL, rows)
+        elif sharding_enabled():
+            for month, group in route_posts(rows).items():
+                with get_pool(shard_target(month)).connection() as c:
+                    c.executemany(UPSERT_POST_SQL, group)
+                    c.commit()
+        else:
+            with get_conn() as c:
+                c.executemany(UPSERT_POST_SQL, rows)
+                c.commit()
     except sqlite3.Error as e:
-        raise Exception(f"Error al insertar post en base de datos: {e}")
+        raise Exception(f"Error al insertar posts en base de datos: {e}")
+    return len(rows)
+
+def upsert_post(p):
+    upsert_posts([p])
 
 def migrate_db():
     """Aplica migraciones pendientes a la base de datos"""
@@ -100,7 +436,6 @@ def migrate_db():
         indices = [
             "CREATE INDEX IF NOT EXISTS idx_posts_url ON posts(url)",
             "CREATE INDEX IF NOT EXISTS idx_posts_keyword_created_at ON posts(keyword, created_at)",
-            "CREATE INDEX IF NOT EXISTS idx_posts_relevance_score ON posts(relevance_score DESC)",
             "CREATE INDEX IF NOT EXISTS idx_posts_tag_created_at ON posts(tag, created_at)"
         ]
 
@@ -111,10 +446,37 @@ def migrate_db():
                 print(f"Error creando índice: {e}")
 
         c.commit()
+
+        # Columnas created_epoch/day_bucket para consultas por rango
+        backfilled = _ensure_time_columns(c)
+        print(f"✅ Columnas de tiempo listas ({backfilled} filas rellenadas)")
+
+        # Índices cubrientes del explorador de leads
+        c.executescript(LEAD_INDEX_DDL)
+        print("✅ Índices del explorador de leads listos")
+
+        # Rollups por hora/día (tablas, triggers y backfill)
+        from database.rollups import rebuild_rollups
+        rebuild_rollups(c)
+        print("✅ Rollups de posts reconstruidos")
+
+        # Índice full-text (se puebla si es nuevo)
+        if _ensure_search_index(c, 'posts_fts'):
+            print("✅ Índice full-text de posts creado")
+
         print("✅ Migración completada: esquema actualizado e índices agregados")
 
 # ===== COMPETITION WATCHER TABLES =====
 
+# Columnas generadas de competitors: agrupaciones indexables sin lógica en Python
+COMPETITOR_GENERATED_COLUMNS = {
+    'location_group': "CASE WHEN location IS NULL OR location = '' THEN NULL "
+                      "WHEN location LIKE '%lima%' THEN 'Lima' ELSE location END",
+    'price_currency': "CASE WHEN pricing_info IS NULL OR pricing_info = '' THEN NULL "
+                      "WHEN pricing_info LIKE '%s/%' OR pricing_info LIKE '%sol%' THEN 'Soles' "
+                      "WHEN pricing_info LIKE '%$%' THEN 'Dólares' ELSE 'No especificado' END",
+}
+
 COMPETITION_DDL = """
 -- Tabla para almacenar competidores encontrados
 CREATE TABLE IF NOT EXISTS competitors (
@@ -127,10 +489,53 @@ CREATE TABLE IF NOT EXISTS competitors (
     contact_info TEXT,
     social_media TEXT,  -- JSON array of social media
     description TEXT,
-    scraped_at TEXT NOT NULL,
+    scraped_at TEXT NOT NULL,  -- última vez que se vio
     keyword TEXT NOT NULL,
     created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP,  -- último cambio de contenido
+    domain TEXT,  -- dominio normalizado; único por keyword
+    content_hash TEXT,  -- hash del estado actual de los campos versionados
+    location_group TEXT GENERATED ALWAYS AS (%(location_group)s) VIRTUAL,
+    price_currency TEXT GENERATED ALWAYS AS (%(price_currency)s) VIRTUAL
+);
+
+-- Servicios normalizados (una fila por servicio, con su categoría)
+CREATE TABLE IF NOT EXISTS competitor_services (
+    competitor_id TEXT NOT NULL,
+    keyword TEXT NOT NULL,
+    service TEXT NOT NULL,
+    category TEXT NOT NULL,
+    PRIMARY KEY (competitor_id, service)
+) WITHOUT ROWID;
+
+-- Redes sociales normalizadas
+CREATE TABLE IF NOT EXISTS competitor_social (
+    competitor_id TEXT NOT NULL,
+    keyword TEXT NOT NULL,
+    url TEXT NOT NULL,
+    platform TEXT NOT NULL,  -- dominio normalizado de la URL
+    PRIMARY KEY (competitor_id, url)
+) WITHOUT ROWID;
+
+-- Ítems de cada análisis (categorías, precios, ubicaciones, servicios, gaps, oportunidades)
+CREATE TABLE IF NOT EXISTS analysis_items (
+    analysis_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    item TEXT NOT NULL,
+    count INTEGER,  -- solo para distribuciones
+    PRIMARY KEY (analysis_id, kind, position)
+) WITHOUT ROWID;
+
+-- Historial compacto: solo los campos que cambiaron (hashes + diff)
+CREATE TABLE IF NOT EXISTS competitor_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    competitor_id TEXT NOT NULL,
+    field TEXT NOT NULL,
+    old_hash TEXT,
+    new_hash TEXT,
+    diff TEXT,  -- JSON: listas -> added/removed, texto -> líneas +/-
+    changed_at TEXT NOT NULL
 );
 
 -- Tabla para almacenar análisis de mercado realizados
@@ -166,148 +571,451 @@ CREATE TABLE IF NOT EXISTS competition_runs (
 CREATE INDEX IF NOT EXISTS idx_competitors_keyword ON competitors(keyword);
 CREATE INDEX IF NOT EXISTS idx_competitors_website ON competitors(website);
 CREATE INDEX IF NOT EXISTS idx_competitors_created_at ON competitors(created_at);
+CREATE INDEX IF NOT EXISTS idx_competitor_history_competitor ON competitor_history(competitor_id, changed_at);
 CREATE INDEX IF NOT EXISTS idx_competition_analysis_keyword ON competition_analysis(keyword);
 CREATE INDEX IF NOT EXISTS idx_competition_analysis_analyzed_at ON competition_analysis(analyzed_at);
 CREATE INDEX IF NOT EXISTS idx_competition_runs_keyword ON competition_runs(keyword);
 CREATE INDEX IF NOT EXISTS idx_competition_runs_status ON competition_runs(status);
 CREATE INDEX IF NOT EXISTS idx_competition_runs_started_at ON competition_runs(started_at);
+CREATE INDEX IF NOT EXISTS idx_competitor_services_keyword_category ON competitor_services(keyword, category);
+CREATE INDEX IF NOT EXISTS idx_competitor_services_keyword_service ON competitor_services(keyword, service);
+CREATE INDEX IF NOT EXISTS idx_competitor_social_keyword_platform ON competitor_social(keyword, platform);
+CREATE INDEX IF NOT EXISTS idx_analysis_items_kind_item ON analysis_items(kind, item);
+""" % COMPETITOR_GENERATED_COLUMNS
+
+# Índices que dependen de columnas agregadas por migración
+COMPETITOR_DOMAIN_INDEX_DDL = """
+CREATE UNIQUE INDEX IF NOT EXISTS idx_competitors_domain_keyword ON competitors(domain, keyword);
+CREATE INDEX IF NOT EXISTS idx_competitors_keyword_scraped_at ON competitors(keyword, scraped_at DESC);
+CREATE INDEX IF NOT EXISTS idx_competitors_keyword_location ON competitors(keyword, location_group);
+CREATE INDEX IF NOT EXISTS idx_competitors_keyword_currency ON competitors(keyword, price_currency);
 """
 
+# Reglas de categorización de servicios (primera coincidencia gana)
+SERVICE_CATEGORY_RULES = (
+    ('Limpieza/Mantenimiento', ('limpieza', 'mantenimiento')),
+    ('Reparaciones', ('reparacion', 'reparar')),
+    ('Instalación', ('instalacion', 'montaje')),
+    ('Tratamiento Químico', ('cloracion', 'quimico')),
+)
+DEFAULT_SERVICE_CATEGORY = 'Otros Servicios'
+
+# Tipos de ítem guardados en analysis_items (los dicts llevan conteo)
+ANALYSIS_ITEM_KINDS = {
+    'service_categories': dict, 'price_ranges': dict, 'locations': dict,
+    'common_services': list, 'market_gaps': list, 'opportunities': list,
+}
+
+def categorize_service(service: str) -> str:
+    service_lower = service.lower()
+    for category, needles in SERVICE_CATEGORY_RULES:
+        if any(needle in service_lower for needle in needles):
+            return category
+    return DEFAULT_SERVICE_CATEGORY
+
+# Campos versionados: sus cambios se registran en competitor_history
+COMPETITOR_TRACKED_FIELDS = ('name', 'services', 'location', 'pricing_info',
+                             'contact_info', 'social_media', 'description')
+_COMPETITOR_LIST_FIELDS = ('services', 'social_media')
+
+COMPETITOR_COLUMNS = ('id', 'name', 'website', 'services', 'location', 'pricing_info',
+                      'contact_info', 'social_media', 'description', 'scraped_at',
+                      'keyword', 'created_at', 'updated_at', 'domain', 'content_hash')
+
+def normalize_domain(url: str) -> str:
+    """'https://www.Ejemplo.pe:443/x' -> 'ejemplo.pe'"""
+    from urllib.parse import urlsplit
+
+    value = (url or '').strip().lower()
+    host = urlsplit(value if '//' in value else f'//{value}').hostname or value
+    host = host.rstrip('.')
+    return host[4:] if host.startswith('www.') else host
+
+def competitor_id_for(domain: str, keyword: str) -> str:
+    return f"{keyword}:{domain}"
+
+def _content_hash(value: Any) -> Optional[str]:
+    """Hash corto (blake2b 64 bits) del valor almacenado en la columna"""
+    if value is None:
+        return None
+    import hashlib
+    return hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).hexdigest()
+
+def _canonical_field(field: str, value: Any) -> Any:
+    """Valor comparable de un campo: las listas JSON se re-serializan con to_json
+
+    Las filas anteriores a utils.codec guardan json.dumps (separadores ', ' y
+    escapes \\uXXXX); sin esto el mismo contenido parecería un cambio.
+    """
+    if field in _COMPETITOR_LIST_FIELDS and value is not None:
+        return to_json(from_json(value, []))
+    return value
+
+def _competitor_state_hash(row: Dict[str, Any]) -> str:
+    values = (_canonical_field(f, row.get(f)) for f in COMPETITOR_TRACKED_FIELDS)
+    return _content_hash('\x1f'.join('' if value is None else str(value) for value in values))
+
+def _field_diff(field: str, old: Optional[str], new: Optional[str]) -> str:
+    """Diff compacto entre dos valores almacenados de un campo"""
+    if field in _COMPETITOR_LIST_FIELDS:
+        old_items, new_items = from_json(old, []), from_json(new, [])
+        return to_json({
+            'added': [item for item in new_items if item not in old_items],
+            'removed': [item for item in old_items if item not in new_items],
+        })
+
+    import difflib
+    old_lines = (old or '').splitlines()
+    new_lines = (new or '').splitlines()
+    changes = [line for line in difflib.ndiff(old_lines, new_lines) if line[:1] in '+-']
+    return to_json(changes)
+
+def _competitor_row(competitor_data: dict, keyword: str) -> Dict[str, Any]:
+    """Fila normalizada de competitors a partir de los datos del watcher"""
+    from datetime import datetime
+
+    scraped_at = competitor_data.get('scraped_at') or datetime.now()
+    if isinstance(scraped_at, datetime):
+        scraped_at = scraped_at.isoformat()
+
+    domain = normalize_domain(competitor_data['website'])
+    row = {
+        'id': competitor_id_for(domain, keyword),
+        'name': competitor_data['name'],
+        'website': competitor_data['website'],
+        'services': to_json(competitor_data.get('services') or []),
+        'location': competitor_data.get('location'),
+        'pricing_info': competitor_data.get('pricing_info'),
+        'contact_info': competitor_data.get('contact_info'),
+        'social_media': to_json(competitor_data.get('social_media') or []),
+        'description': competitor_data.get('description'),
+        'scraped_at': scraped_at,
+        'keyword': keyword,
+        'domain': domain,
+    }
+    row['content_hash'] = _competitor_state_hash(row)
+    return row
+
+def _record_competitor_changes(c: sqlite3.Connection, competitor_id: str,
+                               old: Dict[str, Any], new: Dict[str, Any], changed_at: str) -> int:
+    """Inserta en competitor_history una fila por campo versionado que cambió"""
+    changes = [
+        (competitor_id, field, _content_hash(old.get(field)), _content_hash(new.get(field)),
+         _field_diff(field, old.get(field), new.get(field)), changed_at)
+        for field in COMPETITOR_TRACKED_FIELDS
+        if _canonical_field(field, old.get(field)) != _canonical_field(field, new.get(field))
+    ]
+    c.executemany("""
+        INSERT INTO competitor_history (competitor_id, field, old_hash, new_hash, diff, changed_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, changes)
+    return len(changes)
+
+def _sync_competitor_children(c: sqlite3.Connection, competitor_id: str, keyword: str,
+                              services: List[str], social_media: List[str]) -> None:
+    """Reemplaza las filas de competitor_services/competitor_social de un competidor"""
+    c.execute("DELETE FROM competitor_services WHERE competitor_id = ?", (competitor_id,))
+    c.execute("DELETE FROM competitor_social WHERE competitor_id = ?", (competitor_id,))
+    c.executemany("""
+        INSERT OR IGNORE INTO competitor_services (competitor_id, keyword, service, category)
+        VALUES (?, ?, ?, ?)
+    """, [(competitor_id, keyword, service, categorize_service(service))
+          for service in services if service])
+    c.executemany("""
+        INSERT OR IGNORE INTO competitor_social (competitor_id, keyword, url, platform)
+        VALUES (?, ?, ?, ?)
+    """, [(competitor_id, keyword, url, normalize_domain(url)) for url in social_media if url])
+
+def _migrate_competitor_children(c: sqlite3.Connection) -> int:
+    """Puebla competitor_services/competitor_social desde las columnas JSON"""
+    rows = c.execute("""
+        SELECT id, keyword, services, social_media FROM competitors
+        WHERE NOT EXISTS (SELECT 1 FROM competitor_services s WHERE s.competitor_id = competitors.id)
+          AND NOT EXISTS (SELECT 1 FROM competitor_social m WHERE m.competitor_id = competitors.id)
+    """).fetchall()
+    for competitor_id, keyword, services, social_media in rows:
+        _sync_competitor_children(c, competitor_id, keyword,
+                                  from_json(services, []), from_json(social_media, []))
+    return len(rows)
+
+def _migrate_analysis_items(c: sqlite3.Connection) -> int:
+    """Puebla analysis_items para análisis guardados solo como JSON"""
+    rows = c.execute(f"""
+        SELECT id, {', '.join(ANALYSIS_ITEM_KINDS)} FROM competition_analysis
+        WHERE NOT EXISTS (SELECT 1 FROM analysis_items i WHERE i.analysis_id = competition_analysis.id)
+    """).fetchall()
+    for row in rows:
+        values = {kind: from_json(text) for kind, text in zip(ANALYSIS_ITEM_KINDS, row[1:])}
+        _insert_analysis_items(c, row[0], values)
+    return len(rows)
+
+def _migrate_competitors(c: sqlite3.Connection) -> int:
+    """Agrega domain/content_hash y colapsa filas duplicadas por (dominio, keyword).
+
+    Las filas antiguas de cada grupo se reproducen en orden como historial, así
+    que no se pierden los cambios observados entre ejecuciones. Devuelve el
+    número de filas duplicadas eliminadas.
+    """
+    # table_xinfo incluye las columnas generadas
+    columns = {row[1] for row in c.execute("PRAGMA table_xinfo(competitors)")}
+    if 'domain' not in columns:
+        c.execute("ALTER TABLE competitors ADD COLUMN domain TEXT")
+    if 'content_hash' not in columns:
+        c.execute("ALTER TABLE competitors ADD COLUMN content_hash TEXT")
+    for name, expression in COMPETITOR_GENERATED_COLUMNS.items():
+        if name not in columns:
+            c.execute(f"ALTER TABLE competitors ADD COLUMN {name} TEXT "
+                      f"GENERATED ALWAYS AS ({expression}) VIRTUAL")
+
+    select = f"SELECT rowid, {', '.join(COMPETITOR_COLUMNS)} FROM competitors"
+    pending = c.execute(f"{select} WHERE domain IS NULL OR content_hash IS NULL").fetchall()
+    if not pending:
+        c.executescript(COMPETITOR_DOMAIN_INDEX_DDL)
+        return 0
+
+    # Agrupar todas las filas (también las ya migradas) por su clave nueva
+    groups: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+    for row in c.execute(select).fetchall():
+        data = dict(zip(('rowid',) + COMPETITOR_COLUMNS, row))
+        data['description'] = decompress_value(data['description'])
+        data['domain'] = normalize_domain(data['website'])
+        groups.setdefault((data['domain'], data['keyword']), []).append(data)
+
+    removed = 0
+    c.execute("DROP INDEX IF EXISTS idx_competitors_domain_keyword")
+    for (domain, keyword), rows in groups.items():
+        rows.sort(key=lambda r: (r['scraped_at'] or '', r['rowid']))
+        canonical_id = competitor_id_for(domain, keyword)
+        latest = rows[-1]
+
+        for previous, current in zip(rows, rows[1:]):
+            _record_competitor_changes(c, canonical_id, previous, current,
+                                       current['updated_at'] or current['scraped_at'])
+        stale = [r['rowid'] for r in rows[:-1]]
+        c.executemany("DELETE FROM competitors WHERE rowid = ?", [(rowid,) for rowid in stale])
+        removed += len(stale)
+
+        # Listas JSON en el formato de to_json, como las escribe save_competitor
+        c.execute("""
+            UPDATE competitors SET id = ?, domain = ?, content_hash = ?, created_at = ?,
+                                   services = ?, social_media = ?
+            WHERE rowid = ?
+        """, (canonical_id, domain, _competitor_state_hash(latest),
+              rows[0]['created_at'] or rows[0]['scraped_at'],
+              _canonical_field('services', latest['services']),
+              _canonical_field('social_media', latest['social_media']), latest['rowid']))
+
+    c.executescript(COMPETITOR_DOMAIN_INDEX_DDL)
+    return removed
+
 def init_competition_tables():
     """Inicializar tablas del Competition Watcher"""
     with get_conn() as c:
         c.executescript(COMPETITION_DDL)
+        removed = _migrate_competitors(c)
+        if removed:
+            print(f"✅ Competidores deduplicados por dominio ({removed} filas duplicadas)")
+        _migrate_competitor_children(c)
+        _migrate_analysis_items(c)
+        _ensure_search_index(c, 'competitors_fts')
         c.commit()
         print("✅ Tablas del Competition Watcher inicializadas")
 
-def save_competitor(competitor_data: dict, keyword: str):
-    """Guardar datos de un competidor en la base de datos"""
-    import json
+def save_competitor(competitor_data: dict, keyword: str) -> Dict[str, Any]:
+    """Guardar el estado más reciente de un competidor (uno por dominio y keyword).
+
+    Si el contenido no cambió solo se actualiza scraped_at; si cambió, se
+    actualiza la fila y se registran los campos modificados en
+    competitor_history. Devuelve {'id', 'status': 'created'|'updated'|'unchanged', 'changed_fields'}.
+    """
     from datetime import datetime
 
+    row = _competitor_row(competitor_data, keyword)
+    stored = compress_row(row, 'competitors.description')
+    now = datetime.now().isoformat()
+
     with get_conn() as c:
-        competitor_id = f"{keyword}_{competitor_data['website'].replace('://', '_').replace('/', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            existing = c.execute(
+                f"SELECT {', '.join(COMPETITOR_COLUMNS)} FROM competitors WHERE domain = ? AND keyword = ?",
+                (row['domain'], keyword)
+            ).fetchone()
 
-        # Convertir listas a JSON
-        services_json = json.dumps(competitor_data.get('services', []))
-        social_media_json = json.dumps(competitor_data.get('social_media', []))
+            if existing is None:
+                c.execute(f"""
+                    INSERT INTO competitors ({', '.join(stored)}, created_at, updated_at)
+                    VALUES ({', '.join('?' for _ in stored)}, ?, ?)
+                """, (*stored.values(), now, now))
+                _sync_competitor_children(c, row['id'], keyword,
+                                          competitor_data.get('services') or [],
+                                          competitor_data.get('social_media') or [])
+                result = {'id': row['id'], 'status': 'created', 'changed_fields': 0}
 
-        c.execute("""
-            INSERT OR REPLACE INTO competitors
-            (id, name, website, services, location, pricing_info, contact_info, social_media, description, scraped_at, keyword, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            competitor_id,
-            competitor_data['name'],
-            competitor_data['website'],
-            services_json,
-            competitor_data.get('location'),
-            competitor_data.get('pricing_info'),
-            competitor_data.get('contact_info'),
-            social_media_json,
-            competitor_data.get('description'),
-            competitor_data.get('scraped_at', datetime.now().isoformat()),
-            keyword,
-            datetime.now().isoformat()
-        ))
-        c.commit()
+            else:
+                old = dict(zip(COMPETITOR_COLUMNS, existing))
+                old['description'] = decompress_value(old['description'])
+                if old['content_hash'] == row['content_hash']:
+                    c.execute("UPDATE competitors SET scraped_at = ?, website = ? WHERE id = ?",
+                              (row['scraped_at'], row['website'], old['id']))
+                    result = {'id': old['id'], 'status': 'unchanged', 'changed_fields': 0}
+                else:
+                    changed = _record_competitor_changes(c, old['id'], old, row, now)
+                    assignments = ', '.join(f'{field} = ?' for field in COMPETITOR_TRACKED_FIELDS)
+                    c.execute(f"""
+                        UPDATE competitors
+                        SET {assignments}, website = ?, scraped_at = ?, content_hash = ?, updated_at = ?
+                        WHERE id = ?
+                    """, (*(stored[f] for f in COMPETITOR_TRACKED_FIELDS), row['website'],
+                          row['scraped_at'], row['content_hash'], now, old['id']))
+                    if any(_canonical_field(f, old[f]) != row[f] for f in _COMPETITOR_LIST_FIELDS):
+                        _sync_competitor_children(c, old['id'], keyword,
+                                                  competitor_data.get('services') or [],
+                                                  competitor_data.get('social_media') or [])
+                    # changed == 0: solo cambió el formato guardado (hash de filas antiguas)
+                    result = {'id': old['id'], 'status': 'updated' if changed else 'unchanged',
+                              'changed_fields': changed}
+
+            c.commit()
+        except Exception:
+            c.rollback()
+            raise
+
+    return result
 
 def load_competitors(keyword: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
-    """Cargar competidores de la base de datos"""
-    import json
+    """Cargar el estado más reciente de los competidores de una keyword"""
+    rows = iter_competitors(keyword, page_size=limit)
+    return [row.to_dict() for row in islice(rows, limit)]
 
+def get_competitor_history(competitor_id: str, limit: int = 100) -> List[Dict[str, Any]]:
+    """Cambios registrados de un competidor, del más reciente al más antiguo"""
     with get_conn() as c:
-        query = "SELECT * FROM competitors WHERE keyword = ? ORDER BY scraped_at DESC"
-        params: List[Any] = [keyword]
-
-        if limit is not None:
-            query += " LIMIT ?"
-            params.append(limit)
+        rows = c.execute("""
+            SELECT field, old_hash, new_hash, diff, changed_at
+            FROM competitor_history
+            WHERE competitor_id = ?
+            ORDER BY changed_at DESC, id DESC
+            LIMIT ?
+        """, (competitor_id, limit)).fetchall()
 
-        cursor = c.execute(query, params)
-        rows = cursor.fetchall()
+    return [{
+        'field': field,
+        'old_hash': old_hash,
+        'new_hash': new_hash,
+        'diff': from_json(diff),
+        'changed_at': changed_at,
+    } for field, old_hash, new_hash, diff, changed_at in rows]
 
-        competitors = []
-        for row in rows:
-            competitor = {
-                'id': row[0],
-                'name': row[1],
-                'website': row[2],
-                'services': json.loads(row[3]) if row[3] else [],
-                'location': row[4],
-                'pricing_info': row[5],
-                'contact_info': row[6],
-                'social_media': json.loads(row[7]) if row[7] else [],
-                'description': row[8],
-                'scraped_at': row[9],
-                'keyword': row[10],
-                'created_at': row[11],
-                'updated_at': row[12]
-            }
-            competitors.append(competitor)
-
-        return competitors
+def _insert_analysis_items(c: sqlite3.Connection, analysis_id: str, analysis_data: dict) -> None:
+    rows = []
+    for kind, container in ANALYSIS_ITEM_KINDS.items():
+        values = analysis_data.get(kind) or container()
+        if container is dict:
+            rows.extend((analysis_id, kind, position, item, count)
+                        for position, (item, count) in enumerate(values.items()))
+        else:
+            rows.extend((analysis_id, kind, position, item, None)
+                        for position, item in enumerate(values))
+    c.executemany("""
+        INSERT OR REPLACE INTO analysis_items (analysis_id, kind, position, item, count)
+        VALUES (?, ?, ?, ?, ?)
+    """, rows)
 
 def save_competition_analysis(analysis_data: dict):
-    """Guardar análisis de competencia en la base de datos"""
-    import json
+    """Guardar análisis de competencia (cabecera + analysis_items)"""
     from datetime import datetime
 
     with get_conn() as c:
         analysis_id = f"{analysis_data['keyword']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
 
         c.execute("""
-            INSERT INTO competition_analysis
-            (id, keyword, total_competitors, service_categories, price_ranges, locations, common_services, market_gaps, opportunities, analyzed_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            INSERT OR REPLACE INTO competition_analysis
+            (id, keyword, total_competitors, analyzed_at)
+            VALUES (?, ?, ?, ?)
         """, (
             analysis_id,
             analysis_data['keyword'],
             analysis_data['total_competitors'],
-            json.dumps(analysis_data.get('service_categories', {})),
-            json.dumps(analysis_data.get('price_ranges', {})),
-            json.dumps(analysis_data.get('locations', {})),
-            json.dumps(analysis_data.get('common_services', [])),
-            json.dumps(analysis_data.get('market_gaps', [])),
-            json.dumps(analysis_data.get('opportunities', [])),
             analysis_data.get('analyzed_at', datetime.now().isoformat())
         ))
+        c.execute("DELETE FROM analysis_items WHERE analysis_id = ?", (analysis_id,))
+        _insert_analysis_items(c, analysis_id, analysis_data)
         c.commit()
 
         return analysis_id
 
+def _analysis_from_header(c: sqlite3.Connection, header: Mapping) -> Dict[str, Any]:
+    """Cabecera de competition_analysis + sus analysis_items"""
+    analysis = {'id': header['id'], 'keyword': header['keyword'],
+                'total_competitors': header['total_competitors']}
+    analysis.update({kind: container() for kind, container in ANALYSIS_ITEM_KINDS.items()})
+
+    for kind, item, count in c.execute("""
+        SELECT kind, item, count FROM analysis_items
+        WHERE analysis_id = ? ORDER BY kind, position
+    """, (header['id'],)):
+        if ANALYSIS_ITEM_KINDS.get(kind) is dict:
+            analysis[kind][item] = count
+        elif kind in ANALYSIS_ITEM_KINDS:
+            analysis[kind].append(item)
+
+    analysis['analyzed_at'] = header['analyzed_at']
+    analysis['created_at'] = header['created_at']
+    return analysis
+
 def load_competition_analysis(keyword: str, limit: int = 1) -> list:
     """Cargar análisis de competencia de la base de datos"""
-    import json
+    return list(islice(iter_competition_analyses(keyword, page_size=limit), limit))
 
-    with get_conn() as c:
-        cursor = c.execute("""
-            SELECT * FROM competition_analysis
-            WHERE keyword = ?
-            ORDER BY analyzed_at DESC
-            LIMIT ?
-        """, (keyword, limit))
+def get_competitor_market_stats(keyword: str, common_limit: int = 10) -> Dict[str, Any]:
+    """Agregados de mercado de una keyword calculados en SQL (GROUP BY indexados).
 
-        rows = cursor.fetchall()
+    Cubren todos los competidores guardados de la keyword, no solo los cargados
+    en memoria por el watcher.
+    """
+    with get_read_conn() as c:
+        total_competitors = c.execute(
+            "SELECT COUNT(*) FROM competitors WHERE keyword = ?", (keyword,)).fetchone()[0]
+        total_services = c.execute(
+            "SELECT COUNT(*) FROM competitor_services WHERE keyword = ?", (keyword,)).fetchone()[0]
+
+        service_categories = dict(c.execute("""
+            SELECT category, COUNT(*) FROM competitor_services
+            WHERE keyword = ? GROUP BY category ORDER BY COUNT(*) DESC, category
+        """, (keyword,)).fetchall())
+
+        common_services = [service for service, _ in c.execute("""
+            SELECT service, COUNT(*) AS n FROM competitor_services
+            WHERE keyword = ? GROUP BY service ORDER BY n DESC, service LIMIT ?
+        """, (keyword, common_limit))]
+
+        locations = dict(c.execute("""
+            SELECT location_group, COUNT(*) FROM competitors
+            WHERE keyword = ? AND location_group IS NOT NULL
+            GROUP BY location_group ORDER BY COUNT(*) DESC
+        """, (keyword,)).fetchall())
+
+        price_ranges = dict(c.execute("""
+            SELECT price_currency, COUNT(*) FROM competitors
+            WHERE keyword = ? AND price_currency IS NOT NULL
+            GROUP BY price_currency ORDER BY COUNT(*) DESC
+        """, (keyword,)).fetchall())
+
+        social_platforms = dict(c.execute("""
+            SELECT platform, COUNT(DISTINCT competitor_id) FROM competitor_social
+            WHERE keyword = ? GROUP BY platform ORDER BY COUNT(DISTINCT competitor_id) DESC
+        """, (keyword,)).fetchall())
 
-        analyses = []
-        for row in rows:
-            analysis = {
-                'id': row[0],
-                'keyword': row[1],
-                'total_competitors': row[2],
-                'service_categories': json.loads(row[3]) if row[3] else {},
-                'price_ranges': json.loads(row[4]) if row[4] else {},
-                'locations': json.loads(row[5]) if row[5] else {},
-                'common_services': json.loads(row[6]) if row[6] else [],
-                'market_gaps': json.loads(row[7]) if row[7] else [],
-                'opportunities': json.loads(row[8]) if row[8] else [],
-                'analyzed_at': row[9],
-                'created_at': row[10]
-            }
-            analyses.append(analysis)
-
-        return analyses
+    return {
+        'total_competitors': total_competitors,
+        'total_services': total_services,
+        'service_categories': service_categories,
+        'common_services': common_services,
+        'locations': locations,
+        'price_ranges': price_ranges,
+        'social_platforms': social_platforms,
+    }
 
 def start_competition_run(keyword: str, run_type: str) -> str:
     """Iniciar una nueva ejecución del competition watcher"""
@@ -340,37 +1048,449 @@ def update_competition_run(run_id: str, status: str, competitors_found: int = 0,
 
 def get_competition_runs(keyword: Optional[str] = None, limit: int = 10) -> List[Dict[str, Any]]:
     """Obtener historial de ejecuciones"""
-    with get_conn() as c:
-        if keyword is not None:
-            cursor = c.execute("""
-                SELECT * FROM competition_runs
-                WHERE keyword = ?
-                ORDER BY started_at DESC
-                LIMIT ?
-            """, (keyword, limit))
-        else:
-            cursor = c.execute("""
-                SELECT * FROM competition_runs
-                ORDER BY started_at DESC
-                LIMIT ?
-            """, (limit,))
+    runs = iter_competition_runs(keyword, page_size=limit)
+    return [row.to_dict() for row in islice(runs, limit)]
+
+# ===== LECTURA EN STREAMING (KEYSET) =====
+
+# Los iter_* recorren historiales completos en memoria constante: paginan por
+# clave (WHERE (k1, k2) < (?, ?) ORDER BY k1 DESC, k2 DESC LIMIT n) en vez de
+# OFFSET, piden cada página con su propia conexión de lectura (el consumidor
+# no retiene una transacción abierta que bloquee los checkpoints del WAL) y
+# devuelven LazyRow, que decodifica las columnas JSON solo al leerlas.
+#
+# Las claves terminan en rowid: todos los índices lo incluyen, así
+# (keyword, scraped_at DESC) ya sirve para (keyword, scraped_at, rowid).
+
+class LazyRow(Mapping):
+    """Fila de solo lectura; las columnas con decoder se decodifican al primer acceso"""
+
+    __slots__ = ('_values', '_index', '_decoders', '_decoded')
+
+    def __init__(self, values: Sequence[Any], index: Dict[str, int],
+                 decoders: Dict[str, Callable[[Any], Any]]):
+        self._values = values
+        self._index = index
+        self._decoders = decoders
+        self._decoded: Optional[Dict[str, Any]] = None
+
+    def __getitem__(self, key: str) -> Any:
+        decoder = self._decoders.get(key)
+        if decoder is None:
+            return self._values[self._index[key]]
+        if self._decoded is None:
+            self._decoded = {}
+        if key not in self._decoded:
+            self._decoded[key] = decoder(self._values[self._index[key]])
+        return self._decoded[key]
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def raw(self, key: str) -> Any:
+        """Valor tal como está en SQLite (sin decodificar)"""
+        return self._values[self._index[key]]
+
+    def raw_values(self) -> Sequence[Any]:
+        """Tupla original, incluidas las columnas ocultas de la clave"""
+        return self._values
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: self[key] for key in self._index}
 
+    def __repr__(self) -> str:
+        return f"LazyRow({', '.join(f'{k}={self.raw(k)!r}' for k in self._index)})"
+
+def lazy_row_factory(decoders: Optional[Dict[str, Callable[[Any], Any]]] = None,
+                     hidden: Sequence[str] = ()):
+    """row_factory para un cursor: LazyRow con el índice de columnas calculado una vez.
+
+    Las columnas de ``hidden`` (p. ej. rowid de la clave) no se exponen.
+    """
+    decoders = decoders or {}
+    state: List[Any] = [None, None]  # description, índice
+
+    def factory(cursor: sqlite3.Cursor, row: Tuple[Any, ...]) -> LazyRow:
+        if state[0] is not cursor.description:
+            state[0] = cursor.description
+            state[1] = {col[0]: i for i, col in enumerate(cursor.description)
+                        if col[0] not in hidden}
+        return LazyRow(row, state[1], decoders)
+
+    return factory
+
+def json_list_decoder(value: Any) -> List[Any]:
+    return from_json(value, [])
+
+def json_dict_decoder(value: Any) -> Dict[str, Any]:
+    return from_json(value, {})
+
+def keyset_select(columns: Sequence[str], key: Sequence[str]) -> Tuple[List[str], List[int]]:
+    """Columnas que selecciona iter_keyset y posición de cada columna de la clave"""
+    select = list(columns) + [k for k in key if k not in columns]
+    return select, [select.index(k) for k in key]
+
+def iter_keyset(table: str, columns: Sequence[str], key: Sequence[str],
+                where: str = "", params: Sequence[Any] = (), descending: bool = True,
+                page_size: Optional[int] = None,
+                decoders: Optional[Dict[str, Callable[[Any], Any]]] = None,
+                connect: Callable[[], Any] = None) -> Iterator[LazyRow]:
+    """Recorre ``table`` en orden de ``key`` con paginación keyset.
+
+    ``key`` debe identificar la fila de forma única y sus columnas no pueden
+    ser NULL (termínela en rowid o en la PK). ``connect`` es el context
+    manager que da la conexión de cada página (get_read_conn por defecto).
+    """
+    page_size = page_size or get_settings().database.stream_page_size
+    connect = connect or get_read_conn
+    select, key_pos = keyset_select(columns, key)
+    direction, op = ("DESC", "<") if descending else ("ASC", ">")
+    order = ', '.join(f"{k} {direction}" for k in key)
+    factory = lazy_row_factory(decoders, hidden=select[len(columns):])
+
+    last: Optional[Tuple[Any, ...]] = None
+    while True:
+        conditions = [f"({where})"] if where else []
+        page_params = list(params)
+        if last is not None:
+            conditions.append(f"({', '.join(key)}) {op} ({', '.join('?' for _ in key)})")
+            page_params.extend(last)
+        sql = (f"SELECT {', '.join(select)} FROM {table}"
+               + (f" WHERE {' AND '.join(conditions)}" if conditions else "")
+               + f" ORDER BY {order} LIMIT ?")
+        page_params.append(page_size)
+
+        with connect() as c:
+            cursor = c.execute(sql, page_params)
+            cursor.row_factory = factory
+            page = cursor.fetchall()
+
+        yield from page
+        if len(page) < page_size:
+            return
+        last = tuple(page[-1].raw_values()[i] for i in key_pos)
+
+def keyset_page(table: str, columns: Sequence[str], key: Sequence[str],
+                where: str = "", params: Sequence[Any] = (), after: Optional[Sequence[Any]] = None,
+                limit: int = 50, descending: bool = True,
+                decoders: Optional[Dict[str, Callable[[Any], Any]]] = None) -> Dict[str, Any]:
+    """Una página de ``table`` en orden de ``key`` a partir del cursor ``after``.
+
+    Misma clave que iter_keyset, pero sin estado entre llamadas: devuelve
+    {'rows': [dict], 'next': cursor o None} para APIs que paginan por
+    petición.
+    """
+    select, key_pos = keyset_select(columns, key)
+    direction, op = ("DESC", "<") if descending else ("ASC", ">")
+    conditions = [f"({where})"] if where else []
+    page_params = list(params)
+    if after is not None:
+        if len(after) != len(key):
+            raise ValueError(f"Cursor inválido: se esperaban {len(key)} valores")
+        conditions.append(f"({', '.join(key)}) {op} ({', '.join('?' for _ in key)})")
+        page_params.extend(after)
+    sql = (f"SELECT {', '.join(select)} FROM {table}"
+           + (f" WHERE {' AND '.join(conditions)}" if conditions else "")
+           + f" ORDER BY {', '.join(f'{k} {direction}' for k in key)} LIMIT ?")
+    # Una fila de más indica si hay página siguiente
+    page_params.append(limit + 1)
+
+    with get_read_conn() as c:
+        cursor = c.execute(sql, page_params)
+        cursor.row_factory = lazy_row_factory(decoders, hidden=select[len(columns):])
         rows = cursor.fetchall()
 
-        runs = []
-        for row in rows:
-            run = {
-                'id': row[0],
-                'keyword': row[1],
-                'run_type': row[2],
-                'status': row[3],
-                'competitors_found': row[4],
-                'analysis_generated': row[5],
-                'started_at': row[6],
-                'completed_at': row[7],
-                'error_message': row[8],
-                'created_at': row[9]
-            }
-            runs.append(run)
-
-        return runs
\ No newline at end of file
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1].raw_values()
+        next_cursor = [last[i] for i in key_pos]
+    return {'rows': [row.to_dict() for row in rows[:limit]], 'next': next_cursor}
+
+COMPETITOR_DECODERS = {'services': json_list_decoder, 'social_media': json_list_decoder,
+                       'description': decompress_value}
+
+COMPETITION_RUN_COLUMNS = (
+    'id', 'keyword', 'run_type', 'status', 'competitors_found', 'analysis_generated',
+    'started_at', 'completed_at', 'error_message', 'created_at'
+)
+
+def iter_competitors(keyword: Optional[str] = None,
+                     page_size: Optional[int] = None) -> Iterator[LazyRow]:
+    """Competidores de una keyword del más reciente al más antiguo (o todos, por id)"""
+    if keyword is None:
+        return iter_keyset('competitors', COMPETITOR_COLUMNS, ('id',), descending=False,
+                           page_size=page_size, decoders=COMPETITOR_DECODERS)
+    return iter_keyset('competitors', COMPETITOR_COLUMNS, ('scraped_at', 'rowid'),
+                       where="keyword = ?", params=(keyword,),
+                       page_size=page_size, decoders=COMPETITOR_DECODERS)
+
+def iter_competition_runs(keyword: Optional[str] = None,
+                          page_size: Optional[int] = None) -> Iterator[LazyRow]:
+    """Ejecuciones del watcher de la más reciente a la más antigua"""
+    where, params = ("keyword = ?", (keyword,)) if keyword is not None else ("", ())
+    return iter_keyset('competition_runs', COMPETITION_RUN_COLUMNS, ('started_at', 'rowid'),
+                       where=where, params=params, page_size=page_size)
+
+def iter_competition_analyses(keyword: str,
+                              page_size: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """Análisis de una keyword del más reciente al más antiguo, con sus items"""
+    headers = iter_keyset('competition_analysis',
+                          ('id', 'keyword', 'total_competitors', 'analyzed_at', 'created_at'),
+                          ('analyzed_at', 'rowid'), where="keyword = ?", params=(keyword,),
+                          page_size=page_size)
+    for header in headers:
+        with get_read_conn() as c:
+            yield _analysis_from_header(c, header)
+
+def page_competitors(keyword: Optional[str] = None, after: Optional[Sequence[Any]] = None,
+                     limit: int = 50) -> Dict[str, Any]:
+    """Página de competidores en el orden de iter_competitors; ``after`` es el cursor 'next'"""
+    if keyword is None:
+        page = keyset_page('competitors', COMPETITOR_COLUMNS, ('id',), after=after, limit=limit,
+                           descending=False, decoders=COMPETITOR_DECODERS)
+    else:
+        page = keyset_page('competitors', COMPETITOR_COLUMNS, ('scraped_at', 'rowid'),
+                           where="keyword = ?", params=(keyword,), after=after, limit=limit,
+                           decoders=COMPETITOR_DECODERS)
+    return {'competitors': page['rows'], 'next': page['next']}
+
+# ===== BÚSQUEDA FULL-TEXT (FTS5) =====
+
+# Índices FTS5 con contenido externo: el texto vive en posts/competitors y los
+# triggers mantienen el índice. unicode61 + remove_diacritics 2 hace que
+# "diseño" y "diseno" coincidan.
+# Nota: un VACUUM completo puede renumerar el rowid de estas tablas (su PK es
+# TEXT); después de uno hay que llamar a rebuild_search_index().
+FTS_TOKENIZE = "unicode61 remove_diacritics 2"
+
+SEARCH_INDEXES = {
+    'posts_fts': ('posts', ('title', 'body')),
+    'competitors_fts': ('competitors', ('name', 'description', 'services')),
+}
+
+def _search_index_ddl(fts: str, table: str, columns: Tuple[str, ...]) -> List[str]:
+    """Índice FTS de contenido externo leído a través de una vista
+
+    La vista {fts}_content devuelve el texto descomprimido de las columnas
+    guardadas con zstd (database.compression), así snippet() y 'rebuild'
+    nunca ven el BLOB comprimido.
+
+    Vista y triggers llaman a zdecompress(): toda conexión que escriba en
+    posts o competitors debe registrarla (database.compression.connect() y
+    los pools lo hacen). Con un sqlite3.connect() directo la escritura falla
+    con "no such function: zdecompress".
+    """
+    from database.compression import COMPRESSED_COLUMNS
+
+    def readable(prefix: str, col: str) -> str:
+        value = f'{prefix}{col}'
+        return f'zdecompress({value})' if f'{table}.{col}' in COMPRESSED_COLUMNS else value
+
+    cols = ', '.join(columns)
+    view_values = ', '.join(f'{readable("", col)} AS {col}' for col in columns)
+    new_values = ', '.join(readable('new.', col) for col in columns)
+    old_values = ', '.join(readable('old.', col) for col in columns)
+    return [
+        f"CREATE VIEW IF NOT EXISTS {fts}_content AS "
+        f"SELECT rowid AS content_rowid, {view_values} FROM {table}",
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, "
+        f"content='{fts}_content', content_rowid='content_rowid', tokenize='{FTS_TOKENIZE}')",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, {cols}) VALUES (new.rowid, {new_values});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.rowid, {old_values});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.rowid, {old_values});
+            INSERT INTO {fts}(rowid, {cols}) VALUES (new.rowid, {new_values});
+        END""",
+    ]
+
+def _ensure_search_index(c: sqlite3.Connection, fts: str) -> bool:
+    """Crea el índice FTS y sus triggers; lo puebla si es nuevo. True si se creó"""
+    table, columns = SEARCH_INDEXES[fts]
+    existing = c.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+                         (fts,)).fetchone()
+    if existing and f"content='{fts}_content'" not in existing[0]:
+        # Índice anterior leía la tabla directamente: se recrea sobre la vista
+        for trigger in ('ai', 'ad', 'au'):
+            c.execute(f"DROP TRIGGER IF EXISTS {fts}_{trigger}")
+        c.execute(f"DROP TABLE {fts}")
+        existing = None
+    for statement in _search_index_ddl(fts, table, columns):
+        c.execute(statement)
+    if not existing:
+        c.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+    c.commit()
+    return not existing
+
+def rebuild_search_index(fts: Optional[str] = None):
+    """Reconstruye los índices FTS desde las tablas de contenido"""
+    with get_conn() as c:
+        for name in ([fts] if fts else SEARCH_INDEXES):
+            table = SEARCH_INDEXES[name][0]
+            if not c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                             (table,)).fetchone():
+                continue  # tablas del watcher aún no creadas
+            _ensure_search_index(c, name)
+            c.execute(f"INSERT INTO {name}({name}) VALUES ('rebuild')")
+            c.execute(f"INSERT INTO {name}({name}) VALUES ('optimize')")
+        c.commit()
+
+def fts_query(text: str) -> str:
+    """Convierte texto libre en una consulta FTS5 segura (AND de términos, prefijo en el último)"""
+    terms = [t for t in ''.join(ch if ch.isalnum() else ' ' for ch in text).split() if t]
+    if not terms:
+        return ''
+    quoted = [f'"{t}"' for t in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+def search_posts(query: str, tag: Optional[str] = None, keyword: Optional[str] = None,
+                 since: Optional[date] = None, until: Optional[date] = None,
+                 limit: int = 20) -> List[Dict[str, Any]]:
+    """Posts que coinciden con ``query`` ordenados por bm25 (título pesa más que el cuerpo).
+
+    Con sharding consulta main y los shards del rango [since, until], por
+    tandas si no caben todos en un ATTACH. bm25 usa las estadísticas de cada
+    índice (número de documentos, largo medio, frecuencia de cada término),
+    así que ``rank`` solo es exacto dentro de un mismo archivo: el orden
+    entre posts de shards distintos es aproximado.
+    """
+    match = fts_query(query)
+    if not match:
+        return []
+
+    filters = ""
+    filter_params: List[Any] = []
+    if tag:
+        filters += " AND p.tag = ?"
+        filter_params.append(tag)
+    if keyword:
+        filters += " AND p.keyword = ?"
+        filter_params.append(keyword)
+    if since:
+        filters += " AND p.day_bucket >= ?"
+        filter_params.append(day_bucket_for(since))
+    if until:
+        filters += " AND p.day_bucket <= ?"
+        filter_params.append(day_bucket_for(until))
+
+    rows: List[Tuple[Any, ...]] = []
+    for c, schemas in iter_sharded_posts(since, until):
+        arms = []
+        params: List[Any] = []
+        for schema in schemas:
+            arms.append(f"""
+                SELECT p.id, p.url, p.title, p.tag, p.keyword, p.created_at, p.relevance_score,
+                       bm25(f.posts_fts, 5.0, 1.0) AS rank,
+                       snippet(f.posts_fts, -1, '**', '**', '…', 16) AS snippet
+                FROM {schema}.posts_fts f
+                JOIN {schema}.posts p ON p.rowid = f.rowid
+                WHERE f.posts_fts MATCH ?{filters}
+            """)
+            params += [match, *filter_params]
+        sql = " UNION ALL ".join(arms) + " ORDER BY rank LIMIT ?"
+        rows += c.execute(sql, params + [limit]).fetchall()
+    # Mejores ``limit`` entre todas las tandas de shards; cada rank viene de su
+    # propio posts_fts, por eso la mezcla entre archivos es aproximada
+    rows = heapq.nsmallest(limit, rows, key=lambda row: row[7])
+
+    columns = ('id', 'url', 'title', 'tag', 'keyword', 'created_at', 'relevance_score',
+               'rank', 'snippet')
+    return [dict(zip(columns, row)) for row in rows]
+
+def search_competitors(query: str, keyword: Optional[str] = None,
+                       limit: int = 20) -> List[Dict[str, Any]]:
+    """Competidores cuyo nombre, descripción o servicios coinciden con ``query``"""
+    match = fts_query(query)
+    if not match:
+        return []
+
+    sql = """
+        SELECT c.id, c.name, c.website, c.keyword, c.location,
+               bm25(competitors_fts, 3.0, 1.0, 2.0) AS rank,
+               snippet(competitors_fts, -1, '**', '**', '…', 16) AS snippet
+        FROM competitors_fts
+        JOIN competitors c ON c.rowid = competitors_fts.rowid
+        WHERE competitors_fts MATCH ?
+    """
+    params: List[Any] = [match]
+    if keyword:
+        sql += " AND c.keyword = ?"
+        params.append(keyword)
+    sql += " ORDER BY rank LIMIT ?"
+    params.append(limit)
+
+    with get_read_conn() as c:
+        rows = c.execute(sql, params).fetchall()
+
+    columns = ('id', 'name', 'website', 'keyword', 'location', 'rank', 'snippet')
+    return [dict(zip(columns, row)) for row in rows]
+
+# ===== LEAD BROWSER =====
+
+LEAD_COLUMNS = ('id', 'source', 'url', 'title', 'keyword', 'tag', 'relevance_score', 'created_at')
+LEAD_ORDER = "relevance_score DESC, created_at DESC, id DESC"
+
+def _lead_key(row: Tuple[Any, ...]) -> Tuple[Any, ...]:
+    """(relevance_score, created_at, id) de una fila LEAD_COLUMNS, como LEAD_ORDER"""
+    return row[6], row[7], row[0]
+
+def browse_leads(tag: Optional[str] = None, keyword: Optional[str] = None,
+                 source: Optional[str] = None, min_score: Optional[int] = None,
+                 max_score: Optional[int] = None, after: Optional[Sequence[Any]] = None,
+                 limit: int = 50) -> Dict[str, Any]:
+    """Página de leads de mayor a menor (relevance_score, created_at, id).
+
+    Paginación keyset: ``after`` es el cursor 'next' de la página anterior,
+    así cada página cuesta lo mismo sin importar su profundidad. Los filtros
+    se resuelven en los índices idx_posts_lead_* y solo las filas de la
+    página leen la tabla. Devuelve {'leads': [...], 'next': cursor o None}.
+    """
+    filters: List[str] = []
+    params: List[Any] = []
+    for column, value in (('tag', tag), ('keyword', keyword), ('source', source)):
+        if value is not None:
+            filters.append(f"{column} = ?")
+            params.append(value)
+    if min_score is not None:
+        filters.append("relevance_score >= ?")
+        params.append(min_score)
+    if max_score is not None:
+        # Con cursor, el límite superior del rango es el propio cursor: '+'
+        # deja max_score como filtro para que el planner no lo prefiera
+        filters.append("relevance_score <= ?" if after is None else "+relevance_score <= ?")
+        params.append(max_score)
+    if after is not None:
+        filters.append("(relevance_score, created_at, id) < (?, ?, ?)")
+        params.extend(after)
+    where = " AND ".join(filters) or "1"
+
+    # Una fila de más indica si hay página siguiente. El orden no sigue al
+    # mes del shard: cada tanda aporta su propia página y se combinan
+    rows: List[Tuple[Any, ...]] = []
+    for c, schemas in iter_sharded_posts():
+        arms = []
+        arm_params: List[Any] = []
+        for schema in schemas:
+            arms.append(f"""
+                SELECT {', '.join(LEAD_COLUMNS)} FROM {schema}.posts
+                WHERE rowid IN (SELECT rowid FROM {schema}.posts WHERE {where}
+                                ORDER BY {LEAD_ORDER} LIMIT ?)
+            """)
+            arm_params += [*params, limit + 1]
+        sql = " UNION ALL ".join(arms) + f" ORDER BY {LEAD_ORDER} LIMIT ?"
+        rows += c.execute(sql, arm_params + [limit + 1]).fetchall()
+    rows = heapq.nlargest(limit + 1, rows, key=_lead_key)
+
+    leads = [dict(zip(LEAD_COLUMNS, row)) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = leads[-1]
+        next_cursor = [last['relevance_score'], last['created_at'], last['id']]
+    return {'leads': leads, 'next': next_cursor}
@@ -0,0 +1,431 @@
+"""
+Incremental Columnar Export for Aqxion Scraper
+Streams new rows into date-partitioned Parquet / Arrow IPC files
+
+Each dataset (posts, competitors, market_signals) keeps a high-water mark
+per source database in ``export_watermarks``; a run reads only the rows
+past it with keyset pages on read-only connections (the live database is
+never locked) and appends them to
+
+    <output_directory>/<dataset>/date=YYYY-MM-DD/part-<source>-<start>.<ext>
+
+tag/keyword/source-like columns are dictionary-encoded and files are
+compressed (EXPORT_COMPRESSION, zstd by default), so readers such as
+pyarrow.dataset, DuckDB or pandas can load just the new partitions.
+
+A run is idempotent: files are written as .tmp, renamed once complete and
+only then is the watermark advanced. A part file is named after the
+watermark the run started from, so a run that crashes after renaming is
+redone into the same file names instead of duplicating rows.
+
+pyarrow is optional for the rest of the project and required here.
+
+Usage:
+    python -m database.export [--dataset posts] [--daily]
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import logging
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+from config.config_v2 import get_settings
+from database.compression import decompress_value
+from database.db import (COMPETITOR_COLUMNS, POST_COLUMNS, existing_shard_months, get_conn,
+                         get_read_conn, iter_keyset, json_list_decoder, keyset_select, shard_path,
+                         sharding_enabled)
+from database.pool import get_pool
+from utils.codec import from_json, to_json
+
+log = logging.getLogger("db_export")
+
+WATERMARKS_DDL = """
+CREATE TABLE IF NOT EXISTS export_watermarks(
+  dataset TEXT NOT NULL,
+  source TEXT NOT NULL,        -- 'main' o 'posts_YYYYMM' (shard)
+  last_key TEXT NOT NULL,      -- JSON con la clave de la última fila exportada
+  rows_exported INTEGER NOT NULL DEFAULT 0,
+  updated_at TEXT NOT NULL,
+  PRIMARY KEY (dataset, source)
+);
+"""
+
+FILE_EXTENSIONS = {"parquet": "parquet", "arrow": "arrow"}
+
+
+class ExportError(RuntimeError):
+    """Raised when an export cannot run (missing dependency, bad dataset)"""
+    pass
+
+
+# ===== DATASETS =====
+
+def _day_from_bucket(value: Any) -> Optional[str]:
+    if not value:
+        return None
+    text = str(value)
+    return f"{text[:4]}-{text[4:6]}-{text[6:8]}"
+
+
+def _day_from_text(value: Any) -> Optional[str]:
+    return str(value)[:10] if value else None
+
+
+@dataclass
+class Dataset:
+    """A table exported incrementally"""
+    name: str
+    table: str
+    columns: Sequence[str]
+    key: Sequence[str]                      # keyset / watermark columns (unique, NOT NULL)
+    partition_column: str
+    partition: Callable[[Any], Optional[str]]  # column value -> 'YYYY-MM-DD'
+    types: Dict[str, str] = field(default_factory=dict)  # 'dict' | 'int' | 'float' | 'list' | 'string'
+    where: str = ""
+    decoders: Dict[str, Callable[[Any], Any]] = field(default_factory=dict)
+
+    def arrow_type(self, column: str):
+        kind = self.types.get(column, "string")
+        if kind == "dict":
+            return pa.dictionary(pa.int32(), pa.string())
+        if kind == "int":
+            return pa.int64()
+        if kind == "float":
+            return pa.float64()
+        if kind == "list":
+            return pa.list_(pa.string())
+        return pa.string()
+
+    def schema(self):
+        return pa.schema([(column, self.arrow_type(column)) for column in self.columns])
+
+
+DATASETS: Dict[str, Dataset] = {
+    "posts": Dataset(
+        "posts", "posts", POST_COLUMNS, ("rowid",), "day_bucket", _day_from_bucket,
+        types={"source": "dict", "lang": "dict", "keyword": "dict", "tag": "dict",
+               "relevance_score": "int", "created_epoch": "int", "day_bucket": "int"},
+        decoders={"body": decompress_value},
+    ),
+    # Competitors change in place: exporting by (updated_at, rowid) appends a
+    # new version of a competitor whenever its content changes
+    "competitors": Dataset(
+        "competitors", "competitors", COMPETITOR_COLUMNS, ("updated_at", "rowid"),
+        "updated_at", _day_from_text,
+        types={"keyword": "dict", "domain": "dict", "location": "dict",
+               "services": "list", "social_media": "list"},
+        where="updated_at IS NOT NULL",
+        decoders={"services": json_list_decoder, "social_media": json_list_decoder,
+                  "description": decompress_value},
+    ),
+    "market_signals": Dataset(
+        "market_signals", "market_signals",
+        ("id", "scan_id", "signal_type", "title", "description", "priority",
+         "confidence", "signal_data", "created_at"),
+        ("id",), "created_at", _day_from_text,
+        types={"id": "int", "scan_id": "int", "signal_type": "dict", "priority": "dict",
+               "confidence": "float"},
+    ),
+}
+
+
+# ===== WRITERS =====
+
+class _DictionaryColumn:
+    """Grows one dictionary per file so every batch extends the previous one
+    (Arrow IPC files only accept dictionary deltas, not replacements)"""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self.index: Dict[str, int] = {}
+
+    def encode(self, values: List[Any]):
+        indices = []
+        for value in values:
+            if value is None:
+                indices.append(None)
+                continue
+            value = str(value)
+            position = self.index.get(value)
+            if position is None:
+                position = self.index[value] = len(self.values)
+                self.values.append(value)
+            indices.append(position)
+        return pa.DictionaryArray.from_arrays(pa.array(indices, pa.int32()),
+                                              pa.array(self.values, pa.string()))
+
+
+class _PartitionWriter:
+    """One output file (a date partition) written in row groups / record batches"""
+
+    def __init__(self, dataset: Dataset, path: Path, file_format: str, compression: str):
+        self.dataset = dataset
+        self.path = path
+        self.tmp_path = path.with_name(path.name + ".tmp")
+        self.schema = dataset.schema()
+        self.rows = 0
+        self._dictionaries = {c: _DictionaryColumn() for c in dataset.columns
+                              if dataset.types.get(c) == "dict"}
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        codec = None if compression == "none" else compression
+        if file_format == "parquet":
+            self._writer = pq.ParquetWriter(self.tmp_path, self.schema, compression=codec or "none",
+                                            use_dictionary=True)
+        else:
+            options = pa_ipc.IpcWriteOptions(compression=codec, emit_dictionary_deltas=True)
+            self._sink = pa.OSFile(str(self.tmp_path), "wb")
+            self._writer = pa_ipc.new_file(self._sink, self.schema, options=options)
+
+    def write(self, rows: List[Any]) -> None:
+        arrays = []
+        for column in self.dataset.columns:
+            values = [row[column] for row in rows]
+            if column in self._dictionaries:
+                arrays.append(self._dictionaries[column].encode(values))
+            else:
+                arrays.append(pa.array(values, self.schema.field(column).type))
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+        self.rows += len(rows)
+
+    def close(self) -> None:
+        self._writer.close()
+        if hasattr(self, "_sink"):
+            self._sink.close()
+        with open(self.tmp_path, "rb") as f:
+            os.fsync(f.fileno())
+
+    def commit(self) -> None:
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self) -> None:
+        try:
+            self._writer.close()
+        except Exception:
+            pass
+        self.tmp_path.unlink(missing_ok=True)
+
+
+# ===== EXPORTER =====
+
+@dataclass
+class ExportResult:
+    dataset: str
+    source: str
+    rows: int = 0
+    files: List[str] = field(default_factory=list)
+    last_key: Optional[List[Any]] = None
+    seconds: float = 0.0
+
+
+class IncrementalExporter:
+    """Exports rows past each dataset's watermark"""
+
+    def __init__(self, output_dir: Optional[Path] = None, file_format: Optional[str] = None,
+                 compression: Optional[str] = None, chunk_rows: Optional[int] = None):
+        if not PYARROW_AVAILABLE:
+            raise ExportError("La exportación columnar requiere pyarrow (pip install pyarrow)")
+        export_settings = get_settings().export
+        self.output_dir = Path(output_dir or export_settings.output_directory)
+        self.file_format = file_format or export_settings.columnar_format
+        self.compression = compression or export_settings.compression
+        self.chunk_rows = chunk_rows or export_settings.chunk_rows
+
+        with get_conn() as c:
+            c.execute(WATERMARKS_DDL)
+            c.commit()
+
+    # ===== SOURCES / WATERMARKS =====
+
+    def _sources(self, dataset: Dataset) -> List[Tuple[str, Callable[[], Any]]]:
+        """(name, connection factory) of every database holding the table"""
+        sources = [("main", get_read_conn)]
+        if dataset.table == "posts" and sharding_enabled():
+            for month in existing_shard_months():
+                path = shard_path(month)
+                sources.append((path.stem, lambda path=path: get_pool(path, read_only=True).connection()))
+        return sources
+
+    def watermark(self, dataset: str, source: str = "main") -> Optional[List[Any]]:
+        with get_conn() as c:
+            row = c.execute("SELECT last_key FROM export_watermarks WHERE dataset = ? AND source = ?",
+                            (dataset, source)).fetchone()
+        return from_json(row[0]) if row else None
+
+    def _save_watermark(self, result: ExportResult) -> None:
+        with get_conn() as c:
+            c.execute("""
+                INSERT INTO export_watermarks(dataset, source, last_key, rows_exported, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(dataset, source) DO UPDATE SET
+                    last_key = excluded.last_key,
+                    rows_exported = export_watermarks.rows_exported + excluded.rows_exported,
+                    updated_at = excluded.updated_at
+            """, (result.dataset, result.source, to_json(result.last_key), result.rows,
+                  datetime.now().isoformat()))
+            c.commit()
+
+    def reset(self, dataset: str) -> None:
+        """Forget the watermarks: the next run exports everything again"""
+        with get_conn() as c:
+            c.execute("DELETE FROM export_watermarks WHERE dataset = ?", (dataset,))
+            c.commit()
+
+    # ===== RUN =====
+
+    def export(self, name: str) -> List[ExportResult]:
+        dataset = DATASETS.get(name)
+        if dataset is None:
+            raise ExportError(f"Dataset desconocido: {name} (disponibles: {', '.join(DATASETS)})")
+        return [self._export_source(dataset, source, connect)
+                for source, connect in self._sources(dataset)
+                if self._has_table(connect, dataset.table)]
+
+    def export_all(self) -> List[ExportResult]:
+        results = []
+        for name in DATASETS:
+            results.extend(self.export(name))
+        return results
+
+    @staticmethod
+    def _has_table(connect: Callable[[], Any], table: str) -> bool:
+        with connect() as c:
+            return c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                             (table,)).fetchone() is not None
+
+    def _export_source(self, dataset: Dataset, source: str,
+                       connect: Callable[[], Any]) -> ExportResult:
+        start = time.perf_counter()
+        result = ExportResult(dataset.name, source)
+        last_key = self.watermark(dataset.name, source)
+
+        where, params = dataset.where, []
+        if last_key is not None:
+            after = f"({', '.join(dataset.key)}) > ({', '.join('?' for _ in dataset.key)})"
+            where = f"({where}) AND {after}" if where else after
+            params = list(last_key)
+
+        # Same start watermark -> same file names, so a redone run overwrites its parts
+        start_tag = hashlib.blake2b(to_json(last_key).encode(), digest_size=6).hexdigest()
+        extension = FILE_EXTENSIONS[self.file_format]
+        _, key_pos = keyset_select(dataset.columns, dataset.key)
+        writers: Dict[str, _PartitionWriter] = {}
+        buffers: Dict[str, List[Any]] = {}
+        buffered = 0
+
+        def flush() -> None:
+            nonlocal buffered
+            for day, rows in buffers.items():
+                if rows:
+                    writers[day].write(rows)
+            buffers.clear()
+            buffered = 0
+
+        rows = iter_keyset(dataset.table, dataset.columns, dataset.key, where=where, params=params,
+                           descending=False, page_size=self.chunk_rows,
+                           decoders=dataset.decoders, connect=connect)
+        try:
+            for row in rows:
+                day = dataset.partition(row[dataset.partition_column]) or "unknown"
+                if day not in writers:
+                    path = (self.output_dir / dataset.name / f"date={day}"
+                            / f"part-{source}-{start_tag}.{extension}")
+                    writers[day] = _PartitionWriter(dataset, path, self.file_format, self.compression)
+                buffers.setdefault(day, []).append(row)
+                buffered += 1
+                result.rows += 1
+                values = row.raw_values()
+                result.last_key = [values[i] for i in key_pos]
+                if buffered >= self.chunk_rows:
+                    flush()
+            flush()
+            for writer in writers.values():
+                writer.close()
+        except BaseException:
+            for writer in writers.values():
+                writer.abort()
+            raise
+
+        for writer in writers.values():
+            writer.commit()
+            result.files.append(str(writer.path))
+        if result.rows:
+            self._save_watermark(result)
+
+        result.seconds = time.perf_counter() - start
+        if result.rows:
+            log.info(f"📦 {dataset.name}@{source}: {result.rows} filas en {len(result.files)} "
+                     f"particiones ({result.seconds:.1f}s)")
+        return result
+
+
+# ===== DAILY SCHEDULE =====
+
+def seconds_until_daily_export(now: Optional[datetime] = None) -> float:
+    """Seconds until the next EXPORT_DAILY_EXPORT_HOUR (UTC)"""
+    now = now or datetime.now(timezone.utc)
+    target = now.replace(hour=get_settings().export.daily_export_hour, minute=0, second=0, microsecond=0)
+    if target <= now:
+        target += timedelta(days=1)
+    return (target - now).total_seconds()
+
+
+def run_daily() -> None:
+    """Export every dataset once a day (EXPORT_ENABLE_AUTO_EXPORT)"""
+    if not get_settings().export.enable_auto_export:
+        log.info("Exportación automática desactivada (EXPORT_ENABLE_AUTO_EXPORT=false)")
+        return
+    while True:
+        wait = seconds_until_daily_export()
+        log.info(f"⏰ Próxima exportación en {wait / 3600:.1f} h")
+        time.sleep(wait)
+        try:
+            IncrementalExporter().export_all()
+        except Exception as e:
+            log.error(f"❌ Exportación diaria fallida: {e}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Exportación incremental a Parquet/Arrow")
+    parser.add_argument("--dataset", choices=sorted(DATASETS), action="append",
+                        help="Dataset a exportar (repetible; por defecto todos)")
+    parser.add_argument("--reset", action="store_true", help="Olvidar la marca de agua y exportar todo")
+    parser.add_argument("--daily", action="store_true", help="Quedarse corriendo y exportar una vez al día")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if args.daily:
+        run_daily()
+        return 0
+
+    try:
+        exporter = IncrementalExporter()
+    except ExportError as e:
+        print(f"❌ {e}")
+        return 1
+
+    for name in args.dataset or list(DATASETS):
+        if args.reset:
+            exporter.reset(name)
+        for result in exporter.export(name):
+            print(f"📦 {result.dataset}@{result.source}: {result.rows} filas, "
+                  f"{len(result.files)} archivos ({result.seconds:.2f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,463 @@
+"""
+Append-only Ingestion Log for Aqxion Scraper
+Crawlers append posts to local segments; one loader bulk-ingests them into SQLite
+
+Every producer process owns a directory under ``ingest_dir`` and appends to
+one open segment at a time, so producers never contend on a lock:
+
+    <producer>/<seq>.open   segment being written
+    <producer>/<seq>.seg    sealed segment (fsynced, renamed atomically)
+
+A segment is MAGIC followed by records::
+
+    length (u32 BE) | crc32 (u32 BE) | codec envelope (zlib-compressed list of posts)
+
+Each append() is one record written with a single os.write(), so a crashed
+producer leaves at most a torn tail that fails its length/CRC check.
+Segments are fsynced when they rotate (size or age) or on close().
+
+The loader keeps a byte offset per segment in ``ingest_offsets`` (main
+database) and advances it in the same transaction that upserts the rows, so
+replaying after a crash resumes exactly after the last committed record.
+Rows routed to posts shards commit separately; replaying them is still safe
+because the post upsert is idempotent.
+
+Usage:
+    python -m database.ingest_log load [--once]
+    python -m database.ingest_log status
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import logging
+
+from config.config_v2 import get_db_path, get_settings
+from database.db import (UPSERT_POST_SQL, get_conn, init_db, normalize_post, post_storage_rows,
+                         route_posts, shard_target, sharding_enabled)
+from database.pool import get_pool
+from utils.codec import CodecError, decode, encode
+
+log = logging.getLogger("ingest_log")
+
+SEGMENT_MAGIC = b"AQXLOG1\n"
+RECORD_HEADER = struct.Struct(">II")  # length, crc32 of the payload
+OPEN_SUFFIX = ".open"
+SEALED_SUFFIX = ".seg"
+
+OFFSETS_DDL = """
+CREATE TABLE IF NOT EXISTS ingest_offsets(
+  segment TEXT PRIMARY KEY,     -- "<producer>/<seq>"
+  offset INTEGER NOT NULL,      -- bytes consumed (records fully committed)
+  records INTEGER NOT NULL DEFAULT 0,
+  rows INTEGER NOT NULL DEFAULT 0,
+  corrupt INTEGER NOT NULL DEFAULT 0,
+  completed INTEGER NOT NULL DEFAULT 0,
+  updated_at TEXT NOT NULL
+);
+"""
+
+
+def _fsync_dir(path: Path) -> None:
+    """Make a rename/create inside ``path`` durable"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# ===== PRODUCER =====
+
+class IngestLog:
+    """Segmented append-only log owned by one producer process"""
+
+    def __init__(self, root: Path, producer: Optional[str] = None,
+                 segment_max_bytes: int = 16 * 1024 * 1024, segment_max_age: float = 5.0):
+        self.root = Path(root)
+        self.producer = producer or f"{socket.gethostname()}-{os.getpid()}"
+        self.segment_max_bytes = segment_max_bytes
+        self.segment_max_age = segment_max_age
+        self.directory = self.root / self.producer
+
+        self._lock = threading.Lock()
+        self._fd: Optional[int] = None
+        self._path: Optional[Path] = None
+        self._size = 0
+        self._opened_at = 0.0
+        self._seq = 0
+
+        self._rotator: Optional[threading.Thread] = None
+        self._closed = threading.Event()
+
+        self.records = 0
+        self.rows = 0
+        self.segments_sealed = 0
+
+    def _next_seq(self) -> int:
+        seqs = [int(p.stem) for p in self.directory.glob("*") if p.stem.isdigit()]
+        return max(seqs, default=0) + 1
+
+    def _open_segment(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._seq = max(self._seq, self._next_seq() - 1) + 1
+        self._path = self.directory / f"{self._seq:010d}{OPEN_SUFFIX}"
+        self._fd = os.open(self._path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_APPEND, 0o644)
+        os.write(self._fd, SEGMENT_MAGIC)
+        self._size = len(SEGMENT_MAGIC)
+        self._opened_at = time.monotonic()
+        _fsync_dir(self.directory)
+        if self._rotator is None:
+            # Idle producers still seal by age, so the loader never mistakes
+            # a live open segment for an abandoned one
+            self._rotator = threading.Thread(target=self._rotate_loop, name="ingest-rotator", daemon=True)
+            self._rotator.start()
+
+    def _seal_segment(self) -> None:
+        if self._fd is None:
+            return
+        os.fsync(self._fd)
+        os.close(self._fd)
+        self._path.rename(self._path.with_suffix(SEALED_SUFFIX))
+        _fsync_dir(self.directory)
+        self._fd = None
+        self._path = None
+        self.segments_sealed += 1
+
+    def append(self, posts: List[Dict[str, Any]]) -> int:
+        """Append posts as one record; returns how many were logged.
+
+        Posts are normalized here so validation errors reach the crawler.
+        """
+        rows = [normalize_post(p) for p in posts]
+        if not rows:
+            return 0
+
+        payload = encode(rows, compress_threshold=0)
+        record = RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+        with self._lock:
+            if self._fd is not None and (
+                    self._size + len(record) > self.segment_max_bytes
+                    or time.monotonic() - self._opened_at > self.segment_max_age):
+                self._seal_segment()
+            if self._fd is None:
+                self._open_segment()
+            os.write(self._fd, record)
+            self._size += len(record)
+            self.records += 1
+            self.rows += len(rows)
+        return len(rows)
+
+    async def append_async(self, posts: List[Dict[str, Any]]) -> int:
+        """append() off the event loop (rotation fsyncs)"""
+        return await asyncio.to_thread(self.append, posts)
+
+    def rotate_if_idle(self) -> None:
+        """Seal the open segment once it is older than segment_max_age"""
+        with self._lock:
+            if self._fd is not None and time.monotonic() - self._opened_at > self.segment_max_age:
+                self._seal_segment()
+
+    def _rotate_loop(self) -> None:
+        while not self._closed.wait(self.segment_max_age):
+            try:
+                self.rotate_if_idle()
+            except OSError as e:
+                log.warning(f"⚠️ No se pudo sellar el segmento: {e}")
+
+    def close(self) -> None:
+        self._closed.set()
+        with self._lock:
+            self._seal_segment()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "producer": self.producer,
+            "records": self.records,
+            "rows": self.rows,
+            "segments_sealed": self.segments_sealed,
+            "open_segment": str(self._path) if self._path else None,
+        }
+
+
+_logs: Dict[int, IngestLog] = {}
+_logs_lock = threading.Lock()
+
+
+def get_ingest_log() -> IngestLog:
+    """Log of the current process (a forked worker gets its own directory)"""
+    pid = os.getpid()
+    with _logs_lock:
+        ingest = _logs.get(pid)
+        if ingest is None:
+            db_settings = get_settings().database
+            ingest = IngestLog(
+                db_settings.ingest_dir,
+                segment_max_bytes=db_settings.ingest_segment_max_mb * 1024 * 1024,
+                segment_max_age=db_settings.ingest_segment_max_age_s,
+            )
+            _logs[pid] = ingest
+        return ingest
+
+
+# ===== READER =====
+
+def read_records(path: Path, offset: int = 0) -> Iterator[Tuple[int, Optional[List[Dict[str, Any]]]]]:
+    """Yield (end_offset, rows) for each complete record after ``offset``.
+
+    Stops at an incomplete tail. A record whose CRC does not match yields
+    rows=None and reading stops there.
+    """
+    with open(path, "rb") as f:
+        if offset == 0:
+            if f.read(len(SEGMENT_MAGIC)) != SEGMENT_MAGIC:
+                raise CodecError(f"{path} is not an ingestion segment")
+            offset = len(SEGMENT_MAGIC)
+        f.seek(offset)
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            length, crc = RECORD_HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                return
+            end = offset + RECORD_HEADER.size + length
+            if zlib.crc32(payload) != crc:
+                yield end, None
+                return
+            yield end, decode(payload)
+            offset = end
+
+
+# ===== LOADER =====
+
+@dataclass
+class _Pending:
+    segment: str
+    offset: int
+    records: int
+    rows: int
+
+
+class IngestLoader:
+    """Single process that moves log segments into SQLite"""
+
+    def __init__(self, root: Path, batch_rows: int = 5000, stale_after: float = 300.0):
+        self.root = Path(root)
+        self.batch_rows = batch_rows
+        self.stale_after = stale_after
+        self.rows_loaded = 0
+        self.transactions = 0
+        self.segments_completed = 0
+
+        init_db()
+        with get_conn() as c:
+            c.execute(OFFSETS_DDL)
+            c.commit()
+
+    def _segments(self) -> List[Path]:
+        """Segments ordered per producer; sealed and open ones"""
+        if not self.root.exists():
+            return []
+        return sorted(p for p in self.root.glob("*/*")
+                      if p.suffix in (OPEN_SUFFIX, SEALED_SUFFIX) and p.stem.isdigit())
+
+    def _offsets(self) -> Dict[str, Tuple[int, int]]:
+        with get_conn() as c:
+            return {seg: (offset, completed) for seg, offset, completed in
+                    c.execute("SELECT segment, offset, completed FROM ingest_offsets")}
+
+    def _commit(self, rows: List[Dict[str, Any]], pending: List[_Pending]) -> None:
+        """Upsert rows and advance offsets; one transaction on the main database"""
+        now = datetime.now().isoformat()
+        main_path = Path(get_db_path())
+        rows = post_storage_rows(rows)
+        main_rows = rows
+        if sharding_enabled() and rows:
+            main_rows = []
+            for month, group in route_posts(rows).items():
+                target = shard_target(month)
+                if target == main_path:
+                    main_rows.extend(group)
+                    continue
+                with get_pool(target).connection() as sc:
+                    sc.execute("BEGIN IMMEDIATE")
+                    sc.executemany(UPSERT_POST_SQL, group)
+                    sc.commit()
+
+        with get_conn() as c:
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                if main_rows:
+                    c.executemany(UPSERT_POST_SQL, main_rows)
+                c.executemany("""
+                    INSERT INTO ingest_offsets(segment, offset, records, rows, updated_at)
+                    VALUES(?, ?, ?, ?, ?)
+                    ON CONFLICT(segment) DO UPDATE SET
+                        offset = excluded.offset,
+                        records = ingest_offsets.records + excluded.records,
+                        rows = ingest_offsets.rows + excluded.rows,
+                        updated_at = excluded.updated_at
+                """, [(p.segment, p.offset, p.records, p.rows, now) for p in pending])
+                c.commit()
+            except Exception:
+                c.rollback()
+                raise
+        self.rows_loaded += len(rows)
+        self.transactions += 1
+
+    def _mark_completed(self, segment: str, path: Path, corrupt: bool = False) -> None:
+        with get_conn() as c:
+            c.execute("""
+                INSERT INTO ingest_offsets(segment, offset, completed, corrupt, updated_at)
+                VALUES(?, 0, 1, ?, ?)
+                ON CONFLICT(segment) DO UPDATE SET
+                    completed = 1, corrupt = excluded.corrupt, updated_at = excluded.updated_at
+            """, (segment, int(corrupt), datetime.now().isoformat()))
+            c.commit()
+        if corrupt:
+            # Keep the evidence next to the log, out of the loader's way
+            path.rename(path.with_suffix(".corrupt"))
+        else:
+            path.unlink(missing_ok=True)
+        self.segments_completed += 1
+
+    def run_once(self) -> int:
+        """Ingest every complete record available now; returns rows loaded"""
+        offsets = self._offsets()
+        rows: List[Dict[str, Any]] = []
+        pending: Dict[str, _Pending] = {}
+        finished: List[Tuple[str, Path, bool]] = []
+        loaded = 0
+
+        def flush() -> None:
+            nonlocal rows, loaded
+            if pending:
+                self._commit(rows, list(pending.values()))
+                loaded += len(rows)
+            rows = []
+            pending.clear()
+
+        for path in self._segments():
+            segment = f"{path.parent.name}/{path.stem}"
+            offset, completed = offsets.get(segment, (0, 0))
+            if completed:
+                path.unlink(missing_ok=True)  # crashed between commit and unlink
+                continue
+
+            corrupt = False
+            for end, batch in read_records(path, offset):
+                if batch is None:
+                    corrupt = path.suffix == SEALED_SUFFIX
+                    break
+                rows.extend(batch)
+                entry = pending.setdefault(segment, _Pending(segment, end, 0, 0))
+                entry.offset = end
+                entry.records += 1
+                entry.rows += len(batch)
+                if len(rows) >= self.batch_rows:
+                    flush()
+
+            if corrupt:
+                log.error(f"❌ Registro corrupto en {path}; se omite el resto del segmento")
+
+            # Sealed segments are done once read; abandoned open ones after stale_after
+            abandoned = (path.suffix == OPEN_SUFFIX
+                         and time.time() - path.stat().st_mtime > self.stale_after)
+            if path.suffix == SEALED_SUFFIX or abandoned:
+                finished.append((segment, path, corrupt))
+
+        flush()
+        for segment, path, corrupt in finished:
+            self._mark_completed(segment, path, corrupt)
+        return loaded
+
+    def run(self, poll_interval: float = 1.0, stop: Optional[threading.Event] = None) -> None:
+        """Loop until ``stop`` is set (or forever)"""
+        stop = stop or threading.Event()
+        log.info(f"📥 Loader de ingesta leyendo {self.root}")
+        while not stop.is_set():
+            try:
+                loaded = self.run_once()
+            except sqlite3.Error as e:
+                log.warning(f"⚠️ Error de carga ({e}); se reintenta")
+                loaded = 0
+            if loaded:
+                log.info(f"📥 {loaded} posts cargados")
+            else:
+                stop.wait(poll_interval)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "rows_loaded": self.rows_loaded,
+            "transactions": self.transactions,
+            "segments_completed": self.segments_completed,
+            "avg_rows_per_transaction": round(self.rows_loaded / self.transactions, 1) if self.transactions else 0,
+        }
+
+
+def _build_default_loader() -> IngestLoader:
+    db_settings = get_settings().database
+    return IngestLoader(
+        db_settings.ingest_dir,
+        batch_rows=db_settings.ingest_loader_batch_rows,
+        stale_after=db_settings.ingest_stale_segment_s,
+    )
+
+
+def backlog() -> Dict[str, Any]:
+    """Bytes waiting in segments, per producer"""
+    root = Path(get_settings().database.ingest_dir)
+    with get_conn() as c:
+        c.execute(OFFSETS_DDL)
+        offsets = dict(c.execute("SELECT segment, offset FROM ingest_offsets WHERE completed = 0"))
+    producers: Dict[str, Dict[str, int]] = {}
+    if root.exists():
+        for path in sorted(root.glob("*/*")):
+            if path.suffix not in (OPEN_SUFFIX, SEALED_SUFFIX):
+                continue
+            entry = producers.setdefault(path.parent.name, {"segments": 0, "pending_bytes": 0})
+            consumed = offsets.get(f"{path.parent.name}/{path.stem}", len(SEGMENT_MAGIC))
+            entry["segments"] += 1
+            entry["pending_bytes"] += max(path.stat().st_size - consumed, 0)
+    return producers
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Log de ingesta de posts")
+    parser.add_argument("command", choices=["load", "status"])
+    parser.add_argument("--once", action="store_true", help="Cargar lo disponible y salir")
+    args = parser.parse_args(argv)
+
+    if args.command == "status":
+        producers = backlog()
+        for producer, entry in producers.items():
+            print(f"{producer}: {entry['segments']} segmentos, {entry['pending_bytes']} bytes pendientes")
+        if not producers:
+            print("Sin segmentos pendientes")
+        return 0
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    loader = _build_default_loader()
+    if args.once:
+        print(f"📥 {loader.run_once()} posts cargados")
+    else:
+        loader.run(get_settings().database.ingest_loader_poll_s)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,287 @@
+"""
+SQLite Connection Pool for Aqxion Scraper
+Pooled connections with a PRAGMA profile taken from DatabaseSettings
+"""
+
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+import logging
+
+from config.config_v2 import DatabaseSettings, get_db_path, get_settings
+from database.compression import connect, register_sql_functions
+
+log = logging.getLogger("db_pool")
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    """No connection became available within connection_timeout"""
+    pass
+
+
+@dataclass
+class PragmaProfile:
+    """PRAGMAs applied to every pooled connection"""
+    journal_mode: str = "WAL"
+    synchronous: str = "NORMAL"
+    cache_size: int = -64000
+    mmap_size: int = 268435456
+    temp_store: str = "MEMORY"
+    busy_timeout_ms: int = 5000
+    wal_autocheckpoint: int = 1000
+    auto_vacuum: str = "INCREMENTAL"
+
+    @classmethod
+    def from_settings(cls, db_settings: DatabaseSettings) -> "PragmaProfile":
+        journal_mode = db_settings.journal_mode
+        if journal_mode == "WAL" and not db_settings.enable_wal:
+            journal_mode = "DELETE"
+        return cls(
+            journal_mode=journal_mode,
+            synchronous=db_settings.synchronous_mode,
+            cache_size=db_settings.cache_size,
+            mmap_size=db_settings.mmap_size,
+            temp_store=db_settings.temp_store,
+            busy_timeout_ms=db_settings.busy_timeout_ms,
+            wal_autocheckpoint=db_settings.wal_autocheckpoint,
+            auto_vacuum=db_settings.auto_vacuum,
+        )
+
+    def apply(self, conn: sqlite3.Connection, read_only: bool = False) -> None:
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        if not read_only:
+            # Only takes effect before the first table exists (or after a VACUUM)
+            conn.execute(f"PRAGMA auto_vacuum={self.auto_vacuum}")
+            # journal_mode is persistent in the file; readers just inherit it
+            conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
+            conn.execute(f"PRAGMA wal_autocheckpoint={int(self.wal_autocheckpoint)}")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute(f"PRAGMA cache_size={int(self.cache_size)}")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute(f"PRAGMA temp_store={self.temp_store}")
+        if read_only:
+            conn.execute("PRAGMA query_only=1")
+        # zdecompress(): compressed text columns, FTS content views
+        register_sql_functions(conn)
+
+
+class ConnectionPool:
+    """Fixed-size pool of SQLite connections shared across threads"""
+
+    def __init__(self, path: Path, max_connections: int = 10, timeout: float = 30.0,
+                 profile: Optional[PragmaProfile] = None, read_only: bool = False):
+        self.path = Path(path)
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.profile = profile or PragmaProfile()
+        self.read_only = read_only
+
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+        self.acquired = 0
+        self.waits = 0
+        self.total_wait_seconds = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = connect(self.path, read_only=self.read_only, timeout=self.timeout,
+                       check_same_thread=False)
+        self.profile.apply(conn, read_only=self.read_only)
+        with self._lock:
+            self._created += 1
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """Take a connection, waiting up to ``timeout`` when all are in use"""
+        if self._closed:
+            raise sqlite3.ProgrammingError("Connection pool is closed")
+
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(f"No database connection available after {self.timeout}s "
+                              f"(max_connections={self.max_connections})")
+        waited = time.perf_counter() - start
+        if waited > 0.001:
+            self.waits += 1
+            self.total_wait_seconds += waited
+
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            try:
+                conn = self._connect()
+            except Exception:
+                self._slots.release()
+                raise
+        self.acquired += 1
+        return conn
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """Return a connection; uncommitted work is rolled back"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            with self._lock:
+                self._created -= 1
+        else:
+            if self._closed:
+                conn.close()
+            else:
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self) -> None:
+        """Close idle connections; busy ones are closed when released"""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def get_stats(self) -> Dict[str, float]:
+        return {
+            "path": str(self.path),
+            "read_only": self.read_only,
+            "max_connections": self.max_connections,
+            "open_connections": self._created,
+            "idle_connections": self._idle.qsize(),
+            "acquired": self.acquired,
+            "waits": self.waits,
+            "avg_wait_ms": round(self.total_wait_seconds / self.waits * 1000, 2) if self.waits else 0.0,
+        }
+
+
+class WalCheckpointer(threading.Thread):
+    """Background checkpoints so long-running readers don't let the WAL grow unbounded"""
+
+    def __init__(self, pool: ConnectionPool, interval: float = 30.0, truncate_above_mb: int = 64):
+        super().__init__(name="wal-checkpointer", daemon=True)
+        self.pool = pool
+        self.interval = interval
+        self.truncate_above_bytes = truncate_above_mb * 1024 * 1024
+        self._stop_event = threading.Event()
+        self.checkpoints = 0
+        self.truncations = 0
+        self.last_result: Optional[Tuple[int, int, int]] = None
+
+    @property
+    def wal_path(self) -> Path:
+        return self.pool.path.with_name(self.pool.path.name + "-wal")
+
+    def wal_size(self) -> int:
+        try:
+            return self.wal_path.stat().st_size
+        except OSError:
+            return 0
+
+    def checkpoint(self) -> Tuple[int, int, int]:
+        """PASSIVE checkpoint; TRUNCATE once the WAL file is over the limit"""
+        mode = "TRUNCATE" if self.wal_size() > self.truncate_above_bytes else "PASSIVE"
+        with self.pool.connection() as conn:
+            busy, log_frames, checkpointed = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+        self.checkpoints += 1
+        if mode == "TRUNCATE" and not busy:
+            self.truncations += 1
+        self.last_result = (busy, log_frames, checkpointed)
+        if busy:
+            log.debug(f"WAL checkpoint ({mode}) blocked by readers: {checkpointed}/{log_frames} frames")
+        return self.last_result
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.checkpoint()
+            except Exception as e:
+                log.debug(f"WAL checkpoint failed: {e}")
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+
+_pools: Dict[Tuple[str, bool], ConnectionPool] = {}
+_checkpointers: Dict[str, WalCheckpointer] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path: Optional[Path] = None, read_only: bool = False) -> ConnectionPool:
+    """Shared pool per (database path, read-only); created on first use"""
+    path = Path(path or get_db_path())
+    key = (str(path), read_only)
+
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            db_settings = get_settings().database
+            pool = ConnectionPool(
+                path,
+                max_connections=db_settings.max_connections,
+                timeout=db_settings.connection_timeout,
+                profile=PragmaProfile.from_settings(db_settings),
+                read_only=read_only,
+            )
+            _pools[key] = pool
+
+            if (not read_only and pool.profile.journal_mode == "WAL"
+                    and db_settings.checkpoint_interval > 0):
+                checkpointer = WalCheckpointer(pool, db_settings.checkpoint_interval,
+                                               db_settings.wal_truncate_above_mb)
+                checkpointer.start()
+                _checkpointers[str(path)] = checkpointer
+        return pool
+
+
+def close_pools() -> None:
+    """Stop checkpointers and close every pool"""
+    with _pools_lock:
+        for checkpointer in _checkpointers.values():
+            checkpointer.stop()
+        _checkpointers.clear()
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+def close_pool(path: Path) -> None:
+    """Stop the checkpointer and close both pools of one database file"""
+    path = Path(path)
+    with _pools_lock:
+        checkpointer = _checkpointers.pop(str(path), None)
+        if checkpointer is not None:
+            checkpointer.stop()
+        for read_only in (False, True):
+            pool = _pools.pop((str(path), read_only), None)
+            if pool is not None:
+                pool.close()
+
+
+def get_pool_stats() -> Dict[str, Dict]:
+    with _pools_lock:
+        stats = {}
+        for (path, read_only), pool in _pools.items():
+            entry = pool.get_stats()
+            checkpointer = _checkpointers.get(path)
+            if checkpointer is not None and not read_only:
+                entry["wal_bytes"] = checkpointer.wal_size()
+                entry["checkpoints"] = checkpointer.checkpoints
+                entry["wal_truncations"] = checkpointer.truncations
+            stats[f"{path}{' (ro)' if read_only else ''}"] = entry
+        return stats
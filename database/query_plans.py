@@ -0,0 +1,114 @@
+"""
+Query Plan Checks for Aqxion Scraper
+EXPLAIN QUERY PLAN over the report queries to catch full table scans
+
+Every dashboard/KPI query filters posts by day_bucket; if a schema change
+drops the supporting index the queries silently degrade to ``SCAN posts``.
+Run ``python -m database.query_plans`` after migrations to verify.
+"""
+
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple
+
+from database.db import get_read_conn, lima_day_bucket
+
+# (name, sql, params) of the hot report queries; params use a placeholder day
+REPORT_QUERIES: List[Tuple[str, str, Sequence[Any]]] = [
+    ("today_by_tag",
+     "SELECT tag, COUNT(*) FROM posts WHERE day_bucket = ? AND tag IS NOT NULL GROUP BY tag",
+     (20240101,)),
+    ("today_by_keyword_tag",
+     "SELECT keyword, tag, COUNT(*) FROM posts WHERE day_bucket = ? AND tag IS NOT NULL "
+     "GROUP BY keyword, tag",
+     (20240101,)),
+    ("today_keyword_scores",
+     "SELECT keyword, COUNT(*), AVG(relevance_score) FROM posts WHERE day_bucket = ? "
+     "AND keyword IS NOT NULL GROUP BY keyword",
+     (20240101,)),
+    ("today_alerts",
+     "SELECT tag, relevance_score FROM posts WHERE day_bucket = ? "
+     "AND tag IN ('dolor', 'busqueda') AND relevance_score >= ?",
+     (20240101, 70)),
+    ("today_actionable_dolores",
+     "SELECT COUNT(*) FROM posts WHERE day_bucket = ? AND tag = 'dolor' AND +relevance_score > ? "
+     "AND (LENGTH(title) > ? OR LENGTH(zdecompress(body)) > ?)",
+     (20240101, 70, 30, 50)),
+    ("recent_posts",
+     "SELECT keyword, title, url, tag, created_at, body FROM posts WHERE day_bucket = ? "
+     "ORDER BY created_epoch DESC LIMIT 10",
+     (20240101,)),
+    ("lead_browser_tag",
+     "SELECT rowid FROM posts WHERE tag = ? AND (relevance_score, created_at, id) < (?, ?, ?) "
+     "ORDER BY relevance_score DESC, created_at DESC, id DESC LIMIT 51",
+     ('dolor', 100, '2024-01-01', 'x')),
+    ("lead_browser_score_range",
+     "SELECT rowid FROM posts WHERE relevance_score >= ? AND +relevance_score <= ? "
+     "AND (relevance_score, created_at, id) < (?, ?, ?) "
+     "ORDER BY relevance_score DESC, created_at DESC, id DESC LIMIT 51",
+     (70, 120, 100, '2024-01-01', 'x')),
+    ("trend_7d",
+     (Path(__file__).with_name("trend.sql").read_text(encoding="utf-8-sig")
+      .strip().rstrip(";")),
+     ()),
+]
+
+
+def explain_query_plan(conn: sqlite3.Connection, sql: str,
+                       params: Sequence[Any] = ()) -> List[str]:
+    """Detail lines of EXPLAIN QUERY PLAN for ``sql``"""
+    return [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", tuple(params))]
+
+
+def uses_index(plan: List[str], table: str = "posts") -> bool:
+    """True when no step scans ``table`` without an index"""
+    for detail in plan:
+        words = detail.split()
+        if len(words) >= 2 and words[0] == "SCAN" and words[1] == table \
+                and "INDEX" not in detail:
+            return False
+    return True
+
+
+def assert_uses_index(conn: sqlite3.Connection, sql: str, params: Sequence[Any] = (),
+                      table: str = "posts") -> List[str]:
+    """Raise AssertionError if ``sql`` does a full scan of ``table``"""
+    plan = explain_query_plan(conn, sql, params)
+    if not uses_index(plan, table):
+        raise AssertionError(f"Full scan of {table}: {plan}")
+    return plan
+
+
+def check_report_queries(conn: sqlite3.Connection) -> Dict[str, Dict[str, Any]]:
+    """Plan and index usage for every report query"""
+    results = {}
+    for name, sql, params in REPORT_QUERIES:
+        try:
+            plan = explain_query_plan(conn, sql, params)
+        except sqlite3.OperationalError as e:
+            # Tables created on demand (kpi_daily) may not exist yet
+            if "no such table" not in str(e):
+                raise
+            plan = [f"SKIPPED ({e})"]
+        results[name] = {"plan": plan, "uses_index": uses_index(plan)}
+    return results
+
+
+def main() -> int:
+    with get_read_conn() as conn:
+        results = check_report_queries(conn)
+
+    print(f"Query plans (day_bucket de hoy = {lima_day_bucket()})")
+    failures = 0
+    for name, result in results.items():
+        status = "✅" if result["uses_index"] else "❌"
+        failures += not result["uses_index"]
+        print(f"{status} {name}")
+        for detail in result["plan"]:
+            print(f"     {detail}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,386 @@
+"""
+Retention Engine for Aqxion Scraper
+Archive expired rows to compressed, date-partitioned files, then delete them
+
+Each RetentionPolicy names a table, the column that dates its rows and how
+long to keep them. Expired rows are processed in small batches:
+
+1. the batch (plus child rows, e.g. a scan's signals) is appended to
+   ``<archive_dir>/<table>/<YYYY>/<MM>/<table>-<YYYY-MM-DD>.jsonl.gz`` and
+   fsynced;
+2. the rows are deleted (or, for ``strip_columns`` policies, the bulky
+   columns are set to NULL) in one short transaction.
+
+Archiving is at-least-once: a crash between 1 and 2 re-archives the batch
+on the next run. Free pages are returned to the OS with
+``PRAGMA incremental_vacuum`` when the database uses auto_vacuum=INCREMENTAL
+(``--convert-auto-vacuum`` switches an existing file with one full VACUUM).
+
+Deleting posts goes through the rollup and FTS triggers, so rollups reflect
+the retained rows. With DatabaseSettings.shard_posts the policies on
+``posts`` also run on every monthly shard that is still writable. Sealed
+shards are read-only (see database.shards), so sealing a month ends
+retention for its posts.
+
+Usage:
+    python -m database.retention [--dry-run] [--convert-auto-vacuum]
+"""
+
+import argparse
+import gzip
+import os
+import sqlite3
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import logging
+
+from config.config_v2 import get_settings
+from database.compression import decompress_value
+from database.db import (existing_shard_months, get_conn, is_sealed_shard, rebuild_search_index,
+                         shard_path, sharding_enabled)
+from database.pool import get_pool
+from utils.codec import to_json
+
+log = logging.getLogger("db_retention")
+
+TIME_ISO = "iso"      # naive ISO-8601 text written with datetime.now()
+TIME_EPOCH = "epoch"  # integer UTC seconds
+
+
+@dataclass
+class RetentionPolicy:
+    """How long rows of one table are kept and what happens when they expire"""
+    name: str
+    table: str
+    time_column: str
+    retention_days: int
+    time_format: str = TIME_ISO
+    where: str = ""                         # extra SQL filter, e.g. "tag = 'ruido'"
+    children: Sequence[Tuple[str, str]] = ()  # (child table, FK column) archived/deleted with the row
+    strip_columns: Sequence[str] = ()       # archive and NULL these columns instead of deleting
+    archive: bool = True
+
+    def cutoff(self, now: Optional[float] = None) -> Any:
+        now = time.time() if now is None else now
+        if self.time_format == TIME_EPOCH:
+            return int(now) - self.retention_days * 86400
+        return (datetime.fromtimestamp(now) - timedelta(days=self.retention_days)).isoformat()
+
+    def expired_filter(self) -> str:
+        clauses = [f"{self.time_column} < ?"]
+        if self.where:
+            clauses.append(f"({self.where})")
+        if self.strip_columns:
+            clauses.append("(" + " OR ".join(f"{col} IS NOT NULL" for col in self.strip_columns) + ")")
+        return " AND ".join(clauses)
+
+
+@dataclass
+class PolicyResult:
+    policy: str
+    rows_archived: int = 0
+    rows_deleted: int = 0
+    rows_stripped: int = 0
+    child_rows_deleted: int = 0
+    batches: int = 0
+    archive_files: List[str] = field(default_factory=list)
+    skipped: Optional[str] = None
+
+
+@dataclass
+class RetentionReport:
+    policies: List[PolicyResult] = field(default_factory=list)
+    bytes_before: int = 0
+    bytes_after: int = 0
+    freelist_pages_before: int = 0
+    freelist_pages_after: int = 0
+    vacuum_mode: str = ""
+    seconds: float = 0.0
+
+    @property
+    def bytes_reclaimed(self) -> int:
+        return max(self.bytes_before - self.bytes_after, 0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "policies": [vars(result) for result in self.policies],
+            "bytes_before": self.bytes_before,
+            "bytes_after": self.bytes_after,
+            "bytes_reclaimed": self.bytes_reclaimed,
+            "freelist_pages_before": self.freelist_pages_before,
+            "freelist_pages_after": self.freelist_pages_after,
+            "vacuum_mode": self.vacuum_mode,
+            "seconds": round(self.seconds, 3),
+        }
+
+
+def default_policies() -> List[RetentionPolicy]:
+    """Policies built from DatabaseSettings.retention_*"""
+    db_settings = get_settings().database
+    return [
+        RetentionPolicy("noise_posts", "posts", "created_epoch",
+                        db_settings.retention_noise_posts_days, time_format=TIME_EPOCH,
+                        where="tag = 'ruido'"),
+        RetentionPolicy("competition_runs", "competition_runs", "started_at",
+                        db_settings.retention_competition_runs_days,
+                        where="status != 'running'"),
+        # Whole scans first, so rows about to be deleted aren't stripped (and archived) twice
+        market_scans_policy(db_settings.retention_market_scans_days),
+        RetentionPolicy("scan_raw_data", "market_scans", "scan_timestamp",
+                        db_settings.retention_scan_raw_data_days, strip_columns=("raw_data",)),
+    ]
+
+
+def market_scans_policy(retention_days: int) -> RetentionPolicy:
+    return RetentionPolicy("market_scans", "market_scans", "scan_timestamp", retention_days,
+                           children=(("market_signals", "scan_id"),))
+
+
+class RetentionEngine:
+    """Applies retention policies against the main database and the writable posts shards"""
+
+    def __init__(self, policies: Optional[List[RetentionPolicy]] = None,
+                 archive_dir: Optional[Path] = None, batch_size: Optional[int] = None,
+                 vacuum_pages: Optional[int] = None):
+        db_settings = get_settings().database
+        self.policies = policies if policies is not None else default_policies()
+        self.archive_dir = Path(archive_dir or db_settings.retention_archive_dir)
+        self.batch_size = batch_size or db_settings.retention_batch_size
+        self.vacuum_pages = db_settings.retention_vacuum_pages if vacuum_pages is None else vacuum_pages
+
+    # ===== ENTRY POINT =====
+
+    def run(self, dry_run: bool = False) -> RetentionReport:
+        start = time.perf_counter()
+        report = RetentionReport()
+
+        with get_conn() as conn:
+            report.vacuum_mode = self._run_file(conn, self.policies, report, dry_run)
+
+        posts_policies = [policy for policy in self.policies if policy.table == "posts"]
+        if posts_policies and sharding_enabled():
+            for month in existing_shard_months():
+                path = shard_path(month)
+                if is_sealed_shard(path):
+                    continue
+                with get_pool(path).connection() as conn:
+                    self._run_file(conn, posts_policies, report, dry_run, shard=path.stem)
+
+        report.seconds = time.perf_counter() - start
+        deleted = sum(r.rows_deleted for r in report.policies)
+        log.info(f"🧹 Retención: {deleted} filas eliminadas, "
+                 f"{report.bytes_reclaimed / 1024:.0f} KB recuperados ({report.seconds:.1f}s)")
+        return report
+
+    def _run_file(self, conn: sqlite3.Connection, policies: List[RetentionPolicy],
+                  report: RetentionReport, dry_run: bool, shard: Optional[str] = None) -> str:
+        """Apply ``policies`` to one database file; results of a shard are named policy@shard"""
+        bytes_before, freelist_before = _db_size(conn)
+        for policy in policies:
+            result = self._count_expired(conn, policy) if dry_run else self._apply(conn, policy)
+            if shard:
+                result.policy = f"{result.policy}@{shard}"
+            report.policies.append(result)
+
+        vacuum_mode = "" if dry_run else self._incremental_vacuum(conn)
+        bytes_after, freelist_after = _db_size(conn)
+        report.bytes_before += bytes_before
+        report.bytes_after += bytes_after
+        report.freelist_pages_before += freelist_before
+        report.freelist_pages_after += freelist_after
+        return vacuum_mode
+
+    # ===== POLICIES =====
+
+    def _count_expired(self, conn: sqlite3.Connection, policy: RetentionPolicy) -> PolicyResult:
+        result = PolicyResult(policy.name)
+        if not _table_exists(conn, policy.table):
+            result.skipped = "table missing"
+            return result
+        count = conn.execute(f"SELECT COUNT(*) FROM {policy.table} WHERE {policy.expired_filter()}",
+                             (policy.cutoff(),)).fetchone()[0]
+        if policy.strip_columns:
+            result.rows_stripped = count
+        else:
+            result.rows_deleted = count
+        return result
+
+    def _apply(self, conn: sqlite3.Connection, policy: RetentionPolicy) -> PolicyResult:
+        result = PolicyResult(policy.name)
+        if not _table_exists(conn, policy.table):
+            result.skipped = "table missing"
+            return result
+
+        cutoff = policy.cutoff()
+        columns = _columns(conn, policy.table)
+        select = (f"SELECT rowid AS _rowid, {', '.join(columns)} FROM {policy.table} "
+                  f"WHERE {policy.expired_filter()} ORDER BY rowid LIMIT ?")
+        files = set()
+
+        while True:
+            rows = conn.execute(select, (cutoff, self.batch_size)).fetchall()
+            if not rows:
+                break
+            # Compressed text columns are archived as plain text
+            records = [dict(zip(('_rowid',) + columns, map(decompress_value, row))) for row in rows]
+            self._attach_children(conn, policy, records)
+
+            if policy.archive:
+                files.update(self._archive(policy, records))
+                result.rows_archived += len(records)
+
+            rowids = [(record['_rowid'],) for record in records]
+            try:
+                if policy.strip_columns:
+                    assignments = ", ".join(f"{col} = NULL" for col in policy.strip_columns)
+                    conn.executemany(f"UPDATE {policy.table} SET {assignments} WHERE rowid = ?", rowids)
+                    result.rows_stripped += len(rowids)
+                else:
+                    for child_table, fk in policy.children:
+                        key_column = _key_column(conn, policy.table)
+                        keys = [(record[key_column],) for record in records]
+                        cursor = conn.executemany(f"DELETE FROM {child_table} WHERE {fk} = ?", keys)
+                        result.child_rows_deleted += max(cursor.rowcount, 0)
+                    conn.executemany(f"DELETE FROM {policy.table} WHERE rowid = ?", rowids)
+                    result.rows_deleted += len(rowids)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            result.batches += 1
+
+        result.archive_files = sorted(files)
+        return result
+
+    def _attach_children(self, conn: sqlite3.Connection, policy: RetentionPolicy,
+                         records: List[Dict[str, Any]]) -> None:
+        if policy.strip_columns or not policy.children:
+            return
+        key_column = _key_column(conn, policy.table)
+        for child_table, fk in policy.children:
+            if not _table_exists(conn, child_table):
+                continue
+            child_columns = _columns(conn, child_table)
+            for record in records:
+                rows = conn.execute(f"SELECT {', '.join(child_columns)} FROM {child_table} WHERE {fk} = ?",
+                                    (record[key_column],)).fetchall()
+                record.setdefault('_children', {})[child_table] = [dict(zip(child_columns, r)) for r in rows]
+
+    # ===== ARCHIVE =====
+
+    def _archive(self, policy: RetentionPolicy, records: List[Dict[str, Any]]) -> List[str]:
+        """Append records to one gzip member per day partition; fsync before returning"""
+        partitions: Dict[str, List[Dict[str, Any]]] = {}
+        for record in records:
+            partitions.setdefault(_partition_day(record.get(policy.time_column), policy.time_format),
+                                  []).append(record)
+
+        written = []
+        for day, day_records in partitions.items():
+            path = self.archive_dir / policy.table / day[:4] / day[5:7] / f"{policy.table}-{day}.jsonl.gz"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            payload = "".join(to_json({**r, '_policy': policy.name}) + "\n" for r in day_records)
+            # Each append is a new gzip member; gzip readers concatenate them
+            with open(path, "ab") as raw:
+                with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as gz:
+                    gz.write(payload.encode("utf-8"))
+                raw.flush()
+                os.fsync(raw.fileno())
+            written.append(str(path))
+        return written
+
+    # ===== VACUUM =====
+
+    def _incremental_vacuum(self, conn: sqlite3.Connection) -> str:
+        mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        if mode != 2:
+            return "none (auto_vacuum is not INCREMENTAL)"
+        pages = f"({int(self.vacuum_pages)})" if self.vacuum_pages else ""
+        # executescript steps the pragma to completion; execute() frees a single page
+        conn.commit()
+        conn.executescript(f"PRAGMA incremental_vacuum{pages};")
+        # Checkpoint so the truncated file size is visible on disk
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        return "incremental"
+
+
+def convert_to_incremental_vacuum() -> None:
+    """Switch an existing database to auto_vacuum=INCREMENTAL (full VACUUM, one time).
+
+    VACUUM may renumber rowids of tables without INTEGER PRIMARY KEY, so the
+    FTS indexes are rebuilt afterwards.
+    """
+    with get_conn() as conn:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+    rebuild_search_index()
+
+
+# ===== HELPERS =====
+
+def _table_exists(conn: sqlite3.Connection, table: str) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                        (table,)).fetchone() is not None
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> Tuple[str, ...]:
+    # table_info omits generated columns, which don't need archiving
+    return tuple(row[1] for row in conn.execute(f"PRAGMA table_info({table})"))
+
+
+def _key_column(conn: sqlite3.Connection, table: str) -> str:
+    pk = [row[1] for row in conn.execute(f"PRAGMA table_info({table})") if row[5]]
+    return pk[0] if len(pk) == 1 else "_rowid"
+
+
+def _partition_day(value: Any, time_format: str) -> str:
+    try:
+        if time_format == TIME_EPOCH:
+            return datetime.fromtimestamp(int(value), timezone.utc).strftime("%Y-%m-%d")
+        return datetime.fromisoformat(str(value)).strftime("%Y-%m-%d")
+    except (TypeError, ValueError):
+        return "unknown"
+
+
+def _db_size(conn: sqlite3.Connection) -> Tuple[int, int]:
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return page_size * page_count, freelist
+
+
+def run_retention(dry_run: bool = False) -> RetentionReport:
+    return RetentionEngine().run(dry_run=dry_run)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Retención: archivar y eliminar filas expiradas")
+    parser.add_argument("--dry-run", action="store_true", help="Solo contar filas expiradas")
+    parser.add_argument("--convert-auto-vacuum", action="store_true",
+                        help="Cambiar la base a auto_vacuum=INCREMENTAL (VACUUM completo)")
+    args = parser.parse_args(argv)
+
+    if args.convert_auto_vacuum:
+        convert_to_incremental_vacuum()
+        print("✅ auto_vacuum=INCREMENTAL activado")
+
+    report = run_retention(dry_run=args.dry_run)
+    for result in report.policies:
+        if result.skipped:
+            print(f"⏭️  {result.policy}: {result.skipped}")
+            continue
+        print(f"🧹 {result.policy}: {result.rows_deleted} eliminadas, {result.rows_stripped} recortadas, "
+              f"{result.rows_archived} archivadas ({result.batches} lotes)")
+    print(f"💾 Recuperado: {report.bytes_reclaimed / 1024:.1f} KB "
+          f"({report.bytes_before} → {report.bytes_after} bytes, vacuum: {report.vacuum_mode or 'n/a'})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
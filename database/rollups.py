@@ -0,0 +1,212 @@
+"""
+Post Rollups for Aqxion Scraper
+Hour and day aggregates per (keyword, tag), maintained by triggers on posts
+
+Dashboards and kpi() used to GROUP BY over every post of the day on each
+rerun. The rollup tables hold one row per bucket/keyword/tag with the post
+count, the sum of relevance scores and the number of high-value posts
+(relevance_score > scraping.min_relevance_score, the same strict comparison
+kpi() always used for dolores_calidad), so reports read O(buckets) rows.
+Triggers keep them exact for inserts, upserts that change a post and
+deletes; ``python -m database.rollups rebuild`` recomputes them in the main
+database and in every writable posts shard.
+
+NULL keyword/tag are stored as '' so they can be part of the primary key.
+"""
+
+import argparse
+import sqlite3
+import sys
+from typing import Dict, List, Optional
+import logging
+
+from config.config_v2 import get_settings
+from database.db import is_sealed_shard, posts_db_paths
+from database.pool import get_pool
+
+log = logging.getLogger("db_rollups")
+
+INTENT_TAGS = ("dolor", "busqueda", "objecion")
+
+ROLLUP_DDL = """
+CREATE TABLE IF NOT EXISTS post_rollup_hourly (
+    hour_epoch INTEGER NOT NULL,   -- inicio de la hora en epoch UTC
+    day_bucket INTEGER NOT NULL,   -- día local de Lima (YYYYMMDD)
+    keyword TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    posts INTEGER NOT NULL DEFAULT 0,
+    score_sum INTEGER NOT NULL DEFAULT 0,
+    high_value INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (hour_epoch, keyword, tag)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_rollup_hourly_day ON post_rollup_hourly(day_bucket);
+
+CREATE TABLE IF NOT EXISTS post_rollup_daily (
+    day_bucket INTEGER NOT NULL,
+    keyword TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    posts INTEGER NOT NULL DEFAULT 0,
+    score_sum INTEGER NOT NULL DEFAULT 0,
+    high_value INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day_bucket, keyword, tag)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS rollup_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_TRIGGER_NAMES = ("trg_posts_rollup_insert", "trg_posts_rollup_delete", "trg_posts_rollup_update")
+
+
+def _apply_sql(ref: str, sign: str, high_value_score: int) -> str:
+    """Statements adding (sign '') or removing (sign '-') the NEW/OLD row from both rollups"""
+    high_value = f"(CASE WHEN {ref}.relevance_score > {high_value_score} THEN 1 ELSE 0 END)"
+    values = f"{sign}1, {sign}COALESCE({ref}.relevance_score, 0), {sign}{high_value}"
+    # INSERT ... SELECT ... WHERE lets the trigger skip rows without time columns
+    guard = f"WHERE {ref}.created_epoch IS NOT NULL AND {ref}.day_bucket IS NOT NULL"
+    return f"""
+    INSERT INTO post_rollup_hourly(hour_epoch, day_bucket, keyword, tag, posts, score_sum, high_value)
+    SELECT {ref}.created_epoch - {ref}.created_epoch % 3600, {ref}.day_bucket,
+           COALESCE({ref}.keyword, ''), COALESCE({ref}.tag, ''), {values}
+    {guard}
+    ON CONFLICT(hour_epoch, keyword, tag) DO UPDATE SET
+        posts = posts + excluded.posts,
+        score_sum = score_sum + excluded.score_sum,
+        high_value = high_value + excluded.high_value;
+    INSERT INTO post_rollup_daily(day_bucket, keyword, tag, posts, score_sum, high_value)
+    SELECT {ref}.day_bucket, COALESCE({ref}.keyword, ''), COALESCE({ref}.tag, ''), {values}
+    {guard}
+    ON CONFLICT(day_bucket, keyword, tag) DO UPDATE SET
+        posts = posts + excluded.posts,
+        score_sum = score_sum + excluded.score_sum,
+        high_value = high_value + excluded.high_value;"""
+
+
+def _trigger_statements(high_value_score: int) -> List[str]:
+    add_new = _apply_sql("NEW", "", high_value_score)
+    remove_old = _apply_sql("OLD", "-", high_value_score)
+    return [
+        f"CREATE TRIGGER trg_posts_rollup_insert AFTER INSERT ON posts\nBEGIN{add_new}\nEND",
+        f"CREATE TRIGGER trg_posts_rollup_delete AFTER DELETE ON posts\nBEGIN{remove_old}\nEND",
+        "CREATE TRIGGER trg_posts_rollup_update\n"
+        "AFTER UPDATE OF keyword, tag, relevance_score, created_epoch, day_bucket ON posts\n"
+        f"BEGIN{remove_old}{add_new}\nEND",
+    ]
+
+
+_REBUILD_SQL = """
+DELETE FROM post_rollup_hourly;
+DELETE FROM post_rollup_daily;
+INSERT INTO post_rollup_hourly(hour_epoch, day_bucket, keyword, tag, posts, score_sum, high_value)
+SELECT created_epoch - created_epoch % 3600, day_bucket, COALESCE(keyword, ''), COALESCE(tag, ''),
+       COUNT(*), COALESCE(SUM(relevance_score), 0), SUM(relevance_score > {score})
+FROM posts
+WHERE created_epoch IS NOT NULL AND day_bucket IS NOT NULL
+GROUP BY 1, 3, 4;
+INSERT INTO post_rollup_daily(day_bucket, keyword, tag, posts, score_sum, high_value)
+SELECT day_bucket, keyword, tag, SUM(posts), SUM(score_sum), SUM(high_value)
+FROM post_rollup_hourly
+GROUP BY day_bucket, keyword, tag;
+"""
+
+
+def _high_value_score() -> int:
+    return int(get_settings().scraping.min_relevance_score)
+
+
+def _high_value_rule(score: int) -> str:
+    """Regla guardada en rollup_meta; si cambia (umbral u operador) se reconstruye"""
+    return f"relevance_score > {score}"
+
+
+def _install_triggers(c: sqlite3.Connection, high_value_score: int) -> None:
+    for name in _TRIGGER_NAMES:
+        c.execute(f"DROP TRIGGER IF EXISTS {name}")
+    # execute() rather than executescript(): stays inside the caller's transaction
+    for statement in _trigger_statements(high_value_score):
+        c.execute(statement)
+    c.execute("INSERT OR REPLACE INTO rollup_meta(key, value) VALUES ('high_value_rule', ?)",
+              (_high_value_rule(high_value_score),))
+
+
+def rebuild_rollups(conn: Optional[sqlite3.Connection] = None) -> Dict[str, int]:
+    """Recompute both rollups from posts (backfill or after changing the threshold)
+
+    Without ``conn`` every posts file is rebuilt: the main database and each
+    writable shard. Sealed shards are read-only and keep their rollups.
+    """
+    if conn is None:
+        totals = {"hourly_rows": 0, "daily_rows": 0, "high_value_score": _high_value_score()}
+        for path in posts_db_paths():
+            if is_sealed_shard(path):
+                log.warning(f"Shard sellado {path.name}: rollups sin reconstruir")
+                continue
+            with get_pool(path).connection() as c:
+                result = rebuild_rollups(c)
+            totals["hourly_rows"] += result["hourly_rows"]
+            totals["daily_rows"] += result["daily_rows"]
+        return totals
+
+    score = _high_value_score()
+    conn.executescript(ROLLUP_DDL)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        _install_triggers(conn, score)
+        for statement in _REBUILD_SQL.format(score=score).split(";"):
+            if statement.strip():
+                conn.execute(statement)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    hourly = conn.execute("SELECT COUNT(*) FROM post_rollup_hourly").fetchone()[0]
+    daily = conn.execute("SELECT COUNT(*) FROM post_rollup_daily").fetchone()[0]
+    log.info(f"Rollups reconstruidos: {hourly} filas por hora, {daily} por día (high_value > {score})")
+    return {"hourly_rows": hourly, "daily_rows": daily, "high_value_score": score}
+
+
+def ensure_rollups(conn: sqlite3.Connection) -> None:
+    """Create rollup tables/triggers; rebuild when missing or the threshold changed"""
+    conn.executescript(ROLLUP_DDL)
+    row = conn.execute("SELECT value FROM rollup_meta WHERE key = 'high_value_rule'").fetchone()
+    installed = {r[0] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_posts_rollup_%'")}
+
+    if row is None or row[0] != _high_value_rule(_high_value_score()) or installed != set(_TRIGGER_NAMES):
+        rebuild_rollups(conn)
+
+
+# ===== READ API =====
+
+def total_posts(conn: Optional[sqlite3.Connection] = None) -> int:
+    """Total de posts con fecha (sumando los buckets diarios).
+
+    Sin ``conn`` suma la base principal y todos los shards de posts.
+    """
+    sql = "SELECT COALESCE(SUM(posts), 0) FROM post_rollup_daily"
+    if conn is not None:
+        return conn.execute(sql).fetchone()[0]
+    total = 0
+    for path in posts_db_paths():
+        with get_pool(path, read_only=True).connection() as c:
+            total += c.execute(sql).fetchone()[0]
+    return total
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Rollups de posts por hora/día")
+    parser.add_argument("command", choices=["rebuild"], help="rebuild: recalcular desde posts")
+    parser.parse_args(argv)
+
+    from database.db import init_db
+    init_db()
+    result = rebuild_rollups()
+    print(f"✅ Rollups reconstruidos: {result}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
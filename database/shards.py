@@ -0,0 +1,118 @@
+"""
+Posts Shard Maintenance for Aqxion Scraper
+List, seal and compact the monthly posts_YYYYMM.db shards
+
+Only the newest ``shard_writable_months`` shards receive writes (the current
+month, plus the previous one for posts re-scraped across the month boundary).
+Sealing an older shard checkpoints and compacts it with VACUUM, switches it
+to journal_mode=DELETE (no -wal/-shm needed to read it) and makes the file
+read-only, after which readers attach it with immutable=1. A sealed shard
+can be moved to cheaper storage and symlinked back into shard_dir.
+Retention (database.retention) skips sealed shards: posts still inside
+their retention window when the month is sealed stay in the file.
+
+Usage:
+    python -m database.shards list
+    python -m database.shards seal [--month YYYYMM]
+"""
+
+import argparse
+import os
+import sqlite3
+import stat
+import sys
+from typing import Any, Dict, List, Optional
+import logging
+
+from config.config_v2 import get_settings
+from database.db import (add_months, current_shard_month, existing_shard_months,
+                         is_sealed_shard, shard_path)
+from database.compression import connect
+from database.pool import close_pool
+
+log = logging.getLogger("db_shards")
+
+
+def shard_info() -> List[Dict[str, Any]]:
+    """Size, row count and state of every shard"""
+    info = []
+    for month in existing_shard_months():
+        path = shard_path(month)
+        conn = connect(path, read_only=True)
+        try:
+            rows = conn.execute("SELECT COUNT(*) FROM posts").fetchone()[0]
+        except sqlite3.Error:
+            rows = None
+        finally:
+            conn.close()
+        info.append({
+            "month": month,
+            "path": str(path),
+            "bytes": path.stat().st_size,
+            "rows": rows,
+            "sealed": is_sealed_shard(path),
+        })
+    return info
+
+
+def sealable_months() -> List[int]:
+    """Shards older than the writable window that are not sealed yet"""
+    oldest_writable = add_months(current_shard_month(), -(get_settings().database.shard_writable_months - 1))
+    return [m for m in existing_shard_months()
+            if m < oldest_writable and not is_sealed_shard(shard_path(m))]
+
+
+def seal_shard(month: int) -> Dict[str, Any]:
+    """Compact a shard and make it read-only"""
+    oldest_writable = add_months(current_shard_month(), -(get_settings().database.shard_writable_months - 1))
+    if month >= oldest_writable:
+        raise ValueError(f"El shard {month} sigue recibiendo escrituras")
+
+    path = shard_path(month)
+    close_pool(path)  # nothing in this process may keep it open
+    before = path.stat().st_size
+
+    conn = connect(path)
+    try:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        conn.execute("PRAGMA journal_mode=DELETE").fetchone()
+        conn.execute("PRAGMA optimize")
+        conn.execute("INSERT INTO posts_fts(posts_fts) VALUES ('optimize')")
+        conn.commit()
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+    mode = os.stat(path).st_mode
+    os.chmod(path, mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+    after = path.stat().st_size
+    log.info(f"🔒 Shard {month} sellado: {before} → {after} bytes")
+    return {"month": month, "bytes_before": before, "bytes_after": after}
+
+
+def seal_old_shards() -> List[Dict[str, Any]]:
+    return [seal_shard(month) for month in sealable_months()]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Mantenimiento de shards mensuales de posts")
+    parser.add_argument("command", choices=["list", "seal"])
+    parser.add_argument("--month", type=int, help="Shard a sellar (YYYYMM); por defecto todos los elegibles")
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for entry in shard_info():
+            state = "🔒 sellado" if entry["sealed"] else "✏️  escribible"
+            print(f"{entry['month']}  {entry['rows']!s:>9} posts  {entry['bytes'] / 1024 / 1024:8.1f} MB  {state}")
+        return 0
+
+    results = [seal_shard(args.month)] if args.month else seal_old_shards()
+    for result in results:
+        print(f"🔒 {result['month']}: {result['bytes_before']} → {result['bytes_after']} bytes")
+    if not results:
+        print("No hay shards para sellar")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
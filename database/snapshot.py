@@ -0,0 +1,252 @@
+"""
+Dashboard Snapshots for Aqxion Scraper
+Memoized query results invalidated by PRAGMA data_version
+
+Streamlit re-runs the whole dashboard script on every interaction. Instead
+of reopening connections and recomputing every aggregate, readers go
+through a VersionedCache: it keeps one dedicated read-only connection per
+database file and asks SQLite for ``PRAGMA data_version``, which only
+changes when another connection commits to that file. While it is
+unchanged, cached results are returned without running any query (the
+check reads the WAL index in shared memory, no locks on the scraper's
+database).
+
+When something changed, today_snapshot() recomputes all "today" metrics
+from a single scan of the day's posts (day_bucket index) instead of one
+query per widget.
+"""
+
+import heapq
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+from dataclasses import dataclass, field, replace
+from itertools import chain
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+import logging
+
+from config.config_v2 import get_settings
+from database.compression import connect, decompress_value
+from database.db import day_posts_db_paths, lima_day_bucket, posts_db_path, posts_db_paths
+from database.pool import PragmaProfile, get_pool
+from database.rollups import INTENT_TAGS, total_posts
+
+log = logging.getLogger("db_snapshot")
+
+T = TypeVar("T")
+
+HOT_TAGS = ("dolor", "busqueda")
+LIMA_UTC_OFFSET_S = 5 * 3600
+
+
+class VersionedCache:
+    """Query results memoized until the database file changes"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._version: Optional[int] = None
+        self._results: Dict[Any, Any] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = connect(self.path, read_only=True, check_same_thread=False)
+            PragmaProfile.from_settings(get_settings().database).apply(conn, read_only=True)
+            self._conn = conn
+        return self._conn
+
+    def version(self) -> int:
+        """data_version of the file as seen by the dedicated connection"""
+        with self._lock:
+            return self._check()
+
+    @property
+    def cached_version(self) -> Optional[int]:
+        """data_version the cached results belong to"""
+        return self._version
+
+    def _check(self) -> int:
+        version = self._connection().execute("PRAGMA data_version").fetchone()[0]
+        if version != self._version:
+            self._results.clear()
+            self._version = version
+        return version
+
+    def get(self, key: Any, compute: Callable[[sqlite3.Connection], T]) -> T:
+        """Cached result for ``key``; ``compute(conn)`` runs only after a change"""
+        with self._lock:
+            self._check()
+            if key in self._results:
+                self.hits += 1
+                return self._results[key]
+            self.misses += 1
+            result = compute(self._connection())
+            self._results[key] = result
+            return result
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._version = None
+            self._results.clear()
+
+
+_caches: Dict[str, VersionedCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(path: Optional[Path] = None) -> VersionedCache:
+    """Shared cache per database file (the file holding today's posts by default)"""
+    path = Path(path or posts_db_path())
+    with _caches_lock:
+        cache = _caches.get(str(path))
+        if cache is None:
+            cache = VersionedCache(path)
+            _caches[str(path)] = cache
+        return cache
+
+
+def close_caches() -> None:
+    with _caches_lock:
+        for cache in _caches.values():
+            cache.close()
+        _caches.clear()
+
+
+# ===== TODAY SNAPSHOT =====
+
+TODAY_POST_COLUMNS = ('id', 'source', 'url', 'title', 'lang', 'created_at', 'keyword', 'tag',
+                      'published_at', 'relevance_score', 'created_epoch')
+
+
+@dataclass
+class TodaySnapshot:
+    """Every metric of the dashboard for one Lima day; row tuples match the rollups API"""
+    day_bucket: int
+    version: int
+    computed_at: float
+    total_posts: int = 0
+    posts: List[Tuple] = field(default_factory=list)                    # TODAY_POST_COLUMNS
+    tag_counts: Dict[str, int] = field(default_factory=dict)
+    keyword_tag_counts: List[Tuple[str, str, int]] = field(default_factory=list)
+    keyword_intent: List[Tuple[str, int, int, float]] = field(default_factory=list)
+    keyword_scores: List[Tuple[str, int, float, int]] = field(default_factory=list)
+    hourly_intent: List[Tuple[str, int, int, float]] = field(default_factory=list)
+    tag_distribution: List[Tuple[str, int, float]] = field(default_factory=list)
+    market_alerts: List[Tuple[str, str, str, int, str, str]] = field(default_factory=list)
+    recent_posts: List[Tuple[str, str, str, str, str, Optional[str]]] = field(default_factory=list)
+
+
+def _pct(part: int, total: int) -> float:
+    return round(part * 100.0 / total, 1) if total else 0.0
+
+
+def _compute_today(conns: List[sqlite3.Connection], day: int, version: int, recent_limit: int,
+                   alert_limit: int, min_keyword_posts: int, top_limit: int) -> TodaySnapshot:
+    snapshot = TodaySnapshot(day_bucket=day, version=version, computed_at=time.time())
+    min_score = get_settings().scraping.min_relevance_score
+
+    tags: Counter = Counter()
+    keyword_tags: Counter = Counter()
+    keyword_posts: Counter = Counter()
+    keyword_intent: Counter = Counter()
+    keyword_hot: Counter = Counter()
+    keyword_score: Counter = Counter()
+    hours: Dict[str, List[int]] = defaultdict(lambda: [0, 0])
+    alerts: List[Tuple] = []
+    recent: List[Tuple] = []
+
+    # Una sola pasada por los posts del día en cada archivo (índice por day_bucket)
+    rows = chain.from_iterable(conn.execute(f"""
+        SELECT {', '.join(TODAY_POST_COLUMNS)} FROM posts WHERE day_bucket = ?
+    """, (day,)) for conn in conns)
+    for row in rows:
+        (post_id, _, url, title, _, created_at, keyword, tag, _, score, epoch) = row
+        snapshot.posts.append(row)
+        tag = tag or ''
+        keyword = keyword or ''
+        score = score or 0
+
+        if tag:
+            tags[tag] += 1
+            keyword_tags[(keyword, tag)] += 1
+        keyword_posts[keyword] += 1
+        keyword_score[keyword] += score
+        if tag in INTENT_TAGS:
+            keyword_intent[keyword] += 1
+        if tag in HOT_TAGS:
+            keyword_hot[keyword] += 1
+        if epoch is not None:
+            hour = hours[f"{((epoch - LIMA_UTC_OFFSET_S) % 86400) // 3600:02d}"]
+            hour[0] += 1
+            hour[1] += tag in INTENT_TAGS
+            recent.append((epoch, post_id))
+        if tag in HOT_TAGS and score >= min_score:
+            alerts.append((score, epoch or 0, (title, url, tag, score, keyword or None, created_at)))
+
+    snapshot.tag_counts = dict(tags)
+    snapshot.keyword_tag_counts = [(keyword or None, tag, count)
+                                   for (keyword, tag), count in keyword_tags.most_common(top_limit)]
+    snapshot.keyword_intent = sorted(
+        ((keyword or None, total, keyword_intent[keyword], _pct(keyword_intent[keyword], total))
+         for keyword, total in keyword_posts.items()),
+        key=lambda r: (-r[3], -r[1]))[:top_limit]
+    snapshot.keyword_scores = sorted(
+        ((keyword, total, keyword_score[keyword] / total, keyword_hot[keyword])
+         for keyword, total in keyword_posts.items() if keyword and total >= min_keyword_posts),
+        key=lambda r: (-r[3], -r[2]))[:top_limit]
+    snapshot.hourly_intent = [(hour, total, intent, _pct(intent, total))
+                              for hour, (total, intent) in sorted(hours.items())]
+    tagged = sum(tags.values())
+    snapshot.tag_distribution = [(tag, count, _pct(count, tagged)) for tag, count in tags.most_common()]
+    snapshot.market_alerts = [alert for _, _, alert in
+                              heapq.nlargest(alert_limit, alerts, key=lambda a: (a[0], a[1]))]
+
+    # Solo los posts recientes necesitan el body (comprimido en disco)
+    recent_ids = [post_id for _, post_id in heapq.nlargest(recent_limit, recent)]
+    if recent_ids:
+        by_id = {}
+        for conn in conns:
+            by_id.update((row[0], row[1:]) for row in conn.execute(f"""
+                SELECT id, keyword, title, url, tag, created_at, body FROM posts
+                WHERE id IN ({', '.join('?' for _ in recent_ids)})
+            """, recent_ids))
+        snapshot.recent_posts = [(*by_id[i][:5], decompress_value(by_id[i][5]))
+                                 for i in recent_ids if i in by_id]
+
+    return snapshot
+
+
+def today_snapshot(day: Optional[int] = None, recent_limit: int = 10, alert_limit: int = 5,
+                   min_keyword_posts: int = 3, top_limit: int = 10) -> TodaySnapshot:
+    """Metrics of the day, recomputed only when a file holding the day's posts changed
+
+    The day's posts live in its shard and, for months sealed or written
+    before sharding, in the main database too. The snapshot is cached with
+    the shard; the data_version of the main database is part of its key.
+    """
+    day = day or lima_day_bucket()
+    path, *others = day_posts_db_paths(day)
+    cache = get_cache(path)
+    others_version = tuple(get_cache(other).version() for other in others)
+    key = ("today", day, recent_limit, alert_limit, min_keyword_posts, top_limit, others_version)
+
+    def compute(conn: sqlite3.Connection) -> TodaySnapshot:
+        with ExitStack() as stack:
+            conns = [conn] + [stack.enter_context(get_pool(other, read_only=True).connection())
+                              for other in others]
+            return _compute_today(conns, day, cache.cached_version, recent_limit, alert_limit,
+                                  min_keyword_posts, top_limit)
+    snapshot = cache.get(key, compute)
+    # Whole history: rollups of the main database and every shard, each
+    # memoized until its own file changes (sealed shards never do)
+    total = sum(get_cache(path).get(("total_posts",), total_posts) for path in posts_db_paths())
+    return replace(snapshot, total_posts=total)
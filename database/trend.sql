@@ -1,11 +1,14 @@
 ﻿-- KPI de tendencia (7 días)
 -- Muestra evolución diaria de dolores, búsquedas, objeciones y total
-SELECT DATE(created_at) d,
-       SUM(tag='dolor') dolores,
-       SUM(tag='busqueda') busquedas,
-       SUM(tag='objecion') objeciones,
-       COUNT(*) total
-FROM posts
-WHERE DATE(created_at) >= DATE('now','-6 day')
-GROUP BY d
-ORDER BY d;
+-- Lee los snapshots diarios de kpi_daily (una fila por día, ver utils/kpi.py);
+-- ejecutar antes `python -m utils.kpi --days 7` para completar días faltantes
+SELECT day_bucket d,
+       dolores,
+       busquedas,
+       objeciones,
+       total,
+       leads,
+       conversion_pct
+FROM kpi_daily
+WHERE day_bucket >= CAST(strftime('%Y%m%d','now','-5 hours','-6 days') AS INTEGER)
+ORDER BY day_bucket;
@@ -0,0 +1,214 @@
+"""
+Batched Async DB Writer for Aqxion Scraper
+A single writer task groups posts into executemany transactions
+"""
+
+import asyncio
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+from config.config_v2 import get_db_path, get_settings
+from database.compression import connect
+from database.db import normalize_post, route_posts, shard_target, sharding_enabled, upsert_posts
+from database.pool import PragmaProfile
+
+log = logging.getLogger("db_writer")
+
+
+@dataclass
+class WriterStats:
+    """Throughput counters for the writer"""
+    rows_written: int = 0
+    rows_failed: int = 0
+    batches: int = 0
+    largest_batch: int = 0
+    total_commit_seconds: float = 0.0
+
+
+class AsyncBatchWriter:
+    """Queue-fed writer: groups rows by size or time and acknowledges after commit"""
+
+    def __init__(self, batch_size: int = 500, max_delay: float = 0.05, queue_size: int = 10000):
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.queue_size = queue_size
+        self.stats = WriterStats()
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # One thread owns the SQLite connections (one per shard); the event loop never touches disk
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._conns: Dict[str, sqlite3.Connection] = {}
+
+    # ===== LIFECYCLE =====
+
+    def start(self) -> None:
+        """Start the writer task on the running loop (idempotent)"""
+        if self._task is not None and not self._task.done():
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Flush pending rows and stop the writer"""
+        if self._task is None:
+            return
+
+        await self._queue.put(None)  # sentinel: drain then exit
+        try:
+            await self._task
+        finally:
+            self._task = None
+            if self._executor is not None:
+                await asyncio.get_running_loop().run_in_executor(self._executor, self._close_conn)
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+    # ===== PRODUCERS =====
+
+    async def submit(self, post: Dict[str, Any]) -> asyncio.Future:
+        """Queue a post; the returned future resolves once it is committed"""
+        row = normalize_post(post)  # validation errors surface to the producer immediately
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, future))
+        return future
+
+    async def write(self, post: Dict[str, Any]) -> bool:
+        """Queue a post and wait for its durable acknowledgement"""
+        return await (await self.submit(post))
+
+    async def write_many(self, posts: List[Dict[str, Any]]) -> List[Any]:
+        """Queue several posts; returns True or the exception for each one"""
+        futures = []
+        for post in posts:
+            try:
+                futures.append(await self.submit(post))
+            except ValueError as e:
+                failed = asyncio.get_running_loop().create_future()
+                failed.set_exception(e)
+                futures.append(failed)
+        return await asyncio.gather(*futures, return_exceptions=True)
+
+    # ===== WRITER TASK =====
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+
+            # Gather more rows until the batch is full or max_delay elapses
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                try:
+                    item = self._queue.get_nowait() if timeout <= 0 else \
+                        await asyncio.wait_for(self._queue.get(), timeout)
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(loop, batch)
+
+    async def _flush(self, loop: asyncio.AbstractEventLoop,
+                     batch: List[Tuple[Dict[str, Any], asyncio.Future]]) -> None:
+        rows = [row for row, _ in batch]
+        start = time.perf_counter()
+        try:
+            await loop.run_in_executor(self._executor, self._write_rows, rows)
+        except Exception as e:
+            log.warning(f"⚠️ Batch of {len(rows)} failed ({e}), retrying row by row")
+            await self._flush_individually(loop, batch)
+            return
+
+        self._record_batch(len(rows), time.perf_counter() - start)
+        for _, future in batch:
+            if not future.done():
+                future.set_result(True)
+
+    async def _flush_individually(self, loop: asyncio.AbstractEventLoop,
+                                  batch: List[Tuple[Dict[str, Any], asyncio.Future]]) -> None:
+        """Isolate the row(s) that made a batch fail"""
+        for row, future in batch:
+            try:
+                await loop.run_in_executor(self._executor, self._write_rows, [row])
+                self.stats.rows_written += 1
+                if not future.done():
+                    future.set_result(True)
+            except Exception as e:
+                self.stats.rows_failed += 1
+                if not future.done():
+                    future.set_exception(e)
+
+    def _record_batch(self, size: int, seconds: float) -> None:
+        self.stats.rows_written += size
+        self.stats.batches += 1
+        self.stats.largest_batch = max(self.stats.largest_batch, size)
+        self.stats.total_commit_seconds += seconds
+
+    # ===== WRITER THREAD =====
+
+    def _get_conn(self, path: Optional[Path] = None) -> sqlite3.Connection:
+        path = Path(path or get_db_path())
+        conn = self._conns.get(str(path))
+        if conn is None:
+            db_settings = get_settings().database
+            conn = connect(path, timeout=db_settings.connection_timeout)
+            PragmaProfile.from_settings(db_settings).apply(conn)
+            # Acks promise durability: fsync on every commit
+            conn.execute("PRAGMA synchronous=FULL;")
+            self._conns[str(path)] = conn
+        return conn
+
+    def _write_rows(self, rows: List[Dict[str, Any]]) -> int:
+        if not sharding_enabled():
+            return upsert_posts(rows, conn=self._get_conn())
+        # Rows are already normalized; route each month to its shard
+        written = 0
+        for month, group in route_posts(rows).items():
+            written += upsert_posts(group, conn=self._get_conn(shard_target(month)))
+        return written
+
+    def _close_conn(self) -> None:
+        for conn in self._conns.values():
+            conn.close()
+        self._conns.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        batches = self.stats.batches
+        return {
+            "rows_written": self.stats.rows_written,
+            "rows_failed": self.stats.rows_failed,
+            "batches": batches,
+            "avg_batch_size": round(self.stats.rows_written / batches, 1) if batches else 0,
+            "largest_batch": self.stats.largest_batch,
+            "avg_commit_ms": round(self.stats.total_commit_seconds / batches * 1000, 2) if batches else 0,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+        }
+
+
+def _build_default_writer() -> AsyncBatchWriter:
+    db_settings = get_settings().database
+    return AsyncBatchWriter(
+        batch_size=db_settings.writer_batch_size,
+        max_delay=db_settings.writer_max_delay_ms / 1000,
+        queue_size=db_settings.writer_queue_size
+    )
+
+# Global instance
+post_writer = _build_default_writer()
@@ -42,7 +42,7 @@ async def demo():
     print("-" * 40)
     try:
         print("📂 Cargando datos desde base de datos...")
-        competitors = competition_watcher.load_competitor_data(limit=5)
+        competitors = await competition_watcher.load_competitor_data_async(limit=5)
         print(f"📊 Datos cargados: {len(competitors)} competidores")
 
         if competitors:
@@ -67,7 +67,7 @@ async def demo():
     print("📚 DEMO 3: HISTORIAL DE EJECUCIONES")
     print("-" * 40)
     try:
-        runs = competition_watcher.get_run_history(limit=3)
+        runs = await competition_watcher.get_run_history_async(limit=3)
         if runs:
             print(f"📋 Últimas {len(runs)} ejecuciones:")
             for run in runs:
@@ -18,10 +18,10 @@ from config.config_v2 import get_settings
 from scraping.simple_scrapling import scrapling_scraper
 from ai.ai_service import ai_service
 from database.db import (
-    init_competition_tables, save_competitor, load_competitors,
-    save_competition_analysis, load_competition_analysis,
-    start_competition_run, update_competition_run, get_competition_runs
+    init_competition_tables, load_competitors,
+    load_competition_analysis, get_competition_runs
 )
+from database import async_db
 
 # Configuración
 settings = get_settings()
@@ -98,7 +98,7 @@ class CompetitionWatcher:
         self.logger.info(f"🔍 Iniciando recolección de datos para: {self.keyword}")
 
         # Iniciar tracking de la ejecución
-        self.current_run_id = start_competition_run(self.keyword, "collection")
+        self.current_run_id = await async_db.start_competition_run(self.keyword, "collection")
 
         try:
             # 1. Buscar URLs de competencia
@@ -106,7 +106,7 @@ class CompetitionWatcher:
 
             if not competitor_urls:
                 self.logger.warning("⚠️ No se encontraron URLs de competencia")
-                update_competition_run(self.current_run_id, "completed", 0, False)
+                await async_db.update_competition_run(self.current_run_id, "completed", 0, False)
                 return 0
 
             # 2. Analizar cada competidor y guardar en BD
@@ -116,7 +116,7 @@ class CompetitionWatcher:
                 if competitor:
                     # Convertir a dict para guardar
                     competitor_dict = asdict(competitor)
-                    save_competitor(competitor_dict, self.keyword)
+                    await async_db.save_competitor(competitor_dict, self.keyword)
                     competitors_found += 1
 
                     self.logger.info(f"💾 Competidor guardado: {competitor.name}")
@@ -125,14 +125,14 @@ class CompetitionWatcher:
                 await asyncio.sleep(1)
 
             # Actualizar estado de la ejecución
-            update_competition_run(self.current_run_id, "completed", competitors_found, False)
+            await async_db.update_competition_run(self.current_run_id, "completed", competitors_found, False)
 
             self.logger.info(f"✅ Recolección completada. {competitors_found} competidores guardados")
             return competitors_found
 
         except Exception as e:
             self.logger.error(f"❌ Error en recolección: {e}")
-            update_competition_run(self.current_run_id, "failed", 0, False, str(e))
+            await async_db.update_competition_run(self.current_run_id, "failed", 0, False, str(e))
             raise
 
     def load_competitor_data(self, limit: Optional[int] = None) -> List[CompetitorData]:
@@ -144,33 +144,49 @@ class CompetitionWatcher:
         try:
             # Cargar desde BD
             competitor_dicts = load_competitors(self.keyword, limit)
+            return self._set_competitors(competitor_dicts)
 
-            # Convertir a objetos CompetitorData
-            self.competitors = []
-            for comp_dict in competitor_dicts:
-                try:
-                    competitor = CompetitorData(
-                        name=comp_dict['name'],
-                        website=comp_dict['website'],
-                        services=comp_dict['services'],
-                        location=comp_dict['location'],
-                        pricing_info=comp_dict['pricing_info'],
-                        contact_info=comp_dict['contact_info'],
-                        social_media=comp_dict['social_media'],
-                        description=comp_dict['description'],
-                        scraped_at=datetime.fromisoformat(comp_dict['scraped_at']) if comp_dict['scraped_at'] else None
-                    )
-                    self.competitors.append(competitor)
-                except Exception as e:
-                    self.logger.warning(f"⚠️ Error convirtiendo competidor {comp_dict.get('name', 'unknown')}: {e}")
-
-            self.logger.info(f"✅ Cargados {len(self.competitors)} competidores desde BD")
-            return self.competitors
+        except Exception as e:
+            self.logger.error(f"❌ Error cargando datos: {e}")
+            return []
+
+    async def load_competitor_data_async(self, limit: Optional[int] = None) -> List[CompetitorData]:
+        """
+        Versión asíncrona de load_competitor_data (la consulta corre en los hilos de BD)
+        """
+        self.logger.info(f"📂 Cargando datos de competidores para: {self.keyword}")
+
+        try:
+            competitor_dicts = await async_db.load_competitors(self.keyword, limit)
+            return self._set_competitors(competitor_dicts)
 
         except Exception as e:
             self.logger.error(f"❌ Error cargando datos: {e}")
             return []
 
+    def _set_competitors(self, competitor_dicts: List[Dict[str, Any]]) -> List[CompetitorData]:
+        """Convertir filas de BD a objetos CompetitorData"""
+        self.competitors = []
+        for comp_dict in competitor_dicts:
+            try:
+                competitor = CompetitorData(
+                    name=comp_dict['name'],
+                    website=comp_dict['website'],
+                    services=comp_dict['services'],
+                    location=comp_dict['location'],
+                    pricing_info=comp_dict['pricing_info'],
+                    contact_info=comp_dict['contact_info'],
+                    social_media=comp_dict['social_media'],
+                    description=comp_dict['description'],
+                    scraped_at=datetime.fromisoformat(comp_dict['scraped_at']) if comp_dict['scraped_at'] else None
+                )
+                self.competitors.append(competitor)
+            except Exception as e:
+                self.logger.warning(f"⚠️ Error convirtiendo competidor {comp_dict.get('name', 'unknown')}: {e}")
+
+        self.logger.info(f"✅ Cargados {len(self.competitors)} competidores desde BD")
+        return self.competitors
+
     async def analyze_competitor_data(self) -> MarketAnalysis:
         """
         Fase 2: Analizar datos de competidores ya recolectados
@@ -178,7 +194,7 @@ class CompetitionWatcher:
         if not self.competitors:
             self.logger.warning("⚠️ No hay datos de competidores para analizar. Carga datos primero.")
             # Intentar cargar automáticamente
-            self.load_competitor_data()
+            await self.load_competitor_data_async()
 
             if not self.competitors:
                 raise ValueError("No hay datos de competidores disponibles para análisis")
@@ -186,11 +202,16 @@ class CompetitionWatcher:
         self.logger.info(f"🔬 Iniciando análisis de {len(self.competitors)} competidores")
 
         # Iniciar tracking de análisis
-        analysis_run_id = start_competition_run(self.keyword, "analysis")
+        analysis_run_id = await async_db.start_competition_run(self.keyword, "analysis")
 
+        # Los agregados se calculan en SQL sobre todos los competidores guardados
+        # de la keyword (no solo los cargados con load_limit): el run registra
+        # esa misma población para que coincida con total_competitors
+        competitors_found = len(self.competitors)
         try:
             # Generar análisis
             self.market_analysis = await self._generate_market_analysis()
+            competitors_found = self.market_analysis.total_competitors
 
             # Guardar análisis en BD
             analysis_dict = {
@@ -205,17 +226,17 @@ class CompetitionWatcher:
                 'analyzed_at': self.market_analysis.analyzed_at.isoformat() if self.market_analysis.analyzed_at else datetime.now().isoformat()
             }
 
-            analysis_id = save_competition_analysis(analysis_dict)
+            analysis_id = await async_db.save_competition_analysis(analysis_dict)
 
             # Actualizar estado
-            update_competition_run(analysis_run_id, "completed", len(self.competitors), True)
+            await async_db.update_competition_run(analysis_run_id, "completed", competitors_found, True)
 
             self.logger.info(f"✅ Análisis completado y guardado (ID: {analysis_id})")
             return self.market_analysis
 
         except Exception as e:
             self.logger.error(f"❌ Error en análisis: {e}")
-            update_competition_run(analysis_run_id, "failed", len(self.competitors), False, str(e))
+            await async_db.update_competition_run(analysis_run_id, "failed", competitors_found, False, str(e))
             raise
 
     async def run_full_analysis(self, max_competitors: int = 15) -> MarketAnalysis:
@@ -225,14 +246,14 @@ class CompetitionWatcher:
         self.logger.info("🚀 Iniciando análisis completo de competencia...")
 
         # Iniciar tracking completo
-        full_run_id = start_competition_run(self.keyword, "full")
+        full_run_id = await async_db.start_competition_run(self.keyword, "full")
 
         try:
             # Fase 1: Recolección
             competitors_found = await self.collect_competitor_data(max_competitors)
 
             if competitors_found == 0:
-                update_competition_run(full_run_id, "completed", 0, False, "No se encontraron competidores")
+                await async_db.update_competition_run(full_run_id, "completed", 0, False, "No se encontraron competidores")
                 return MarketAnalysis(
                     keyword=self.keyword,
                     total_competitors=0,
@@ -248,14 +269,14 @@ class CompetitionWatcher:
             analysis = await self.analyze_competitor_data()
 
             # Actualizar estado final
-            update_competition_run(full_run_id, "completed", competitors_found, True)
+            await async_db.update_competition_run(full_run_id, "completed", competitors_found, True)
 
             self.logger.info("✅ Análisis completo finalizado")
             return analysis
 
         except Exception as e:
             self.logger.error(f"❌ Error en análisis completo: {e}")
-            update_competition_run(full_run_id, "failed", 0, False, str(e))
+            await async_db.update_competition_run(full_run_id, "failed", 0, False, str(e))
             raise
 
     def get_analysis_history(self, limit: int = 5) -> List[Dict[str, Any]]:
@@ -278,10 +299,30 @@ class CompetitionWatcher:
             self.logger.error(f"❌ Error obteniendo historial de ejecuciones: {e}")
             return []
 
+    async def get_analysis_history_async(self, limit: int = 5) -> List[Dict[str, Any]]:
+        """
+        Versión asíncrona de get_analysis_history (la consulta corre en los hilos de BD)
+        """
+        try:
+            return await async_db.load_competition_analysis(self.keyword, limit)
+        except Exception as e:
+            self.logger.error(f"❌ Error obteniendo historial: {e}")
+            return []
+
+    async def get_run_history_async(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Versión asíncrona de get_run_history (la consulta corre en los hilos de BD)
+        """
+        try:
+            return await async_db.get_competition_runs(self.keyword, limit)
+        except Exception as e:
+            self.logger.error(f"❌ Error obteniendo historial de ejecuciones: {e}")
+            return []
+
     async def initialize_database(self):
         """Inicializar las tablas de la base de datos"""
         try:
-            init_competition_tables()
+            await async_db.init_competition_tables()
             self.logger.info("✅ Tablas de Competition Watcher inicializadas")
         except Exception as e:
             self.logger.error(f"❌ Error inicializando tablas: {e}")
@@ -429,7 +470,8 @@ class CompetitionWatcher:
 
     async def _generate_market_analysis(self) -> MarketAnalysis:
         """
-        Generar análisis de mercado basado en competidores encontrados
+        Generar análisis de mercado con los agregados SQL de todos los
+        competidores guardados de la keyword
         """
         if not self.competitors:
             return MarketAnalysis(
@@ -443,64 +485,24 @@ class CompetitionWatcher:
                 opportunities=[]
             )
 
-        # Análisis de servicios
-        service_categories = {}
-        locations = {}
-        price_ranges = {}
-        all_services = []
-
-        for competitor in self.competitors:
-            # Categorizar servicios
-            for service in competitor.services:
-                service_lower = service.lower()
-                if 'limpieza' in service_lower or 'mantenimiento' in service_lower:
-                    category = 'Limpieza/Mantenimiento'
-                elif 'reparacion' in service_lower or 'reparar' in service_lower:
-                    category = 'Reparaciones'
-                elif 'instalacion' in service_lower or 'montaje' in service_lower:
-                    category = 'Instalación'
-                elif 'cloracion' in service_lower or 'quimico' in service_lower:
-                    category = 'Tratamiento Químico'
-                else:
-                    category = 'Otros Servicios'
-
-                service_categories[category] = service_categories.get(category, 0) + 1
-                all_services.append(service)
-
-            # Análisis de ubicación
-            location = competitor.location
-            if 'lima' in location.lower():
-                locations['Lima'] = locations.get('Lima', 0) + 1
-            else:
-                locations[location] = locations.get(location, 0) + 1
-
-            # Análisis de precios (si disponible)
-            if competitor.pricing_info:
-                if 's/' in competitor.pricing_info.lower() or 'sol' in competitor.pricing_info.lower():
-                    price_ranges['Soles'] = price_ranges.get('Soles', 0) + 1
-                elif '$' in competitor.pricing_info:
-                    price_ranges['Dólares'] = price_ranges.get('Dólares', 0) + 1
-                else:
-                    price_ranges['No especificado'] = price_ranges.get('No especificado', 0) + 1
-
-        # Identificar servicios más comunes
-        common_services = list(set(all_services))[:10]  # Top 10 servicios únicos
+        # Agregados calculados en SQL sobre las tablas normalizadas
+        stats = await async_db.get_competitor_market_stats(self.keyword)
 
         # Generar insights usando IA
-        market_gaps, opportunities = await self._identify_market_gaps_and_opportunities()
+        market_gaps, opportunities = await self._identify_market_gaps_and_opportunities(stats)
 
         return MarketAnalysis(
             keyword=self.keyword,
-            total_competitors=len(self.competitors),
-            service_categories=service_categories,
-            price_ranges=price_ranges,
-            locations=locations,
-            common_services=common_services,
+            total_competitors=stats['total_competitors'],
+            service_categories=stats['service_categories'],
+            price_ranges=stats['price_ranges'],
+            locations=stats['locations'],
+            common_services=stats['common_services'],
             market_gaps=market_gaps,
             opportunities=opportunities
         )
 
-    async def _identify_market_gaps_and_opportunities(self) -> Tuple[List[str], List[str]]:
+    async def _identify_market_gaps_and_opportunities(self, stats: Dict[str, Any]) -> Tuple[List[str], List[str]]:
         """
         Identificar gaps de mercado y oportunidades usando lógica básica
         """
@@ -509,21 +511,11 @@ class CompetitionWatcher:
             gaps = []
             opportunities = []
 
-            # Analizar servicios más comunes
-            if self.competitors:
-                all_services = []
-                for comp in self.competitors:
-                    all_services.extend(comp.services)
-
-                service_counts = {}
-                for service in all_services:
-                    service_counts[service] = service_counts.get(service, 0) + 1
-
+            if stats['total_competitors']:
                 # Gaps: servicios poco ofrecidos
-                if len(self.competitors) > 0:
-                    avg_services_per_competitor = len(all_services) / len(self.competitors)
-                    if avg_services_per_competitor < 2:
-                        gaps.append("Especialización limitada - muchos competidores ofrecen pocos servicios")
+                avg_services_per_competitor = stats['total_services'] / stats['total_competitors']
+                if avg_services_per_competitor < 2:
+                    gaps.append("Especialización limitada - muchos competidores ofrecen pocos servicios")
 
                 # Oportunidades basadas en análisis
                 opportunities.append("Ofrecer paquetes de servicios integrales (limpieza + mantenimiento + tratamiento)")
@@ -209,13 +209,16 @@ class EfficientScraper:
 
             if cached_data and isinstance(cached_data, dict):
                 log.debug(f"✅ Cache hit for: {url}")
-                # Convert cached dict to ScrapedData object
+                # Convert cached dict to ScrapedData object (datetimes are cached as ISO strings)
+                scraped_at = cached_data.get('scraped_at')
+                if isinstance(scraped_at, str):
+                    scraped_at = datetime.fromisoformat(scraped_at)
                 cached_scraped_data = ScrapedData(
                     url=cached_data.get('url', url),
                     title=cached_data.get('title', ''),
                     content=cached_data.get('content', ''),
                     metadata=cached_data.get('metadata', {}),
-                    scraped_at=cached_data.get('scraped_at', datetime.now()),
+                    scraped_at=scraped_at or datetime.now(),
                     content_hash=cached_data.get('content_hash', '')
                 )
                 return ScrapingResult(
@@ -0,0 +1,31 @@
+"""
+Fixtures compartidas: cada test usa su propia base SQLite en tmp_path
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Raíz del proyecto en el path (los módulos se importan como database.db, utils.kpi, ...)
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config.config_v2 import get_settings  # noqa: E402
+from database import db  # noqa: E402
+from database.pool import close_pools  # noqa: E402
+from database.snapshot import close_caches  # noqa: E402
+
+
+@pytest.fixture
+def tmp_db(tmp_path, monkeypatch):
+    """Base principal y directorio de shards temporales; cierra pools y cachés al terminar"""
+    db_settings = get_settings().database
+    monkeypatch.setattr(db_settings, "path", tmp_path / "scraping.db")
+    monkeypatch.setattr(db_settings, "shard_dir", tmp_path / "shards")
+    monkeypatch.setattr(db_settings, "shard_posts", False)
+    # ensure_shard recuerda los meses ya inicializados por proceso
+    monkeypatch.setattr(db, "_initialized_shards", set())
+    close_pools()
+    yield tmp_path / "scraping.db"
+    close_caches()
+    close_pools()
@@ -0,0 +1,75 @@
+"""
+API REST: 304 con un ETag vigente, 400 con un cursor inválido y páginas encadenadas por cursor
+"""
+
+import asyncio
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from database.db import init_db, upsert_posts
+from web.api import QueryAPI
+
+
+def _posts(start: int, count: int) -> list:
+    return [{
+        'id': f'p{n}', 'source': 'test', 'url': f'https://example.com/p{n}',
+        'title': f'Busco agencia de marketing {n}', 'body': 'Presupuesto para campaña en Lima',
+        'keyword': 'marketing', 'tag': 'busqueda', 'relevance_score': 50 + n,
+        'created_at': '2024-05-01T12:00:00+00:00',
+    } for n in range(start, start + count)]
+
+
+@pytest.fixture
+def api(tmp_db):
+    init_db()
+    upsert_posts(_posts(0, 5))
+    return QueryAPI()
+
+
+def _run(api: QueryAPI, scenario):
+    async def run():
+        async with TestClient(TestServer(api.app())) as client:
+            return await scenario(client)
+    return asyncio.run(run())
+
+
+def test_matching_etag_gets_304(api):
+    async def scenario(client):
+        first = await client.get("/v1/leads")
+        etag = first.headers["ETag"]
+        cached = await client.get("/v1/leads", headers={"If-None-Match": etag})
+
+        upsert_posts(_posts(5, 1))
+        changed = await client.get("/v1/leads", headers={"If-None-Match": etag})
+        return first.status, cached.status, changed.status, etag, changed.headers["ETag"]
+
+    first, cached, changed, etag, new_etag = _run(api, scenario)
+    assert (first, cached, changed) == (200, 304, 200)
+    assert new_etag != etag
+    assert api.not_modified == 1
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "e30", "WzEsMl0"])  # basura, {}, [1,2]
+def test_invalid_cursor_gets_400(api, cursor):
+    async def scenario(client):
+        response = await client.get("/v1/leads", params={"cursor": cursor})
+        return response.status, await response.json()
+
+    status, body = _run(api, scenario)
+    assert status == 400
+    assert body == {"error": "invalid cursor"}
+
+
+def test_cursor_pages_cover_every_lead(api):
+    async def scenario(client):
+        seen, cursor = [], None
+        while True:
+            params = {"limit": "2", **({"cursor": cursor} if cursor else {})}
+            page = await (await client.get("/v1/leads", params=params)).json()
+            seen += [lead['id'] for lead in page['leads']]
+            cursor = page['next']
+            if cursor is None:
+                return seen
+
+    assert _run(api, scenario) == ['p4', 'p3', 'p2', 'p1', 'p0']
@@ -0,0 +1,77 @@
+"""
+Competition Watcher: migración de filas antiguas y detección de cambios
+"""
+
+import json
+import sqlite3
+
+from database.db import get_read_conn, init_competition_tables, save_competitor
+
+# Esquema de competitors antes de domain/content_hash (una fila por ejecución)
+LEGACY_COMPETITORS_DDL = """
+CREATE TABLE competitors (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    website TEXT NOT NULL,
+    services TEXT,
+    location TEXT,
+    pricing_info TEXT,
+    contact_info TEXT,
+    social_media TEXT,
+    description TEXT,
+    scraped_at TEXT NOT NULL,
+    keyword TEXT NOT NULL,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+COMPETITOR = {
+    'name': 'Agencia Diseño Lima',
+    'website': 'https://www.agencia.pe',
+    'services': ['diseño web', 'SEO', 'publicidad en redes'],
+    'location': 'Lima, Perú',
+    'pricing_info': 'desde S/ 500',
+    'contact_info': 'hola@agencia.pe',
+    'social_media': ['https://facebook.com/agencia', 'https://instagram.com/agencia'],
+    'description': 'Agencia de marketing digital',
+}
+
+
+def test_migrated_legacy_competitor_saved_again_is_unchanged(tmp_db):
+    # Fila guardada con json.dumps (separadores ', ' y escapes \uXXXX)
+    conn = sqlite3.connect(tmp_db)
+    conn.execute(LEGACY_COMPETITORS_DDL)
+    conn.execute("""
+        INSERT INTO competitors (id, name, website, services, location, pricing_info,
+                                 contact_info, social_media, description, scraped_at, keyword)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, ('legacy-1', COMPETITOR['name'], COMPETITOR['website'], json.dumps(COMPETITOR['services']),
+          COMPETITOR['location'], COMPETITOR['pricing_info'], COMPETITOR['contact_info'],
+          json.dumps(COMPETITOR['social_media']), COMPETITOR['description'],
+          '2026-01-01T10:00:00', 'marketing'))
+    conn.commit()
+    conn.close()
+
+    init_competition_tables()
+    result = save_competitor(dict(COMPETITOR), 'marketing')
+
+    assert result['status'] == 'unchanged'
+    assert result['changed_fields'] == 0
+    with get_read_conn() as c:
+        assert c.execute("SELECT COUNT(*) FROM competitor_history").fetchone()[0] == 0
+
+
+def test_real_change_is_recorded(tmp_db):
+    init_competition_tables()
+    assert save_competitor(dict(COMPETITOR), 'marketing')['status'] == 'created'
+
+    changed = dict(COMPETITOR, services=COMPETITOR['services'] + ['branding'])
+    result = save_competitor(changed, 'marketing')
+
+    assert result['status'] == 'updated'
+    assert result['changed_fields'] == 1
+    with get_read_conn() as c:
+        field, diff = c.execute("SELECT field, diff FROM competitor_history").fetchone()
+    assert field == 'services'
+    assert json.loads(diff) == {'added': ['branding'], 'removed': []}
@@ -0,0 +1,83 @@
+"""
+zdecompress(): toda conexión abierta por el repo puede escribir en posts;
+train/recompress recorren la base principal y los shards escribibles
+"""
+
+import os
+import sqlite3
+import stat
+
+import pytest
+
+from config.config_v2 import get_settings
+from database.compression import ZSTD_AVAILABLE, connect, recompress, train_dictionaries
+from database.db import (UPSERT_POST_SQL, get_read_conn, init_db, normalize_post, post_storage_rows,
+                         shard_path, upsert_posts)
+from database.pool import close_pool, get_pool
+
+POST = {
+    'id': 'p1', 'source': 'test', 'url': 'https://example.com/p1', 'title': 'Busco diseñador',
+    'body': 'Necesito rediseñar la web de mi restaurante ' * 20, 'tag': 'busqueda',
+    'created_at': '2024-05-01T12:00:00+00:00',
+}
+
+
+def test_connect_registers_zdecompress_for_triggers(tmp_db):
+    init_db()
+    conn = connect(tmp_db)
+    try:
+        with conn:
+            conn.executemany(UPSERT_POST_SQL, post_storage_rows([normalize_post(POST)]))
+        body, = conn.execute("SELECT zdecompress(body) FROM posts WHERE id = 'p1'").fetchone()
+        assert body == POST['body']
+        assert conn.execute("SELECT rowid FROM posts_fts WHERE posts_fts MATCH 'restaurante'").fetchall()
+    finally:
+        conn.close()
+
+
+def test_plain_connection_cannot_write_posts(tmp_db):
+    init_db()
+    conn = sqlite3.connect(str(tmp_db))
+    try:
+        with pytest.raises(sqlite3.OperationalError, match="zdecompress"):
+            with conn:
+                conn.executemany(UPSERT_POST_SQL, post_storage_rows([normalize_post(POST)]))
+    finally:
+        conn.close()
+
+
+def _body_types(path) -> set:
+    with get_pool(path, read_only=True).connection() as c:
+        return {t for (t,) in c.execute("SELECT DISTINCT typeof(body) FROM posts")}
+
+
+@pytest.mark.skipif(not ZSTD_AVAILABLE, reason="zstandard no instalado")
+def test_train_and_recompress_cover_writable_shards(tmp_db, monkeypatch):
+    db_settings = get_settings().database
+    monkeypatch.setattr(db_settings, "compress_text", False)
+    monkeypatch.setattr(db_settings, "compress_dict_min_samples", 5)
+    monkeypatch.setattr(db_settings, "compress_dict_size", 1024)
+
+    def posts(prefix, month):
+        return [{**POST, 'id': f'{prefix}{n}', 'url': f'https://example.com/{prefix}{n}',
+                 'body': f"{POST['body']} pedido {n} " * 2,
+                 'created_at': f'2024-{month:02d}-1{n % 10}T12:00:00+00:00'} for n in range(20)]
+
+    init_db()
+    upsert_posts(posts('main', 1))
+    monkeypatch.setattr(db_settings, "shard_posts", True)
+    upsert_posts(posts('jan', 1) + posts('feb', 2))
+    sealed, writable = shard_path(202401), shard_path(202402)
+    close_pool(sealed)
+    os.chmod(sealed, os.stat(sealed).st_mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+
+    monkeypatch.setattr(db_settings, "compress_text", True)
+    trained = train_dictionaries('posts.body')
+    result = recompress('posts.body')
+
+    assert list(trained) == ['test']
+    with get_read_conn() as c:
+        assert c.execute("SELECT samples FROM compression_dicts").fetchone()[0] == 40
+    assert result['rows'] == 40
+    assert _body_types(tmp_db) == _body_types(writable) == {'blob'}
+    assert _body_types(sealed) == {'text'}
@@ -0,0 +1,63 @@
+"""
+Exportación incremental: repetir una corrida (o rehacerla tras un crash) no duplica filas
+"""
+
+import pytest
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+from database.db import init_db, upsert_posts  # noqa: E402
+from database.export import IncrementalExporter  # noqa: E402
+
+
+def _posts(start: int, count: int, day: str = '2024-05-01') -> list:
+    return [{
+        'id': f'p{n}', 'source': 'test', 'url': f'https://example.com/p{n}',
+        'title': f'Busco agencia de marketing {n}', 'body': 'Presupuesto para campaña en Lima',
+        'keyword': 'marketing', 'tag': 'busqueda', 'relevance_score': 80,
+        'created_at': f'{day}T12:00:00+00:00',
+    } for n in range(start, start + count)]
+
+
+def _exported_ids(output_dir) -> list:
+    files = sorted((output_dir / "posts").glob("date=*/part-*.parquet"))
+    return sorted(i for f in files for i in pq.read_table(f, columns=["id"]).column("id").to_pylist())
+
+
+@pytest.fixture
+def exporter(tmp_db, tmp_path):
+    init_db()
+    return IncrementalExporter(output_dir=tmp_path / "export", file_format="parquet", chunk_rows=2)
+
+
+def test_rerun_exports_only_new_rows(exporter):
+    upsert_posts(_posts(0, 3))
+    [first] = exporter.export("posts")
+    assert first.rows == 3
+
+    [again] = exporter.export("posts")
+    assert again.rows == 0 and again.files == []
+
+    upsert_posts(_posts(3, 2, day='2024-05-02'))
+    [second] = exporter.export("posts")
+    assert second.rows == 2
+    assert _exported_ids(exporter.output_dir) == [f'p{n}' for n in range(5)]
+
+
+def test_crash_before_watermark_is_redone_into_same_files(exporter, monkeypatch):
+    upsert_posts(_posts(0, 3))
+
+    def crash(self, result):
+        raise RuntimeError("crash")
+
+    save_watermark = IncrementalExporter._save_watermark
+    monkeypatch.setattr(IncrementalExporter, "_save_watermark", crash)
+    with pytest.raises(RuntimeError):
+        exporter.export("posts")
+    monkeypatch.setattr(IncrementalExporter, "_save_watermark", save_watermark)
+    assert exporter.watermark("posts") is None
+
+    [redone] = exporter.export("posts")
+    assert redone.rows == 3
+    assert _exported_ids(exporter.output_dir) == ['p0', 'p1', 'p2']
+    assert not list(exporter.output_dir.rglob("*.tmp"))
@@ -0,0 +1,106 @@
+"""
+fetch_url: la caché negativa solo registra una URL cuando se agotan los reintentos
+"""
+
+import asyncio
+
+import pytest
+from tenacity import wait_none
+
+main_async = pytest.importorskip("core.main_async", exc_type=ImportError)
+
+from cache.negative_cache import NegativeCache, NegativeReason  # noqa: E402
+from cache.simple_cache import SmartCacheManager  # noqa: E402
+
+URL = "https://example.com/post"
+
+
+class FakeResponse:
+    status = 200
+    headers = {"Content-Type": "text/html; charset=utf-8"}
+
+    def raise_for_status(self) -> None:
+        pass
+
+    async def text(self) -> str:
+        return "<html><title>Post</title></html>"
+
+
+class FakeRequest:
+    def __init__(self, error):
+        self.error = error
+
+    async def __aenter__(self):
+        if self.error is not None:
+            raise self.error
+        return FakeResponse()
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    """Falla con TimeoutError las primeras ``failures`` peticiones"""
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.calls = 0
+
+    def get(self, url: str) -> FakeRequest:
+        self.calls += 1
+        return FakeRequest(asyncio.TimeoutError() if self.calls <= self.failures else None)
+
+
+class NoRateLimit:
+    async def wait_if_needed(self, domain: str) -> None:
+        pass
+
+    def handle_error(self, domain: str, error: Exception) -> None:
+        pass
+
+    def reset_error_count(self, domain: str) -> None:
+        pass
+
+
+@pytest.fixture
+def scraper(monkeypatch):
+    monkeypatch.setattr(main_async.AsyncScraper._fetch_url_with_retry.retry, "wait", wait_none())
+    manager = SmartCacheManager()
+    monkeypatch.setattr(main_async, "cache_manager", manager)
+    monkeypatch.setattr(main_async, "AsyncRateLimiter", NoRateLimit)
+    scraper = main_async.AsyncScraper()
+    scraper.negative_cache = NegativeCache(manager, enabled=True)
+    return scraper
+
+
+def test_success_after_retry_is_not_recorded(scraper):
+    async def run():
+        scraper.session = FakeSession(failures=2)
+        content = await scraper.fetch_url(URL)
+        return content, await scraper.negative_cache.check(URL)
+
+    content, reason = asyncio.run(run())
+    assert "Post" in content
+    assert scraper.session.calls == 3
+    assert reason is None
+
+
+def test_exhausted_retries_are_recorded_once(scraper):
+    async def run():
+        scraper.session = FakeSession(failures=3)
+        with pytest.raises(asyncio.TimeoutError):
+            await scraper.fetch_url(URL)
+        return await scraper.negative_cache.check(URL)
+
+    assert asyncio.run(run()) is NegativeReason.TIMEOUT
+    assert scraper.negative_cache.stats.recorded_by_reason == {"timeout": 1}
+
+
+def test_success_forgets_previous_entry(scraper):
+    async def run():
+        await scraper.negative_cache.record(URL, NegativeReason.TIMEOUT)
+        scraper.session = FakeSession(failures=0)
+        await scraper.fetch_url(URL)
+        return await scraper.negative_cache.check(URL)
+
+    assert asyncio.run(run()) is None
@@ -0,0 +1,115 @@
+"""
+Log de ingesta: cola rota de un productor caído y reanudación del loader tras un crash
+"""
+
+import os
+
+import pytest
+
+from database.db import get_read_conn
+from database.ingest_log import RECORD_HEADER, IngestLoader, IngestLog, read_records
+
+
+def _posts(start: int, count: int) -> list:
+    return [{
+        'id': f'p{n}', 'source': 'test', 'url': f'https://example.com/p{n}',
+        'title': f'Busco agencia de marketing {n}', 'body': 'Presupuesto para campaña en Lima',
+        'keyword': 'marketing', 'tag': 'busqueda', 'relevance_score': 80,
+        'created_at': '2024-05-01T12:00:00+00:00',
+    } for n in range(start, start + count)]
+
+
+def _post_ids() -> list:
+    with get_read_conn() as c:
+        return [row[0] for row in c.execute("SELECT id FROM posts ORDER BY id")]
+
+
+def _offsets() -> dict:
+    with get_read_conn() as c:
+        return {seg: (offset, completed) for seg, offset, completed in
+                c.execute("SELECT segment, offset, completed FROM ingest_offsets")}
+
+
+@pytest.fixture
+def ingest_root(tmp_db, tmp_path):
+    return tmp_path / "ingest"
+
+
+def test_torn_tail_is_skipped_and_abandoned_segment_completed(ingest_root):
+    producer = IngestLog(ingest_root, producer="crawler", segment_max_age=3600)
+    producer.append(_posts(0, 2))
+    producer.append(_posts(2, 2))
+    segment = producer._path
+    # Crash a mitad de un os.write(): cabecera completa y payload a medias
+    os.write(producer._fd, RECORD_HEADER.pack(100, 0) + b"x" * 10)
+    os.close(producer._fd)
+    producer._fd = None
+    producer.close()
+
+    complete = [end for end, _ in read_records(segment)]
+    assert len(complete) == 2
+
+    loader = IngestLoader(ingest_root, stale_after=3600)
+    assert loader.run_once() == 4
+    assert _offsets() == {f"crawler/{segment.stem}": (complete[-1], 0)}
+    assert segment.exists()  # segmento abierto y reciente: el productor podría seguir
+
+    # Pasado stale_after el segmento abandonado se da por terminado sin reinsertar nada
+    loader.stale_after = 0
+    assert loader.run_once() == 0
+    assert not segment.exists()
+    assert _offsets()[f"crawler/{segment.stem}"][1] == 1
+    assert _post_ids() == [f'p{n}' for n in range(4)]
+
+
+def test_loader_resumes_after_crash_without_duplicates(ingest_root, monkeypatch):
+    producer = IngestLog(ingest_root, producer="crawler", segment_max_age=3600)
+    for start in range(0, 6, 2):
+        producer.append(_posts(start, 2))
+    producer.close()
+
+    # Una transacción por registro; el loader muere tras confirmar el primero
+    loader = IngestLoader(ingest_root, batch_rows=2)
+    commit = IngestLoader._commit
+    calls = []
+
+    def crash_after_first(self, rows, pending):
+        calls.append(len(rows))
+        if len(calls) > 1:
+            raise RuntimeError("crash")
+        commit(self, rows, pending)
+
+    monkeypatch.setattr(IngestLoader, "_commit", crash_after_first)
+    with pytest.raises(RuntimeError):
+        loader.run_once()
+    assert _post_ids() == ['p0', 'p1']
+
+    # Un loader nuevo sigue desde el offset confirmado
+    monkeypatch.setattr(IngestLoader, "_commit", commit)
+    restarted = IngestLoader(ingest_root, batch_rows=2)
+    assert restarted.run_once() == 4
+    assert restarted.rows_loaded == 4
+    assert _post_ids() == [f'p{n}' for n in range(6)]
+    assert not list(ingest_root.glob("crawler/*"))
+
+
+def test_replay_after_crash_between_commit_and_unlink(ingest_root, monkeypatch):
+    producer = IngestLog(ingest_root, producer="crawler", segment_max_age=3600)
+    producer.append(_posts(0, 3))
+    producer.close()
+
+    def crash(self, *args, **kwargs):
+        raise RuntimeError("crash")
+
+    loader = IngestLoader(ingest_root)
+    mark_completed = IngestLoader._mark_completed
+    monkeypatch.setattr(IngestLoader, "_mark_completed", crash)
+    with pytest.raises(RuntimeError):
+        loader.run_once()
+    monkeypatch.setattr(IngestLoader, "_mark_completed", mark_completed)
+
+    # Offsets ya confirmados: la repetición no vuelve a cargar filas
+    restarted = IngestLoader(ingest_root)
+    assert restarted.run_once() == 0
+    assert restarted.segments_completed == 1
+    assert _post_ids() == ['p0', 'p1', 'p2']
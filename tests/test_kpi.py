@@ -0,0 +1,71 @@
+"""
+KPIs diarios: snapshots de días pasados guardados antes de que terminara el día
+"""
+
+from datetime import datetime, timedelta
+
+from config.config_v2 import get_settings
+from database.db import LIMA_TZ, day_bucket_for, init_db, lima_today, upsert_posts
+from utils.kpi import compute_day_kpis, is_final_snapshot, kpi_trend, load_kpi_series, save_day_kpis
+
+
+def _post(post_id: str, created_at: datetime, tag: str = 'dolor', score: int = 90) -> dict:
+    return {
+        'id': post_id, 'source': 'test', 'url': f'https://example.com/{post_id}',
+        'title': 'Necesito una agencia de marketing digital para mi negocio',
+        'body': 'Busco proveedor con experiencia en campañas para pymes en Lima',
+        'keyword': 'marketing digital', 'tag': tag, 'relevance_score': score,
+        'created_at': created_at.isoformat(),
+    }
+
+
+def test_partial_past_day_snapshot_is_recomputed(tmp_db):
+    init_db()
+    yesterday = lima_today() - timedelta(days=1)
+    bucket = day_bucket_for(yesterday)
+    morning = datetime.combine(yesterday, datetime.min.time(), LIMA_TZ) + timedelta(hours=9)
+    evening = morning + timedelta(hours=10)
+
+    # Snapshot tomado a media mañana con el único post que había
+    upsert_posts([_post('p1', morning)])
+    partial = compute_day_kpis(bucket)
+    partial['computed_at'] = (morning + timedelta(hours=1)).isoformat(timespec='seconds')
+    save_day_kpis(partial)
+    assert not is_final_snapshot(yesterday, partial['computed_at'])
+
+    # Llegan más posts del mismo día
+    upsert_posts([_post('p2', evening), _post('p3', evening, tag='busqueda')])
+
+    point = next(p for p in kpi_trend(2) if p['day_bucket'] == bucket)
+    assert point['total'] == 3
+    assert point['busquedas'] == 1
+    assert is_final_snapshot(yesterday, point['computed_at'])
+
+
+def test_final_past_day_snapshot_is_kept(tmp_db):
+    init_db()
+    yesterday = lima_today() - timedelta(days=1)
+    bucket = day_bucket_for(yesterday)
+    morning = datetime.combine(yesterday, datetime.min.time(), LIMA_TZ) + timedelta(hours=9)
+
+    upsert_posts([_post('p1', morning)])
+    final = compute_day_kpis(bucket)
+    # Calculado pasada la medianoche: el día ya estaba cerrado
+    final['computed_at'] = (morning + timedelta(hours=15, minutes=5)).isoformat(timespec='seconds')
+    save_day_kpis(final)
+    assert is_final_snapshot(yesterday, final['computed_at'])
+
+    kpi_trend(2)
+    [stored] = load_kpi_series(bucket, bucket)
+    assert stored['computed_at'] == final['computed_at']
+
+
+def test_actionable_dolores_use_high_value_threshold(tmp_db):
+    init_db()
+    threshold = get_settings().scraping.min_relevance_score
+    noon = datetime.now(LIMA_TZ).replace(hour=12, minute=0, second=0, microsecond=0)
+    upsert_posts([_post('above', noon, score=threshold + 1), _post('at', noon, score=threshold)])
+
+    kpis = compute_day_kpis(day_bucket_for(noon.date()))
+    [marketing] = kpis['keywords']
+    assert kpis['actionable_dolores'] == marketing['dolores_calidad'] == 1
@@ -0,0 +1,35 @@
+"""
+EXPLAIN QUERY PLAN de las consultas de reportes: ninguna recorre posts (ni kpi_daily) completa
+"""
+
+import pytest
+
+from database.db import get_conn, get_read_conn, init_db
+from database.query_plans import REPORT_QUERIES, check_report_queries, explain_query_plan, uses_index
+from utils.kpi import KPI_DAILY_DDL
+
+
+@pytest.fixture
+def schema(tmp_db):
+    init_db()
+    with get_conn() as c:
+        c.execute(KPI_DAILY_DDL)
+        c.commit()
+    return tmp_db
+
+
+def test_report_queries_use_indexes(schema):
+    with get_read_conn() as c:
+        results = check_report_queries(c)
+
+    assert set(results) == {name for name, _, _ in REPORT_QUERIES}
+    for name, result in results.items():
+        assert not any(detail.startswith("SKIPPED") for detail in result["plan"]), (name, result["plan"])
+        assert result["uses_index"], (name, result["plan"])
+        assert uses_index(result["plan"], "kpi_daily"), (name, result["plan"])
+
+
+def test_full_scan_is_detected(schema):
+    with get_read_conn() as c:
+        plan = explain_query_plan(c, "SELECT id FROM posts WHERE lang = ?", ("es",))
+    assert not uses_index(plan)
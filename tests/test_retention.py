@@ -0,0 +1,75 @@
+"""
+Retención y totales históricos con posts repartidos en shards mensuales
+"""
+
+import os
+import stat
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from config.config_v2 import get_settings
+from database.db import existing_shard_months, init_db, shard_path, upsert_posts
+from database.pool import get_pool
+from database.retention import RetentionEngine
+from database.rollups import total_posts
+from database.snapshot import today_snapshot
+
+
+def _post(post_id: str, created_at: datetime, tag: str) -> dict:
+    return {
+        'id': post_id, 'source': 'test', 'url': f'https://example.com/{post_id}',
+        'title': f'Post {post_id}', 'body': 'Texto del post', 'keyword': 'marketing',
+        'tag': tag, 'relevance_score': 10, 'created_at': created_at.isoformat(),
+    }
+
+
+@pytest.fixture
+def sharded(tmp_db, monkeypatch):
+    """Posts en la base principal (antes del sharding) y en tres shards mensuales"""
+    init_db()
+    now = datetime.now(timezone.utc)
+    old = now - timedelta(days=400)
+    upsert_posts([_post('main-ruido', old, 'ruido'), _post('main-dolor', old, 'dolor')])
+
+    monkeypatch.setattr(get_settings().database, "shard_posts", True)
+    monkeypatch.setattr(get_settings().database, "retention_noise_posts_days", 30)
+    posts = []
+    for months_ago in (0, 3, 6):
+        created = now - timedelta(days=31 * months_ago + 1)
+        posts += [_post(f'{months_ago}-ruido', created, 'ruido'),
+                  _post(f'{months_ago}-dolor', created, 'dolor')]
+    upsert_posts(posts)
+    assert len(existing_shard_months()) == 3
+    return tmp_db
+
+
+def _ids(path) -> set:
+    with get_pool(path, read_only=True).connection() as c:
+        return {row[0] for row in c.execute("SELECT id FROM posts")}
+
+
+def test_total_posts_sums_main_and_shards(sharded):
+    assert total_posts() == 8
+    assert today_snapshot().total_posts == 8
+
+
+def test_noise_retention_runs_on_writable_shards(sharded, tmp_path):
+    months = existing_shard_months()
+    sealed = shard_path(months[0])
+    os.chmod(sealed, stat.S_IREAD)
+    try:
+        report = RetentionEngine(archive_dir=tmp_path / "archive").run()
+    finally:
+        os.chmod(sealed, stat.S_IREAD | stat.S_IWRITE)
+
+    deleted = {r.policy: r.rows_deleted for r in report.policies if r.policy.startswith("noise_posts")}
+    assert deleted["noise_posts"] == 1
+    assert f"noise_posts@{shard_path(months[1]).stem}" in deleted
+    # El shard sellado no se toca
+    assert not any(sealed.stem in policy for policy in deleted)
+    assert _ids(sealed) == {'6-ruido', '6-dolor'}
+    assert _ids(shard_path(months[1])) == {'3-dolor'}
+    assert _ids(shard_path(months[2])) == {'0-ruido', '0-dolor'}
+    assert _ids(sharded) == {'main-dolor'}
+    assert total_posts() == 6
@@ -0,0 +1,133 @@
+"""
+Posts en shards mensuales: lecturas de muchos shards y de días repartidos entre shard y base principal
+"""
+
+import sqlite3
+from datetime import date, datetime
+
+import pytest
+
+from config.config_v2 import get_settings
+from database.db import (LIMA_TZ, add_months, browse_leads, day_posts_db_paths, existing_shard_months,
+                         get_read_conn, init_db, search_posts, sharded_posts, upsert_posts)
+from database.rollups import rebuild_rollups
+from database.snapshot import today_snapshot
+from utils.kpi import compute_day_kpis
+from web.live_feed import PostTailer
+
+FIRST_MONTH = 202401
+MONTHS = 14
+
+
+@pytest.fixture
+def many_shards(tmp_db, monkeypatch):
+    """Un shard por mes con tres posts cada uno, más de SQLITE_LIMIT_ATTACHED shards"""
+    init_db()
+    monkeypatch.setattr(get_settings().database, "shard_posts", True)
+    posts = []
+    for offset in range(MONTHS):
+        month = add_months(FIRST_MONTH, offset)
+        for n in range(3):
+            posts.append({
+                'id': f'{month}-{n}', 'source': 'test', 'url': f'https://example.com/{month}/{n}',
+                'title': f'Busco agencia de marketing {month}', 'body': 'Presupuesto para campaña',
+                'keyword': 'marketing', 'tag': 'busqueda', 'relevance_score': (offset * 7 + n * 31) % 100,
+                'created_at': f'{month // 100}-{month % 100:02d}-1{n}T12:00:00+00:00',
+            })
+    upsert_posts(posts)
+    with get_read_conn() as c:
+        assert len(existing_shard_months()) > c.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+    return posts
+
+
+def test_sharded_posts_rejects_too_many_shards(many_shards):
+    with pytest.raises(ValueError):
+        with sharded_posts():
+            pass
+
+
+def test_browse_leads_pages_across_all_shards(many_shards):
+    seen = []
+    after = None
+    while True:
+        page = browse_leads(after=after, limit=5)
+        seen += page['leads']
+        after = page['next']
+        if after is None:
+            break
+
+    assert len(seen) == len(many_shards)
+    keys = [(p['relevance_score'], p['created_at'], p['id']) for p in seen]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_search_posts_across_all_shards(many_shards):
+    results = search_posts("agencia marketing", limit=100)
+    assert len(results) == len(many_shards)
+
+    oldest = search_posts("agencia marketing", until=date(2024, 1, 31), limit=100)
+    assert {r['id'] for r in oldest} == {f'{FIRST_MONTH}-{n}' for n in range(3)}
+
+
+def _today_post(post_id: str, tag: str = 'dolor') -> dict:
+    noon = datetime.now(LIMA_TZ).replace(hour=12, minute=0, second=0, microsecond=0)
+    return {
+        'id': post_id, 'source': 'test', 'url': f'https://example.com/{post_id}',
+        'title': 'Necesito una agencia de marketing digital para mi negocio',
+        'body': 'Busco proveedor con experiencia', 'keyword': 'marketing', 'tag': tag,
+        'relevance_score': 90, 'created_at': noon.isoformat(),
+    }
+
+
+@pytest.fixture
+def split_day(tmp_db, monkeypatch):
+    """Posts de hoy en la base principal (antes del sharding) y en el shard del mes"""
+    init_db()
+    upsert_posts([_today_post('main-1'), _today_post('main-2', 'busqueda')])
+    monkeypatch.setattr(get_settings().database, "shard_posts", True)
+    init_db()
+    upsert_posts([_today_post('shard-1'), _today_post('shard-2', 'ruido'), _today_post('shard-3')])
+    assert len(day_posts_db_paths()) == 2
+    return tmp_db
+
+
+def test_day_reads_sum_main_and_shard(split_day):
+    kpis = compute_day_kpis()
+    assert kpis['total'] == 5
+    assert (kpis['dolores'], kpis['busquedas'], kpis['ruido']) == (3, 1, 1)
+    assert kpis['actionable_dolores'] == 3
+
+    snapshot = today_snapshot()
+    assert len(snapshot.posts) == 5
+    assert snapshot.tag_counts == {'dolor': 3, 'busqueda': 1, 'ruido': 1}
+    assert snapshot.total_posts == 5
+
+
+def test_rebuild_rollups_covers_main_and_shard(split_day, monkeypatch):
+    assert sum(k['dolores_calidad'] for k in compute_day_kpis()['keywords']) == 3
+
+    # Con umbral 90 ningún post (score 90) supera el corte estricto
+    monkeypatch.setattr(get_settings().scraping, "min_relevance_score", 90)
+    result = rebuild_rollups()
+    assert result['high_value_score'] == 90
+    # (keyword, tag) por archivo: dolor+busqueda en main, dolor+ruido en el shard
+    assert result['daily_rows'] == 4
+    assert sum(k['dolores_calidad'] for k in compute_day_kpis()['keywords']) == 0
+
+
+def test_live_feed_tails_main_and_shard(split_day, monkeypatch):
+    tailer = PostTailer(batch_rows=100, recent_leads=10)
+    try:
+        assert tailer.bootstrap()['posts'] == 5
+
+        # Un mes sellado (u otro proceso sin sharding) escribe en la base principal
+        monkeypatch.setattr(get_settings().database, "shard_posts", False)
+        upsert_posts([_today_post('main-3', 'busqueda')])
+        monkeypatch.setattr(get_settings().database, "shard_posts", True)
+
+        delta, rebuilt = tailer.poll()
+        assert not rebuilt
+        assert delta['posts'] == 1
+        assert tailer.aggregates.posts == 6
+    finally:
+        tailer.close()
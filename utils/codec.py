@@ -0,0 +1,233 @@
+"""
+Codec Layer for Aqxion Scraper
+Shared serialization for cache entries, database JSON columns and outputs
+"""
+
+import dataclasses
+import json
+import zlib
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal
+from enum import Enum
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+from config.config_v2 import get_settings
+
+# Envelope layout: MAGIC | VERSION | CODEC_ID | FLAGS | payload
+# 0xA9 is never the first byte of valid UTF-8, so legacy JSON/text values
+# written before the envelope existed can still be told apart and decoded.
+ENVELOPE_MAGIC = 0xA9
+ENVELOPE_VERSION = 1
+ENVELOPE_HEADER_SIZE = 4
+FLAG_COMPRESSED = 0x01
+
+
+class CodecError(ValueError):
+    """Raised when a blob cannot be decoded"""
+    pass
+
+
+def to_builtin(value: Any) -> Any:
+    """Convert values the codecs don't handle natively into plain types"""
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if isinstance(value, (datetime, date, dt_time)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, Path):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8', errors='replace')
+    raise TypeError(f"Type {type(value).__name__} is not serializable")
+
+
+class Codec:
+    """Base codec: turns Python values into bytes and back"""
+
+    name = "base"
+    codec_id = 0
+
+    def dumps(self, value: Any) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, data: bytes) -> Any:
+        raise NotImplementedError
+
+
+class JSONCodec(Codec):
+    """Stdlib JSON codec (always available, slowest)"""
+
+    name = "json"
+    codec_id = 1
+
+    def dumps(self, value: Any) -> bytes:
+        return json.dumps(value, ensure_ascii=False, default=to_builtin,
+                          separators=(',', ':')).encode('utf-8')
+
+    def loads(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+class OrjsonCodec(Codec):
+    """orjson codec with native dataclass/datetime support"""
+
+    name = "orjson"
+    codec_id = 2
+
+    def dumps(self, value: Any) -> bytes:
+        return orjson.dumps(value, default=to_builtin, option=orjson.OPT_NON_STR_KEYS)
+
+    def loads(self, data: bytes) -> Any:
+        return orjson.loads(data)
+
+
+class MsgpackCodec(Codec):
+    """MessagePack codec (compact binary)"""
+
+    name = "msgpack"
+    codec_id = 3
+
+    def dumps(self, value: Any) -> bytes:
+        return msgpack.packb(value, default=to_builtin, use_bin_type=True)
+
+    def loads(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+_CODECS_BY_ID: Dict[int, Codec] = {}
+_CODECS_BY_NAME: Dict[str, Codec] = {}
+
+
+def register_codec(codec: Codec) -> None:
+    """Register a codec so it can be selected by name and decoded by id"""
+    _CODECS_BY_ID[codec.codec_id] = codec
+    _CODECS_BY_NAME[codec.name] = codec
+
+
+register_codec(JSONCodec())
+if ORJSON_AVAILABLE:
+    register_codec(OrjsonCodec())
+if MSGPACK_AVAILABLE:
+    register_codec(MsgpackCodec())
+
+
+def get_codec(name: Optional[str] = None) -> Codec:
+    """Get a codec by name; 'auto' (default) picks the fastest installed one"""
+    if name is None:
+        name = get_settings().cache.codec
+
+    if name == "auto":
+        for candidate in ("orjson", "msgpack", "json"):
+            if candidate in _CODECS_BY_NAME:
+                return _CODECS_BY_NAME[candidate]
+
+    codec = _CODECS_BY_NAME.get(name)
+    if codec is None:
+        raise CodecError(f"Codec '{name}' is not available (installed: {sorted(_CODECS_BY_NAME)})")
+    return codec
+
+
+# ===== BINARY ENVELOPE (cache entries) =====
+
+def seal(payload: bytes, codec: Codec, compress: bool = False) -> bytes:
+    """Wrap an encoded payload in the versioned envelope"""
+    flags = 0
+    if compress:
+        compressed = zlib.compress(payload, 6)
+        if len(compressed) < len(payload):
+            payload = compressed
+            flags |= FLAG_COMPRESSED
+
+    header = bytes((ENVELOPE_MAGIC, ENVELOPE_VERSION, codec.codec_id, flags))
+    return header + payload
+
+
+def encode(value: Any, codec: Optional[Codec] = None,
+           compress_threshold: Optional[int] = None) -> bytes:
+    """Encode a value into an enveloped blob, compressing large payloads"""
+    codec = codec or get_codec()
+    payload = codec.dumps(value)
+    compress = compress_threshold is not None and len(payload) > compress_threshold
+    return seal(payload, codec, compress)
+
+
+def is_sealed(blob: Union[bytes, bytearray, memoryview]) -> bool:
+    """Check whether a blob carries the codec envelope"""
+    return len(blob) >= ENVELOPE_HEADER_SIZE and blob[0] == ENVELOPE_MAGIC
+
+
+def decode(blob: Union[bytes, bytearray, memoryview, str, None]) -> Any:
+    """Decode an enveloped blob; legacy JSON/plain-text values are passed through"""
+    if blob is None:
+        return None
+
+    if isinstance(blob, str):
+        return _decode_legacy_text(blob)
+
+    if not is_sealed(blob):
+        try:
+            return _decode_legacy_text(bytes(blob).decode('utf-8'))
+        except UnicodeDecodeError:
+            raise CodecError("Blob is neither enveloped nor UTF-8 text")
+
+    version, codec_id, flags = blob[1], blob[2], blob[3]
+    if version != ENVELOPE_VERSION:
+        raise CodecError(f"Unsupported envelope version: {version}")
+
+    codec = _CODECS_BY_ID.get(codec_id)
+    if codec is None:
+        raise CodecError(f"Blob was written with unavailable codec id {codec_id}")
+
+    payload = bytes(blob[ENVELOPE_HEADER_SIZE:])
+    if flags & FLAG_COMPRESSED:
+        payload = zlib.decompress(payload)
+    return codec.loads(payload)
+
+
+def _decode_legacy_text(text: str) -> Any:
+    """Values written before the envelope were JSON or plain str()"""
+    try:
+        return json.loads(text)
+    except (json.JSONDecodeError, TypeError):
+        return text
+
+
+# ===== JSON TEXT (database columns and outputs) =====
+
+def to_json(value: Any, indent: bool = False) -> str:
+    """Serialize to JSON text, using orjson when installed"""
+    if ORJSON_AVAILABLE:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(value, default=to_builtin, option=option).decode('utf-8')
+
+    return json.dumps(value, ensure_ascii=False, default=to_builtin,
+                      indent=2 if indent else None)
+
+
+def from_json(text: Union[str, bytes, None], default: Any = None) -> Any:
+    """Parse JSON text, returning ``default`` for NULL/empty columns"""
+    if not text:
+        return default
+    if ORJSON_AVAILABLE:
+        return orjson.loads(text)
+    return json.loads(text)
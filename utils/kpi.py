@@ -1,144 +1,301 @@
-import sqlite3, datetime as dt
+"""
+KPIs diarios de Aqxion Scraper
+
+Todas las métricas del día salen de una lectura de post_rollup_daily
+(una fila por keyword/tag) más un conteo indexado de dolores accionables
+(day_bucket, tag, ...) en cada archivo con posts del día (su shard y la
+base principal). El resultado se guarda en kpi_daily (base
+principal), así las series de N días (database/trend.sql, kpi_trend) leen
+una fila por día.
+
+Uso:
+    python -m utils.kpi                   # reporte del día
+    python -m utils.kpi --json            # mismo reporte en JSON
+    python -m utils.kpi --days 7 [--json] # serie de los últimos 7 días
+"""
+
+import argparse
+import sqlite3
+import sys
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.codec import from_json, to_json
 from utils.simple_alerts import alert_lead
-from config.config_v2 import get_settings, get_db_path
+from config.config_v2 import MIN_BODY_LENGTH, MIN_TITLE_LENGTH, get_settings
+from database.db import (LIMA_TZ, day_bucket_for, get_conn, get_day_read_conns, get_read_conn,
+                         lima_day_bucket, lima_day_range, lima_today)
+from database.rollups import INTENT_TAGS
+
+KPI_DAILY_DDL = """
+CREATE TABLE IF NOT EXISTS kpi_daily (
+    day_bucket INTEGER PRIMARY KEY,   -- día local de Lima (YYYYMMDD)
+    total INTEGER NOT NULL,
+    dolores INTEGER NOT NULL,
+    objeciones INTEGER NOT NULL,
+    busquedas INTEGER NOT NULL,
+    ruido INTEGER NOT NULL,
+    intent_pct REAL NOT NULL,
+    actionable_dolores INTEGER NOT NULL,
+    leads INTEGER NOT NULL,
+    conversion_pct REAL NOT NULL,
+    keywords TEXT,                    -- JSON: métricas por keyword
+    computed_at TEXT NOT NULL
+)
+"""
+
+KPI_DAILY_COLUMNS = ('day_bucket', 'total', 'dolores', 'objeciones', 'busquedas', 'ruido',
+                     'intent_pct', 'actionable_dolores', 'leads', 'conversion_pct', 'keywords',
+                     'computed_at')
+
+
+def _pct(part: int, total: int) -> float:
+    return round(part * 100.0 / total, 1) if total else 0.0
+
+
+def compute_day_kpis(day: Optional[int] = None,
+                     conn: Optional[sqlite3.Connection] = None) -> Dict[str, Any]:
+    """Métricas del día: totales por tag, por keyword, leads accionables y conversión.
+
+    Sin ``conn`` suma el shard del día y la base principal (posts anteriores
+    al sharding o de meses sellados).
+    """
+    day = day or lima_day_bucket()
+    if conn is None:
+        with get_day_read_conns(day) as conns:
+            return _day_kpis(day, conns)
+    return _day_kpis(day, [conn])
+
+
+def _day_kpis(day: int, conns: List[sqlite3.Connection]) -> Dict[str, Any]:
+    tags = {'dolor': 0, 'objecion': 0, 'busqueda': 0, 'ruido': 0}
+    keywords: Dict[str, Dict[str, Any]] = {}
+    keyword_tags: Dict[Tuple[Optional[str], str], int] = {}
+    total = 0
+    actionable_dolores = 0
+    min_score = get_settings().scraping.min_relevance_score
+
+    for conn in conns:
+        # Una lectura del rollup diario: (keyword, tag) -> posts, high_value
+        rows = conn.execute("""
+            SELECT keyword, tag, posts, high_value FROM post_rollup_daily
+            WHERE day_bucket = ? AND posts > 0
+        """, (day,)).fetchall()
+        dolores = 0
+        for keyword, tag, posts, high_value in rows:
+            total += posts
+            if tag in tags:
+                tags[tag] += posts
+            stats = keywords.setdefault(keyword, {
+                'keyword': keyword or None, 'posts': 0, 'intent': 0,
+                'dolores_calidad': 0, 'busquedas': 0,
+            })
+            stats['posts'] += posts
+            if tag in INTENT_TAGS:
+                stats['intent'] += posts
+            if tag == 'dolor':
+                stats['dolores_calidad'] += high_value
+                dolores += posts
+            elif tag == 'busqueda':
+                stats['busquedas'] += posts
+            if tag and tag != 'ruido':
+                key = (keyword or None, tag)
+                keyword_tags[key] = keyword_tags.get(key, 0) + posts
+
+        # Dolores con contenido sustancial y el mismo umbral que high_value de
+        # los rollups (> min_relevance_score). +relevance_score: el rango por
+        # score no debe llevar al planificador a idx_posts_lead_tag (todos los días)
+        if dolores:
+            actionable_dolores += conn.execute("""
+                SELECT COUNT(*)
+                FROM posts
+                WHERE day_bucket = ? AND tag = 'dolor' AND +relevance_score > ?
+                  AND (LENGTH(title) > ? OR LENGTH(zdecompress(body)) > ?)
+            """, (day, min_score, MIN_TITLE_LENGTH, MIN_BODY_LENGTH)).fetchone()[0]
+
+    for stats in keywords.values():
+        stats['intent_pct'] = _pct(stats['intent'], stats['posts'])
+        stats['leads'] = stats['dolores_calidad'] + stats['busquedas']
+
+    leads = actionable_dolores + tags['busqueda']
+    return {
+        'day_bucket': day,
+        'total': total,
+        'dolores': tags['dolor'],
+        'objeciones': tags['objecion'],
+        'busquedas': tags['busqueda'],
+        'ruido': tags['ruido'],
+        'intent_pct': _pct(tags['dolor'] + tags['objecion'] + tags['busqueda'], total),
+        'actionable_dolores': actionable_dolores,
+        'leads': leads,
+        'conversion_pct': _pct(leads, total),
+        'keywords': sorted(keywords.values(), key=lambda k: (-k['leads'], -k['posts'])),
+        'top_keyword_tags': sorted(((keyword, tag, posts) for (keyword, tag), posts in keyword_tags.items()),
+                                   key=lambda r: -r[2])[:10],
+        'computed_at': datetime.now(LIMA_TZ).isoformat(timespec='seconds'),
+    }
+
+
+# ===== SNAPSHOTS DIARIOS =====
+
+def save_day_kpis(kpis: Dict[str, Any]) -> None:
+    """Guarda (o reemplaza) la fila del día en kpi_daily"""
+    row = [to_json(kpis[col]) if col == 'keywords' else kpis[col] for col in KPI_DAILY_COLUMNS]
+    with get_conn() as c:
+        c.execute(KPI_DAILY_DDL)
+        c.execute(f"""
+            INSERT OR REPLACE INTO kpi_daily ({', '.join(KPI_DAILY_COLUMNS)})
+            VALUES ({', '.join('?' for _ in KPI_DAILY_COLUMNS)})
+        """, row)
+        c.commit()
+
+
+def snapshot_day(day: Optional[int] = None) -> Dict[str, Any]:
+    """Calcula y guarda los KPIs de un día"""
+    kpis = compute_day_kpis(day)
+    save_day_kpis(kpis)
+    return kpis
+
+
+def is_final_snapshot(day: date, computed_at: Optional[str]) -> bool:
+    """True si el snapshot se calculó después del fin del día local de Lima"""
+    if not computed_at:
+        return False
+    moment = datetime.fromisoformat(computed_at)
+    if moment.tzinfo is None:
+        # Snapshots sin zona horaria: no se puede saber si son parciales
+        return False
+    return moment.timestamp() >= lima_day_range(day)[1]
 
 
-def kpi():
-    settings = get_settings()
-    con = sqlite3.connect(str(get_db_path()))
-    cur = con.cursor()
+def kpi_trend(days: int = 7, today: Optional[date] = None) -> List[Dict[str, Any]]:
+    """Serie diaria de los últimos ``days`` días leída de kpi_daily
 
+    Un día pasado se calcula si no tiene snapshot o si el suyo es parcial
+    (guardado antes de que terminara el día); después ya no cambia. Hoy se
+    recalcula en cada llamada porque sigue recibiendo posts.
+    """
+    today = today or lima_today()
+    days_back = [today - timedelta(days=offset) for offset in range(days - 1, -1, -1)]
+    buckets = [day_bucket_for(day) for day in days_back]
+
+    with get_conn() as c:
+        c.execute(KPI_DAILY_DDL)
+        c.commit()
+        stored = dict(c.execute(
+            "SELECT day_bucket, computed_at FROM kpi_daily WHERE day_bucket BETWEEN ? AND ?",
+            (buckets[0], buckets[-1])).fetchall())
+    for day, bucket in zip(days_back, buckets):
+        if bucket == buckets[-1] or not is_final_snapshot(day, stored.get(bucket)):
+            snapshot_day(bucket)
+
+    return load_kpi_series(buckets[0], buckets[-1])
+
+
+def load_kpi_series(first: int, last: int) -> List[Dict[str, Any]]:
+    """Snapshots guardados entre dos day_bucket (incluidos), sin calcular ni escribir"""
+    with get_read_conn() as c:
+        try:
+            rows = c.execute(f"""
+                SELECT {', '.join(KPI_DAILY_COLUMNS)} FROM kpi_daily
+                WHERE day_bucket BETWEEN ? AND ? ORDER BY day_bucket
+            """, (first, last)).fetchall()
+        except sqlite3.OperationalError as e:
+            # kpi_daily se crea con el primer snapshot
+            if "no such table" not in str(e):
+                raise
+            return []
+    series = [dict(zip(KPI_DAILY_COLUMNS, row)) for row in rows]
+    for point in series:
+        point['keywords'] = from_json(point['keywords'], [])
+    return series
+
+
+# ===== REPORTE =====
+
+def kpi(as_json: bool = False) -> Dict[str, Any]:
     try:
-        # Primera consulta - KPIs generales
-        cur.execute("""
-            SELECT
-              SUM(CASE WHEN tag='dolor' THEN 1 ELSE 0 END) AS dolores,
-              SUM(CASE WHEN tag='objecion' THEN 1 ELSE 0 END) AS objeciones,
-              SUM(CASE WHEN tag='busqueda' THEN 1 ELSE 0 END) AS busquedas,
-              SUM(CASE WHEN tag='ruido' THEN 1 ELSE 0 END) AS ruido,
-              COUNT(DISTINCT id) AS total
-            FROM posts
-            WHERE DATE(created_at, 'localtime') = DATE('now', 'localtime')
-        """)
-        row = cur.fetchone()
-
-        if row is None:
-            print("No hay datos para calcular KPIs")
-            return
-
-        dolores, objeciones, busquedas, ruido, total = row
-        intencion_pct = ((dolores or 0) + (objeciones or 0) + (busquedas or 0)) / (total or 1) * 100
-
-        print("=== KPI DEL DÍA ===")
-        print(f"Dolores únicos: {dolores or 0}")
-        print(f"Objeciones: {objeciones or 0}")
-        print(f"Búsquedas proveedor: {busquedas or 0}")
-        print(f"Ruido: {ruido or 0}")
-        print(f"Total únicos: {total or 0}")
-        print(f"% de intención (dolor+objecion+busqueda): {intencion_pct:.1f}%")
-
-        # KPIs ESPECÍFICOS PARA GENERACIÓN DE INGRESOS
-        print("\n=== 🎯 KPIs ACCIONABLES PARA INGRESOS ===")
-
-        # Dolores únicos accionables (alta calidad)
-        actionable_dolores = 0
-        if dolores and dolores > 0:
-            # Contar dolores con contenido sustancial
-            cur.execute("""
-                SELECT COUNT(DISTINCT p.id)
-                FROM posts p
-                WHERE DATE(p.created_at, 'localtime') = DATE('now', 'localtime')
-                AND p.tag='dolor'
-                AND (LENGTH(p.title) > MIN_TITLE_LENGTH OR LENGTH(p.body) > MIN_BODY_LENGTH)
-                AND p.relevance_score > ?
-            """, (settings.scraping.min_relevance_score,))
-            actionable_dolores = cur.fetchone()[0]
-
-        # Búsquedas proveedor activas
-        active_provider_searches = busquedas or 0
-
-        print(f"💰 Dolores únicos accionables: {actionable_dolores}")
-        print(f"🔍 Búsquedas proveedor activas: {active_provider_searches}")
-        print(f"📈 Total leads potenciales: {actionable_dolores + active_provider_searches}")
-
-        if total and total > 0:
-            conversion_rate = ((actionable_dolores + active_provider_searches) / total) * 100
-            print(f"🎯 Tasa de conversión lead: {conversion_rate:.1f}%")
-
-        # Top keywords por ingresos potenciales
-        print("\n=== 💎 Keywords con Mayor Potencial de Ingresos ===")
-        cur.execute("""
-            SELECT
-                keyword,
-                SUM(CASE WHEN tag='dolor' AND relevance_score > ? THEN 1 ELSE 0 END) as dolores_calidad,
-                SUM(CASE WHEN tag='busqueda' THEN 1 ELSE 0 END) as busquedas_proveedor,
-                COUNT(*) as total_posts,
-                (SUM(CASE WHEN tag='dolor' AND relevance_score > ? THEN 1 ELSE 0 END) +
-                 SUM(CASE WHEN tag='busqueda' THEN 1 ELSE 0 END)) as leads_potenciales
-            FROM posts
-            WHERE DATE(created_at, 'localtime') = DATE('now', 'localtime')
-            GROUP BY keyword
-            ORDER BY leads_potenciales DESC, total_posts DESC
-            LIMIT 5
-        """, (settings.scraping.min_relevance_score, settings.scraping.min_relevance_score))
-        revenue_keywords = cur.fetchall()
-
-        if revenue_keywords:
-            for keyword, dolores_calidad, busquedas, total, leads in revenue_keywords:
-                print(f"{keyword}: {dolores_calidad}💰 + {busquedas}🔍 = {leads} leads ({total} posts)")
+        kpis = snapshot_day()
+    except sqlite3.Error as e:
+        print(f"Error en consulta de KPIs: {e}")
+        return {}
 
+    if as_json:
+        print(to_json(kpis, indent=True))
+        return kpis
+
+    _print_kpis(kpis)
+    if kpis['total']:
         # Enviar alerta de resumen diario
         alert_lead({
-            'actionable_dolores': actionable_dolores,
-            'active_provider_searches': active_provider_searches,
-            'total_leads': actionable_dolores + active_provider_searches
+            'actionable_dolores': kpis['actionable_dolores'],
+            'active_provider_searches': kpis['busquedas'],
+            'total_leads': kpis['leads']
         })
+    return kpis
+
+
+def _print_kpis(kpis: Dict[str, Any]) -> None:
+    if not kpis['total']:
+        print("No hay datos para calcular KPIs")
+        return
 
-        # KPI por keyword
-        print("\n=== % INTENCIÓN POR KEYWORD ===")
-        cur.execute("""
-            SELECT
-                keyword,
-                COUNT(*) as total_posts,
-                SUM(CASE WHEN tag IN ('dolor', 'objecion', 'busqueda') THEN 1 ELSE 0 END) as intencion_posts,
-                ROUND(
-                    (SUM(CASE WHEN tag IN ('dolor', 'objecion', 'busqueda') THEN 1 ELSE 0 END) * 100.0) / COUNT(*),
-                    1
-                ) as intencion_pct
-            FROM posts
-            WHERE DATE(created_at, 'localtime') = DATE('now', 'localtime')
-            GROUP BY keyword
-            ORDER BY intencion_pct DESC, total_posts DESC
-            LIMIT 10
-        """)
-        keyword_stats = cur.fetchall()
-
-        if keyword_stats:
-            for keyword, total, intencion, pct in keyword_stats:
-                print(f"{keyword}: {intencion}/{total} posts ({pct}%)")
+    print("=== KPI DEL DÍA ===")
+    print(f"Dolores únicos: {kpis['dolores']}")
+    print(f"Objeciones: {kpis['objeciones']}")
+    print(f"Búsquedas proveedor: {kpis['busquedas']}")
+    print(f"Ruido: {kpis['ruido']}")
+    print(f"Total únicos: {kpis['total']}")
+    print(f"% de intención (dolor+objecion+busqueda): {kpis['intent_pct']:.1f}%")
+
+    # KPIs ESPECÍFICOS PARA GENERACIÓN DE INGRESOS
+    print("\n=== 🎯 KPIs ACCIONABLES PARA INGRESOS ===")
+    print(f"💰 Dolores únicos accionables: {kpis['actionable_dolores']}")
+    print(f"🔍 Búsquedas proveedor activas: {kpis['busquedas']}")
+    print(f"📈 Total leads potenciales: {kpis['leads']}")
+    print(f"🎯 Tasa de conversión lead: {kpis['conversion_pct']:.1f}%")
+
+    # Top keywords por ingresos potenciales
+    print("\n=== 💎 Keywords con Mayor Potencial de Ingresos ===")
+    # dolores_calidad = dolores con relevance_score > min_relevance_score (high_value)
+    for k in kpis['keywords'][:5]:
+        print(f"{k['keyword']}: {k['dolores_calidad']}💰 + {k['busquedas']}🔍 = "
+              f"{k['leads']} leads ({k['posts']} posts)")
+
+    # KPI por keyword
+    print("\n=== % INTENCIÓN POR KEYWORD ===")
+    for k in sorted(kpis['keywords'], key=lambda k: (-k['intent_pct'], -k['posts']))[:10]:
+        print(f"{k['keyword']}: {k['intent']}/{k['posts']} posts ({k['intent_pct']}%)")
+
+    # Top keywords por intención
+    if kpis['top_keyword_tags']:
+        print("\n=== TOP KEYWORDS POR INTENCIÓN ===")
+        for keyword, tag, count in kpis['top_keyword_tags']:
+            print(f"{keyword} ({tag}): {count}")
+
+
+def _print_trend(series: List[Dict[str, Any]]) -> None:
+    print(f"{'día':<10} {'total':>7} {'dolores':>8} {'búsq.':>6} {'objec.':>7} {'leads':>6} {'conv.%':>7}")
+    for p in series:
+        print(f"{p['day_bucket']:<10} {p['total']:>7} {p['dolores']:>8} {p['busquedas']:>6} "
+              f"{p['objeciones']:>7} {p['leads']:>6} {p['conversion_pct']:>7.1f}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="KPIs diarios de leads")
+    parser.add_argument("--json", action="store_true", help="Salida JSON (scripts y monitoreo)")
+    parser.add_argument("--days", type=int, help="Serie de los últimos N días en vez del reporte de hoy")
+    args = parser.parse_args(argv)
+
+    if args.days:
+        series = kpi_trend(args.days)
+        if args.json:
+            print(to_json(series, indent=True))
         else:
-            print("No hay datos suficientes para calcular KPIs por keyword")
-
-        # Top keywords por intención
-        cur.execute("""
-            SELECT keyword, tag, COUNT(*) as c
-            FROM posts
-            WHERE DATE(created_at, 'localtime') = DATE('now', 'localtime') AND tag != 'ruido'
-            GROUP BY keyword, tag
-            ORDER BY c DESC
-            LIMIT 10
-        """)
-        top_keywords = cur.fetchall()
-
-        if top_keywords:
-            print("\n=== TOP KEYWORDS POR INTENCIÓN ===")
-            for keyword, tag, count in top_keywords:
-                print(f"{keyword} ({tag}): {count}")
+            _print_trend(series)
+        return 0
+    return 0 if kpi(as_json=args.json) else 1
 
-    except sqlite3.Error as e:
-        print(f"Error en consulta de KPIs: {e}")
-    finally:
-        con.close()
 
 if __name__ == "__main__":
-    kpi()
\ No newline at end of file
+    sys.exit(main())
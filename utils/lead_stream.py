@@ -0,0 +1,319 @@
+"""
+Lead Stream for Aqxion Scraper
+Publishes saved posts to a Redis Stream for downstream consumers
+
+High-value leads used to reach other systems only through alert_lead()
+printing to stdout, so CRM sync or notifications had to poll SQLite.
+After the writer confirms a batch, the scraper appends one entry per
+high-value lead (tag dolor/busqueda with relevance_score >=
+scraping.high_value_threshold, or every post with STREAM_PUBLISH_ALL) to
+the stream with ``XADD ... MAXLEN ~ STREAM_MAXLEN``, in a single pipelined
+round trip.
+
+Entry fields:
+    d    lead payload as a utils.codec envelope (msgpack/orjson, zlib above
+         STREAM_COMPRESS_MIN_BYTES)
+    tag  post tag, so consumers can filter without decoding
+    hv   b"1" for high-value leads, b"0" for other posts
+
+Consumers read through consumer groups: every group gets every entry and
+the consumers of one group share the work. Entries are acknowledged
+after the handler succeeds; entries of a consumer that died stay pending
+and are reclaimed with XAUTOCLAIM (Redis 6.2+) after STREAM_CLAIM_IDLE_MS.
+
+Publishing never blocks the crawler: if Redis is unreachable the batch is
+dropped (the posts are in SQLite) and the connection is retried later.
+
+Usage:
+    python -m utils.lead_stream consume [--group crm] [--name worker-1] [--json]
+    python -m utils.lead_stream info
+"""
+
+import argparse
+import asyncio
+import inspect
+import os
+import socket
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Union
+import logging
+
+import redis.asyncio as redis
+from redis.exceptions import RedisError, ResponseError
+
+from config.config_v2 import get_settings
+from database.snapshot import HOT_TAGS
+from utils import codec
+
+log = logging.getLogger("lead_stream")
+
+LEAD_FIELDS = ('id', 'source', 'url', 'title', 'keyword', 'tag', 'relevance_score',
+               'created_at', 'published_at', 'lang')
+
+# Seconds between reconnect attempts after Redis failed
+RECONNECT_INTERVAL = 30.0
+
+LeadHandler = Callable[[str, Dict[str, Any]], Union[None, Awaitable[None]]]
+
+
+def stream_redis_url() -> str:
+    settings = get_settings()
+    return settings.stream.redis_url or settings.cache.redis_url or "redis://localhost:6379"
+
+
+def is_high_value(post: Dict[str, Any]) -> bool:
+    """Same rule as the lead alerts of the scraper"""
+    return (post.get('tag') in HOT_TAGS and
+            (post.get('relevance_score') or 0) >= get_settings().scraping.high_value_threshold)
+
+
+def encode_entry(post: Dict[str, Any], high_value: bool) -> Dict[bytes, bytes]:
+    """Stream fields for a post dict (as returned by ScrapedPost.to_dict())"""
+    stream_settings = get_settings().stream
+    payload = {field: post.get(field) for field in LEAD_FIELDS}
+    if stream_settings.body_chars:
+        payload['body'] = (post.get('body') or '')[:stream_settings.body_chars]
+    return {
+        b"d": codec.encode(payload, compress_threshold=stream_settings.compress_min_bytes),
+        b"tag": (post.get('tag') or '').encode('utf-8'),
+        b"hv": b"1" if high_value else b"0",
+    }
+
+
+def decode_entry(fields: Dict[bytes, bytes]) -> Dict[str, Any]:
+    """Lead dict of a stream entry, with a 'high_value' flag"""
+    lead = codec.decode(fields[b"d"])
+    lead['high_value'] = fields.get(b"hv") == b"1"
+    return lead
+
+
+def _client(url: str, socket_timeout: Optional[float] = 2.0) -> redis.Redis:
+    return redis.Redis.from_url(url, socket_timeout=socket_timeout, socket_connect_timeout=2.0,
+                                retry_on_timeout=False, decode_responses=False)
+
+
+class LeadStreamPublisher:
+    """Appends saved posts to the lead stream; failures only cost the batch"""
+
+    def __init__(self):
+        stream_settings = get_settings().stream
+        self.enabled = stream_settings.enabled
+        self.key = stream_settings.key
+        self.maxlen = stream_settings.maxlen
+        self.publish_all = stream_settings.publish_all
+        self.client: Optional[redis.Redis] = None
+        self.connected = False
+        self._retry_at = 0.0
+        self.published = 0
+        self.dropped = 0
+
+    async def connect(self) -> bool:
+        if not self.enabled:
+            return False
+        try:
+            if self.client is None:
+                self.client = _client(stream_redis_url())
+            await self.client.ping()
+            self.connected = True
+            log.info(f"📤 Lead stream conectado: {self.key}")
+        except (RedisError, OSError) as e:
+            self.connected = False
+            self._retry_at = time.monotonic() + RECONNECT_INTERVAL
+            log.warning(f"⚠️ Lead stream sin Redis ({e}); reintento en {RECONNECT_INTERVAL:.0f}s")
+        return self.connected
+
+    async def publish(self, posts: Iterable[Dict[str, Any]]) -> int:
+        """XADD the posts that qualify in one round trip; returns how many were published"""
+        if not self.enabled:
+            return 0
+        entries = []
+        for post in posts:
+            high_value = is_high_value(post)
+            if high_value or self.publish_all:
+                entries.append(encode_entry(post, high_value))
+        if not entries:
+            return 0
+
+        if not self.connected and (time.monotonic() < self._retry_at or not await self.connect()):
+            self.dropped += len(entries)
+            return 0
+
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for fields in entries:
+                    pipe.xadd(self.key, fields, maxlen=self.maxlen, approximate=True)
+                await pipe.execute()
+        except (RedisError, OSError) as e:
+            self.connected = False
+            self._retry_at = time.monotonic() + RECONNECT_INTERVAL
+            self.dropped += len(entries)
+            log.warning(f"⚠️ No se pudieron publicar {len(entries)} leads: {e}")
+            return 0
+
+        self.published += len(entries)
+        return len(entries)
+
+    async def close(self) -> None:
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+        self.connected = False
+
+
+lead_stream = LeadStreamPublisher()
+
+
+class LeadStreamConsumer:
+    """Consumer-group reader: handler(entry_id, lead) per entry, XACK after it returns"""
+
+    def __init__(self, handler: LeadHandler, group: Optional[str] = None,
+                 name: Optional[str] = None, client: Optional[redis.Redis] = None):
+        stream_settings = get_settings().stream
+        self.handler = handler
+        self.key = stream_settings.key
+        self.group = group or stream_settings.group
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.batch_size = stream_settings.batch_size
+        self.block_ms = stream_settings.block_ms
+        self.claim_idle_ms = stream_settings.claim_idle_ms
+        # XREADGROUP blocks up to block_ms: no socket timeout for the reader
+        self.client = client or _client(stream_redis_url(), socket_timeout=None)
+        self.processed = 0
+        self.failed = 0
+
+    async def ensure_group(self) -> None:
+        """Create the group (and the stream) if needed; a new group starts at the oldest entry"""
+        try:
+            await self.client.xgroup_create(self.key, self.group, id="0", mkstream=True)
+            log.info(f"Grupo {self.group} creado en {self.key}")
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def _handle(self, entries: List[Tuple[bytes, Dict[bytes, bytes]]]) -> int:
+        acked = []
+        for entry_id, fields in entries:
+            if not fields:
+                # Trimmed by MAXLEN while pending: nothing left to process
+                acked.append(entry_id)
+                continue
+            entry = entry_id.decode('ascii')
+            try:
+                result = self.handler(entry, decode_entry(fields))
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                # Stays pending; reclaimed after claim_idle_ms
+                self.failed += 1
+                log.error(f"Error procesando lead {entry}: {e}")
+                continue
+            acked.append(entry_id)
+        if acked:
+            await self.client.xack(self.key, self.group, *acked)
+            self.processed += len(acked)
+        return len(acked)
+
+    async def reclaim(self) -> int:
+        """Take over entries left pending by consumers that stopped"""
+        handled = 0
+        start = "0-0"
+        while True:
+            result = await self.client.xautoclaim(self.key, self.group, self.name, self.claim_idle_ms,
+                                                  start_id=start, count=self.batch_size)
+            start, entries = result[0], result[1]
+            handled += await self._handle(entries)
+            if start in (b"0-0", "0-0") or not entries:
+                return handled
+
+    async def read_batch(self) -> int:
+        """Handle the next batch of new entries (waits up to block_ms)"""
+        response = await self.client.xreadgroup(self.group, self.name, {self.key: ">"},
+                                                count=self.batch_size, block=self.block_ms)
+        handled = 0
+        for _, entries in response or []:
+            handled += await self._handle(entries)
+        return handled
+
+    async def run(self, stop: Optional[asyncio.Event] = None) -> None:
+        await self.ensure_group()
+        await self.reclaim()
+        last_claim = time.monotonic()
+        while stop is None or not stop.is_set():
+            await self.read_batch()
+            if time.monotonic() - last_claim >= self.claim_idle_ms / 1000:
+                await self.reclaim()
+                last_claim = time.monotonic()
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+# ===== CLI =====
+
+def _print_lead(entry_id: str, lead: Dict[str, Any]) -> None:
+    """Reference handler: one line per lead"""
+    flag = "🔥" if lead['high_value'] else "  "
+    print(f"{flag} {entry_id} [{lead.get('tag')}] {lead.get('relevance_score')} "
+          f"{lead.get('keyword')}: {lead.get('title')} {lead.get('url')}")
+
+
+def _print_lead_json(entry_id: str, lead: Dict[str, Any]) -> None:
+    print(codec.to_json({'entry_id': entry_id, **lead}))
+
+
+async def _info() -> Dict[str, Any]:
+    client = _client(stream_redis_url())
+    key = get_settings().stream.key
+    try:
+        stream = await client.xinfo_stream(key)
+        groups = await client.xinfo_groups(key)
+    except ResponseError:
+        return {'key': key, 'exists': False}
+    finally:
+        await client.close()
+    return {
+        'key': key,
+        'length': stream['length'],
+        'first_entry': stream['first-entry'][0] if stream.get('first-entry') else None,
+        'last_entry': stream['last-generated-id'],
+        'groups': [{'name': g['name'], 'consumers': g['consumers'], 'pending': g['pending'],
+                    'lag': g.get('lag')} for g in groups],
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Stream de leads en Redis")
+    sub = parser.add_subparsers(dest="command", required=True)
+    consume = sub.add_parser("consume", help="Consumidor de referencia (imprime cada lead)")
+    consume.add_argument("--group", help="Grupo de consumidores (STREAM_GROUP por defecto)")
+    consume.add_argument("--name", help="Nombre del consumidor dentro del grupo")
+    consume.add_argument("--json", action="store_true", help="Un JSON por línea")
+    sub.add_parser("info", help="Longitud del stream y estado de los grupos")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=get_settings().monitoring.log_level,
+                        format=get_settings().monitoring.log_format)
+
+    if args.command == "info":
+        print(codec.to_json(asyncio.run(_info()), indent=True))
+        return 0
+
+    async def run() -> None:
+        consumer = LeadStreamConsumer(_print_lead_json if args.json else _print_lead,
+                                      group=args.group, name=args.name)
+        log.info(f"📥 Consumiendo {consumer.key} como {consumer.group}/{consumer.name}")
+        try:
+            await consumer.run()
+        finally:
+            await consumer.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+"""
+Event Loop Lag Monitor for Aqxion Scraper
+Measures how late the loop wakes up to detect blocking calls in coroutines
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, Optional
+import logging
+
+log = logging.getLogger("loop_monitor")
+
+
+class LoopLagMonitor:
+    """Sleeps for ``interval`` and records how much later than expected it woke up"""
+
+    def __init__(self, interval: float = 0.1, warn_threshold: float = 0.1):
+        self.interval = interval
+        self.warn_threshold = warn_threshold
+        self._task: Optional[asyncio.Task] = None
+        self.reset()
+
+    def reset(self) -> None:
+        self.samples = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+        self.stalls = 0  # samples above warn_threshold
+
+    def start(self) -> None:
+        """Start monitoring on the running loop (idempotent)"""
+        if self._task is not None and not self._task.done():
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(time.perf_counter() - expected, 0.0)
+
+            self.samples += 1
+            self.total_lag += lag
+            self.max_lag = max(self.max_lag, lag)
+            if lag > self.warn_threshold:
+                self.stalls += 1
+                log.warning(f"⚠️ Event loop bloqueado {lag * 1000:.0f} ms")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "samples": self.samples,
+            "avg_lag_ms": round(self.total_lag / self.samples * 1000, 2) if self.samples else 0.0,
+            "max_lag_ms": round(self.max_lag * 1000, 2),
+            "stalls": self.stalls,
+            "warn_threshold_ms": round(self.warn_threshold * 1000, 2),
+        }
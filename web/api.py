@@ -0,0 +1,315 @@
+"""
+REST API for Aqxion Scraper
+Read-only JSON endpoints over leads, KPIs, competitors and radar signals
+
+Downstream tools used to open scraping.db directly and compete with the
+crawler for locks. This service only uses the read-only connection pools
+(and read-only ATTACH for shards), so it never takes a write lock.
+
+Every response carries a weak ETag built from ``PRAGMA data_version`` of
+the main database and of every unsealed posts shard (see
+database.snapshot.VersionedCache). Clients that send it back in
+If-None-Match get a 304 without any query running. Encoded bodies (and
+their gzip version) are cached per URL until the data version changes, so
+repeated polls cost one PRAGMA per file.
+
+Lists use keyset pagination: ``next`` is an opaque cursor to pass back as
+``?cursor=``; every page costs the same regardless of its depth.
+
+Endpoints:
+    GET /health
+    GET /v1/leads         ?tag= &keyword= &source= &min_score= &max_score= &cursor= &limit=
+    GET /v1/kpis          ?day=YYYYMMDD (today by default)
+    GET /v1/kpis/series   ?days=7 (stored daily snapshots, today and partial days computed live)
+    GET /v1/competitors   ?keyword= &cursor= &limit=
+    GET /v1/signals       ?signal_type= &priority= &scan_id= &cursor= &limit=
+
+Usage:
+    python -m web.api [--host 0.0.0.0] [--port 8000]
+"""
+
+import argparse
+import base64
+import binascii
+import gzip
+import os
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+
+from aiohttp import web
+
+from config.config_v2 import get_db_path, get_settings
+from database import db
+from database.async_db import run_db
+from database.snapshot import close_caches, get_cache
+from utils.codec import from_json, to_json
+from utils import kpi
+from competitive_radar.storage.market_data import page_signals
+
+log = logging.getLogger("rest_api")
+
+
+class DataVersion:
+    """ETag of the current data: data_version of every file that can still change"""
+
+    def __init__(self):
+        # data_version counters restart with the process; the token keeps
+        # tags from a previous run from matching
+        self.token = os.urandom(4).hex()
+
+    def paths(self) -> List[Path]:
+        paths = [Path(get_db_path())]
+        if db.sharding_enabled():
+            for month in db.existing_shard_months():
+                path = db.shard_path(month)
+                if not db.is_sealed_shard(path):
+                    paths.append(path)
+        return paths
+
+    def etag(self) -> str:
+        # The Lima day is part of the tag: "today" endpoints change at midnight
+        # even when nothing was written
+        versions = "-".join(str(get_cache(path).version()) for path in self.paths())
+        return f'W/"{self.token}-{db.lima_day_bucket()}-{versions}"'
+
+
+class ResponseCache:
+    """Encoded bodies by URL, valid for a single data version"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._etag: Optional[str] = None
+        self._entries: "OrderedDict[str, Tuple[bytes, Optional[bytes]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, etag: str, key: str) -> Optional[Tuple[bytes, Optional[bytes]]]:
+        with self._lock:
+            if etag != self._etag:
+                self._entries.clear()
+                self._etag = etag
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, etag: str, key: str, entry: Tuple[bytes, Optional[bytes]]) -> None:
+        if not self.max_entries:
+            return
+        with self._lock:
+            if etag != self._etag:
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+# ===== PARAMETERS =====
+
+def encode_cursor(cursor: Optional[List[Any]]) -> Optional[str]:
+    if cursor is None:
+        return None
+    return base64.urlsafe_b64encode(to_json(cursor).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(value: Optional[str]) -> Optional[List[Any]]:
+    if not value:
+        return None
+    try:
+        cursor = from_json(base64.urlsafe_b64decode(value + "=" * (-len(value) % 4)))
+    except (binascii.Error, ValueError):
+        raise ValueError("invalid cursor")
+    if not isinstance(cursor, list):
+        raise ValueError("invalid cursor")
+    return cursor
+
+
+def int_param(request: web.Request, name: str, default: Optional[int] = None,
+              minimum: Optional[int] = None, maximum: Optional[int] = None) -> Optional[int]:
+    value = request.query.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+    if minimum is not None and number < minimum or maximum is not None and number > maximum:
+        raise ValueError(f"{name} must be between {minimum} and {maximum}")
+    return number
+
+
+def _ignore_missing_table(func: Callable[[], Dict[str, Any]], empty: Dict[str, Any]) -> Dict[str, Any]:
+    """Tables created by other services (market_signals, competitors) may not exist yet"""
+    try:
+        return func()
+    except sqlite3.OperationalError as e:
+        if "no such table" not in str(e):
+            raise
+        return empty
+
+
+class QueryAPI:
+    """aiohttp application over the read-only query functions"""
+
+    def __init__(self):
+        web_settings = get_settings().web
+        self.page_size = web_settings.api_page_size
+        self.max_page_size = web_settings.api_max_page_size
+        self.gzip_min_bytes = web_settings.api_gzip_min_bytes
+        self.kpi_days_max = web_settings.api_kpi_days_max
+        self.versions = DataVersion()
+        self.cache = ResponseCache(web_settings.api_cache_entries)
+        self.not_modified = 0
+
+    def _limit(self, request: web.Request) -> int:
+        return int_param(request, "limit", self.page_size, 1, self.max_page_size)
+
+    async def _respond(self, request: web.Request, compute: Callable[[], Any]) -> web.Response:
+        """304 when the client's ETag is current; otherwise the cached or freshly encoded body"""
+        etag = await run_db(self.versions.etag)
+        headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+        if etag in (tag.strip() for tag in request.headers.get("If-None-Match", "").split(",")):
+            self.not_modified += 1
+            return web.Response(status=304, headers=headers)
+
+        key = request.path_qs
+        entry = self.cache.get(etag, key)
+        if entry is None:
+            body = to_json(await run_db(compute)).encode("utf-8")
+            compressed = gzip.compress(body, 5) if len(body) >= self.gzip_min_bytes else None
+            entry = (body, compressed)
+            self.cache.put(etag, key, entry)
+
+        body, compressed = entry
+        if compressed is not None and "gzip" in request.headers.get("Accept-Encoding", ""):
+            body = compressed
+            headers["Content-Encoding"] = "gzip"
+        return web.Response(body=body, headers=headers, content_type="application/json")
+
+    @web.middleware
+    async def errors(self, request: web.Request, handler) -> web.StreamResponse:
+        try:
+            return await handler(request)
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=400, dumps=to_json)
+
+    # ===== HANDLERS =====
+
+    async def leads(self, request: web.Request) -> web.Response:
+        params = dict(
+            tag=request.query.get("tag"),
+            keyword=request.query.get("keyword"),
+            source=request.query.get("source"),
+            min_score=int_param(request, "min_score"),
+            max_score=int_param(request, "max_score"),
+            after=decode_cursor(request.query.get("cursor")),
+            limit=self._limit(request),
+        )
+        if params["after"] is not None and len(params["after"]) != 3:
+            raise ValueError("invalid cursor")
+
+        def compute() -> Dict[str, Any]:
+            page = db.browse_leads(**params)
+            return {"leads": page["leads"], "next": encode_cursor(page["next"])}
+        return await self._respond(request, compute)
+
+    async def kpis(self, request: web.Request) -> web.Response:
+        day = int_param(request, "day", db.lima_day_bucket(), 19700101, 99991231)
+        return await self._respond(request, lambda: kpi.compute_day_kpis(day))
+
+    async def kpi_series(self, request: web.Request) -> web.Response:
+        days = int_param(request, "days", 7, 1, self.kpi_days_max)
+
+        def compute() -> Dict[str, Any]:
+            today = db.lima_today()
+            days_back = [today - timedelta(days=offset) for offset in range(days - 1, -1, -1)]
+            # Past days come from kpi_daily (filled by `python -m utils.kpi
+            # --days N`); today, missing days and snapshots saved before their
+            # day ended are computed live
+            stored = {point["day_bucket"]: point for point in
+                      kpi.load_kpi_series(db.day_bucket_for(days_back[0]), db.day_bucket_for(today))}
+            series = []
+            for day in days_back:
+                point = stored.get(db.day_bucket_for(day))
+                if point is None or not kpi.is_final_snapshot(day, point["computed_at"]):
+                    point = kpi.compute_day_kpis(db.day_bucket_for(day))
+                series.append(point)
+            return {"days": days, "series": series}
+        return await self._respond(request, compute)
+
+    async def competitors(self, request: web.Request) -> web.Response:
+        keyword = request.query.get("keyword")
+        after = decode_cursor(request.query.get("cursor"))
+        limit = self._limit(request)
+
+        def compute() -> Dict[str, Any]:
+            page = _ignore_missing_table(lambda: db.page_competitors(keyword, after, limit),
+                                         {"competitors": [], "next": None})
+            return {"competitors": page["competitors"], "next": encode_cursor(page["next"])}
+        return await self._respond(request, compute)
+
+    async def signals(self, request: web.Request) -> web.Response:
+        params = dict(
+            signal_type=request.query.get("signal_type"),
+            priority=request.query.get("priority"),
+            scan_id=int_param(request, "scan_id"),
+            after=decode_cursor(request.query.get("cursor")),
+            limit=self._limit(request),
+        )
+
+        def compute() -> Dict[str, Any]:
+            page = _ignore_missing_table(lambda: page_signals(**params), {"signals": [], "next": None})
+            return {"signals": page["signals"], "next": encode_cursor(page["next"])}
+        return await self._respond(request, compute)
+
+    async def health(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "status": "ok",
+            "etag": await run_db(self.versions.etag),
+            "cache_hits": self.cache.hits,
+            "cache_misses": self.cache.misses,
+            "not_modified": self.not_modified,
+        }, dumps=to_json)
+
+    async def stop(self, app: web.Application) -> None:
+        await run_db(close_caches)
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self.errors])
+        app.router.add_get("/health", self.health)
+        app.router.add_get("/v1/leads", self.leads)
+        app.router.add_get("/v1/kpis", self.kpis)
+        app.router.add_get("/v1/kpis/series", self.kpi_series)
+        app.router.add_get("/v1/competitors", self.competitors)
+        app.router.add_get("/v1/signals", self.signals)
+        app.on_cleanup.append(self.stop)
+        return app
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    web_settings = get_settings().web
+    parser = argparse.ArgumentParser(description="API REST de solo lectura (leads, KPIs, competidores, señales)")
+    parser.add_argument("--host", default=web_settings.api_host)
+    parser.add_argument("--port", type=int, default=web_settings.api_port)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=get_settings().monitoring.log_level,
+                        format=get_settings().monitoring.log_format)
+    log.info(f"🔌 API REST en http://{args.host}:{args.port}/v1/")
+    web.run_app(QueryAPI().app(), host=args.host, port=args.port, print=None)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,7 +3,8 @@ from datetime import datetime, timedelta
 import pytz
 import streamlit as st
 import pandas as pd
-from config.config_v2 import get_settings
+from database.db import browse_leads, lima_day_bucket, lima_today, search_posts
+from database.snapshot import TODAY_POST_COLUMNS, today_snapshot
 
 # Configuración de la página
 st.set_page_config(
@@ -12,15 +13,25 @@ st.set_page_config(
     layout="wide"
 )
 
-# Función para conectar a la base de datos
-def get_db_connection():
-    return sqlite3.connect('scraping.db')
+# Métricas del día memoizadas: solo se recalculan (en una sola pasada)
+# cuando PRAGMA data_version indica que la base cambió
+def get_snapshot():
+    try:
+        return today_snapshot(get_today_bucket())
+    except sqlite3.Error as e:
+        st.error(f"Error al leer la base de datos: {e}")
+        return None
 
 # Función para obtener la fecha UTC actual en formato ISO
 def get_utc_today():
     """Obtiene la fecha UTC actual en formato ISO para consultas SQL"""
     return datetime.now(pytz.UTC).strftime('%Y-%m-%d')
 
+# Día local de Lima como entero YYYYMMDD (columna indexada day_bucket)
+def get_today_bucket():
+    """Obtiene el día de hoy en Lima para filtrar por day_bucket"""
+    return lima_day_bucket()
+
 # Función para convertir UTC a hora local de Lima
 def utc_to_lima_time(utc_str):
     """Convierte una cadena UTC ISO a hora de Lima"""
@@ -34,211 +45,55 @@ def utc_to_lima_time(utc_str):
 
 # Función para obtener datos de hoy
 def get_today_data():
-    con = get_db_connection()
-    cur = con.cursor()
-
-    try:
-        # Usar UTC para consultas de base de datos
-        utc_today = get_utc_today()
-        cur.execute("""
-            SELECT * FROM posts
-            WHERE DATE(created_at) = ?
-        """, (utc_today,))
-        today_posts = cur.fetchall()
-        return today_posts
-    except sqlite3.Error as e:
-        st.error(f"Error al obtener datos de hoy: {e}")
-        return []
-    finally:
-        con.close()
+    snapshot = get_snapshot()
+    return snapshot.posts if snapshot else []
 
 # Función para obtener métricas de radar de mercado
 def get_market_radar_metrics():
     """Obtener métricas avanzadas para el radar de mercado"""
-    settings = get_settings()
-    con = get_db_connection()
-    cur = con.cursor()
-
-    try:
-        # Usar UTC para consultas de base de datos
-        utc_today = get_utc_today()
-
-        # Métricas de intención por hora
-        cur.execute("""
-            SELECT
-                strftime('%H', created_at) as hour,
-                COUNT(*) as total_posts,
-                SUM(CASE WHEN tag IN ('dolor', 'busqueda', 'objecion') THEN 1 ELSE 0 END) as intent_posts,
-                ROUND(
-                    (SUM(CASE WHEN tag IN ('dolor', 'busqueda', 'objecion') THEN 1 ELSE 0 END) * 100.0) / COUNT(*),
-                    1
-                ) as intent_pct
-            FROM posts
-            WHERE DATE(created_at) = ?
-            GROUP BY hour
-            ORDER BY hour
-        """, (utc_today,))
-        hourly_intent = cur.fetchall()
-
-        # Top keywords con mayor crecimiento
-        cur.execute("""
-            SELECT
-                keyword,
-                COUNT(*) as posts_today,
-                AVG(relevance_score) as avg_score,
-                SUM(CASE WHEN tag IN ('dolor', 'busqueda') THEN 1 ELSE 0 END) as hot_leads
-            FROM posts
-            WHERE DATE(created_at) = ?
-            AND keyword IS NOT NULL
-            GROUP BY keyword
-            HAVING posts_today >= 3
-            ORDER BY hot_leads DESC, avg_score DESC
-            LIMIT 10
-        """, (utc_today,))
-        top_keywords = cur.fetchall()
-
-        # Distribución de tags
-        cur.execute("""
-            SELECT
-                tag,
-                COUNT(*) as count,
-                ROUND((COUNT(*) * 100.0) / SUM(COUNT(*)) OVER (), 1) as percentage
-            FROM posts
-            WHERE DATE(created_at) = ?
-            AND tag IS NOT NULL
-            GROUP BY tag
-            ORDER BY count DESC
-        """, (utc_today,))
-        tag_distribution = cur.fetchall()
-
-        # Alertas de mercado (posts con alta intención)
-        cur.execute("""
-            SELECT
-                title,
-                url,
-                tag,
-                relevance_score,
-                keyword,
-                created_at
-            FROM posts
-            WHERE DATE(created_at) = ?
-            AND tag IN ('dolor', 'busqueda')
-            AND relevance_score >= ?
-            ORDER BY relevance_score DESC, created_at DESC
-            LIMIT 5
-        """, (utc_today, settings.scraping.min_relevance_score))
-        market_alerts = cur.fetchall()
-
-        return {
-            'hourly_intent': hourly_intent,
-            'top_keywords': top_keywords,
-            'tag_distribution': tag_distribution,
-            'market_alerts': market_alerts
-        }
-
-    except sqlite3.Error as e:
-        st.error(f"Error al obtener métricas de radar: {e}")
+    snapshot = get_snapshot()
+    if snapshot is None:
         return {}
-    finally:
-        con.close()
+    return {
+        'hourly_intent': snapshot.hourly_intent,
+        'top_keywords': snapshot.keyword_scores,
+        'tag_distribution': snapshot.tag_distribution,
+        'market_alerts': snapshot.market_alerts
+    }
 
 # Función para obtener KPIs
 def get_kpis():
-    con = get_db_connection()
-    cur = con.cursor()
-    
-    try:
-        # Usar UTC para consultas de base de datos
-        utc_today = get_utc_today()
-
-        # Total posts
-        cur.execute('SELECT COUNT(*) FROM posts')
-        result = cur.fetchone()
-        total_posts = result[0] if result else 0
-
-        # Posts por intención - usar UTC para consultas
-        cur.execute("""
-            SELECT tag, COUNT(*) FROM posts
-            WHERE DATE(created_at) = ? AND tag IS NOT NULL
-            GROUP BY tag
-        """, (utc_today,))
-        intent_results = cur.fetchall()
-        intent_counts = dict(intent_results) if intent_results else {}
-
-        # Top keywords por intención - usar UTC para consultas
-        cur.execute('''
-            SELECT keyword, tag, COUNT(*) as count
-            FROM posts
-            WHERE DATE(created_at) = ? AND tag IS NOT NULL
-            GROUP BY keyword, tag
-            ORDER BY count DESC
-            LIMIT 10
-        ''', (utc_today,))
-        top_keywords = cur.fetchall()
-        
-        return total_posts, intent_counts, top_keywords or []
-    except sqlite3.Error as e:
-        st.error(f"Error al obtener KPIs: {e}")
+    snapshot = get_snapshot()
+    if snapshot is None:
         return 0, {}, []
-    finally:
-        con.close()
+    return snapshot.total_posts, snapshot.tag_counts, snapshot.keyword_tag_counts
 
 # Función para obtener KPIs por keyword
 def get_keyword_kpis():
-    con = get_db_connection()
-    cur = con.cursor()
-    
-    try:
-        # Usar UTC para consultas de base de datos
-        utc_today = get_utc_today()
-
-        cur.execute("""
-            SELECT 
-                keyword,
-                COUNT(*) as total_posts,
-                SUM(CASE WHEN tag IN ('dolor', 'objecion', 'busqueda') THEN 1 ELSE 0 END) as intencion_posts,
-                ROUND(
-                    (SUM(CASE WHEN tag IN ('dolor', 'objecion', 'busqueda') THEN 1 ELSE 0 END) * 100.0) / COUNT(*), 
-                    1
-                ) as intencion_pct
-            FROM posts
-            WHERE DATE(created_at) = ?
-            GROUP BY keyword
-            ORDER BY intencion_pct DESC, total_posts DESC
-            LIMIT 10
-        """, (utc_today,))
-        keyword_stats = cur.fetchall()
-        return keyword_stats or []
-    except sqlite3.Error as e:
-        st.error(f"Error al obtener KPIs por keyword: {e}")
-        return []
-    finally:
-        con.close()
+    snapshot = get_snapshot()
+    return snapshot.keyword_intent if snapshot else []
 
 # Función para obtener posts recientes
 def get_recent_posts(limit=10):
-    con = get_db_connection()
-    cur = con.cursor()
-    
+    snapshot = get_snapshot()
+    return snapshot.recent_posts[:limit] if snapshot else []
+
+# Función para buscar leads por texto (índice FTS5)
+def get_search_results(query, tag=None, days=None, limit=50):
     try:
-        # Usar UTC para consultas de base de datos
-        utc_today = get_utc_today()
-
-        cur.execute('''
-            SELECT keyword, title, url, tag, created_at, body
-            FROM posts
-            WHERE DATE(created_at) = ?
-            ORDER BY created_at DESC
-            LIMIT ?
-        ''', (utc_today, limit))
-
-        posts = cur.fetchall()
-        return posts or []
+        since = lima_today() - timedelta(days=days - 1) if days else None
+        return search_posts(query, tag=tag, since=since, limit=limit)
     except sqlite3.Error as e:
-        st.error(f"Error al obtener posts recientes: {e}")
+        st.error(f"Error en la búsqueda: {e}")
         return []
-    finally:
-        con.close()
+
+# Función para una página del explorador de leads (keyset, índices cubrientes)
+def get_leads_page(filters, after=None, limit=50):
+    try:
+        return browse_leads(**filters, after=after, limit=limit)
+    except sqlite3.Error as e:
+        st.error(f"Error al explorar leads: {e}")
+        return {'leads': [], 'next': None}
 
 # Header
 st.title("📊 Aqxion Scraper Dashboard")
@@ -266,13 +121,114 @@ with col4:
 
 st.markdown("---")
 
+# Búsqueda full-text en títulos y contenido
+st.subheader("🔎 Buscar Leads")
+
+search_col, tag_col, days_col = st.columns([3, 1, 1])
+with search_col:
+    search_text = st.text_input("Buscar en títulos y contenido", placeholder="ej. agencia marketing digital")
+with tag_col:
+    search_tag = st.selectbox("Tag", ['todos', 'dolor', 'busqueda', 'objecion', 'ruido'])
+with days_col:
+    search_days = st.selectbox("Período", [1, 7, 30, 0], index=1,
+                               format_func=lambda d: "Todo" if d == 0 else f"Últimos {d} días")
+
+if search_text.strip():
+    results = get_search_results(search_text, None if search_tag == 'todos' else search_tag, search_days)
+    if results:
+        df_search = pd.DataFrame(results)
+        df_search['created_at'] = df_search['created_at'].apply(
+            lambda v: utc_to_lima_time(v).strftime('%Y-%m-%d %H:%M'))
+        st.dataframe(
+            df_search[['created_at', 'keyword', 'tag', 'relevance_score', 'title', 'snippet', 'url']],
+            column_config={
+                'created_at': st.column_config.TextColumn('Fecha', width='small'),
+                'keyword': st.column_config.TextColumn('Keyword', width='small'),
+                'tag': st.column_config.TextColumn('Tag', width='small'),
+                'relevance_score': st.column_config.NumberColumn('Score', width='small'),
+                'title': st.column_config.TextColumn('Título', width='medium'),
+                'snippet': st.column_config.TextColumn('Fragmento', width='large'),
+                'url': st.column_config.LinkColumn('URL', width='medium')
+            },
+            hide_index=True,
+            width='stretch'
+        )
+    else:
+        st.info("Sin resultados para la búsqueda.")
+
+st.markdown("---")
+
+# Explorador de leads paginado en el servidor
+st.subheader("🗂️ Explorador de Leads")
+
+f_tag, f_keyword, f_source, f_score, f_size = st.columns([1, 1, 1, 2, 1])
+with f_tag:
+    browse_tag = st.selectbox("Tag", ['todos', 'dolor', 'busqueda', 'objecion', 'ruido'], key='browse_tag')
+with f_keyword:
+    browse_keyword = st.text_input("Keyword", key='browse_keyword').strip()
+with f_source:
+    browse_source = st.text_input("Dominio", placeholder="ej. reddit.com", key='browse_source').strip()
+with f_score:
+    browse_min, browse_max = st.slider("Score", 0, 150, (0, 150), key='browse_score')
+with f_size:
+    browse_size = st.selectbox("Filas", [25, 50, 100, 200], index=1, key='browse_size')
+
+lead_filters = {
+    'tag': None if browse_tag == 'todos' else browse_tag,
+    'keyword': browse_keyword or None,
+    'source': browse_source or None,
+    'min_score': browse_min if browse_min > 0 else None,
+    'max_score': browse_max if browse_max < 150 else None,
+}
+# Pila de cursores: la página N se pide con el cursor 'next' de la N-1
+if st.session_state.get('lead_filters') != (lead_filters, browse_size):
+    st.session_state['lead_filters'] = (lead_filters, browse_size)
+    st.session_state['lead_cursors'] = [None]
+cursors = st.session_state['lead_cursors']
+lead_page = get_leads_page(lead_filters, after=cursors[-1], limit=browse_size)
+
+if lead_page['leads']:
+    df_leads = pd.DataFrame(lead_page['leads'])
+    df_leads['created_at'] = df_leads['created_at'].apply(
+        lambda v: utc_to_lima_time(v).strftime('%Y-%m-%d %H:%M'))
+    st.dataframe(
+        df_leads[['relevance_score', 'tag', 'keyword', 'source', 'title', 'created_at', 'url']],
+        column_config={
+            'relevance_score': st.column_config.NumberColumn('Score', width='small'),
+            'tag': st.column_config.TextColumn('Tag', width='small'),
+            'keyword': st.column_config.TextColumn('Keyword', width='small'),
+            'source': st.column_config.TextColumn('Dominio', width='small'),
+            'title': st.column_config.TextColumn('Título', width='large'),
+            'created_at': st.column_config.TextColumn('Fecha', width='small'),
+            'url': st.column_config.LinkColumn('URL', width='medium')
+        },
+        hide_index=True,
+        width='stretch'
+    )
+else:
+    st.info("Sin leads para los filtros seleccionados.")
+
+prev_col, page_col, next_col = st.columns([1, 4, 1])
+with prev_col:
+    if st.button("⬅️ Anterior", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+with page_col:
+    st.caption(f"Página {len(cursors)}")
+with next_col:
+    if st.button("Siguiente ➡️", disabled=lead_page['next'] is None):
+        cursors.append(lead_page['next'])
+        st.rerun()
+
+st.markdown("---")
+
 # Posts de hoy por intención
 st.subheader("📅 Posts de Hoy por Intención")
 
 today_posts = get_today_data()
 if today_posts:
     # Convertir a DataFrame para mejor visualización
-    df_today = pd.DataFrame(today_posts, columns=['id', 'source', 'url', 'title', 'body', 'lang', 'created_at', 'keyword', 'tag', 'published_at', 'relevance_score'])
+    df_today = pd.DataFrame(today_posts, columns=TODAY_POST_COLUMNS)
     
     # Convertir fechas UTC a hora local de Lima
     df_today['created_at'] = df_today['created_at'].apply(utc_to_lima_time)
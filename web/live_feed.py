@@ -0,0 +1,438 @@
+"""
+Live Feed for Aqxion Scraper
+Push-based dashboard: tails new posts by rowid and streams deltas
+
+A single tailer per process keeps today's aggregates in memory. Every
+``live_poll_ms`` it checks ``PRAGMA data_version`` on a dedicated
+read-only connection and, only when another connection committed, reads
+the rows after the last rowid it saw. Subscribers get a full snapshot on
+connect and then one small delta per batch of new posts, so the database
+load does not grow with the number of viewers.
+
+Endpoints:
+    GET /          HTML page subscribed to /events
+    GET /events    Server-Sent Events ("snapshot", then "delta")
+    GET /ws        same events over a websocket
+    GET /snapshot  current aggregates as JSON
+    GET /health    tailer status
+
+Posts updated in place (upserts keep their rowid) are not re-sent; the
+feed follows new rows only. With sharding it tails today's shard and the
+main database (posts of sealed months and from before sharding). The
+aggregates are rebuilt from the day's posts at startup and when the Lima
+day (or shard month) changes.
+
+Usage:
+    python -m web.live_feed [--host 0.0.0.0] [--port 8765]
+"""
+
+import argparse
+import asyncio
+import sqlite3
+import sys
+import time
+from collections import Counter, deque
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Tuple
+import logging
+
+from aiohttp import WSMsgType, web
+
+from config.config_v2 import get_settings
+from database.async_db import run_db
+from database.compression import connect
+from database.db import day_posts_db_paths, lima_day_bucket
+from database.pool import PragmaProfile
+from database.rollups import INTENT_TAGS
+from database.snapshot import HOT_TAGS, LIMA_UTC_OFFSET_S
+from utils.codec import to_json
+
+log = logging.getLogger("live_feed")
+
+TAIL_COLUMNS = ('id', 'url', 'title', 'keyword', 'tag', 'relevance_score', 'created_at',
+                'created_epoch', 'day_bucket')
+
+
+class LiveAggregates:
+    """Running totals of one Lima day, updated row by row"""
+
+    def __init__(self, day_bucket: int, recent_leads: int, min_score: int):
+        self.day_bucket = day_bucket
+        self.min_score = min_score
+        self.posts = 0
+        self.tags: Counter = Counter()
+        self.keywords: Dict[str, List[int]] = {}   # keyword -> [posts, intent, hot, score_sum]
+        self.hours: Dict[str, List[int]] = {}      # 'HH' Lima -> [posts, intent]
+        self.leads: Deque[Dict[str, Any]] = deque(maxlen=recent_leads)
+
+    def apply(self, rows: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """Add rows of this day; returns the delta in the same shape as to_dict()"""
+        delta = {"posts": 0, "tags": Counter(), "keywords": {}, "hours": {}, "leads": []}
+        for row in rows:
+            tag = row['tag'] or ''
+            keyword = row['keyword'] or ''
+            score = row['relevance_score'] or 0
+            intent = int(tag in INTENT_TAGS)
+            hot = int(tag in HOT_TAGS)
+
+            delta["posts"] += 1
+            if tag:
+                delta["tags"][tag] += 1
+            k = delta["keywords"].setdefault(keyword, [0, 0, 0, 0])
+            k[0] += 1
+            k[1] += intent
+            k[2] += hot
+            k[3] += score
+            if row['created_epoch'] is not None:
+                hour = f"{((row['created_epoch'] - LIMA_UTC_OFFSET_S) % 86400) // 3600:02d}"
+                h = delta["hours"].setdefault(hour, [0, 0])
+                h[0] += 1
+                h[1] += intent
+            if hot and score >= self.min_score:
+                delta["leads"].append({col: row[col] for col in
+                                       ('id', 'url', 'title', 'keyword', 'tag', 'relevance_score', 'created_at')})
+
+        self.posts += delta["posts"]
+        self.tags.update(delta["tags"])
+        for keyword, values in delta["keywords"].items():
+            current = self.keywords.setdefault(keyword, [0, 0, 0, 0])
+            for i, value in enumerate(values):
+                current[i] += value
+        for hour, values in delta["hours"].items():
+            current = self.hours.setdefault(hour, [0, 0])
+            current[0] += values[0]
+            current[1] += values[1]
+        self.leads.extend(delta["leads"])
+        delta["tags"] = dict(delta["tags"])
+        return delta
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "day_bucket": self.day_bucket,
+            "posts": self.posts,
+            "tags": dict(self.tags),
+            "keywords": self.keywords,
+            "hours": self.hours,
+            "leads": list(self.leads),
+        }
+
+
+class TailedFile:
+    """Dedicated read-only connection to one posts file and the last rowid read from it"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        conn = connect(path, read_only=True, check_same_thread=False)
+        PragmaProfile.from_settings(get_settings().database).apply(conn, read_only=True)
+        conn.row_factory = sqlite3.Row
+        self.conn = conn
+        self.version = conn.execute("PRAGMA data_version").fetchone()[0]
+        self.last_rowid = conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM posts").fetchone()[0]
+
+    def day_rows(self, day: int) -> List[sqlite3.Row]:
+        """Rows of the day up to the bootstrap rowid"""
+        return self.conn.execute(f"""
+            SELECT {', '.join(TAIL_COLUMNS)} FROM posts
+            WHERE day_bucket = ? AND rowid <= ?
+        """, (day, self.last_rowid)).fetchall()
+
+    def new_rows(self, day: int, batch_rows: int) -> List[sqlite3.Row]:
+        """Rows of the day added since the last call (nothing when the file did not change)"""
+        version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self.version:
+            return []
+        self.version = version
+
+        new_rows = []
+        while True:
+            rows = self.conn.execute(f"""
+                SELECT rowid, {', '.join(TAIL_COLUMNS)} FROM posts
+                WHERE rowid > ? ORDER BY rowid LIMIT ?
+            """, (self.last_rowid, batch_rows)).fetchall()
+            if not rows:
+                break
+            self.last_rowid = rows[-1]['rowid']
+            new_rows.extend(row for row in rows if row['day_bucket'] == day)
+            if len(rows) < batch_rows:
+                break
+        return new_rows
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+class PostTailer:
+    """Follows the posts tables holding today's posts by rowid (blocking; runs on DB threads)
+
+    That is today's shard and, when it is another file, the main database,
+    which keeps posts written before sharding was enabled.
+    """
+
+    def __init__(self, batch_rows: int, recent_leads: int):
+        self.batch_rows = batch_rows
+        self.recent_leads = recent_leads
+        self.files: List[TailedFile] = []
+        self.aggregates: Optional[LiveAggregates] = None
+
+    @property
+    def paths(self) -> List[Path]:
+        return [tailed.path for tailed in self.files]
+
+    def bootstrap(self) -> Dict[str, Any]:
+        """Rebuild today's aggregates from the day's posts; returns the snapshot"""
+        day = lima_day_bucket()
+        self.close()
+        self.files = [TailedFile(path) for path in day_posts_db_paths(day)]
+        self.aggregates = LiveAggregates(day, self.recent_leads,
+                                         get_settings().scraping.min_relevance_score)
+        rows = [row for tailed in self.files for row in tailed.day_rows(day)]
+        rows.sort(key=lambda row: row['created_epoch'] or 0)
+        self.aggregates.apply(rows)
+        return self.aggregates.to_dict()
+
+    def poll(self) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """(delta or None, rebuilt): new rows since the last poll, or a fresh
+        snapshot when the day or the posts files changed"""
+        day = lima_day_bucket()
+        if self.aggregates is None or day != self.aggregates.day_bucket or \
+                day_posts_db_paths(day) != self.paths:
+            return self.bootstrap(), True
+
+        new_rows = [row for tailed in self.files for row in tailed.new_rows(day, self.batch_rows)]
+        if not new_rows:
+            return None, False
+        delta = self.aggregates.apply(new_rows)
+        delta["rowid"] = {tailed.path.stem: tailed.last_rowid for tailed in self.files}
+        return delta, False
+
+    def close(self) -> None:
+        for tailed in self.files:
+            tailed.close()
+        self.files = []
+
+
+class LiveHub:
+    """Fan-out of encoded events to every subscriber queue"""
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.snapshot: Optional[str] = None
+        self.events = 0
+        self.dropped = 0
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        if self.snapshot is not None:
+            queue.put_nowait(("snapshot", self.snapshot))
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self.subscribers.discard(queue)
+
+    def publish(self, event: str, data: str) -> None:
+        self.events += 1
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait((event, data))
+            except asyncio.QueueFull:
+                # Too slow: disconnect; on reconnect it gets a fresh snapshot
+                self.unsubscribe(queue)
+                self.dropped += 1
+                queue.get_nowait()  # room for the close sentinel
+                queue.put_nowait(("close", ""))
+
+
+class LiveFeed:
+    """Tailer loop plus the aiohttp application"""
+
+    def __init__(self):
+        web_settings = get_settings().web
+        self.poll_interval = web_settings.live_poll_ms / 1000
+        self.heartbeat = web_settings.live_heartbeat_s
+        self.tailer = PostTailer(web_settings.live_batch_rows, web_settings.live_recent_leads)
+        self.hub = LiveHub(web_settings.live_queue_size)
+        self._task: Optional[asyncio.Task] = None
+        self.last_poll = 0.0
+
+    async def _run(self) -> None:
+        snapshot = await run_db(self.tailer.bootstrap)
+        self.hub.snapshot = to_json(snapshot)
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                delta, rebuilt = await run_db(self.tailer.poll)
+            except sqlite3.Error as e:
+                log.warning(f"⚠️ Error leyendo posts nuevos: {e}")
+                continue
+            self.last_poll = time.time()
+            if rebuilt:
+                self.hub.snapshot = to_json(delta)
+                self.hub.publish("snapshot", self.hub.snapshot)
+            elif delta is not None:
+                self.hub.snapshot = to_json(self.tailer.aggregates.to_dict())
+                self.hub.publish("delta", to_json(delta))
+
+    async def start(self, app: web.Application) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, app: web.Application) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await run_db(self.tailer.close)
+
+    # ===== HANDLERS =====
+
+    async def events(self, request: web.Request) -> web.StreamResponse:
+        response = web.StreamResponse(headers={
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        })
+        await response.prepare(request)
+        queue = self.hub.subscribe()
+        try:
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=self.heartbeat)
+                except asyncio.TimeoutError:
+                    await response.write(b": ping\n\n")
+                    continue
+                if event == "close":
+                    break
+                await response.write(f"event: {event}\ndata: {data}\n\n".encode("utf-8"))
+        except (ConnectionResetError, asyncio.CancelledError):
+            pass
+        finally:
+            self.hub.unsubscribe(queue)
+        return response
+
+    async def websocket(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse(heartbeat=self.heartbeat)
+        await ws.prepare(request)
+        queue = self.hub.subscribe()
+
+        async def drain_client() -> None:
+            async for message in ws:
+                if message.type in (WSMsgType.CLOSE, WSMsgType.ERROR):
+                    break
+
+        reader = asyncio.create_task(drain_client())
+        try:
+            while not ws.closed:
+                getter = asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait({getter, reader}, return_when=asyncio.FIRST_COMPLETED)
+                if getter not in done:
+                    getter.cancel()
+                    break
+                event, data = getter.result()
+                if event == "close":
+                    break
+                await ws.send_str(f'{{"event":"{event}","data":{data}}}')
+        except ConnectionResetError:
+            pass
+        finally:
+            self.hub.unsubscribe(queue)
+            reader.cancel()
+            await ws.close()
+        return ws
+
+    async def snapshot(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.hub.snapshot or "{}", content_type="application/json")
+
+    async def health(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "files": {str(tailed.path): tailed.last_rowid for tailed in self.tailer.files},
+            "last_poll": self.last_poll,
+            "subscribers": len(self.hub.subscribers),
+            "events": self.hub.events,
+            "dropped": self.hub.dropped,
+        }, dumps=to_json)
+
+    async def index(self, request: web.Request) -> web.Response:
+        return web.Response(text=LIVE_PAGE, content_type="text/html")
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/", self.index)
+        app.router.add_get("/events", self.events)
+        app.router.add_get("/ws", self.websocket)
+        app.router.add_get("/snapshot", self.snapshot)
+        app.router.add_get("/health", self.health)
+        app.on_startup.append(self.start)
+        app.on_cleanup.append(self.stop)
+        return app
+
+
+LIVE_PAGE = """<!doctype html>
+<html lang="es"><head><meta charset="utf-8"><title>Aqxion Live</title>
+<style>
+body{font-family:system-ui,sans-serif;margin:2rem;background:#0f1115;color:#e6e6e6}
+.tiles{display:flex;gap:1rem;margin-bottom:1.5rem}.tile{background:#1b1e26;padding:1rem 1.5rem;border-radius:8px}
+.tile b{display:block;font-size:1.8rem}table{border-collapse:collapse;width:100%;margin-bottom:1.5rem}
+td,th{padding:.35rem .6rem;border-bottom:1px solid #2a2e38;text-align:left}a{color:#7cb7ff}
+.new{animation:flash 2s}@keyframes flash{from{background:#2e5c2e}to{background:none}}#status{color:#888}
+</style></head><body>
+<h1>📡 Aqxion Live <small id="status">conectando…</small></h1>
+<div class="tiles" id="tiles"></div>
+<h2>🔥 Leads de alto valor</h2><table><thead><tr><th>Score</th><th>Tag</th><th>Keyword</th><th>Título</th><th>Hora</th></tr></thead><tbody id="leads"></tbody></table>
+<h2>🏆 Keywords</h2><table><thead><tr><th>Keyword</th><th>Posts</th><th>% Intención</th><th>Leads calientes</th></tr></thead><tbody id="keywords"></tbody></table>
+<script>
+let state = null;
+const esc = s => String(s ?? '').replace(/[&<>"]/g, c => ({'&':'&amp;','<':'&lt;','>':'&gt;','"':'&quot;'}[c]));
+function merge(delta) {
+  state.posts += delta.posts;
+  for (const [t, n] of Object.entries(delta.tags)) state.tags[t] = (state.tags[t] || 0) + n;
+  for (const [k, v] of Object.entries(delta.keywords)) {
+    const cur = state.keywords[k] || (state.keywords[k] = [0, 0, 0, 0]);
+    v.forEach((n, i) => cur[i] += n);
+  }
+  for (const [h, v] of Object.entries(delta.hours)) {
+    const cur = state.hours[h] || (state.hours[h] = [0, 0]);
+    cur[0] += v[0]; cur[1] += v[1];
+  }
+  state.leads = state.leads.concat(delta.leads).slice(-50);
+}
+function render(fresh) {
+  const tiles = [['Posts hoy', state.posts], ['Dolores', state.tags.dolor || 0],
+                 ['Búsquedas', state.tags.busqueda || 0], ['Objeciones', state.tags.objecion || 0]];
+  document.getElementById('tiles').innerHTML = tiles.map(([l, v]) => `<div class="tile">${l}<b>${v}</b></div>`).join('');
+  document.getElementById('leads').innerHTML = state.leads.slice().reverse().map(l =>
+    `<tr class="${fresh.has(l.id) ? 'new' : ''}"><td>${l.relevance_score}</td><td>${esc(l.tag)}</td><td>${esc(l.keyword)}</td>` +
+    `<td><a href="${esc(l.url)}" target="_blank">${esc(l.title)}</a></td><td>${esc((l.created_at || '').slice(11, 16))}</td></tr>`).join('');
+  document.getElementById('keywords').innerHTML = Object.entries(state.keywords)
+    .sort((a, b) => b[1][2] - a[1][2] || b[1][0] - a[1][0]).slice(0, 15).map(([k, v]) =>
+    `<tr><td>${esc(k || '—')}</td><td>${v[0]}</td><td>${(v[1] * 100 / v[0]).toFixed(1)}%</td><td>${v[2]}</td></tr>`).join('');
+}
+const source = new EventSource('events');
+source.addEventListener('snapshot', e => { state = JSON.parse(e.data); render(new Set()); });
+source.addEventListener('delta', e => {
+  const delta = JSON.parse(e.data); merge(delta); render(new Set(delta.leads.map(l => l.id)));
+});
+source.onopen = () => document.getElementById('status').textContent = 'en vivo';
+source.onerror = () => document.getElementById('status').textContent = 'reconectando…';
+</script></body></html>
+"""
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    web_settings = get_settings().web
+    parser = argparse.ArgumentParser(description="Feed en vivo de posts (SSE/websocket)")
+    parser.add_argument("--host", default=web_settings.live_host)
+    parser.add_argument("--port", type=int, default=web_settings.live_port)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=get_settings().monitoring.log_level,
+                        format=get_settings().monitoring.log_format)
+    log.info(f"📡 Feed en vivo en http://{args.host}:{args.port}/")
+    web.run_app(LiveFeed().app(), host=args.host, port=args.port, print=None)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())